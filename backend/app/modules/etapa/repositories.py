@@ -1,6 +1,8 @@
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 TABELA_ETAPAS = "orcamento_etapas"
+TABELA_ORCAMENTOS = "orcamentos"
 
 class EtapaRepository:
     def __init__(self, supabase_client):
@@ -36,3 +38,10 @@ class EtapaRepository:
             .eq("orcamento_id", orcamento_id)\
             .execute()
         return True
+
+    def marcar_orcamento_alterado(self, orcamento_id: str) -> None:
+        """Regrava o ``updated_at`` do orçamento, que versiona as exportações."""
+        self.supabase.table(TABELA_ORCAMENTOS)\
+            .update({"updated_at": datetime.now().isoformat()})\
+            .eq("id", orcamento_id)\
+            .execute()
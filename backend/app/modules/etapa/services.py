@@ -18,6 +18,7 @@ class EtapaService:
         resultado = self.repository.criar(dados)
         if not resultado:
             raise Exception("Erro ao criar etapa")
+        self.repository.marcar_orcamento_alterado(orcamento_id)
         return resultado
 
     def listar_etapas(self, orcamento_id: str) -> List[dict]:
@@ -27,8 +28,11 @@ class EtapaService:
         resultado = self.repository.atualizar(etapa_id, etapa_update)
         if not resultado:
             raise Exception("Erro ao atualizar etapa")
+        if resultado.get("orcamento_id"):
+            self.repository.marcar_orcamento_alterado(resultado["orcamento_id"])
         return resultado
 
     def deletar_etapa(self, etapa_id: str, orcamento_id: str) -> dict:
         self.repository.deletar(etapa_id, orcamento_id)
+        self.repository.marcar_orcamento_alterado(orcamento_id)
         return {"message": "Etapa deletada com sucesso"}
@@ -1,11 +1,12 @@
 import logging
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
 
-from app.modules.importacao.services.import_service import extract_metadata, process_import_file
+from app.modules.importacao.services.import_service import extract_metadata, importar_arquivos
 from app.modules.item.repositories import ItemRepository
 from app.modules.item.schemas import SinapiMetadata
 from core.supabase_client import get_supabase_client
 from core.security import require_admin
+from core.jobs import STATUS_PENDENTE, get_job_manager
 
 logger = logging.getLogger("projeto_orcamento")
 router = APIRouter(prefix="/importacao", tags=["Importacao"], redirect_slashes=False)
@@ -46,46 +47,42 @@ async def upload_worksheet(
         logger.error(f"Unexpected error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error processing file.")
 
-@router.post("/import")
+@router.post("/import", status_code=202)
 async def import_worksheet_data(
     files: list[UploadFile] = File(...),
     source: str = Query("SINAPI", description="Fonte da planilha (ex: SINAPI, SEINFRA)"),
+    paralelo: bool | None = Query(None, description="Extrai cada aba num processo separado (padrão: IMPORT_PARALELO)"),
+    delta: bool = Query(False, description="Envia apenas linhas novas ou alteradas desde a última importação"),
     current_user = Depends(require_admin),
 ):
     """
-    Full import: Accepts multiple Excel files (e.g., CSD, CCD, CSE) and processes them all.
-    Extracts metadata AND processes data sheets to database.
+    Full import: Accepts multiple Excel files (e.g., CSD, CCD, CSE) and queues them
+    as a background job. Returns the job id immediately; poll GET /importacao/jobs/{id}
+    for stage, rows read/written per table and elapsed time.
     """
-    total_items = 0
-    total_prices = 0
-    results_metadata = []
+    arquivos = []
+    for file in files:
+        if not file.filename.endswith(('.xls', '.xlsx')):
+            continue
+        arquivos.append((file.filename, await file.read()))
 
-    repository = get_item_repository()
+    if not arquivos:
+        raise HTTPException(status_code=400, detail="Nenhuma planilha Excel enviada.")
 
-    try:
-        for file in files:
-            if not file.filename.endswith(('.xls', '.xlsx')):
-                continue
-            
-            content = await file.read()
-            try:
-                result = process_import_file(content, repository, source_type=source)
-                total_items += result.get("imported_items", 0)
-                total_prices += result.get("imported_prices", 0)
-                results_metadata.append(result.get("metadata"))
-            except ValueError as e:
-                logger.error(f"Error processing file {file.filename}: {e}")
-                pass 
+    job_id = get_job_manager().submeter(
+        "importacao", importar_arquivos, arquivos, get_item_repository(),
+        source_type=source, paralelo=paralelo, delta=delta,
+    )
+    return {"job_id": job_id, "status": STATUS_PENDENTE, "url": f"/importacao/jobs/{job_id}"}
 
-        return {
-            "status": "sucesso",
-            "imported_items": total_items,
-            "imported_prices": total_prices,
-            "metadata_list": results_metadata
-        }
-    except Exception as e:
-        logger.error(f"Error importing SINAPI: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error importing SINAPI: {str(e)}")
+@router.get("/jobs/{job_id}")
+async def obter_job_importacao(job_id: str, current_user = Depends(require_admin)):
+    """Estado de uma importação em segundo plano."""
+    job = get_job_manager().obter(job_id)
+    # O armazenamento é compartilhado com as exportações: só tarefas de importação
+    if job is None or job["tipo"] != "importacao":
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return job
 
 @router.get("/bases")
 async def listar_bases_disponiveis():
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Tuple, Optional
 import pandas as pd
-from io import BytesIO
+
+from .workbook_session import WorkbookSession
 
 class BaseExcelParser(ABC):
     """
@@ -9,18 +10,27 @@ class BaseExcelParser(ABC):
     Define o contrato que cada implementação específica (SINAPI, SEINFRA, etc.) deve seguir.
     """
 
-    def __init__(self, file_content: bytes):
+    def __init__(self, file_content: bytes, sessao: Optional[WorkbookSession] = None):
         self._file_content = file_content
-        self._xl = pd.ExcelFile(BytesIO(file_content))
+        self._sessao = sessao or WorkbookSession(file_content)
+
+    @property
+    def sessao(self) -> WorkbookSession:
+        """Sessão de leitura compartilhada (cache de abas e contadores)."""
+        return self._sessao
+
+    @property
+    def _xl(self) -> pd.ExcelFile:
+        return self._sessao.excel_file
 
     @property
     def sheet_names(self) -> List[str]:
         """Retorna os nomes de todas as abas do arquivo."""
-        return self._xl.sheet_names
+        return self._sessao.sheet_names
 
     def ler_aba(self, sheet_name: str, **kwargs) -> pd.DataFrame:
-        """Lê uma aba do arquivo Excel como DataFrame."""
-        return pd.read_excel(self._xl, sheet_name=sheet_name, **kwargs)
+        """Lê uma aba do arquivo Excel como DataFrame (via cache da sessão)."""
+        return self._sessao.ler_aba(sheet_name, **kwargs)
 
     @abstractmethod
     def identificar_abas_dados(self) -> List[str]:
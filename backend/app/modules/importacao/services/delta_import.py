@@ -0,0 +1,52 @@
+"""
+Importação incremental (delta) por hash de conteúdo.
+
+Cada registro recebe em ``hash_conteudo`` uma impressão digital dos seus
+campos. Na importação delta, os hashes já gravados para o mesmo
+``mes_referencia``/``fonte`` são lidos uma vez por tabela e apenas os
+registros novos ou alterados seguem para o upsert.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Tuple
+
+CAMPO_HASH = "hash_conteudo"
+
+
+def calcular_hash(registro: dict) -> str:
+    """Hash estável dos campos do registro (ignora o próprio ``hash_conteudo``)."""
+    conteudo = {k: v for k, v in registro.items() if k != CAMPO_HASH}
+    serializado = json.dumps(conteudo, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(serializado.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def marcar_hashes(registros: List[dict]) -> List[dict]:
+    """Grava ``hash_conteudo`` em cada registro (in-place) e devolve a lista."""
+    for reg in registros:
+        reg[CAMPO_HASH] = calcular_hash(reg)
+    return registros
+
+
+def chave_registro(registro: dict, campos: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Chave de upsert do registro, normalizada como texto."""
+    return tuple(str(registro.get(c)) for c in campos)
+
+
+def filtrar_alterados(
+    registros: List[dict],
+    campos_chave: Tuple[str, ...],
+    hashes_gravados: Dict[Tuple[str, ...], str],
+) -> Tuple[List[dict], int]:
+    """Separa os registros novos ou alterados dos que já estão no banco.
+
+    Os registros precisam ter passado por :func:`marcar_hashes`.
+
+    Returns:
+        Tupla ``(alterados, qtd_ignorados)``.
+    """
+    alterados = [
+        reg for reg in registros
+        if hashes_gravados.get(chave_registro(reg, campos_chave)) != reg[CAMPO_HASH]
+    ]
+    return alterados, len(registros) - len(alterados)
@@ -5,16 +5,59 @@ Orquestra a extração de metadados e importação de dados de composições
 e preços a partir de arquivos Excel no formato SINAPI.
 """
 
+import hashlib
 import logging
-from typing import Any, Dict, List
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.modules.item.repositories import ItemRepository
+from app.modules.item.repositories import (
+    TABELA_COMPOSICAO_ITENS,
+    TABELA_COMPOSICOES,
+    TABELA_COMPOSICOES_ESTADOS,
+    TABELA_INSUMOS_BASICOS,
+    ItemRepository,
+)
+from app.modules.item.composition_tree import (
+    GrafoComposicoes,
+    achatar_grafo,
+    invalidar_explosao_composicoes,
+)
+from app.modules.item.price_index import invalidar_indice_precos
 from app.modules.item.schemas import SinapiMetadata
+from .base_excel_parser import BaseExcelParser
+from .delta_import import filtrar_alterados, marcar_hashes
 from .parser_factory import get_parser
-from .sinapi_text_utils import normalizar_nome_aba
+from .workbook_session import WorkbookSession
+from core.cache import CacheLRU
+from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Relações do Analítico lidas e gravadas por vez
+TAMANHO_LOTE_ANALITICO = 5000
+
+# Chaves de conflito usadas no upsert de cada tabela
+CHAVE_COMPOSICAO = ("codigo_composicao", "mes_referencia", "fonte")
+CHAVE_PRECO = ("codigo_composicao", "mes_referencia", "tipo_composicao", "fonte")
+CHAVE_ANALITICO = ("codigo_pai", "codigo_filho", "mes_referencia", "fonte")
+
+
+@dataclass
+class AnaliseArquivo:
+    """Metadados e classificação de abas de um arquivo, guardados em cache."""
+
+    metadados: SinapiMetadata
+    abas_dados: List[str]
+    aba_analitico: Optional[str]
+    aba_insumos: Optional[str]
+
+
+# Análises por (SHA-256 do arquivo, fonte): uploads repetidos e o /import
+# seguinte do mesmo arquivo não reabrem a planilha para ler metadados
+_cache_arquivos: CacheLRU[AnaliseArquivo] = CacheLRU(max_itens=settings.IMPORT_CACHE_ARQUIVOS)
+
 
 # ---------------------------------------------------------------------------
 # Extração de metadados
@@ -23,11 +66,21 @@ logger = logging.getLogger(__name__)
 def extract_metadata(
     file_content: bytes,
     sheet_name_hint: str | None = None,
-    source_type: str = "SINAPI"
+    source_type: str = "SINAPI",
+    parser: BaseExcelParser | None = None,
 ) -> SinapiMetadata:
-    """Extrai metadados delegando a tarefa ao parser específico."""
+    """Extrai metadados delegando a tarefa ao parser específico.
+
+    Se ``parser`` for informado, reaproveita o arquivo já aberto por ele
+    em vez de ler os bytes novamente. Sem ``sheet_name_hint``, usa o cache
+    de :func:`analisar_arquivo`.
+    """
+    if sheet_name_hint is None:
+        return analisar_arquivo(file_content, source_type, parser=parser).metadados.model_copy()
+
     try:
-        parser = get_parser(file_content, source_type)
+        if parser is None:
+            parser = get_parser(file_content, source_type)
         meta_dict = parser.extrair_metadados(sheet_hint=sheet_name_hint)
         
         return SinapiMetadata(
@@ -40,6 +93,50 @@ def extract_metadata(
         raise ValueError(f"Erro ao extrair metadados: {e}") from e
 
 
+def analisar_arquivo(
+    file_content: bytes,
+    source_type: str = "SINAPI",
+    parser: BaseExcelParser | None = None,
+) -> AnaliseArquivo:
+    """Metadados e classificação das abas do arquivo, com cache por conteúdo.
+
+    A chave é o SHA-256 dos bytes: o mesmo arquivo enviado de novo (ou
+    importado logo após o upload) não é reaberto. O cache guarda até
+    ``settings.IMPORT_CACHE_ARQUIVOS`` arquivos, descartando o menos usado.
+    """
+    chave = (hashlib.sha256(file_content).hexdigest(), source_type)
+    analise = _cache_arquivos.obter(chave)
+    if analise is not None:
+        logger.debug("Análise do arquivo %s… reaproveitada do cache", chave[0][:12])
+        return analise
+
+    try:
+        if parser is None:
+            parser = get_parser(file_content, source_type)
+        abas_dados = parser.identificar_abas_dados()
+        primeira_aba = abas_dados[0] if abas_dados else parser.sheet_names[0]
+        meta_dict = parser.extrair_metadados(sheet_hint=primeira_aba)
+
+        identificar_analitico = getattr(parser, "identificar_aba_analitico", None)
+        identificar_insumos = getattr(parser, "identificar_aba_insumos", None)
+        analise = AnaliseArquivo(
+            metadados=SinapiMetadata(
+                mes_referencia=meta_dict.get("mes_referencia", "UNKNOWN"),
+                uf=meta_dict.get("uf", "BR"),
+                desoneracao=meta_dict.get("desoneracao", "UNKNOWN"),
+                fonte=source_type
+            ),
+            abas_dados=abas_dados,
+            aba_analitico=identificar_analitico() if identificar_analitico else None,
+            aba_insumos=identificar_insumos() if identificar_insumos else None,
+        )
+    except Exception as e:
+        raise ValueError(f"Erro ao extrair metadados: {e}") from e
+
+    _cache_arquivos.definir(chave, analise)
+    return analise
+
+
 # ---------------------------------------------------------------------------
 # Processamento completo (composições + preços)
 # ---------------------------------------------------------------------------
@@ -47,74 +144,436 @@ def extract_metadata(
 def process_import_file(
     file_content: bytes,
     repository: ItemRepository,
-    source_type: str = "SINAPI"
+    source_type: str = "SINAPI",
+    paralelo: bool | None = None,
+    max_workers: int | None = None,
+    progresso: Callable[..., None] | None = None,
+    delta: bool = False,
 ) -> Dict[str, Any]:
     """Processa um arquivo SINAPI completo e importa os dados no banco.
+
+    O arquivo é aberto uma única vez numa :class:`WorkbookSession`, que
+    serve metadados, abas de preços, códigos de fórmulas e a aba Analítico,
+    e cujos contadores por etapa vão em ``"estatisticas"`` no retorno.
+    Linhas gravadas, perdidas e reenviadas por tabela vão em ``"upserts"``.
+
+    Args:
+        file_content: Bytes do arquivo Excel.
+        repository: Repositório onde os registros são gravados.
+        source_type: Fonte da planilha (ex: ``"SINAPI"``).
+        paralelo: Extrai cada aba de preços (e a Analítico) num processo
+            separado. ``None`` usa ``settings.IMPORT_PARALELO``.
+        max_workers: Processos do pool no modo paralelo. ``None`` usa
+            ``settings.IMPORT_WORKERS`` (0 = número de CPUs).
+        progresso: Chamado a cada etapa como ``progresso(etapa, lidas=...,
+            gravadas=...)``, com incrementos de linhas por tabela (ver
+            :class:`core.jobs.ProgressoJob`).
+        delta: Envia apenas linhas novas ou alteradas, comparando o
+            ``hash_conteudo`` de cada registro com os já gravados para o
+            mesmo mês/fonte. As linhas puladas vão em ``"ignorados"``.
     """
+    if paralelo is None:
+        paralelo = settings.IMPORT_PARALELO
+    progresso = progresso or _sem_progresso
+
+    sessao = None
     try:
-        parser = get_parser(file_content, source_type)
-        abas_precos = parser.identificar_abas_dados()
+        # No modo paralelo o processo principal só lê o topo das abas; com a
+        # análise em cache, nem chega a abrir a planilha
+        sessao = WorkbookSession(
+            file_content, ler_abas_completas=not paralelo, medir_memoria=settings.IMPORT_MEDIR_MEMORIA,
+        )
+        parser = get_parser(file_content, source_type, sessao=sessao)
 
-        first_sheet = abas_precos[0] if abas_precos else parser.sheet_names[0]
-        metadata = extract_metadata(file_content, sheet_name_hint=first_sheet, source_type=source_type)
+        progresso("metadados")
+        with sessao.medir("metadados"):
+            analise = analisar_arquivo(file_content, source_type, parser=parser)
+        metadata = analise.metadados
+        abas_precos = analise.abas_dados
+        aba_analitico = analise.aba_analitico if source_type == "SINAPI" else None
 
         logger.info(
-            "Processando arquivo SINAPI — abas: %s, metadados: %s",
+            "Processando arquivo SINAPI — abas: %s, metadados: %s, paralelo: %s",
             abas_precos,
             metadata,
+            paralelo,
         )
 
+        progresso("extracao")
+        analitico: List[dict] | None = None
+        if paralelo:
+            with sessao.medir("extracao_paralela"):
+                resultados, analitico = _extrair_em_paralelo(
+                    file_content, source_type, abas_precos, aba_analitico,
+                    metadata.mes_referencia, max_workers,
+                )
+        else:
+            resultados = []
+            for aba in abas_precos:
+                with sessao.medir(f"extracao:{aba}"):
+                    resultados.append(
+                        parser.extrair_registros_aba(aba, metadata.mes_referencia)
+                    )
+                sessao.liberar_aba(aba)
+
         todas_composicoes: List[dict] = []
         todos_precos: List[dict] = []
-
-        for aba in abas_precos:
-            composicoes, precos = parser.extrair_registros_aba(
-                aba, metadata.mes_referencia
-            )
+        for composicoes, precos in resultados:
             for c in composicoes:
                 c["fonte"] = source_type
             for p in precos:
                 p["fonte"] = source_type
-
             todas_composicoes.extend(composicoes)
             todos_precos.extend(precos)
 
         todas_composicoes = _deduplicar_composicoes(todas_composicoes)
+        todos_precos = _deduplicar_por_chave(todos_precos, CHAVE_PRECO)
+        marcar_hashes(todas_composicoes)
+        marcar_hashes(todos_precos)
+
+        ignorados = {TABELA_COMPOSICOES: 0, TABELA_COMPOSICOES_ESTADOS: 0, TABELA_COMPOSICAO_ITENS: 0}
+        hashes_analitico = None
+        if delta:
+            with sessao.medir("delta_hashes"):
+                todas_composicoes, ignorados[TABELA_COMPOSICOES] = filtrar_alterados(
+                    todas_composicoes, CHAVE_COMPOSICAO,
+                    repository.listar_hashes(
+                        TABELA_COMPOSICOES, CHAVE_COMPOSICAO, metadata.mes_referencia, source_type,
+                    ),
+                )
+                todos_precos, ignorados[TABELA_COMPOSICOES_ESTADOS] = filtrar_alterados(
+                    todos_precos, CHAVE_PRECO,
+                    repository.listar_hashes(
+                        TABELA_COMPOSICOES_ESTADOS, CHAVE_PRECO, metadata.mes_referencia, source_type,
+                    ),
+                )
+                if aba_analitico:
+                    hashes_analitico = repository.listar_hashes(
+                        TABELA_COMPOSICAO_ITENS, CHAVE_ANALITICO, metadata.mes_referencia, source_type,
+                    )
+            logger.info("Importação delta — linhas sem alteração: %s", ignorados)
+        progresso("upsert_composicoes", lidas={
+            TABELA_COMPOSICOES: len(todas_composicoes),
+            TABELA_COMPOSICOES_ESTADOS: len(todos_precos),
+        })
 
-        q_comp = repository.upsert_batch_composicoes(todas_composicoes)
-        q_est = repository.upsert_batch_estados(todos_precos)
+        with sessao.medir("upsert_composicoes"):
+            q_comp = repository.upsert_batch_composicoes(todas_composicoes)
+        progresso("upsert_estados", gravadas={TABELA_COMPOSICOES: q_comp})
+        with sessao.medir("upsert_estados"):
+            q_est = repository.upsert_batch_estados(todos_precos)
+        # Preços desta base mudaram: o índice em memória não pode servi-los
+        invalidar_indice_precos(fonte=source_type, mes_referencia=metadata.mes_referencia)
+        progresso("upsert_estados", gravadas={TABELA_COMPOSICOES_ESTADOS: q_est})
 
         q_analitico = 0
-        if source_type == "SINAPI" and hasattr(parser, "identificar_aba_analitico"):
-            aba_analitico = parser.identificar_aba_analitico()
-            if aba_analitico:
-                logger.info("Extraindo aba Analítico: '%s'", aba_analitico)
-                relacoes = parser.extrair_analitico(
-                    aba_analitico, metadata.mes_referencia, fonte=source_type
+        q_insumos_basicos = 0
+        if aba_analitico:
+            logger.info("Extraindo aba Analítico: '%s'", aba_analitico)
+            grafo = GrafoComposicoes() if settings.IMPORT_INSUMOS_BASICOS else None
+            if analitico is not None:
+                q_analitico, ignorados[TABELA_COMPOSICAO_ITENS] = _gravar_analitico_em_lotes(
+                    analitico, repository, sessao, progresso, hashes_analitico, grafo,
+                )
+            else:
+                q_analitico, ignorados[TABELA_COMPOSICAO_ITENS] = _importar_analitico_em_lotes(
+                    parser, aba_analitico, metadata.mes_referencia,
+                    source_type, repository, sessao, progresso, hashes_analitico, grafo,
+                )
+            logger.info("%d relacionamentos analíticos importados.", q_analitico)
+            if grafo:
+                q_insumos_basicos = _gravar_insumos_basicos(
+                    grafo, metadata.mes_referencia, source_type, repository, sessao, progresso,
                 )
-                q_analitico = repository.upsert_batch_composicao_itens(relacoes)
-                logger.info("%d relacionamentos analíticos importados.", q_analitico)
+            invalidar_explosao_composicoes(fonte=source_type, mes_referencia=metadata.mes_referencia)
+
+        estatisticas = sessao.estatisticas()
+        logger.info("Estatísticas da importação: %s", estatisticas)
 
         return {
             "status": "sucesso",
             "imported_items": q_comp,
             "imported_prices": q_est,
             "imported_analitico": q_analitico,
+            "imported_insumos_basicos": q_insumos_basicos,
             "metadata": metadata.model_dump(), # Pydantic v2 usa model_dump()
+            "estatisticas": estatisticas,
+            "upserts": repository.relatorio_upsert(),
+            "ignorados": ignorados,
         }
 
     except Exception as e:
         logger.exception("Erro no processamento da importação SINAPI")
         raise ValueError(f"Erro no processamento da importação: {e}") from e
+    finally:
+        if sessao is not None:
+            sessao.fechar()
+
+
+def importar_arquivos(
+    progresso: Callable[..., None],
+    arquivos: List[Tuple[str, bytes]],
+    repository: ItemRepository,
+    source_type: str = "SINAPI",
+    paralelo: bool | None = None,
+    delta: bool = False,
+) -> Dict[str, Any]:
+    """Importa vários arquivos (ex: CSD, CCD, CSE) e consolida os totais.
+
+    Assinatura compatível com :meth:`core.jobs.JobManager.submeter`: roda
+    como tarefa em segundo plano de ``POST /importacao/import``. Um arquivo
+    com erro é registrado em ``"erros"`` sem interromper os demais.
+    """
+    total_items = 0
+    total_prices = 0
+    results_metadata = []
+    erros = []
+    ignorados: Dict[str, int] = {}
+
+    for i, (nome, conteudo) in enumerate(arquivos, start=1):
+        if not nome.endswith(('.xls', '.xlsx')):
+            continue
+        progresso("arquivo", arquivo=nome, arquivo_atual=i, total_arquivos=len(arquivos))
+        try:
+            result = process_import_file(
+                conteudo, repository, source_type=source_type,
+                paralelo=paralelo, progresso=progresso, delta=delta,
+            )
+            for tabela, qtd in result.get("ignorados", {}).items():
+                ignorados[tabela] = ignorados.get(tabela, 0) + qtd
+            total_items += result.get("imported_items", 0)
+            total_prices += result.get("imported_prices", 0)
+            results_metadata.append(result.get("metadata"))
+        except ValueError as e:
+            logger.error(f"Error processing file {nome}: {e}")
+            erros.append({"arquivo": nome, "erro": str(e)})
+
+    progresso("concluido")
+    return {
+        "status": "sucesso",
+        "imported_items": total_items,
+        "imported_prices": total_prices,
+        "metadata_list": results_metadata,
+        "upserts": repository.relatorio_upsert(),
+        "ignorados": ignorados,
+        "erros": erros,
+    }
+
+
+def _sem_progresso(etapa: str, **_: Any) -> None:
+    """Relator de progresso padrão: não faz nada."""
+
+
+# ---------------------------------------------------------------------------
+# Extração paralela (um processo por aba)
+# ---------------------------------------------------------------------------
+
+def _extrair_em_paralelo(
+    file_content: bytes,
+    source_type: str,
+    abas_precos: List[str],
+    aba_analitico: str | None,
+    mes_referencia: str,
+    max_workers: int | None = None,
+) -> Tuple[List[Tuple[List[dict], List[dict]]], List[dict] | None]:
+    """Extrai as abas de preços e a Analítico em processos separados.
+
+    Cada processo abre o próprio arquivo e devolve os registros da sua aba;
+    os resultados voltam na ordem de ``abas_precos``, para que a
+    deduplicação mantenha as mesmas ocorrências do modo sequencial.
+
+    Returns:
+        Tupla ``(resultados_por_aba, analitico)``; ``analitico`` é ``None``
+        quando o arquivo não tem aba Analítico.
+    """
+    tarefas = len(abas_precos) + (1 if aba_analitico else 0)
+    if tarefas == 0:
+        return [], None
+
+    workers = max_workers or settings.IMPORT_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, tarefas))
+    logger.info("Extração paralela: %d abas em %d processos.", tarefas, workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # A Analítico é a aba mais longa: submetida primeiro
+        futuro_analitico = None
+        if aba_analitico:
+            futuro_analitico = executor.submit(
+                _extrair_analitico_em_processo,
+                file_content, source_type, aba_analitico, mes_referencia,
+            )
+        futuros = [
+            executor.submit(
+                _extrair_aba_em_processo,
+                file_content, source_type, aba, mes_referencia,
+            )
+            for aba in abas_precos
+        ]
+        resultados = [f.result() for f in futuros]
+        analitico = None
+        if futuro_analitico is not None:
+            analitico = _deduplicar_por_chave(futuro_analitico.result(), CHAVE_ANALITICO)
+
+    return resultados, analitico
+
+
+def _extrair_aba_em_processo(
+    file_content: bytes,
+    source_type: str,
+    nome_aba: str,
+    mes_referencia: str,
+) -> Tuple[List[dict], List[dict]]:
+    """Executado no processo filho: extrai composições e preços de uma aba."""
+    sessao = WorkbookSession(file_content, ler_abas_completas=True)
+    try:
+        parser = get_parser(file_content, source_type, sessao=sessao)
+        return parser.extrair_registros_aba(nome_aba, mes_referencia)
+    finally:
+        sessao.fechar()
+
+
+def _extrair_analitico_em_processo(
+    file_content: bytes,
+    source_type: str,
+    nome_aba: str,
+    mes_referencia: str,
+) -> List[dict]:
+    """Executado no processo filho: extrai os relacionamentos da Analítico."""
+    sessao = WorkbookSession(file_content)
+    try:
+        parser = get_parser(file_content, source_type, sessao=sessao)
+        return parser.extrair_analitico(nome_aba, mes_referencia, fonte=source_type)
+    finally:
+        sessao.fechar()
+
+
+# ---------------------------------------------------------------------------
+# Gravação da aba Analítico
+# ---------------------------------------------------------------------------
+
+def _importar_analitico_em_lotes(
+    parser: BaseExcelParser,
+    aba_analitico: str,
+    mes_referencia: str,
+    fonte: str,
+    repository: ItemRepository,
+    sessao: WorkbookSession,
+    progresso: Callable[..., None] | None = None,
+    hashes_gravados: Dict[Tuple[str, ...], str] | None = None,
+    grafo: GrafoComposicoes | None = None,
+) -> Tuple[int, int]:
+    """Lê a aba Analítico em streaming e grava cada lote assim que é produzido.
+
+    Nenhum momento mantém mais de ``TAMANHO_LOTE_ANALITICO`` relações
+    completas em memória, independente do tamanho da aba; com ``grafo``,
+    os campos usados na explosão de cada relação são acumulados nele.
+
+    Returns:
+        Tupla ``(gravadas, ignoradas)``; só há ignoradas quando
+        ``hashes_gravados`` (importação delta) é informado.
+    """
+    progresso = progresso or _sem_progresso
+    total = 0
+    ignoradas = 0
+    lotes = parser.iterar_analitico(
+        aba_analitico, mes_referencia, fonte=fonte,
+        tamanho_lote=TAMANHO_LOTE_ANALITICO,
+    )
+    while True:
+        with sessao.medir("extracao_analitico"):
+            lote = next(lotes, None)
+        if lote is None:
+            break
+        progresso("upsert_analitico", lidas={TABELA_COMPOSICAO_ITENS: len(lote)})
+        lote = _deduplicar_por_chave(lote, CHAVE_ANALITICO)
+        if grafo is not None:
+            grafo.adicionar(lote)
+        lote, qtd_ignoradas = _preparar_lote_analitico(lote, hashes_gravados)
+        ignoradas += qtd_ignoradas
+        with sessao.medir("upsert_analitico"):
+            gravadas = repository.upsert_batch_composicao_itens(lote)
+        progresso("upsert_analitico", gravadas={TABELA_COMPOSICAO_ITENS: gravadas})
+        total += gravadas
+    return total, ignoradas
+
+
+def _gravar_analitico_em_lotes(
+    registros: List[dict],
+    repository: ItemRepository,
+    sessao: WorkbookSession,
+    progresso: Callable[..., None] | None = None,
+    hashes_gravados: Dict[Tuple[str, ...], str] | None = None,
+    grafo: GrafoComposicoes | None = None,
+) -> Tuple[int, int]:
+    """Grava relacionamentos já extraídos em lotes de ``TAMANHO_LOTE_ANALITICO``.
+
+    Returns:
+        Tupla ``(gravadas, ignoradas)``, como em :func:`_importar_analitico_em_lotes`.
+    """
+    progresso = progresso or _sem_progresso
+    progresso("upsert_analitico", lidas={TABELA_COMPOSICAO_ITENS: len(registros)})
+    if grafo is not None:
+        grafo.adicionar(registros)
+    registros, ignoradas = _preparar_lote_analitico(registros, hashes_gravados)
+    total = 0
+    for i in range(0, len(registros), TAMANHO_LOTE_ANALITICO):
+        with sessao.medir("upsert_analitico"):
+            gravadas = repository.upsert_batch_composicao_itens(
+                registros[i:i + TAMANHO_LOTE_ANALITICO]
+            )
+        progresso("upsert_analitico", gravadas={TABELA_COMPOSICAO_ITENS: gravadas})
+        total += gravadas
+    return total, ignoradas
+
+
+def _gravar_insumos_basicos(
+    grafo: GrafoComposicoes,
+    mes_referencia: str,
+    fonte: str,
+    repository: ItemRepository,
+    sessao: WorkbookSession,
+    progresso: Callable[..., None] | None = None,
+) -> int:
+    """Achata todas as composições do grafo e regrava a tabela derivada da base."""
+    progresso = progresso or _sem_progresso
+    progresso("insumos_basicos")
+    with sessao.medir("achatar_composicoes"):
+        linhas = achatar_grafo(grafo, mes_referencia, fonte)
+    progresso("insumos_basicos", lidas={TABELA_INSUMOS_BASICOS: len(linhas)})
+    with sessao.medir("upsert_insumos_basicos"):
+        gravadas = repository.substituir_insumos_basicos(linhas, mes_referencia, fonte)
+    progresso("insumos_basicos", gravadas={TABELA_INSUMOS_BASICOS: gravadas})
+    logger.info("%d insumos básicos de %d composições gravados.", gravadas, len(grafo))
+    return gravadas
+
+
+def _preparar_lote_analitico(
+    lote: List[dict],
+    hashes_gravados: Dict[Tuple[str, ...], str] | None,
+) -> Tuple[List[dict], int]:
+    """Marca o hash de cada relação e, no modo delta, descarta as inalteradas."""
+    marcar_hashes(lote)
+    if hashes_gravados is None:
+        return lote, 0
+    return filtrar_alterados(lote, CHAVE_ANALITICO, hashes_gravados)
 
 
 def _deduplicar_composicoes(registros: List[dict]) -> List[dict]:
     """Remove composições duplicadas mantendo a primeira ocorrência."""
+    return _deduplicar_por_chave(registros, ("codigo_composicao",))
+
+
+def _deduplicar_por_chave(registros: List[dict], campos: Tuple[str, ...]) -> List[dict]:
+    """Remove registros com a mesma chave ``campos``, mantendo o primeiro.
+
+    Um mesmo lote de upsert não pode conter duas linhas com a mesma chave
+    de conflito, por isso a deduplicação usa os campos do ``on_conflict``.
+    """
     vistos: set = set()
     resultado: List[dict] = []
     for reg in registros:
-        cod = reg["codigo_composicao"]
-        if cod not in vistos:
-            vistos.add(cod)
+        chave = tuple(reg.get(c) for c in campos)
+        if chave not in vistos:
+            vistos.add(chave)
             resultado.append(reg)
     return resultado
@@ -1,15 +1,23 @@
+from typing import Optional
+
 from .base_excel_parser import BaseExcelParser
 from .sinapi_excel_parser import SinapiExcelParser
 from .seinfra_excel_parser import SeinfraExcelParser
+from .workbook_session import WorkbookSession
 
-def get_parser(file_content: bytes, source_type: str = "SINAPI") -> BaseExcelParser:
+def get_parser(
+    file_content: bytes,
+    source_type: str = "SINAPI",
+    sessao: Optional[WorkbookSession] = None,
+) -> BaseExcelParser:
     """
     Fábrica para retornar a instância correta de parser baseada na fonte.
+    Se ``sessao`` for informada, o parser reaproveita o arquivo já aberto.
     """
     if source_type.upper() == "SINAPI":
-        return SinapiExcelParser(file_content)
+        return SinapiExcelParser(file_content, sessao=sessao)
     
     if source_type.upper() == "SEINFRA":
-        return SeinfraExcelParser(file_content)
+        return SeinfraExcelParser(file_content, sessao=sessao)
         
     raise ValueError(f"Fonte de dados '{source_type}' não suportada atualmente.")
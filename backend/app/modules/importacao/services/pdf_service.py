@@ -1,6 +1,56 @@
+from functools import lru_cache
 from fpdf import FPDF
 from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+# Larguras dos caracteres (milésimos de em) por fonte já usada, para quebrar
+# linhas sem passar pelo multi_cell
+_LARGURAS_FONTE: Dict[str, Dict[str, int]] = {}
+
+# Descrições se repetem muito entre orçamentos (mesmas composições SINAPI)
+TAMANHO_CACHE_QUEBRA_LINHAS = 8192
+
+_SEPARADORES_BR = str.maketrans(",.", ".,")
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_QUEBRA_LINHAS)
+def quebrar_linhas(fonte: str, largura_max: float, texto: str) -> Tuple[str, ...]:
+    """Linhas de ``texto`` com no máximo ``largura_max`` (em milésimos de em).
+
+    Quebra nos espaços, como o ``multi_cell`` do fpdf; uma palavra mais
+    larga que a linha é partida por caractere. ``fonte`` é a ``fontkey`` de
+    uma fonte registrada em ``_LARGURAS_FONTE``.
+    """
+    cw = _LARGURAS_FONTE[fonte]
+    espaco = cw.get(" ", 278)
+    linhas: List[str] = []
+    for paragrafo in texto.split("\n"):
+        atual: List[str] = []
+        largura_atual = 0
+        for palavra in paragrafo.split(" "):
+            largura_palavra = sum(cw.get(c, 600) for c in palavra)
+            extra = largura_palavra + (espaco if atual else 0)
+            if largura_atual + extra <= largura_max:
+                atual.append(palavra)
+                largura_atual += extra
+                continue
+            if atual:
+                linhas.append(" ".join(atual))
+            atual, largura_atual = [], 0
+            while largura_palavra > largura_max:
+                pedaco, largura_pedaco = "", 0
+                for c in palavra:
+                    if largura_pedaco + cw.get(c, 600) > largura_max and pedaco:
+                        break
+                    pedaco += c
+                    largura_pedaco += cw.get(c, 600)
+                linhas.append(pedaco)
+                palavra = palavra[len(pedaco):]
+                largura_palavra -= largura_pedaco
+            atual, largura_atual = [palavra], largura_palavra
+        linhas.append(" ".join(atual))
+    return tuple(linhas)
+
 
 class PdfService(FPDF):
     def header(self):
@@ -16,45 +66,53 @@ class PdfService(FPDF):
     def _formatar_real(self, valor: float) -> str:
         try:
             valor = float(valor)
-            partes = f"{valor:.2f}".split('.')
-            inteiro = partes[0]
-            decimal = partes[1]
-            
-            sinal = "-" if inteiro.startswith("-") else ""
-            if sinal:
-                inteiro = inteiro[1:]
-                
-            acumulado = []
-            for i, char in enumerate(reversed(inteiro)):
-                if i > 0 and i % 3 == 0:
-                    acumulado.append('.')
-                acumulado.append(char)
-                
-            inteiro_formatado = "".join(reversed(acumulado))
-            return f"{sinal}R$ {inteiro_formatado},{decimal}"
         except (ValueError, TypeError):
             return "R$ 0,00"
+        texto = f"{abs(valor):,.2f}".translate(_SEPARADORES_BR)
+        return f"{'-' if valor < 0 else ''}R$ {texto}"
+
+    def _linhas(self, texto: str, largura: float) -> Tuple[str, ...]:
+        """Linhas de ``texto`` numa célula de ``largura`` com a fonte atual."""
+        fonte = self.current_font.fontkey
+        if fonte not in _LARGURAS_FONTE:
+            _LARGURAS_FONTE[fonte] = self.current_font.cw
+        util = (largura - 2 * self.c_margin) * self.k * 1000 / self.font_size_pt
+        return quebrar_linhas(fonte, round(util, 3), self.normalize_text(texto))
+
+    def _celula_texto(self, largura: float, linhas: Tuple[str, ...], line_h: float, row_h: float,
+                      fill: bool, align: str = 'L'):
+        """Célula com linhas já quebradas: a borda com ``rect`` e cada linha com ``text``.
+
+        Mesmo desenho do ``multi_cell``/``cell`` com ``border=1``, sem
+        remedir nem requebrar o texto a cada chamada.
+        """
+        x, y = self.get_x(), self.get_y()
+        self.rect(x, y, largura, row_h, style="DF" if fill else "D")
+        base = 0.5 * line_h + 0.3 * self.font_size
+        for i, linha in enumerate(linhas):
+            if align == 'L':
+                tx = x + self.c_margin
+            else:
+                livre = largura - sum(self.current_font.cw.get(c, 600) for c in linha) * self.font_size_pt / 1000 / self.k
+                tx = x + livre - self.c_margin if align == 'R' else x + livre / 2
+            self.text(tx, y + i * line_h + base, linha)
+        self.set_xy(x + largura, y)
 
     def _render_row(self, indent: str, number_str: str, description: str, quant_str: str, unitario_str: str, total_str: str, fill: bool = False):
         line_h = 6
         full_text = f"{indent}{number_str}. {description}" if number_str else f"{indent}{description}"
         
-        lines = self.multi_cell(w=100, h=line_h, text=full_text, dry_run=True, output='LINES')
-        num_lines = max(1, len(lines))
-        row_h = num_lines * line_h
+        lines = self._linhas(full_text, 100)
+        row_h = len(lines) * line_h
         
         if self.get_y() + row_h > self.page_break_trigger:
             self.add_page()
             
-        start_x = self.get_x()
-        start_y = self.get_y()
-        
-        self.multi_cell(w=100, h=line_h, text=full_text, border=1, fill=fill)
-        
-        self.set_xy(start_x + 100, start_y)
-        self.cell(w=30, h=row_h, text=quant_str, border=1, align='C', fill=fill)
-        self.cell(w=30, h=row_h, text=unitario_str, border=1, align='R', fill=fill)
-        self.cell(w=30, h=row_h, text=total_str, border=1, align='R', fill=fill, new_x="LMARGIN", new_y="NEXT")
+        self._celula_texto(100, lines, line_h, row_h, fill)
+        self._celula_texto(30, (quant_str,), row_h, row_h, fill, align='C')
+        self._celula_texto(30, (unitario_str,), row_h, row_h, fill, align='R')
+        self._celula_texto(30, (total_str,), row_h, row_h, fill, align='R')
+        self.set_xy(self.l_margin, self.get_y() + row_h)
 
     def _render_stage_row(self, prefix: str, name: str, subtotal_str: str, depth: int):
         line_h = 7
@@ -74,20 +132,15 @@ class PdfService(FPDF):
 
         full_text = f"{prefix}. {name}"
         
-        lines = self.multi_cell(w=160, h=line_h, text=full_text, dry_run=True, output='LINES')
-        num_lines = max(1, len(lines))
-        row_h = num_lines * line_h
+        lines = self._linhas(full_text, 160)
+        row_h = len(lines) * line_h
         
         if self.get_y() + row_h > self.page_break_trigger:
             self.add_page()
             
-        start_x = self.get_x()
-        start_y = self.get_y()
-        
-        self.multi_cell(w=160, h=line_h, text=full_text, border=1, fill=fill)
-        
-        self.set_xy(start_x + 160, start_y)
-        self.cell(w=30, h=row_h, text=subtotal_str, border=1, align='R', fill=fill, new_x="LMARGIN", new_y="NEXT")
+        self._celula_texto(160, lines, line_h, row_h, fill)
+        self._celula_texto(30, (subtotal_str,), row_h, row_h, fill, align='R')
+        self.set_xy(self.l_margin, self.get_y() + row_h)
 
     def gerar_pdf(self, orcamento: Dict[str, Any], itens: List[Dict[str, Any]], etapas: Optional[List[Dict[str, Any]]] = None) -> bytes:
         if not etapas:
@@ -135,7 +188,7 @@ class PdfService(FPDF):
         self.set_font('helvetica', '', 12)
         self.cell(0, 10, f"Obra: {orcamento.get('nome', 'Não informado')}", new_x="LMARGIN", new_y="NEXT")
         self.cell(0, 10, f"Fonte: {orcamento.get('fonte', 'SINAPI')} | Data Ref: {orcamento.get('base_referencia', '')}", new_x="LMARGIN", new_y="NEXT")
-        self.cell(0, 10, f"Emitido em: {orcamento.get('created_at', '')[:10]}", new_x="LMARGIN", new_y="NEXT")
+        self.cell(0, 10, f"Emitido em: {str(orcamento.get('created_at') or '')[:10]}", new_x="LMARGIN", new_y="NEXT")
         self.ln(10)
 
         self.set_font('helvetica', 'B', 10)
@@ -227,7 +280,7 @@ class PdfService(FPDF):
         self.set_font('helvetica', '', 12)
         self.cell(0, 10, f"Obra: {orcamento.get('nome', 'Não informado')}", new_x="LMARGIN", new_y="NEXT")
         self.cell(0, 10, f"Fonte: {orcamento.get('fonte', 'SINAPI')} | Data Ref: {orcamento.get('base_referencia', '')}", new_x="LMARGIN", new_y="NEXT")
-        self.cell(0, 10, f"Emitido em: {orcamento.get('created_at', '')[:10]}", new_x="LMARGIN", new_y="NEXT")
+        self.cell(0, 10, f"Emitido em: {str(orcamento.get('created_at') or '')[:10]}", new_x="LMARGIN", new_y="NEXT")
         self.ln(10)
 
         self.set_font('helvetica', 'B', 10)
@@ -8,15 +8,14 @@ e extração de registros de composições e preços por estado.
 import logging
 import re
 from dataclasses import dataclass, field
-from io import BytesIO
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
 from .base_excel_parser import BaseExcelParser
 
 from .sinapi_text_utils import (
-    limpar_valor_moeda,
+    limpar_valores_moeda_serie,
     normalizar_nome_aba,
     remover_acentos,
 )
@@ -76,6 +75,12 @@ class HeaderInfo:
     """Mapeia índice da coluna → sigla do estado (lowercase)."""
 
 
+def _montar_registros(colunas: Dict[str, list]) -> List[dict]:
+    """Transpõe listas de colunas (mesmo tamanho) em uma lista de dicts."""
+    nomes = list(colunas)
+    return [dict(zip(nomes, valores)) for valores in zip(*colunas.values())]
+
+
 class SinapiExcelParser(BaseExcelParser):
     """Parser para arquivos Excel no formato SINAPI.
 
@@ -86,18 +91,6 @@ class SinapiExcelParser(BaseExcelParser):
         ...     composicoes, precos = parser.extrair_registros_aba(aba, "09/2025")
     """
 
-    def __init__(self, file_content: bytes):
-        super().__init__(file_content)
-
-    @property
-    def sheet_names(self) -> List[str]:
-        """Nomes de todas as abas do arquivo."""
-        return self._xl.sheet_names
-
-    def ler_aba(self, sheet_name: str, **kwargs) -> pd.DataFrame:
-        """Lê uma aba do arquivo Excel como DataFrame."""
-        return pd.read_excel(self._xl, sheet_name=sheet_name, **kwargs)
-
     # ------------------------------------------------------------------
     # Identificação de abas
     # ------------------------------------------------------------------
@@ -360,23 +353,9 @@ class SinapiExcelParser(BaseExcelParser):
                     nome_aba, header.col_codigo, header.linha + 1,
                 )
 
-        composicoes: List[dict] = []
-        precos: List[dict] = []
-
-        for r_idx, row in df_dados.iterrows():
-            code_override = codigos_formula.get(r_idx)
-            registro = self._processar_linha(
-                row, header, mes_referencia, tipo_comp, code_override,
-            )
-            if registro is None:
-                continue
-
-            composicao, preco = registro
-            composicoes.append(composicao)
-            if preco is not None:
-                precos.append(preco)
-
-        return composicoes, precos
+        return self._extrair_registros_vetorizado(
+            df_dados, header, mes_referencia, tipo_comp, codigos_formula,
+        )
 
     def _extrair_codigos_formula(
         self,
@@ -386,8 +365,7 @@ class SinapiExcelParser(BaseExcelParser):
     ) -> Dict[int, str]:
         """Extrai códigos reais de fórmulas HYPERLINK via openpyxl.
         """
-        wb = load_workbook(BytesIO(self._file_content), data_only=False, read_only=True)
-        ws = wb[nome_aba]
+        ws = self._sessao.workbook_formulas()[nome_aba]
 
         padrao_hyperlink = re.compile(r'[,)]\s*(\d+)\s*\)\s*$')
 
@@ -412,7 +390,6 @@ class SinapiExcelParser(BaseExcelParser):
             elif val_str.strip() and val_str.strip() != '0':
                 codigos[row_idx] = val_str.replace('.0', '').strip()
 
-        wb.close()
         logger.info(
             "Extraídos %d códigos de fórmulas na aba '%s'.",
             len(codigos), nome_aba,
@@ -420,62 +397,86 @@ class SinapiExcelParser(BaseExcelParser):
         return codigos
 
     @staticmethod
-    def _processar_linha(
-        row: pd.Series,
+    def _extrair_registros_vetorizado(
+        df_dados: pd.DataFrame,
         header: HeaderInfo,
         mes_referencia: str,
         tipo_composicao: str,
-        code_override: Optional[str] = None,
-    ) -> Optional[Tuple[dict, Optional[dict]]]:
-        """Processa uma linha de dados e retorna composição + preço.
-        """
-        if code_override:
-            cod = code_override
-        else:
-            cod_raw = row.iloc[header.col_codigo] if header.col_codigo != -1 else None
-            if pd.isna(cod_raw) or str(cod_raw).strip() == "":
-                return None
-            cod = str(cod_raw).replace('.0', '').strip()
+        codigos_formula: Optional[Dict[int, str]] = None,
+    ) -> Tuple[List[dict], List[dict]]:
+        """Normaliza as colunas da aba inteiras e monta composições + preços.
 
-        if not cod.isdigit() and len(cod) < 3:
-            return None
+        Opera coluna a coluna (código, descrição, unidade, grupo e as colunas
+        de ``mapa_estados``) em vez de linha a linha, o que reduz a extração
+        de uma aba com dezenas de milhares de linhas a poucas operações
+        vetorizadas do pandas.
+        """
+        if df_dados.empty:
+            return [], []
 
-        desc_raw = row.iloc[header.col_descricao] if header.col_descricao != -1 else None
-        desc = str(desc_raw).strip() if desc_raw is not None else ""
-        unid = (
-            str(row.iloc[header.col_unidade]).strip()
-            if header.col_unidade != -1
-            else "-"
-        )
+        if header.col_codigo != -1:
+            cod_raw = df_dados.iloc[:, header.col_codigo]
+            cod = cod_raw.astype(str).str.replace(".0", "", regex=False).str.strip()
+            cod_valido = cod_raw.notna() & (cod != "")
+        else:
+            cod = pd.Series("", index=df_dados.index, dtype=object)
+            cod_valido = pd.Series(False, index=df_dados.index)
+
+        if codigos_formula:
+            override = pd.Series(codigos_formula, dtype=object).reindex(df_dados.index)
+            tem_override = override.notna()
+            cod = override.where(tem_override, cod)
+            cod_valido = cod_valido | tem_override
+
+        cod = cod.fillna("").astype(str)
+        mantem = cod_valido & (cod.str.isdigit() | (cod.str.len() >= 3))
+        if not mantem.any():
+            return [], []
 
-        grupo = "-"
-        if header.col_grupo != -1:
-            g_raw = row.iloc[header.col_grupo]
-            if not pd.isna(g_raw) and str(g_raw).strip():
-                grupo = str(g_raw).strip()
-
-        composicao = {
-            "codigo_composicao": cod,
-            "descricao": desc,
-            "unidade": unid,
-            "grupo": grupo,
-            "mes_referencia": mes_referencia,
+        linhas = df_dados.loc[mantem]
+        codigos = cod.loc[mantem]
+
+        def _coluna_texto(col: int, padrao: str) -> pd.Series:
+            if col == -1:
+                return pd.Series(padrao, index=linhas.index, dtype=object)
+            serie = linhas.iloc[:, col]
+            texto = serie.astype(str).str.strip()
+            return texto.where(serie.notna(), padrao)
+
+        grupo = _coluna_texto(header.col_grupo, "-")
+        grupo = grupo.where(grupo != "", "-")
+
+        lista_codigos = codigos.tolist()
+        composicoes = _montar_registros({
+            "codigo_composicao": lista_codigos,
+            "descricao": _coluna_texto(header.col_descricao, "").tolist(),
+            "unidade": _coluna_texto(header.col_unidade, "-").tolist(),
+            "grupo": grupo.tolist(),
+            "mes_referencia": [mes_referencia] * len(lista_codigos),
+        })
+
+        if not header.mapa_estados:
+            return composicoes, []
+
+        valores = {
+            sigla: limpar_valores_moeda_serie(linhas.iloc[:, c_idx]).to_numpy()
+            for c_idx, sigla in header.mapa_estados.items()
         }
-
-        reg_preco = {
-            "codigo_composicao": cod,
-            "mes_referencia": mes_referencia,
-            "tipo_composicao": tipo_composicao,
+        tem_valor = ~np.logical_and.reduce([np.isnan(v) for v in valores.values()])
+        if not tem_valor.any():
+            return composicoes, []
+
+        qtd_precos = int(tem_valor.sum())
+        colunas_preco: Dict[str, list] = {
+            "codigo_composicao": np.asarray(lista_codigos, dtype=object)[tem_valor].tolist(),
+            "mes_referencia": [mes_referencia] * qtd_precos,
+            "tipo_composicao": [tipo_composicao] * qtd_precos,
         }
-        tem_valor = False
-        for c_idx, sigla in header.mapa_estados.items():
-            val = limpar_valor_moeda(row.iloc[c_idx])
-            reg_preco[sigla] = val
-            if val is not None:
-                tem_valor = True
-        
-        preco = reg_preco if tem_valor else None
-        return composicao, preco
+        for sigla, coluna in valores.items():
+            coluna = coluna[tem_valor]
+            colunas_preco[sigla] = np.where(np.isnan(coluna), None, coluna).tolist()
+
+        return composicoes, _montar_registros(colunas_preco)
 
     # ------------------------------------------------------------------
     # Extração da aba Analítico (hierarquia pai→filho)
@@ -488,88 +489,141 @@ class SinapiExcelParser(BaseExcelParser):
         fonte: str = "SINAPI",
     ) -> List[Dict[str, Any]]:
         """Extrai os relacionamentos composicao→insumo da aba Analítico.
-        """
-        df = self.ler_aba(nome_aba, header=None, dtype=str)
 
-        col_cod_pai = -1
-        col_tipo = -1
-        col_cod_filho = -1
-        col_desc = -1
-        col_unid = -1
-        col_coef = -1
-        header_row = -1
+        Conveniência que materializa :meth:`iterar_analitico` numa lista;
+        para abas grandes prefira consumir os lotes diretamente.
+        """
+        registros = [
+            registro
+            for lote in self.iterar_analitico(nome_aba, mes_referencia, fonte=fonte)
+            for registro in lote
+        ]
+        logger.info(
+            "Aba '%s': %d relacionamentos analíticos extraídos.",
+            nome_aba, len(registros)
+        )
+        return registros
 
-        for r_idx, row in df.head(15).iterrows():
-            vals = [remover_acentos(str(v)).strip().lower() for v in row.values]
-            tem_codigo = any("codigo" in v and "composicao" in v for v in vals)
-            tem_coef = any("coeficiente" in v for v in vals)
-            if tem_codigo and tem_coef:
-                header_row = r_idx
-                for c_idx, v in enumerate(vals):
-                    if "codigo" in v and "composicao" in v:
-                        col_cod_pai = c_idx
-                    elif "tipo" in v and "item" in v:
-                        col_tipo = c_idx
-                    elif "codigo" in v and "item" in v:
-                        col_cod_filho = c_idx
-                    elif "descricao" in v or "descri" in v:
-                        col_desc = c_idx
-                    elif "unidade" in v:
-                        col_unid = c_idx
-                    elif "coeficiente" in v:
-                        col_coef = c_idx
-                break
+    def iterar_analitico(
+        self,
+        nome_aba: str,
+        mes_referencia: str,
+        fonte: str = "SINAPI",
+        tamanho_lote: int = 5000,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Lê a aba Analítico em streaming e produz lotes de ``composicao_itens``.
 
-        if header_row == -1 or col_cod_pai == -1 or col_cod_filho == -1:
-            logger.warning("Cabeçalho do Analítico não encontrado na aba '%s'.", nome_aba)
-            return []
+        Usa o workbook openpyxl ``read_only`` da sessão com
+        ``iter_rows(values_only=True)``: apenas as linhas do lote corrente
+        ficam em memória, independente do tamanho da aba.
 
-        registros: List[Dict[str, Any]] = []
-        df_dados = df.iloc[header_row + 1:]
+        Args:
+            nome_aba: Nome da aba Analítico.
+            mes_referencia: Mês de referência (ex: ``"09/2025"``).
+            fonte: Fonte gravada em cada relacionamento.
+            tamanho_lote: Quantidade máxima de registros por lote.
 
-        for _, row in df_dados.iterrows():
-            cod_pai_raw = row.iloc[col_cod_pai]
-            cod_filho_raw = row.iloc[col_cod_filho]
+        Yields:
+            Listas com até ``tamanho_lote`` registros prontos para upsert.
+        """
+        ws = self._sessao.workbook_valores()[nome_aba]
+        linhas = ws.iter_rows(values_only=True)
 
-            if pd.isna(cod_filho_raw) or str(cod_filho_raw).strip() in ("", "None", "nan"):
-                continue
+        colunas = None
+        for _, row in zip(range(15), linhas):
+            colunas = self._detectar_header_analitico(row)
+            if colunas is not None:
+                break
 
-            cod_pai = str(cod_pai_raw).replace('.0', '').strip()
-            cod_filho = str(cod_filho_raw).replace('.0', '').strip()
+        if colunas is None:
+            logger.warning("Cabeçalho do Analítico não encontrado na aba '%s'.", nome_aba)
+            return
 
-            if not cod_pai.isdigit() or not cod_filho.isdigit():
+        lote: List[Dict[str, Any]] = []
+        for row in linhas:
+            registro = self._converter_linha_analitico(row, colunas, mes_referencia, fonte)
+            if registro is None:
                 continue
+            lote.append(registro)
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
 
-            tipo_raw = row.iloc[col_tipo] if col_tipo != -1 else ""
-            tipo = remover_acentos(str(tipo_raw)).strip().upper() if not pd.isna(tipo_raw) else ""
+        if lote:
+            yield lote
 
-            desc_raw = row.iloc[col_desc] if col_desc != -1 else ""
-            desc = str(desc_raw).strip() if not pd.isna(desc_raw) else ""
+    @staticmethod
+    def _detectar_header_analitico(row: Tuple[Any, ...]) -> Optional[Dict[str, int]]:
+        """Mapeia as colunas do Analítico se ``row`` for a linha de cabeçalho."""
+        vals = [remover_acentos(str(v)).strip().lower() for v in row]
+        tem_codigo = any("codigo" in v and "composicao" in v for v in vals)
+        tem_coef = any("coeficiente" in v for v in vals)
+        if not (tem_codigo and tem_coef):
+            return None
 
-            unid_raw = row.iloc[col_unid] if col_unid != -1 else "-"
-            unid = str(unid_raw).strip() if not pd.isna(unid_raw) else "-"
+        colunas = {
+            "cod_pai": -1, "tipo": -1, "cod_filho": -1,
+            "desc": -1, "unid": -1, "coef": -1,
+        }
+        for c_idx, v in enumerate(vals):
+            if "codigo" in v and "composicao" in v:
+                colunas["cod_pai"] = c_idx
+            elif "tipo" in v and "item" in v:
+                colunas["tipo"] = c_idx
+            elif "codigo" in v and "item" in v:
+                colunas["cod_filho"] = c_idx
+            elif "descricao" in v or "descri" in v:
+                colunas["desc"] = c_idx
+            elif "unidade" in v:
+                colunas["unid"] = c_idx
+            elif "coeficiente" in v:
+                colunas["coef"] = c_idx
+
+        if colunas["cod_pai"] == -1 or colunas["cod_filho"] == -1:
+            return None
+        return colunas
 
-            coef_raw = row.iloc[col_coef] if col_coef != -1 else None
-            try:
-                coef = float(str(coef_raw).replace(',', '.')) if coef_raw and not pd.isna(coef_raw) else None
-            except (ValueError, TypeError):
-                coef = None
+    @staticmethod
+    def _converter_linha_analitico(
+        row: Tuple[Any, ...],
+        colunas: Dict[str, int],
+        mes_referencia: str,
+        fonte: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Converte uma linha do Analítico num registro de ``composicao_itens``."""
+        def valor(chave: str):
+            c_idx = colunas[chave]
+            if c_idx == -1 or c_idx >= len(row):
+                return None
+            return row[c_idx]
 
-            if coef is None:
-                continue
+        cod_filho_raw = valor("cod_filho")
+        if cod_filho_raw is None or str(cod_filho_raw).strip() in ("", "None", "nan"):
+            return None
 
-            registros.append({
-                "codigo_pai": cod_pai,
-                "codigo_filho": cod_filho,
-                "quantidade_coeficiente": coef,
-                "fonte": fonte,
-                "mes_referencia": mes_referencia,
-                "descricao_filho": desc,
-                "unidade_filho": unid,
-            })
+        cod_pai = str(valor("cod_pai")).replace('.0', '').strip()
+        cod_filho = str(cod_filho_raw).replace('.0', '').strip()
+        if not cod_pai.isdigit() or not cod_filho.isdigit():
+            return None
 
-        logger.info(
-            "Aba '%s': %d relacionamentos analíticos extraídos.",
-            nome_aba, len(registros)
-        )
-        return registros
+        coef_raw = valor("coef")
+        try:
+            coef = float(str(coef_raw).replace(',', '.')) if coef_raw not in (None, "") else None
+        except (ValueError, TypeError):
+            coef = None
+        if coef is None:
+            return None
+
+        desc_raw = valor("desc")
+        unid_raw = valor("unid")
+        tipo_raw = valor("tipo")
+        return {
+            "codigo_pai": cod_pai,
+            "codigo_filho": cod_filho,
+            "quantidade_coeficiente": coef,
+            "fonte": fonte,
+            "mes_referencia": mes_referencia,
+            "descricao_filho": str(desc_raw).strip() if desc_raw is not None else "",
+            "unidade_filho": str(unid_raw).strip() if unid_raw is not None else "-",
+            "tipo_item": remover_acentos(str(tipo_raw).strip()).upper() if tipo_raw is not None else None,
+        }
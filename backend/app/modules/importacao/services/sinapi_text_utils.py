@@ -8,6 +8,7 @@ usadas no parsing de arquivos Excel da SINAPI.
 import re
 import unicodedata
 
+import numpy as np
 import pandas as pd
 
 
@@ -102,3 +103,43 @@ def normalizar_nome_aba(texto) -> str:
         Nome sem acentos e sem espaços extras.
     """
     return remover_acentos(str(texto)).strip()
+
+
+def limpar_valores_moeda_serie(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de :func:`limpar_valor_moeda` para uma coluna inteira.
+
+    Células numéricas são convertidas de uma vez com ``pd.to_numeric``; só
+    as células de texto passam pela conversão do formato brasileiro
+    (``"1.234,56"``). Valores vazios, hífens e textos não numéricos viram
+    ``NaN``.
+
+    Args:
+        serie: Coluna da planilha (dtype numérico ou ``object`` misto).
+
+    Returns:
+        Série ``float64`` com o mesmo índice, ``NaN`` onde não houver valor.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype("float64")
+
+    valores = serie.to_numpy(dtype=object)
+    eh_texto = np.fromiter(
+        (isinstance(v, str) for v in valores), dtype=bool, count=len(valores)
+    )
+
+    numeros = np.where(eh_texto, np.nan, valores)
+    try:
+        resultado = numeros.astype("float64")
+    except (TypeError, ValueError):
+        resultado = pd.to_numeric(pd.Series(numeros), errors="coerce").to_numpy(
+            dtype="float64", copy=True
+        )
+
+    if eh_texto.any():
+        textos = pd.Series(valores[eh_texto], dtype=object).str.strip()
+        resultado[eh_texto] = pd.to_numeric(
+            textos.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+            errors="coerce",
+        ).to_numpy(dtype="float64")
+
+    return pd.Series(resultado, index=serie.index)
@@ -0,0 +1,212 @@
+"""
+Sessão compartilhada de leitura de uma planilha de importação.
+
+Um mesmo arquivo SINAPI é usado para metadados, abas de preços, códigos
+em fórmulas HYPERLINK e aba Analítico. A sessão abre o ``pd.ExcelFile``
+uma única vez (só quando alguém o usa), lê cada aba no máximo uma vez e guarda contadores de tempo
+e memória por etapa da importação.
+"""
+
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EstatisticaEtapa:
+    """Contadores acumulados de uma etapa da importação."""
+
+    chamadas: int = 0
+    """Quantas vezes a etapa foi executada."""
+
+    segundos: float = 0.0
+    """Tempo total gasto na etapa."""
+
+    pico_memoria_bytes: int = 0
+    """Maior pico de memória alocada durante a etapa (0 se não medido)."""
+
+
+class WorkbookSession:
+    """Cache de leitura de um arquivo Excel durante uma importação.
+
+    Uso típico:
+        >>> sessao = WorkbookSession(file_content, ler_abas_completas=True)
+        >>> parser = get_parser(file_content, "SINAPI", sessao=sessao)
+        >>> ...
+        >>> sessao.estatisticas()
+    """
+
+    def __init__(
+        self,
+        file_content: bytes,
+        ler_abas_completas: bool = False,
+        medir_memoria: bool = False,
+    ):
+        """
+        Args:
+            file_content: Bytes do arquivo Excel.
+            ler_abas_completas: Se True, leituras parciais (``nrows``) carregam
+                a aba inteira e devolvem o início dela, para que a leitura
+                completa posterior reaproveite o cache. Use na importação;
+                no upload (só metadados) deixe False.
+            medir_memoria: Ativa ``tracemalloc`` para registrar o pico de
+                memória de cada etapa (tem custo de desempenho).
+        """
+        self._file_content = file_content
+        self._ler_abas_completas = ler_abas_completas
+        self._medir_memoria = medir_memoria
+        self._estatisticas: Dict[str, EstatisticaEtapa] = {}
+        self._abas: Dict[Tuple[str, Any], pd.DataFrame] = {}
+        self._abas_parciais: Dict[Tuple[str, Any], pd.DataFrame] = {}
+        self._wb_formulas = None
+        self._wb_valores = None
+        self._profundidade = 0
+        self._xl: Optional[pd.ExcelFile] = None
+
+    # ------------------------------------------------------------------
+    # Acesso ao arquivo
+    # ------------------------------------------------------------------
+
+    @property
+    def file_content(self) -> bytes:
+        """Bytes originais do arquivo."""
+        return self._file_content
+
+    @property
+    def excel_file(self) -> pd.ExcelFile:
+        """``pd.ExcelFile`` compartilhado por todos os leitores da sessão."""
+        if self._xl is None:
+            with self.medir("abrir_arquivo"):
+                self._xl = pd.ExcelFile(BytesIO(self._file_content))
+        return self._xl
+
+    @property
+    def sheet_names(self) -> List[str]:
+        """Nomes de todas as abas do arquivo."""
+        return self.excel_file.sheet_names
+
+    def ler_aba(
+        self,
+        sheet_name: str,
+        header=None,
+        nrows: Optional[int] = None,
+        dtype=None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """Lê uma aba com ``header=None``, consultando o cache da sessão.
+
+        Leituras com outros parâmetros do ``pd.read_excel`` (``header``,
+        ``usecols``...) não passam pelo cache.
+        """
+        if header is not None or kwargs:
+            with self.medir(f"leitura_aba:{sheet_name}"):
+                return pd.read_excel(
+                    self.excel_file, sheet_name=sheet_name, header=header,
+                    nrows=nrows, dtype=dtype, **kwargs,
+                )
+
+        chave = (sheet_name, dtype)
+        if chave in self._abas:
+            df = self._abas[chave]
+            return df.head(nrows) if nrows is not None else df
+
+        if nrows is not None and not self._ler_abas_completas:
+            parcial = self._abas_parciais.get(chave)
+            if parcial is None or len(parcial) < nrows:
+                with self.medir(f"leitura_aba:{sheet_name}"):
+                    parcial = pd.read_excel(
+                        self.excel_file, sheet_name=sheet_name, header=None,
+                        nrows=nrows, dtype=dtype,
+                    )
+                self._abas_parciais[chave] = parcial
+            return parcial.head(nrows)
+
+        with self.medir(f"leitura_aba:{sheet_name}"):
+            df = pd.read_excel(self.excel_file, sheet_name=sheet_name, header=None, dtype=dtype)
+        self._abas[chave] = df
+        self._abas_parciais.pop(chave, None)
+        return df.head(nrows) if nrows is not None else df
+
+    def liberar_aba(self, sheet_name: str) -> None:
+        """Descarta do cache as leituras de uma aba que não será mais usada."""
+        for cache in (self._abas, self._abas_parciais):
+            for chave in [c for c in cache if c[0] == sheet_name]:
+                del cache[chave]
+
+    def workbook_formulas(self):
+        """Workbook openpyxl (read-only, com fórmulas) aberto uma única vez."""
+        if self._wb_formulas is None:
+            with self.medir("abrir_formulas"):
+                self._wb_formulas = load_workbook(
+                    BytesIO(self._file_content), data_only=False, read_only=True,
+                )
+        return self._wb_formulas
+
+    def workbook_valores(self):
+        """Workbook openpyxl (read-only, valores calculados) para leitura em streaming."""
+        if self._wb_valores is None:
+            with self.medir("abrir_valores"):
+                self._wb_valores = load_workbook(
+                    BytesIO(self._file_content), data_only=True, read_only=True,
+                )
+        return self._wb_valores
+
+    def fechar(self) -> None:
+        """Libera o cache de abas e os arquivos abertos."""
+        self._abas.clear()
+        self._abas_parciais.clear()
+        for wb in (self._wb_formulas, self._wb_valores):
+            if wb is not None:
+                wb.close()
+        self._wb_formulas = None
+        self._wb_valores = None
+        if self._xl is not None:
+            self._xl.close()
+            self._xl = None
+
+    # ------------------------------------------------------------------
+    # Contadores
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def medir(self, etapa: str) -> Iterator[None]:
+        """Acumula tempo (e pico de memória, se ativado) de uma etapa."""
+        estat = self._estatisticas.setdefault(etapa, EstatisticaEtapa())
+        iniciou_tracemalloc = False
+        if self._medir_memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                iniciou_tracemalloc = True
+            # Etapas aninhadas (ex.: leitura dentro da extração) compartilham o pico
+            if self._profundidade == 0:
+                tracemalloc.reset_peak()
+
+        self._profundidade += 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._profundidade -= 1
+            estat.chamadas += 1
+            estat.segundos += time.perf_counter() - inicio
+            if self._medir_memoria:
+                _, pico = tracemalloc.get_traced_memory()
+                estat.pico_memoria_bytes = max(estat.pico_memoria_bytes, pico)
+                if iniciou_tracemalloc:
+                    tracemalloc.stop()
+
+    def estatisticas(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores por etapa, prontos para log ou resposta JSON."""
+        return {
+            etapa: {**asdict(e), "segundos": round(e.segundos, 4)}
+            for etapa, e in self._estatisticas.items()
+        }
@@ -0,0 +1,172 @@
+"""
+Gravação em massa (upsert) com lotes concorrentes.
+
+Os lotes de uma importação SINAPI são independentes entre si: em vez de
+esperar cada ida e volta HTTP ao PostgREST, o :class:`BulkUpsertWriter`
+mantém até ``max_em_voo`` lotes em andamento num pool de threads, ajusta
+o tamanho de cada lote pelo tamanho do payload em bytes e refaz lotes que
+falharam com espera exponencial antes de considerá-los perdidos.
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Amostra de linhas usada para estimar o tamanho médio de uma linha
+LINHAS_AMOSTRA = 50
+
+
+@dataclass
+class ResultadoUpsert:
+    """Contadores de linhas de um upsert em massa."""
+
+    gravadas: int = 0
+    """Linhas confirmadas pelo banco."""
+
+    falhas: int = 0
+    """Linhas de lotes que falharam em todas as tentativas."""
+
+    retentativas: int = 0
+    """Linhas reenviadas após uma falha (contadas a cada nova tentativa)."""
+
+    lotes: int = 0
+    """Quantidade de lotes enviados."""
+
+    def acumular(self, outro: "ResultadoUpsert") -> None:
+        """Soma os contadores de ``outro`` neste resultado."""
+        self.gravadas += outro.gravadas
+        self.falhas += outro.falhas
+        self.retentativas += outro.retentativas
+        self.lotes += outro.lotes
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class BulkUpsertWriter:
+    """Envia upserts em lotes paralelos, com retentativa e lotes por bytes.
+
+    Uso típico:
+        >>> writer = BulkUpsertWriter(supabase)
+        >>> resultado = writer.upsert("composicao", dados, on_conflict="codigo_composicao")
+        >>> resultado.gravadas, resultado.falhas
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        max_em_voo: int = 4,
+        bytes_por_lote: int = 1_000_000,
+        tentativas: int = 3,
+        espera_inicial: float = 0.5,
+        dormir: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            supabase_client: Cliente Supabase usado nos upserts.
+            max_em_voo: Lotes enviados simultaneamente.
+            bytes_por_lote: Tamanho alvo do payload JSON de cada lote.
+            tentativas: Tentativas por lote antes de contá-lo como falha.
+            espera_inicial: Espera (s) antes da 1ª retentativa; dobra a cada nova.
+            dormir: Função de espera (substituível nos testes).
+        """
+        self.supabase = supabase_client
+        self.max_em_voo = max(1, max_em_voo)
+        self.bytes_por_lote = bytes_por_lote
+        self.tentativas = max(1, tentativas)
+        self.espera_inicial = espera_inicial
+        self._dormir = dormir
+
+    def upsert(
+        self,
+        tabela: str,
+        dados: List[Dict[str, Any]],
+        on_conflict: str,
+        max_linhas: int = 1000,
+    ) -> ResultadoUpsert:
+        """Grava ``dados`` em ``tabela`` e devolve os contadores da operação.
+
+        Args:
+            tabela: Nome da tabela.
+            dados: Linhas a gravar.
+            on_conflict: Colunas da chave de conflito do upsert.
+            max_linhas: Limite de linhas por lote, mesmo com linhas pequenas.
+        """
+        resultado = ResultadoUpsert()
+        if not dados:
+            return resultado
+
+        tamanho = self.linhas_por_lote(dados, max_linhas)
+        lotes = [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+
+        if len(lotes) == 1 or self.max_em_voo == 1:
+            parciais = [self._enviar_lote(tabela, lote, on_conflict) for lote in lotes]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_em_voo, len(lotes)),
+                thread_name_prefix=f"upsert-{tabela}",
+            ) as executor:
+                parciais = list(executor.map(
+                    lambda lote: self._enviar_lote(tabela, lote, on_conflict), lotes
+                ))
+
+        for parcial in parciais:
+            resultado.acumular(parcial)
+
+        if resultado.falhas:
+            logger.error(
+                "Upsert em %s: %d linhas gravadas, %d perdidas após %d tentativas.",
+                tabela, resultado.gravadas, resultado.falhas, self.tentativas,
+            )
+        return resultado
+
+    def linhas_por_lote(self, dados: List[Dict[str, Any]], max_linhas: int) -> int:
+        """Estima quantas linhas cabem em ``bytes_por_lote``, até ``max_linhas``."""
+        amostra = dados[:LINHAS_AMOSTRA]
+        bytes_amostra = len(json.dumps(amostra, default=str).encode("utf-8"))
+        bytes_por_linha = max(1, bytes_amostra // len(amostra))
+        return max(1, min(max_linhas, self.bytes_por_lote // bytes_por_linha))
+
+    def _enviar_lote(
+        self,
+        tabela: str,
+        lote: List[Dict[str, Any]],
+        on_conflict: str,
+    ) -> ResultadoUpsert:
+        resultado = ResultadoUpsert(lotes=1)
+        espera = self.espera_inicial
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                r = self.supabase.table(tabela).upsert(lote, on_conflict=on_conflict).execute()
+                resultado.gravadas = len(r.data) if r.data else 0
+                return resultado
+            except Exception as e:
+                if tentativa == self.tentativas:
+                    logger.error(f"Erro lote {tabela} ({len(lote)} linhas): {e}")
+                    resultado.falhas = len(lote)
+                    return resultado
+                logger.warning(
+                    "Lote %s falhou (tentativa %d/%d): %s — nova tentativa em %.1fs",
+                    tabela, tentativa, self.tentativas, e, espera,
+                )
+                resultado.retentativas += len(lote)
+                self._dormir(espera)
+                espera *= 2
+        return resultado  # pragma: no cover - o laço sempre retorna
+
+
+def criar_writer_padrao(supabase_client, max_em_voo: Optional[int] = None) -> BulkUpsertWriter:
+    """Writer com a configuração de concorrência das ``settings``."""
+    return BulkUpsertWriter(
+        supabase_client,
+        max_em_voo=max_em_voo or settings.UPSERT_MAX_EM_VOO,
+        bytes_por_lote=settings.UPSERT_BYTES_POR_LOTE,
+        tentativas=settings.UPSERT_TENTATIVAS,
+    )
@@ -0,0 +1,294 @@
+"""
+Explosão recursiva de composições em insumos básicos.
+
+No Analítico do SINAPI, um filho de ``composicao_itens`` pode ser outra
+composição (tipo ``COMPOSICAO``), como concretos e argamassas usados por
+centenas de serviços. A explosão desce o grafo pai → filho até os insumos
+básicos, multiplicando os coeficientes ao longo do caminho.
+
+A importação grava o vetor achatado de todas as composições da base em
+``composicao_insumos_basicos`` (ver :func:`achatar_grafo`); a explosão lê
+esse vetor com uma consulta. Bases sem a tabela derivada caem no percurso
+do grafo, buscando os filhos nível a nível com uma consulta ``in`` por
+nível. Em ambos os casos o vetor é memorizado num LRU por
+``(fonte, mes_referencia, codigo)``.
+"""
+
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from core.cache import CacheLRU
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TIPO_COMPOSICAO = "COMPOSICAO"
+TIPO_INSUMO = "INSUMO"
+
+# Limite de níveis descidos, contra dados com ciclo que escapem da detecção
+PROFUNDIDADE_MAXIMA = 20
+
+
+@dataclass(frozen=True)
+class InsumoExplodido:
+    """Insumo básico de uma composição, com o coeficiente acumulado."""
+
+    codigo: str
+    coeficiente: float
+    """Quantidade do insumo por unidade da composição raiz."""
+
+    descricao: str = ""
+    unidade: str = "-"
+
+
+class ExplosaoComposicoes:
+    """Cache LRU dos vetores de insumos básicos de cada composição.
+
+    Uso típico:
+        >>> explosao = ExplosaoComposicoes()
+        >>> insumos = explosao.explodir(item_repository, "92873", "12/2025", "SINAPI")
+    """
+
+    def __init__(self, max_composicoes: int = 2048):
+        """
+        Args:
+            max_composicoes: Composições mantidas em cache (todas as bases).
+        """
+        self._cache: CacheLRU[Tuple[InsumoExplodido, ...]] = CacheLRU(max_itens=max_composicoes)
+
+    def explodir(
+        self,
+        repository,
+        codigo: str,
+        mes_referencia: str,
+        fonte: str = "SINAPI",
+    ) -> List[InsumoExplodido]:
+        """Insumos básicos de ``codigo``, por unidade da composição.
+
+        Um mesmo insumo alcançado por caminhos diferentes aparece uma vez,
+        com a soma dos coeficientes. Composição sem filhos devolve ``[]``.
+
+        Args:
+            repository: ``ItemRepository`` (usa ``buscar_insumos_basicos`` e,
+                sem vetor pré-calculado, ``buscar_filhos_composicoes``).
+        """
+        codigo = str(codigo)
+        chave = (fonte, mes_referencia, codigo)
+        em_cache = self._cache.obter(chave)
+        if em_cache is not None:
+            return list(em_cache)
+
+        precalculado = tuple(
+            InsumoExplodido(
+                str(row.get("codigo_insumo")), float(row.get("coeficiente") or 0),
+                row.get("descricao") or "", row.get("unidade") or "-",
+            )
+            for row in repository.buscar_insumos_basicos(codigo, mes_referencia, fonte)
+        )
+        if precalculado:
+            self._cache.definir(chave, precalculado)
+            return list(precalculado)
+
+        filhos = self._buscar_arvore(repository, codigo, mes_referencia, fonte)
+        memo: Dict[str, Tuple[InsumoExplodido, ...]] = {}
+        resultado = self._achatar(codigo, filhos, memo, mes_referencia, fonte, frozenset())
+        # Filhos consultados sem filhos próprios são folhas: evita nova consulta
+        for cod, lista in filhos.items():
+            if not lista:
+                memo.setdefault(cod, ())
+        for cod, vetor in memo.items():
+            self._cache.definir((fonte, mes_referencia, cod), vetor)
+        return list(resultado)
+
+    def invalidar(self, fonte: Optional[str] = None, mes_referencia: Optional[str] = None) -> int:
+        """Descarta as composições da fonte/mês informados (todas, se omitidos)."""
+        return self._cache.invalidar(
+            lambda chave: (fonte is None or chave[0] == fonte)
+            and (mes_referencia is None or chave[1] == mes_referencia)
+        )
+
+    def estatisticas(self) -> Dict[str, int]:
+        return self._cache.estatisticas()
+
+    def _buscar_arvore(
+        self,
+        repository,
+        codigo: str,
+        mes_referencia: str,
+        fonte: str,
+    ) -> Dict[str, List[dict]]:
+        """Filhos de cada composição da árvore ainda fora do cache.
+
+        Filhos marcados como ``INSUMO`` não são consultados; os demais
+        (``COMPOSICAO`` ou sem tipo, em bases importadas antes da coluna)
+        são procurados no nível seguinte e viram folha se não tiverem filhos.
+        """
+        filhos: Dict[str, List[dict]] = {}
+        nivel = [codigo]
+        profundidade = 0
+        while nivel and profundidade < PROFUNDIDADE_MAXIMA:
+            encontrados = repository.buscar_filhos_composicoes(nivel, mes_referencia, fonte)
+            proximo: List[str] = []
+            for cod in nivel:
+                filhos[cod] = encontrados.get(cod, [])
+                for filho in filhos[cod]:
+                    cod_filho = str(filho.get("codigo_filho"))
+                    if (
+                        _tipo(filho) != TIPO_INSUMO
+                        and float(filho.get("quantidade_coeficiente") or 0) > 0
+                        and cod_filho not in filhos
+                        and cod_filho not in proximo
+                        and (fonte, mes_referencia, cod_filho) not in self._cache
+                    ):
+                        proximo.append(cod_filho)
+            nivel = proximo
+            profundidade += 1
+        return filhos
+
+    def _achatar(
+        self,
+        codigo: str,
+        filhos: Dict[str, List[dict]],
+        memo: Dict[str, Tuple[InsumoExplodido, ...]],
+        mes_referencia: str,
+        fonte: str,
+        caminho: FrozenSet[str],
+    ) -> Tuple[InsumoExplodido, ...]:
+        if codigo in memo:
+            return memo[codigo]
+
+        acumulado: Dict[str, InsumoExplodido] = {}
+        for filho in filhos.get(codigo, []):
+            cod_filho = str(filho.get("codigo_filho"))
+            coef = float(filho.get("quantidade_coeficiente") or 0)
+            if coef <= 0:
+                continue
+
+            sub = self._subvetor(cod_filho, filhos, memo, mes_referencia, fonte, caminho | {codigo})
+            if sub is None:
+                folhas = [InsumoExplodido(
+                    cod_filho, coef,
+                    filho.get("descricao_filho") or "",
+                    filho.get("unidade_filho") or "-",
+                )]
+            else:
+                folhas = [
+                    InsumoExplodido(f.codigo, f.coeficiente * coef, f.descricao, f.unidade)
+                    for f in sub
+                ]
+
+            for folha in folhas:
+                atual = acumulado.get(folha.codigo)
+                if atual is not None:
+                    folha = InsumoExplodido(
+                        atual.codigo, atual.coeficiente + folha.coeficiente,
+                        atual.descricao, atual.unidade,
+                    )
+                acumulado[folha.codigo] = folha
+
+        vetor = tuple(acumulado.values())
+        memo[codigo] = vetor
+        return vetor
+
+    def _subvetor(
+        self,
+        codigo: str,
+        filhos: Dict[str, List[dict]],
+        memo: Dict[str, Tuple[InsumoExplodido, ...]],
+        mes_referencia: str,
+        fonte: str,
+        caminho: FrozenSet[str],
+    ) -> Optional[Tuple[InsumoExplodido, ...]]:
+        """Vetor do filho se ele for uma composição com filhos; ``None`` se for folha."""
+        if codigo in caminho:
+            logger.warning("Ciclo na composição %s (%s, %s); tratada como insumo.", codigo, fonte, mes_referencia)
+            return None
+        em_cache = self._cache.obter((fonte, mes_referencia, codigo))
+        if em_cache is not None:
+            return em_cache or None
+        if not filhos.get(codigo):
+            return None
+        return self._achatar(codigo, filhos, memo, mes_referencia, fonte, caminho)
+
+
+class GrafoComposicoes:
+    """Relações pai → filho de uma base, montadas em memória na importação.
+
+    Expõe ``buscar_filhos_composicoes`` como o ``ItemRepository``, então
+    pode ser percorrido pela :class:`ExplosaoComposicoes` sem consultar o
+    banco. Guarda só os campos usados na explosão.
+    """
+
+    _CAMPOS = ("codigo_filho", "quantidade_coeficiente", "tipo_item", "descricao_filho", "unidade_filho")
+
+    def __init__(self):
+        self._filhos: Dict[str, List[dict]] = {}
+        self._relacoes: Set[Tuple[str, str]] = set()
+
+    def adicionar(self, registros: List[dict]) -> None:
+        """Acrescenta linhas no formato de ``composicao_itens``.
+
+        Relações pai/filho repetidas são ignoradas (vale a primeira), como
+        na deduplicação por ``CHAVE_ANALITICO`` da importação.
+        """
+        for reg in registros:
+            pai = str(reg.get("codigo_pai"))
+            relacao = (pai, str(reg.get("codigo_filho")))
+            if relacao in self._relacoes:
+                continue
+            self._relacoes.add(relacao)
+            self._filhos.setdefault(pai, []).append({c: reg.get(c) for c in self._CAMPOS})
+
+    def composicoes(self) -> List[str]:
+        return list(self._filhos)
+
+    def buscar_filhos_composicoes(self, codigos_pai, mes_referencia=None, fonte=None) -> Dict[str, List[dict]]:
+        return {c: self._filhos[c] for c in codigos_pai if c in self._filhos}
+
+    def buscar_insumos_basicos(self, codigo, mes_referencia=None, fonte=None) -> List[dict]:
+        return []
+
+    def __len__(self) -> int:
+        return len(self._filhos)
+
+
+def achatar_grafo(grafo: GrafoComposicoes, mes_referencia: str, fonte: str) -> List[Dict[str, Any]]:
+    """Linhas de ``composicao_insumos_basicos`` de todas as composições do grafo.
+
+    Cada subcomposição é achatada uma única vez e reaproveitada pelas
+    composições que a usam.
+    """
+    explosao = ExplosaoComposicoes(max_composicoes=max(1, len(grafo)) * 2)
+    linhas: List[Dict[str, Any]] = []
+    for codigo in grafo.composicoes():
+        for insumo in explosao.explodir(grafo, codigo, mes_referencia, fonte):
+            linhas.append({
+                "codigo_composicao": codigo,
+                "codigo_insumo": insumo.codigo,
+                "coeficiente": round(insumo.coeficiente, 8),
+                "descricao": insumo.descricao,
+                "unidade": insumo.unidade,
+                "mes_referencia": mes_referencia,
+                "fonte": fonte,
+            })
+    return linhas
+
+
+def _tipo(filho: dict) -> str:
+    return str(filho.get("tipo_item") or "").strip().upper()
+
+
+@lru_cache(maxsize=1)
+def get_explosao_composicoes() -> ExplosaoComposicoes:
+    """Cache de explosões compartilhado pelos serviços deste processo."""
+    return ExplosaoComposicoes(max_composicoes=settings.EXPLOSAO_CACHE_COMPOSICOES)
+
+
+def invalidar_explosao_composicoes(
+    fonte: Optional[str] = None,
+    mes_referencia: Optional[str] = None,
+) -> int:
+    """Invalida as explosões em cache deste processo."""
+    return get_explosao_composicoes().invalidar(fonte, mes_referencia)
@@ -0,0 +1,347 @@
+"""
+Índice de preços em memória para ``ItemRepository.buscar_preco``.
+
+Cada base de preços (fonte + mês + tipo de composição) é carregada do
+``composicao_estados`` uma única vez, na primeira consulta, como uma
+matriz ``float64`` de ``n_codigos × 27 estados`` com um dicionário
+código → linha. Consultas seguintes são resolvidas sem acesso ao banco.
+
+O fallback "mês mais recente" (código ausente no mês pedido) consulta o
+banco uma vez por código e guarda a resposta, positiva ou negativa, pelo
+mesmo ``ttl`` das bases.
+
+O índice é local ao processo: a importação invalida a base gravada no
+worker que a executou; nos demais, ``ttl`` limita quanto tempo uma base
+desatualizada pode ser servida.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABELA_COMPOSICOES_ESTADOS = "composicao_estados"
+
+# Colunas de preço por estado em composicao_estados (27 UFs)
+ESTADOS: Tuple[str, ...] = (
+    "ac", "al", "ap", "am", "ba", "ce", "df", "es", "go",
+    "ma", "mt", "ms", "mg", "pa", "pb", "pr", "pe", "pi",
+    "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to",
+)
+_COLUNA_ESTADO = {uf: i for i, uf in enumerate(ESTADOS)}
+
+# Códigos por consulta ``in`` (mantém a URL do PostgREST curta)
+TAMANHO_GRUPO_IN = 200
+
+ChaveBase = Tuple[str, str, str]  # (fonte, mes_referencia, tipo_composicao normalizado)
+
+
+def _ordem_mes(mes_referencia: str) -> Tuple[str, str]:
+    """Chave de ordenação de ``"MM/AAAA"`` (ano, mês)."""
+    partes = (mes_referencia or "").split("/")
+    if len(partes) == 2:
+        return (partes[1], partes[0])
+    return ("0000", "00")
+
+
+def preco_da_linha(linha: dict, estado: str) -> Optional[float]:
+    """Preço do estado numa linha de ``composicao_estados`` (``None`` se vazio)."""
+    valor = linha.get(estado.lower())
+    return float(valor) if valor is not None else None
+
+
+def buscar_mais_recentes(
+    supabase_client,
+    codigos: List[str],
+    tipo_composicao: str,
+    fonte: str,
+    tamanho_grupo: int = TAMANHO_GRUPO_IN,
+) -> Dict[str, Tuple[str, dict]]:
+    """Linha do mês mais recente de cada código, para a fonte e o tipo.
+
+    Faz uma consulta ``in`` por grupo de ``tamanho_grupo`` códigos. Códigos
+    que não existem em nenhum mês ficam fora do resultado.
+    """
+    resultado: Dict[str, Tuple[str, dict]] = {}
+    colunas = "codigo_composicao,mes_referencia," + ",".join(ESTADOS)
+    for i in range(0, len(codigos), tamanho_grupo):
+        r = supabase_client.table(TABELA_COMPOSICOES_ESTADOS)\
+            .select(colunas)\
+            .in_("codigo_composicao", codigos[i:i + tamanho_grupo])\
+            .ilike("tipo_composicao", tipo_composicao)\
+            .eq("fonte", fonte)\
+            .execute()
+        for linha in r.data or []:
+            codigo = str(linha.get("codigo_composicao"))
+            mes = linha.get("mes_referencia")
+            atual = resultado.get(codigo)
+            if atual is None or _ordem_mes(mes) > _ordem_mes(atual[0]):
+                resultado[codigo] = (mes, linha)
+
+    for codigo, (mes, _) in resultado.items():
+        logger.warning("[buscar_preco] Composição %s ausente no mês pedido; usando %s.", codigo, mes)
+    return resultado
+
+
+@dataclass
+class TabelaPrecos:
+    """Preços de uma base: ``matriz[linha, coluna_estado]`` (NaN = sem preço)."""
+
+    linhas: Dict[str, int]
+    matriz: np.ndarray
+    carregada_em: float = field(default_factory=time.monotonic)
+
+    def preco(self, codigo: str, estado: str) -> Tuple[bool, Optional[float]]:
+        """``(codigo_existe, preco)``; o preço é ``None`` se a célula estiver vazia."""
+        linha = self.linhas.get(codigo)
+        if linha is None:
+            return False, None
+        coluna = _COLUNA_ESTADO.get(estado.lower())
+        if coluna is None:
+            return True, None
+        valor = self.matriz[linha, coluna]
+        return True, None if np.isnan(valor) else float(valor)
+
+
+class IndicePrecos:
+    """Cache de bases de preço carregadas sob demanda, seguro entre threads."""
+
+    def __init__(self, ttl: Optional[float] = None, tamanho_pagina: int = 1000):
+        """
+        Args:
+            ttl: Segundos até uma base carregada ser recarregada (``None`` = nunca).
+            tamanho_pagina: Linhas por requisição ao PostgREST.
+        """
+        self.ttl = ttl
+        self.tamanho_pagina = tamanho_pagina
+        self._bases: Dict[ChaveBase, TabelaPrecos] = {}
+        # (fonte, tipo, codigo) → (guardado_em, (mes, linha de preços) ou None se não existe em nenhum mês)
+        self._mais_recente: Dict[Tuple[str, str, str], Tuple[float, Optional[Tuple[str, dict]]]] = {}
+        self._lock = threading.Lock()
+        self._locks_carga: Dict[ChaveBase, threading.Lock] = {}
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def buscar(
+        self,
+        supabase_client,
+        codigo_composicao: str,
+        estado: str,
+        mes_referencia: str,
+        tipo_composicao: str,
+        fonte: str = "SINAPI",
+    ) -> Optional[float]:
+        """Preço do código no estado, com as mesmas regras de ``buscar_preco``.
+
+        Se o código não existe na base pedida, usa o mês mais recente em que
+        ele aparece para a mesma fonte e tipo. ``supabase_client`` só é usado
+        quando a base (ou o fallback) ainda não está em memória.
+        """
+        existe, preco = self.base(supabase_client, fonte, mes_referencia, tipo_composicao).preco(
+            str(codigo_composicao), estado,
+        )
+        if existe:
+            return preco
+
+        recente = self._buscar_mais_recente(
+            supabase_client, str(codigo_composicao), tipo_composicao, fonte,
+        )
+        return preco_da_linha(recente[1], estado) if recente else None
+
+    def base(self, supabase_client, fonte: str, mes_referencia: str, tipo_composicao: str) -> TabelaPrecos:
+        """Tabela da base, carregando-a do banco se ainda não estiver em memória."""
+        chave = (fonte, mes_referencia, tipo_composicao.casefold())
+        tabela = self._base_valida(chave)
+        if tabela is not None:
+            return tabela
+
+        with self._lock:
+            lock_carga = self._locks_carga.setdefault(chave, threading.Lock())
+        # Uma única carga por base, mesmo com várias threads consultando
+        with lock_carga:
+            tabela = self._base_valida(chave)
+            if tabela is None:
+                tabela = self._carregar_base(supabase_client, fonte, mes_referencia, tipo_composicao)
+                with self._lock:
+                    self._bases[chave] = tabela
+        return tabela
+
+    # ------------------------------------------------------------------
+    # Invalidação
+    # ------------------------------------------------------------------
+
+    def invalidar(
+        self,
+        fonte: Optional[str] = None,
+        mes_referencia: Optional[str] = None,
+        tipo_composicao: Optional[str] = None,
+    ) -> int:
+        """Descarta as bases que casam com os filtros informados.
+
+        O cache do fallback "mês mais recente" da fonte também é limpo, pois
+        uma base nova pode mudar qual é o mês mais recente de cada código.
+
+        Returns:
+            Quantidade de bases descartadas.
+        """
+        tipo = tipo_composicao.casefold() if tipo_composicao else None
+        with self._lock:
+            removidas = [
+                chave for chave in self._bases
+                if (fonte is None or chave[0] == fonte)
+                and (mes_referencia is None or chave[1] == mes_referencia)
+                and (tipo is None or chave[2] == tipo)
+            ]
+            for chave in removidas:
+                del self._bases[chave]
+            for chave in [c for c in self._mais_recente if fonte is None or c[0] == fonte]:
+                del self._mais_recente[chave]
+        if removidas:
+            logger.info("Índice de preços: %d base(s) invalidada(s) (%s, %s)", len(removidas), fonte, mes_referencia)
+        return len(removidas)
+
+    def bases_carregadas(self) -> List[ChaveBase]:
+        with self._lock:
+            return list(self._bases)
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def _base_valida(self, chave: ChaveBase) -> Optional[TabelaPrecos]:
+        with self._lock:
+            tabela = self._bases.get(chave)
+        if tabela is None or self._expirado(tabela.carregada_em):
+            return None
+        return tabela
+
+    def _expirado(self, guardado_em: float) -> bool:
+        return self.ttl is not None and time.monotonic() - guardado_em > self.ttl
+
+    def _carregar_base(
+        self,
+        supabase_client,
+        fonte: str,
+        mes_referencia: str,
+        tipo_composicao: str,
+    ) -> TabelaPrecos:
+        inicio = time.perf_counter()
+        colunas = "codigo_composicao," + ",".join(ESTADOS)
+        codigos: List[str] = []
+        valores: List[List[Optional[float]]] = []
+        pagina_inicio = 0
+        while True:
+            r = supabase_client.table(TABELA_COMPOSICOES_ESTADOS)\
+                .select(colunas)\
+                .eq("mes_referencia", mes_referencia)\
+                .ilike("tipo_composicao", tipo_composicao)\
+                .eq("fonte", fonte)\
+                .order("codigo_composicao")\
+                .range(pagina_inicio, pagina_inicio + self.tamanho_pagina - 1)\
+                .execute()
+            pagina = r.data or []
+            for row in pagina:
+                codigos.append(str(row.get("codigo_composicao")))
+                valores.append([row.get(uf) for uf in ESTADOS])
+            if len(pagina) < self.tamanho_pagina:
+                break
+            pagina_inicio += self.tamanho_pagina
+
+        matriz = np.array(valores, dtype=np.float64).reshape(len(valores), len(ESTADOS))
+        tabela = TabelaPrecos(linhas={c: i for i, c in enumerate(codigos)}, matriz=matriz)
+        logger.info(
+            "Índice de preços: base (%s, %s, %s) carregada — %d composições em %.2fs",
+            fonte, mes_referencia, tipo_composicao, len(codigos), time.perf_counter() - inicio,
+        )
+        return tabela
+
+    def _buscar_mais_recente(
+        self,
+        supabase_client,
+        codigo: str,
+        tipo_composicao: str,
+        fonte: str,
+    ) -> Optional[Tuple[str, dict]]:
+        return self._buscar_mais_recentes(supabase_client, [codigo], tipo_composicao, fonte)[codigo]
+
+    def _buscar_mais_recentes(
+        self,
+        supabase_client,
+        codigos: List[str],
+        tipo_composicao: str,
+        fonte: str,
+    ) -> Dict[str, Optional[Tuple[str, dict]]]:
+        """Fallback memorizado; consulta o banco só pelos códigos ainda
+        desconhecidos ou guardados há mais de ``ttl`` segundos."""
+        tipo = tipo_composicao.casefold()
+        resultado: Dict[str, Optional[Tuple[str, dict]]] = {}
+        pendentes: List[str] = []
+        with self._lock:
+            for codigo in codigos:
+                guardado = self._mais_recente.get((fonte, tipo, codigo))
+                if guardado is not None and not self._expirado(guardado[0]):
+                    resultado[codigo] = guardado[1]
+                else:
+                    pendentes.append(codigo)
+
+        if pendentes:
+            encontrados = buscar_mais_recentes(supabase_client, pendentes, tipo_composicao, fonte)
+            agora = time.monotonic()
+            with self._lock:
+                for codigo in pendentes:
+                    resultado[codigo] = encontrados.get(codigo)
+                    self._mais_recente[(fonte, tipo, codigo)] = (agora, resultado[codigo])
+        return resultado
+
+    def buscar_lote(
+        self,
+        supabase_client,
+        codigos: List[str],
+        estado: str,
+        mes_referencia: str,
+        tipo_composicao: str,
+        fonte: str = "SINAPI",
+    ) -> Dict[str, Optional[float]]:
+        """Versão em lote de :meth:`buscar`: o fallback dos códigos ausentes
+        na base é resolvido com uma única consulta ``in``."""
+        tabela = self.base(supabase_client, fonte, mes_referencia, tipo_composicao)
+        precos: Dict[str, Optional[float]] = {}
+        ausentes: List[str] = []
+        for codigo in dict.fromkeys(str(c) for c in codigos):
+            existe, preco = tabela.preco(codigo, estado)
+            if existe:
+                precos[codigo] = preco
+            else:
+                ausentes.append(codigo)
+
+        if ausentes:
+            recentes = self._buscar_mais_recentes(supabase_client, ausentes, tipo_composicao, fonte)
+            for codigo in ausentes:
+                recente = recentes.get(codigo)
+                precos[codigo] = preco_da_linha(recente[1], estado) if recente else None
+        return precos
+
+
+@lru_cache(maxsize=1)
+def get_indice_precos() -> IndicePrecos:
+    """Índice de preços compartilhado pelos repositórios deste processo."""
+    return IndicePrecos(ttl=settings.PRECO_INDICE_TTL or None)
+
+
+def invalidar_indice_precos(
+    fonte: Optional[str] = None,
+    mes_referencia: Optional[str] = None,
+    tipo_composicao: Optional[str] = None,
+) -> int:
+    """Invalida bases do índice compartilhado deste processo."""
+    return get_indice_precos().invalidar(fonte, mes_referencia, tipo_composicao)
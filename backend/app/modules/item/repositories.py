@@ -1,49 +1,104 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from .bulk_writer import BulkUpsertWriter, ResultadoUpsert, criar_writer_padrao
+from .price_index import ESTADOS, TAMANHO_GRUPO_IN, IndicePrecos, buscar_mais_recentes, preco_da_linha
 
 logger = logging.getLogger(__name__)
 
 TABELA_COMPOSICOES = "composicao"
 TABELA_COMPOSICOES_ESTADOS = "composicao_estados"
 TABELA_COMPOSICAO_ITENS = "composicao_itens"
+TABELA_INSUMOS_BASICOS = "composicao_insumos_basicos"
 
 class ItemRepository:
-    def __init__(self, supabase_client):
+    def __init__(
+        self,
+        supabase_client,
+        writer: Optional[BulkUpsertWriter] = None,
+        indice_precos: Optional[IndicePrecos] = None,
+    ):
+        """
+        Args:
+            supabase_client: Cliente Supabase.
+            writer: Gravador dos upserts em massa (padrão: ``settings``).
+            indice_precos: Índice em memória usado por :meth:`buscar_preco`;
+                sem ele, cada busca consulta o banco.
+        """
         self.supabase = supabase_client
+        self.writer = writer or criar_writer_padrao(supabase_client)
+        self.indice_precos = indice_precos
+        self._relatorio_upsert: Dict[str, ResultadoUpsert] = {}
+
+    def _upsert_em_massa(
+        self,
+        tabela: str,
+        dados: List[Dict[str, Any]],
+        on_conflict: str,
+        max_linhas: int,
+    ) -> int:
+        resultado = self.writer.upsert(tabela, dados, on_conflict, max_linhas=max_linhas)
+        self._relatorio_upsert.setdefault(tabela, ResultadoUpsert()).acumular(resultado)
+        return resultado.gravadas
+
+    def relatorio_upsert(self) -> Dict[str, Dict[str, int]]:
+        """Linhas gravadas, perdidas e reenviadas por tabela desde a criação do repositório."""
+        return {tabela: r.to_dict() for tabela, r in self._relatorio_upsert.items()}
 
     def upsert_batch_composicoes(self, dados: List[Dict[str, Any]]) -> int:
         if not dados: return 0
-        total = 0
-        for i in range(0, len(dados), 1000):
-            try:
-                lote = []
-                for d in dados[i:i+1000]:
-                    d_copy = d.copy()
-                    d_copy.pop("grupo", None)
-                    lote.append(d_copy)
-
-                r = self.supabase.table(TABELA_COMPOSICOES).upsert(
-                    lote,
-                    on_conflict="codigo_composicao,mes_referencia,fonte"
-                ).execute()
-                if r.data: total += len(r.data)
-            except Exception as e:
-                logger.error(f"Erro lote {TABELA_COMPOSICOES}: {e}")
-        return total
+        lote = []
+        for d in dados:
+            d_copy = d.copy()
+            d_copy.pop("grupo", None)
+            lote.append(d_copy)
+        return self._upsert_em_massa(
+            TABELA_COMPOSICOES, lote,
+            on_conflict="codigo_composicao,mes_referencia,fonte",
+            max_linhas=1000,
+        )
 
     def upsert_batch_estados(self, dados: List[Dict[str, Any]]) -> int:
         if not dados: return 0
-        total = 0
-        for i in range(0, len(dados), 1000):
-            try:
-                r = self.supabase.table(TABELA_COMPOSICOES_ESTADOS).upsert(
-                    dados[i:i+1000],
-                    on_conflict="codigo_composicao,mes_referencia,tipo_composicao,fonte"
-                ).execute()
-                if r.data: total += len(r.data)
-            except Exception as e:
-                logger.error(f"Erro lote {TABELA_COMPOSICOES_ESTADOS}: {e}")
-        return total
+        return self._upsert_em_massa(
+            TABELA_COMPOSICOES_ESTADOS, dados,
+            on_conflict="codigo_composicao,mes_referencia,tipo_composicao,fonte",
+            max_linhas=1000,
+        )
+
+    def listar_hashes(
+        self,
+        tabela: str,
+        campos_chave: Tuple[str, ...],
+        mes_referencia: str,
+        fonte: str = "SINAPI",
+        tamanho_pagina: int = 1000,
+    ) -> Dict[Tuple[str, ...], str]:
+        """Hashes de conteúdo já gravados em ``tabela`` para um mês/fonte.
+
+        Retorna ``{chave_upsert: hash_conteudo}``, com a chave normalizada
+        como texto. Lê em páginas de ``tamanho_pagina`` linhas (limite do
+        PostgREST por requisição).
+        """
+        colunas = ",".join((*campos_chave, "hash_conteudo"))
+        hashes: Dict[Tuple[str, ...], str] = {}
+        inicio = 0
+        while True:
+            query = self.supabase.table(tabela)\
+                .select(colunas)\
+                .eq("mes_referencia", mes_referencia)\
+                .eq("fonte", fonte)
+            # Ordem estável entre páginas
+            for campo in campos_chave:
+                query = query.order(campo)
+            r = query.range(inicio, inicio + tamanho_pagina - 1).execute()
+            pagina = r.data or []
+            for row in pagina:
+                if row.get("hash_conteudo"):
+                    hashes[tuple(str(row.get(c)) for c in campos_chave)] = row["hash_conteudo"]
+            if len(pagina) < tamanho_pagina:
+                return hashes
+            inicio += tamanho_pagina
 
     def listar(self, limit: int = 100) -> List[Dict[str, Any]]:
         return self.supabase.table(TABELA_COMPOSICOES).select("*").limit(limit).execute().data or []
@@ -54,6 +109,19 @@ class ItemRepository:
             .eq("fonte", fonte)\
             .execute().data
 
+    def buscar_por_codigos(self, codigos: List[str], fonte: str = "SINAPI") -> Dict[str, Dict[str, Any]]:
+        """Primeira composição encontrada de cada código, numa consulta ``in`` por grupo."""
+        composicoes: Dict[str, Dict[str, Any]] = {}
+        codigos = list(dict.fromkeys(str(c) for c in codigos))
+        for i in range(0, len(codigos), TAMANHO_GRUPO_IN):
+            r = self.supabase.table(TABELA_COMPOSICOES).select("*")\
+                .in_("codigo_composicao", codigos[i:i + TAMANHO_GRUPO_IN])\
+                .eq("fonte", fonte)\
+                .execute()
+            for row in r.data or []:
+                composicoes.setdefault(str(row.get("codigo_composicao")), row)
+        return composicoes
+
     def buscar_por_descricao(self, termo: str, fonte: str = "SINAPI", limit: int = 50) -> List[Dict[str, Any]]:
         return self.supabase.table(TABELA_COMPOSICOES).select("*")\
             .eq("fonte", fonte)\
@@ -83,8 +151,16 @@ class ItemRepository:
                     return preco
             return None
 
+        if self.indice_precos is not None:
+            try:
+                return self.indice_precos.buscar(
+                    self.supabase, codigo_composicao, estado, mes_referencia, tipo_composicao, fonte,
+                )
+            except Exception as e:
+                logger.error(f"[buscar_preco] Erro no índice de preços, consultando o banco: {e}")
+
         try:
-            logger.info(
+            logger.debug(
                 f"[buscar_preco] Buscando: codigo={codigo_composicao!r}, estado={estado!r}, "
                 f"mes_referencia={mes_referencia!r}, tipo_composicao={tipo_composicao!r}, fonte={fonte!r}"
             )
@@ -150,27 +226,95 @@ class ItemRepository:
 
             dados = r.data[0]
             preco = dados.get(estado.lower())
-            logger.info(f"[buscar_preco] Preço encontrado para estado={estado.lower()!r}: {preco}")
+            logger.debug(f"[buscar_preco] Preço encontrado para estado={estado.lower()!r}: {preco}")
             return float(preco) if preco is not None else None
         except Exception as e:
             logger.error(f"[buscar_preco] Exceção: {e}")
             return None
 
+    def buscar_precos_em_lote(
+        self,
+        codigos: List[str],
+        estado: str,
+        mes_referencia: str,
+        tipo_composicao: str,
+        fonte: str = "SINAPI",
+    ) -> Dict[str, Optional[float]]:
+        """Preços de vários códigos de uma vez, com as regras de :meth:`buscar_preco`.
+
+        Sem índice em memória, resolve a base pedida com uma consulta ``in``
+        por grupo de códigos e os ausentes com mais uma (mês mais recente).
+        Meses separados por vírgula são tentados em ordem para os códigos
+        ainda sem preço.
+
+        Returns:
+            ``{codigo: preco}``, com ``None`` para códigos sem preço (e para
+            todos, se ``estado`` não for uma das colunas de ``ESTADOS``).
+        """
+        codigos = list(dict.fromkeys(str(c) for c in codigos if c))
+        if not codigos or not mes_referencia:
+            return {c: None for c in codigos}
+        if estado.lower() not in ESTADOS:
+            # O estado vira nome de coluna no select: só as UFs conhecidas passam
+            logger.warning(f"[buscar_precos_em_lote] Estado inválido: {estado!r}")
+            return {c: None for c in codigos}
+
+        if "," in mes_referencia:
+            precos: Dict[str, Optional[float]] = {c: None for c in codigos}
+            pendentes = codigos
+            for mes in [m.strip() for m in mes_referencia.split(",") if m.strip()]:
+                parciais = self.buscar_precos_em_lote(pendentes, estado, mes, tipo_composicao, fonte)
+                precos.update({c: p for c, p in parciais.items() if p is not None})
+                pendentes = [c for c in pendentes if precos[c] is None]
+                if not pendentes:
+                    break
+            return precos
+
+        if self.indice_precos is not None:
+            try:
+                return self.indice_precos.buscar_lote(
+                    self.supabase, codigos, estado, mes_referencia, tipo_composicao, fonte,
+                )
+            except Exception as e:
+                logger.error(f"[buscar_precos_em_lote] Erro no índice de preços, consultando o banco: {e}")
+
+        try:
+            colunas = f"codigo_composicao,{estado.lower()}"
+            linhas: Dict[str, dict] = {}
+            for i in range(0, len(codigos), TAMANHO_GRUPO_IN):
+                r = self.supabase.table(TABELA_COMPOSICOES_ESTADOS)\
+                    .select(colunas)\
+                    .in_("codigo_composicao", codigos[i:i + TAMANHO_GRUPO_IN])\
+                    .eq("mes_referencia", mes_referencia)\
+                    .ilike("tipo_composicao", tipo_composicao)\
+                    .eq("fonte", fonte)\
+                    .execute()
+                for linha in r.data or []:
+                    linhas.setdefault(str(linha.get("codigo_composicao")), linha)
+
+            ausentes = [c for c in codigos if c not in linhas]
+            if ausentes:
+                for codigo, (_, linha) in buscar_mais_recentes(
+                    self.supabase, ausentes, tipo_composicao, fonte,
+                ).items():
+                    linhas[codigo] = linha
+
+            return {
+                c: preco_da_linha(linhas[c], estado) if c in linhas else None
+                for c in codigos
+            }
+        except Exception as e:
+            logger.error(f"[buscar_precos_em_lote] Exceção: {e}")
+            return {c: None for c in codigos}
+
     def upsert_batch_composicao_itens(self, dados: List[Dict[str, Any]]) -> int:
         if not dados:
             return 0
-        total = 0
-        for i in range(0, len(dados), 500):
-            try:
-                r = self.supabase.table(TABELA_COMPOSICAO_ITENS).upsert(
-                    dados[i:i+500],
-                    on_conflict="codigo_pai,codigo_filho,mes_referencia,fonte"
-                ).execute()
-                if r.data:
-                    total += len(r.data)
-            except Exception as e:
-                logger.error(f"Erro lote {TABELA_COMPOSICAO_ITENS}: {e}")
-        return total
+        return self._upsert_em_massa(
+            TABELA_COMPOSICAO_ITENS, dados,
+            on_conflict="codigo_pai,codigo_filho,mes_referencia,fonte",
+            max_linhas=500,
+        )
 
     def buscar_filhos_composicao(self, codigo_pai: str, mes_referencia: str, fonte: str = "SINAPI") -> List[Dict[str, Any]]:
         try:
@@ -184,3 +328,136 @@ class ItemRepository:
         except Exception as e:
             logger.error(f"Erro ao buscar filhos de {codigo_pai}: {e}")
             return []
+
+    def substituir_insumos_basicos(
+        self,
+        linhas: List[Dict[str, Any]],
+        mes_referencia: str,
+        fonte: str = "SINAPI",
+    ) -> int:
+        """Regrava os vetores achatados de composições de um mês/fonte.
+
+        As linhas novas são gravadas primeiro; só então as que ficaram fora
+        delas (insumos que saíram de uma composição) são apagadas. Se algum
+        lote falhar, levanta exceção antes de apagar, e a base anterior
+        continua inteira no banco.
+        """
+        resultado = self.writer.upsert(
+            TABELA_INSUMOS_BASICOS, linhas,
+            on_conflict="codigo_composicao,codigo_insumo,mes_referencia,fonte",
+            max_linhas=1000,
+        )
+        self._relatorio_upsert.setdefault(TABELA_INSUMOS_BASICOS, ResultadoUpsert()).acumular(resultado)
+        if resultado.falhas:
+            raise Exception(
+                f"Falha ao gravar {resultado.falhas} de {len(linhas)} insumos básicos ({mes_referencia}, {fonte})"
+            )
+
+        novas: Dict[str, set] = {}
+        for linha in linhas:
+            novas.setdefault(str(linha["codigo_composicao"]), set()).add(str(linha["codigo_insumo"]))
+        obsoletas: Dict[str, List[str]] = {}
+        for codigo, insumo in self._listar_chaves_insumos_basicos(mes_referencia, fonte):
+            if insumo not in novas.get(codigo, ()):
+                obsoletas.setdefault(codigo, []).append(insumo)
+        self._apagar_insumos_basicos(obsoletas, novas, mes_referencia, fonte)
+        return resultado.gravadas
+
+    def _listar_chaves_insumos_basicos(
+        self, mes_referencia: str, fonte: str, tamanho_pagina: int = 1000,
+    ) -> List[Tuple[str, str]]:
+        """``(codigo_composicao, codigo_insumo)`` gravados para o mês/fonte."""
+        chaves: List[Tuple[str, str]] = []
+        inicio = 0
+        while True:
+            r = self.supabase.table(TABELA_INSUMOS_BASICOS)\
+                .select("codigo_composicao,codigo_insumo")\
+                .eq("mes_referencia", mes_referencia)\
+                .eq("fonte", fonte)\
+                .order("codigo_composicao")\
+                .order("codigo_insumo")\
+                .range(inicio, inicio + tamanho_pagina - 1)\
+                .execute()
+            pagina = r.data or []
+            chaves.extend((str(row["codigo_composicao"]), str(row["codigo_insumo"])) for row in pagina)
+            if len(pagina) < tamanho_pagina:
+                return chaves
+            inicio += tamanho_pagina
+
+    def _apagar_insumos_basicos(
+        self,
+        obsoletas: Dict[str, List[str]],
+        novas: Dict[str, set],
+        mes_referencia: str,
+        fonte: str,
+    ) -> None:
+        """Apaga as linhas obsoletas: composições inteiras que saíram da base
+        numa consulta ``in`` por grupo; as demais, por composição."""
+        def apagar():
+            return self.supabase.table(TABELA_INSUMOS_BASICOS)\
+                .delete()\
+                .eq("mes_referencia", mes_referencia)\
+                .eq("fonte", fonte)
+
+        removidas = [codigo for codigo in obsoletas if codigo not in novas]
+        for i in range(0, len(removidas), TAMANHO_GRUPO_IN):
+            apagar().in_("codigo_composicao", removidas[i:i + TAMANHO_GRUPO_IN]).execute()
+        for codigo, insumos in obsoletas.items():
+            if codigo not in novas:
+                continue
+            for i in range(0, len(insumos), TAMANHO_GRUPO_IN):
+                apagar().eq("codigo_composicao", codigo).in_("codigo_insumo", insumos[i:i + TAMANHO_GRUPO_IN]).execute()
+
+    def buscar_insumos_basicos(self, codigo_composicao: str, mes_referencia: str, fonte: str = "SINAPI") -> List[Dict[str, Any]]:
+        """Vetor achatado (pré-calculado na importação) de uma composição."""
+        try:
+            r = self.supabase.table(TABELA_INSUMOS_BASICOS)\
+                .select("codigo_insumo,coeficiente,descricao,unidade")\
+                .eq("codigo_composicao", codigo_composicao)\
+                .eq("mes_referencia", mes_referencia)\
+                .eq("fonte", fonte)\
+                .execute()
+            return r.data or []
+        except Exception as e:
+            logger.error(f"Erro ao buscar insumos básicos de {codigo_composicao}: {e}")
+            return []
+
+    def buscar_filhos_composicoes(
+        self,
+        codigos_pai: List[str],
+        mes_referencia: str,
+        fonte: str = "SINAPI",
+        tamanho_pagina: int = 1000,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Filhos de várias composições, agrupados pelo código do pai.
+
+        Faz uma consulta ``in`` (paginada) por grupo de códigos. Ao contrário
+        de :meth:`buscar_filhos_composicao`, erros são propagados: o resultado
+        alimenta um cache e uma falha não pode virar "composição sem filhos".
+        """
+        filhos: Dict[str, List[Dict[str, Any]]] = {}
+        codigos = list(dict.fromkeys(str(c) for c in codigos_pai))
+        for i in range(0, len(codigos), TAMANHO_GRUPO_IN):
+            grupo = codigos[i:i + TAMANHO_GRUPO_IN]
+            inicio = 0
+            while True:
+                try:
+                    r = self.supabase.table(TABELA_COMPOSICAO_ITENS)\
+                        .select("*")\
+                        .in_("codigo_pai", grupo)\
+                        .eq("mes_referencia", mes_referencia)\
+                        .eq("fonte", fonte)\
+                        .order("codigo_pai")\
+                        .order("codigo_filho")\
+                        .range(inicio, inicio + tamanho_pagina - 1)\
+                        .execute()
+                except Exception as e:
+                    logger.error(f"Erro ao buscar filhos de {len(grupo)} composições: {e}")
+                    raise
+                pagina = r.data or []
+                for row in pagina:
+                    filhos.setdefault(str(row.get("codigo_pai")), []).append(row)
+                if len(pagina) < tamanho_pagina:
+                    break
+                inicio += tamanho_pagina
+        return filhos
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.modules.item.services import ItemService
 from app.modules.item.repositories import ItemRepository
+from app.modules.item.price_index import ESTADOS, get_indice_precos
+from app.modules.item.schemas import PrecosLoteRequest, PrecosLoteResponse
 from app.dependencies import get_supabase
 from core.security import get_current_user
 
@@ -12,7 +14,7 @@ router = APIRouter(
 )
 
 def get_item_service(supabase = Depends(get_supabase)) -> ItemService:
-    repository = ItemRepository(supabase)
+    repository = ItemRepository(supabase, indice_precos=get_indice_precos())
     return ItemService(repository)
 
 @router.post("/importar", summary="Importar SINAPI (Completo)")
@@ -35,6 +37,20 @@ async def buscar_composicao(termo: str, fonte: str = "SINAPI", service: ItemServ
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar composição: {str(e)}")
 
+@router.post("/precos", response_model=PrecosLoteResponse, summary="Preços de vários códigos")
+async def buscar_precos_em_lote(
+    payload: PrecosLoteRequest,
+    service: ItemService = Depends(get_item_service),
+):
+    """Resolve os preços de uma lista de composições numa única requisição,
+    com o mesmo fallback de mês/tipo da busca individual."""
+    if payload.estado.lower() not in ESTADOS:
+        raise HTTPException(status_code=400, detail=f"Estado inválido: {payload.estado}")
+    return service.buscar_precos_em_lote(
+        payload.codigos, payload.estado, payload.mes_referencia,
+        payload.tipo_composicao, payload.fonte,
+    )
+
 @router.get("/{codigo_composicao}/estados")
 async def listar_estados_composicao(
     codigo_composicao: str, 
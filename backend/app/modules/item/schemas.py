@@ -1,7 +1,22 @@
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
 
 class SinapiMetadata(BaseModel):
     mes_referencia: str
     uf: str
     desoneracao: str
     fonte: str = "SINAPI"
+
+
+class PrecosLoteRequest(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=5000)
+    estado: str
+    mes_referencia: str
+    tipo_composicao: str = "Sem Desoneração"
+    fonte: str = "SINAPI"
+
+
+class PrecosLoteResponse(BaseModel):
+    precos: Dict[str, Optional[float]]
+    nao_encontrados: List[str] = []
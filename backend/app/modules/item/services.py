@@ -211,3 +211,19 @@ class ItemService:
 
     def listar_estados_composicao(self, codigo_composicao: str, mes_referencia: str, fonte: str = "SINAPI"):
         return self.repository.listar_estados_por_item(codigo_composicao, mes_referencia, fonte=fonte)
+
+    def buscar_precos_em_lote(
+        self,
+        codigos: List[str],
+        estado: str,
+        mes_referencia: str,
+        tipo_composicao: str,
+        fonte: str = "SINAPI",
+    ) -> Dict[str, Any]:
+        precos = self.repository.buscar_precos_em_lote(
+            codigos, estado, mes_referencia, tipo_composicao, fonte,
+        )
+        return {
+            "precos": precos,
+            "nao_encontrados": [c for c, p in precos.items() if p is None],
+        }
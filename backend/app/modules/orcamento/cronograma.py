@@ -0,0 +1,144 @@
+"""
+Cronograma físico-financeiro com desembolso rateado por dia.
+
+Cada etapa vira uma taxa diária (custo / dias da etapa) aplicada num vetor
+de dias por um vetor de diferenças; os desembolsos por período são somas
+desse vetor nos limites de cada período. Tudo em NumPy: o custo é
+proporcional a ``etapas + dias`` do cronograma, sem laços por etapa × mês.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import List, Sequence, Union
+
+import numpy as np
+
+PERIODO_MENSAL = "mensal"
+PERIODO_SEMANAL = "semanal"
+
+MESES_PT = ("Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez")
+
+
+@dataclass
+class PeriodoCronograma:
+    """Desembolso de um período do cronograma."""
+
+    inicio: date
+    fim: date
+    """Último dia do período (inclusive)."""
+
+    valor: float
+    acumulado_pct: float
+    etapas: List[str]
+
+
+def normalizar_periodo(periodo: Union[str, int, None]) -> Union[str, int]:
+    """``"mensal"``, ``"semanal"`` ou a quantidade de dias de cada período."""
+    if periodo is None or periodo == "":
+        return PERIODO_MENSAL
+    if isinstance(periodo, str) and periodo.lower() in (PERIODO_MENSAL, PERIODO_SEMANAL):
+        return periodo.lower()
+    try:
+        dias = int(periodo)
+    except (TypeError, ValueError):
+        raise ValueError(f"Período inválido: {periodo!r} (use mensal, semanal ou número de dias)")
+    if dias <= 0:
+        raise ValueError("O período em dias deve ser maior que zero")
+    return dias
+
+
+def _limites(primeiro: np.datetime64, ultimo: np.datetime64, periodo: Union[str, int]) -> np.ndarray:
+    """Dia inicial de cada período e, no fim, o dia seguinte ao último."""
+    if periodo == PERIODO_MENSAL:
+        meses = np.arange(primeiro.astype("datetime64[M]"), ultimo.astype("datetime64[M]") + 2)
+        return meses.astype("datetime64[D]")
+    if periodo == PERIODO_SEMANAL:
+        # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 == 0 nas segundas
+        segunda = primeiro - ((primeiro.astype(np.int64) + 3) % 7)
+        passo = 7
+    else:
+        segunda = primeiro
+        passo = int(periodo)
+    qtd = (ultimo - segunda).astype(np.int64) // passo + 1
+    return segunda + np.arange(qtd + 1) * passo
+
+
+def calcular_cronograma(
+    inicios: Sequence[date],
+    fins: Sequence[date],
+    custos: Sequence[float],
+    nomes: Sequence[str],
+    periodo: Union[str, int] = PERIODO_MENSAL,
+) -> List[PeriodoCronograma]:
+    """Desembolso por período, rateado pelos dias de cada etapa em cada período.
+
+    Args:
+        inicios, fins: Primeiro e último dia (inclusive) de cada etapa.
+        custos: Custo total de cada etapa.
+        nomes: Nome de cada etapa, listado nos períodos em que ela está ativa.
+        periodo: ``"mensal"`` (meses do calendário), ``"semanal"`` (semanas
+            de segunda a domingo) ou a quantidade de dias de cada período,
+            contada a partir do início da primeira etapa.
+
+    Returns:
+        Períodos contíguos do primeiro ao último dia do cronograma, inclusive
+        os sem desembolso.
+    """
+    if len(custos) == 0:
+        return []
+
+    inicio = np.asarray(inicios, dtype="datetime64[D]")
+    fim = np.asarray(fins, dtype="datetime64[D]")
+    fim = np.maximum(fim, inicio)
+    custo = np.asarray(custos, dtype=np.float64)
+
+    limites = _limites(inicio.min(), fim.max(), normalizar_periodo(periodo))
+    origem = limites[0]
+    dias_total = int((limites[-1] - origem).astype(np.int64))
+
+    # Vetor diário: +taxa no início e -taxa no dia seguinte ao fim de cada etapa
+    i_ini = (inicio - origem).astype(np.int64)
+    i_fim = (fim - origem).astype(np.int64) + 1
+    taxa = custo / (i_fim - i_ini)
+    diferencas = np.zeros(dias_total + 1)
+    np.add.at(diferencas, i_ini, taxa)
+    np.add.at(diferencas, i_fim, -taxa)
+    diario = np.cumsum(diferencas[:-1])
+
+    i_limites = (limites - origem).astype(np.int64)
+    valores = np.add.reduceat(diario, i_limites[:-1])
+    total = float(custo.sum())
+    acumulado = np.cumsum(valores) / total * 100.0 if total > 0 else np.zeros_like(valores)
+
+    # Períodos em que cada etapa está ativa: [p_ini, p_fim]
+    p_ini = np.searchsorted(limites, inicio, side="right") - 1
+    p_fim = np.searchsorted(limites, fim, side="right") - 1
+    qtd = p_fim - p_ini + 1
+    etapa_rep = np.repeat(np.arange(len(custo)), qtd)
+    deslocamento = np.arange(int(qtd.sum())) - np.repeat(np.cumsum(qtd) - qtd, qtd)
+    periodo_rep = p_ini[etapa_rep] + deslocamento
+    etapas_por_periodo: List[set] = [set() for _ in range(len(valores))]
+    for p, e in zip(periodo_rep.tolist(), etapa_rep.tolist()):
+        if nomes[e]:
+            etapas_por_periodo[p].add(nomes[e])
+
+    inicios_periodo = limites[:-1].tolist()
+    fins_periodo = (limites[1:] - 1).tolist()
+    return [
+        PeriodoCronograma(
+            inicio=inicios_periodo[p],
+            fim=fins_periodo[p],
+            valor=float(valores[p]),
+            acumulado_pct=float(acumulado[p]),
+            etapas=sorted(etapas_por_periodo[p]),
+        )
+        for p in range(len(valores))
+    ]
+
+
+def rotulo_periodo(periodo_cronograma: PeriodoCronograma, periodo: Union[str, int]) -> str:
+    """``Jul/2026`` nos períodos mensais; data inicial (``06/07/2026``) nos demais."""
+    inicio = periodo_cronograma.inicio
+    if normalizar_periodo(periodo) == PERIODO_MENSAL:
+        return f"{MESES_PT[inicio.month - 1]}/{inicio.year}"
+    return inicio.strftime("%d/%m/%Y")
@@ -1,91 +1,385 @@
-from typing import List, Dict, Any
+"""
+Exportação do orçamento em planilha Excel.
+
+A planilha é escrita com o modo write-only do openpyxl: as linhas vão direto
+para um arquivo temporário à medida que os itens chegam (de uma leitura
+paginada), em vez de montar o workbook inteiro na memória. A formatação usa
+estilos nomeados registrados uma vez no workbook, compartilhados por todas
+as células, em vez de objetos Font/Border/Alignment por célula.
+
+A exportação completa (:func:`escrever_planilha_completa`) escreve, no mesmo
+workbook, o sintético agrupado por etapa, o analítico com os insumos de cada
+item, a Curva ABC e o cronograma.
+"""
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+from copy import copy
 from decimal import Decimal
 import io
+import tempfile
+
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
-def gerar_planilha_orcamento_excel(orcamento: Dict[str, Any], itens: List[Dict[str, Any]]) -> bytes:
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Orçamento Sintético"
-
-    # Fontes e Estilos
-    font_header = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
-    fill_header = PatternFill(start_color="001B3D", end_color="001B3D", fill_type="solid")
-    font_bold = Font(name="Calibri", size=11, bold=True)
-    align_center = Alignment(horizontal="center", vertical="center")
-    align_right = Alignment(horizontal="right", vertical="center")
-    border_thin = Border(
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+
+# Arquivos menores que isso ficam em memória; maiores vão para o disco
+LIMITE_ARQUIVO_EM_MEMORIA = 4 * 1024 * 1024
+TAMANHO_BLOCO_DOWNLOAD = 64 * 1024
+
+MEDIA_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+CABECALHO_SINTETICO = ["Item", "Código", "Descrição da Composição", "Unid.", "Qtd.", "Preço Unit. (R$)", "Preço Total (R$)"]
+LARGURAS_SINTETICO = {"A": 8, "B": 14, "C": 50, "D": 10, "E": 12, "F": 18, "G": 20}
+
+CABECALHO_ANALITICO = ["Item", "Código", "Descrição", "Unid.", "Qtd.", "Preço Unit. (R$)", "Total (R$)"]
+CABECALHO_CURVA_ABC = ["Classe", "Código", "Descrição do Insumo", "Unid.", "Qtd.", "Total (R$)", "%", "% Acumulado"]
+LARGURAS_CURVA_ABC = {"A": 8, "B": 14, "C": 50, "D": 10, "E": 14, "F": 18, "G": 10, "H": 14}
+CABECALHO_CRONOGRAMA = ["Período", "Início", "Fim", "Serviços", "Valor (R$)", "% Acumulado"]
+LARGURAS_CRONOGRAMA = {"A": 14, "B": 12, "C": 12, "D": 60, "E": 18, "F": 14}
+
+# Itens cujos insumos são buscados juntos no analítico
+ITENS_POR_CONSULTA_INSUMOS = 200
+
+SEM_ETAPA = "Itens sem etapa"
+
+
+def _estilos() -> list:
+    """Estilos nomeados da planilha (registrados uma vez por workbook)."""
+    borda = Border(
         left=Side(style="thin", color="E2E8F0"),
         right=Side(style="thin", color="E2E8F0"),
         top=Side(style="thin", color="E2E8F0"),
         bottom=Side(style="thin", color="E2E8F0")
     )
+    centro = Alignment(horizontal="center", vertical="center")
+    direita = Alignment(horizontal="right", vertical="center")
+    return [
+        NamedStyle("orc_titulo", font=Font(name="Calibri", size=16, bold=True, color="001B3D")),
+        NamedStyle("orc_subtitulo", font=Font(name="Calibri", size=11, italic=True, color="64748B")),
+        NamedStyle(
+            "orc_cabecalho",
+            font=Font(name="Calibri", size=11, bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="001B3D", end_color="001B3D", fill_type="solid"),
+            alignment=centro,
+        ),
+        NamedStyle("orc_texto", border=borda),
+        NamedStyle("orc_centro", border=borda, alignment=centro),
+        NamedStyle("orc_numero", border=borda, alignment=direita, number_format="#,##0.00"),
+        NamedStyle("orc_moeda", border=borda, alignment=direita, number_format="R$ #,##0.00"),
+        NamedStyle(
+            "orc_etapa",
+            font=Font(name="Calibri", size=11, bold=True, color="001B3D"),
+            fill=PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid"),
+            border=borda,
+        ),
+        NamedStyle(
+            "orc_etapa_moeda",
+            font=Font(name="Calibri", size=11, bold=True, color="001B3D"),
+            fill=PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid"),
+            border=borda, alignment=direita, number_format="R$ #,##0.00",
+        ),
+        NamedStyle("orc_negrito", font=Font(name="Calibri", size=11, bold=True), border=borda),
+        NamedStyle("orc_recuo", border=borda, alignment=Alignment(indent=2)),
+        NamedStyle("orc_data", border=borda, alignment=centro, number_format="DD/MM/YYYY"),
+        NamedStyle("orc_percentual", border=borda, alignment=direita, number_format="0.00"),
+        NamedStyle("orc_total_rotulo", font=Font(name="Calibri", size=11, bold=True), alignment=direita),
+        NamedStyle(
+            "orc_total_moeda",
+            font=Font(name="Calibri", size=11, bold=True),
+            alignment=direita,
+            number_format="R$ #,##0.00",
+        ),
+    ]
 
-    # Cabeçalho do Projeto
-    ws["A1"] = f"ORÇAMENTO: {orcamento.get('nome', '')}"
-    ws["A1"].font = Font(name="Calibri", size=16, bold=True, color="001B3D")
-    ws["A2"] = f"Cliente: {orcamento.get('cliente', '')} | Base: {orcamento.get('base_referencia', '')} | BDI: {orcamento.get('bdi', 0)}%"
-    ws["A2"].font = Font(name="Calibri", size=11, italic=True, color="64748B")
-
-    # Linhas da Tabela
-    headers = ["Item", "Código", "Descrição da Composição", "Unid.", "Qtd.", "Preço Unit. (R$)", "Preço Total (R$)"]
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col_num)
-        cell.value = header
-        cell.font = font_header
-        cell.fill = fill_header
-        cell.alignment = align_center
-
-    row_num = 5
-    total_geral = Decimal("0.0")
 
-    for idx, item in enumerate(itens, 1):
+class _PlanilhaStreaming:
+    """Workbook write-only com os estilos nomeados já registrados."""
+
+    def __init__(self):
+        self.wb = openpyxl.Workbook(write_only=True)
+        for estilo in _estilos():
+            self.wb.add_named_style(estilo)
+        self._estilos_resolvidos: Dict[str, Any] = {}
+
+    def nova_aba(self, titulo: str, larguras: Dict[str, float]):
+        ws = self.wb.create_sheet(titulo)
+        for coluna, largura in larguras.items():
+            ws.column_dimensions[coluna].width = largura
+        return ws
+
+    def celula(self, ws, valor: Any, estilo: str = None) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=valor)
+        if estilo:
+            # A atribuição por nome procura o estilo no workbook a cada célula;
+            # o arranjo de índices resultante é o mesmo para todas, então é
+            # resolvido uma vez e copiado
+            resolvido = self._estilos_resolvidos.get(estilo)
+            if resolvido is None:
+                cell.style = estilo
+                self._estilos_resolvidos[estilo] = copy(cell._style)
+            else:
+                cell._style = copy(resolvido)
+        return cell
+
+    def cabecalho_orcamento(self, ws, orcamento: Dict[str, Any], titulos: List[str]) -> None:
+        """Título, subtítulo, linha em branco e cabeçalho da tabela (linha 4)."""
+        ws.append([self.celula(ws, f"ORÇAMENTO: {orcamento.get('nome', '')}", "orc_titulo")])
+        ws.append([self.celula(
+            ws,
+            f"Cliente: {orcamento.get('cliente', '')} | Base: {orcamento.get('base_referencia', '')} | BDI: {orcamento.get('bdi', 0)}%",
+            "orc_subtitulo",
+        )])
+        ws.append([])
+        ws.append([self.celula(ws, titulo, "orc_cabecalho") for titulo in titulos])
+
+    def linha_item(self, ws, numero, item: Dict[str, Any]) -> Decimal:
+        """Linha de um item de orçamento; devolve o preço total."""
         qtd = Decimal(str(item.get("quantidade", 0)))
         pu = Decimal(str(item.get("preco_unitario") or 0))
         pt = Decimal(str(item.get("preco_total") or (qtd * pu)))
-        total_geral += pt
-
-        ws.cell(row=row_num, column=1, value=idx).alignment = align_center
-        ws.cell(row=row_num, column=2, value=item.get("codigo_composicao", "")).alignment = align_center
-        ws.cell(row=row_num, column=3, value=item.get("descricao", ""))
-        ws.cell(row=row_num, column=4, value=item.get("unidade", "")).alignment = align_center
-        
-        cell_qtd = ws.cell(row=row_num, column=5, value=float(qtd))
-        cell_qtd.number_format = "#,##0.00"
-        cell_qtd.alignment = align_right
-
-        cell_pu = ws.cell(row=row_num, column=6, value=float(pu))
-        cell_pu.number_format = "R$ #,##0.00"
-        cell_pu.alignment = align_right
-
-        cell_pt = ws.cell(row=row_num, column=7, value=float(pt))
-        cell_pt.number_format = "R$ #,##0.00"
-        cell_pt.alignment = align_right
-
-        for c in range(1, 8):
-            ws.cell(row=row_num, column=c).border = border_thin
-
-        row_num += 1
-
-    # Linha de Total Geral
-    ws.cell(row=row_num, column=3, value="TOTAL GERAL DO ORÇAMENTO").font = font_bold
-    ws.cell(row=row_num, column=3).alignment = align_right
-    cell_tot = ws.cell(row=row_num, column=7, value=float(total_geral))
-    cell_tot.font = font_bold
-    cell_tot.number_format = "R$ #,##0.00"
-    cell_tot.alignment = align_right
-
-    # Largura das colunas
-    ws.column_dimensions["A"].width = 8
-    ws.column_dimensions["B"].width = 14
-    ws.column_dimensions["C"].width = 50
-    ws.column_dimensions["D"].width = 10
-    ws.column_dimensions["E"].width = 12
-    ws.column_dimensions["F"].width = 18
-    ws.column_dimensions["G"].width = 20
+        cel = self.celula
+        ws.append([
+            cel(ws, numero, "orc_centro"),
+            cel(ws, item.get("codigo_composicao", ""), "orc_centro"),
+            cel(ws, item.get("descricao", ""), "orc_texto"),
+            cel(ws, item.get("unidade", ""), "orc_centro"),
+            cel(ws, float(qtd), "orc_numero"),
+            cel(ws, float(pu), "orc_moeda"),
+            cel(ws, float(pt), "orc_moeda"),
+        ])
+        return pt
+
+    def linha_total(self, ws, rotulo: str, valor: float, coluna_valor: int = 7) -> None:
+        linha = [None] * coluna_valor
+        linha[2] = self.celula(ws, rotulo, "orc_total_rotulo")
+        linha[coluna_valor - 1] = self.celula(ws, float(valor), "orc_total_moeda")
+        ws.append(linha)
+
+
+def escrever_planilha_orcamento(
+    destino: BinaryIO,
+    orcamento: Dict[str, Any],
+    itens: Iterable[Dict[str, Any]],
+) -> int:
+    """Escreve a planilha sintética em ``destino``, consumindo ``itens`` uma vez.
+
+    Returns:
+        Quantidade de itens escritos.
+    """
+    planilha = _PlanilhaStreaming()
+    ws = planilha.nova_aba("Orçamento Sintético", LARGURAS_SINTETICO)
+    planilha.cabecalho_orcamento(ws, orcamento, CABECALHO_SINTETICO)
+
+    total_geral = Decimal("0.0")
+    idx = 0
+    for idx, item in enumerate(itens, 1):
+        total_geral += planilha.linha_item(ws, idx, item)
+
+    planilha.linha_total(ws, "TOTAL GERAL DO ORÇAMENTO", total_geral)
+
+    planilha.wb.save(destino)
+    return idx
+
+
+def escrever_planilha_completa(
+    destino: BinaryIO,
+    orcamento: Dict[str, Any],
+    etapas: List[Dict[str, Any]],
+    itens: Iterable[Dict[str, Any]],
+    buscar_insumos: Callable[[List[str]], Iterable[Dict[str, Any]]],
+    curva_abc: Optional[Dict[str, Any]] = None,
+    cronograma: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Workbook completo: sintético por etapa, analítico, Curva ABC e cronograma.
+
+    Args:
+        etapas: Etapas do orçamento, na ordem de exibição.
+        itens: Itens do orçamento (lidos uma vez e agrupados por etapa).
+        buscar_insumos: Insumos de uma lista de ids de itens, numa consulta
+            em lote; chamada a cada ``ITENS_POR_CONSULTA_INSUMOS`` itens.
+        curva_abc, cronograma: Resultados de ``obter_curva_abc`` e
+            ``obter_cronograma``; a aba é omitida se ausentes.
+
+    Returns:
+        Quantidade de itens escritos.
+    """
+    planilha = _PlanilhaStreaming()
+
+    por_etapa: Dict[Any, List[Dict[str, Any]]] = {}
+    ids_etapas = {e.get("id") for e in etapas}
+    for item in itens:
+        etapa_id = item.get("etapa_id")
+        por_etapa.setdefault(etapa_id if etapa_id in ids_etapas else None, []).append(item)
+    grupos = [(e.get("nome") or "", por_etapa.get(e.get("id"), [])) for e in etapas]
+    grupos.append((SEM_ETAPA, por_etapa.get(None, [])))
+    grupos = [(nome, lista) for nome, lista in grupos if lista]
+    numerados = [
+        (f"{g}.{i}", item)
+        for g, (_, lista) in enumerate(grupos, 1)
+        for i, item in enumerate(lista, 1)
+    ]
+
+    _aba_sintetico_por_etapa(planilha, orcamento, grupos)
+    _aba_analitico(planilha, orcamento, numerados, buscar_insumos)
+    if curva_abc is not None:
+        _aba_curva_abc(planilha, orcamento, curva_abc)
+    if cronograma is not None:
+        _aba_cronograma(planilha, orcamento, cronograma)
+
+    planilha.wb.save(destino)
+    return len(numerados)
+
+
+def _aba_sintetico_por_etapa(planilha: _PlanilhaStreaming, orcamento, grupos) -> None:
+    ws = planilha.nova_aba("Sintético por Etapa", LARGURAS_SINTETICO)
+    cel = planilha.celula
+    planilha.cabecalho_orcamento(ws, orcamento, CABECALHO_SINTETICO)
+
+    total_geral = Decimal("0.0")
+    for g, (nome, lista) in enumerate(grupos, 1):
+        subtotal = sum(
+            (Decimal(str(i.get("preco_total") or (Decimal(str(i.get("quantidade", 0))) * Decimal(str(i.get("preco_unitario") or 0)))))
+             for i in lista),
+            Decimal("0.0"),
+        )
+        ws.append([
+            cel(ws, str(g), "orc_etapa"), cel(ws, "", "orc_etapa"), cel(ws, nome, "orc_etapa"),
+            cel(ws, "", "orc_etapa"), cel(ws, "", "orc_etapa"), cel(ws, "", "orc_etapa"),
+            cel(ws, float(subtotal), "orc_etapa_moeda"),
+        ])
+        for i, item in enumerate(lista, 1):
+            total_geral += planilha.linha_item(ws, f"{g}.{i}", item)
+
+    planilha.linha_total(ws, "TOTAL GERAL DO ORÇAMENTO", total_geral)
+
+
+def _aba_analitico(planilha: _PlanilhaStreaming, orcamento, numerados, buscar_insumos) -> None:
+    ws = planilha.nova_aba("Analítico", LARGURAS_SINTETICO)
+    cel = planilha.celula
+    planilha.cabecalho_orcamento(ws, orcamento, CABECALHO_ANALITICO)
+
+    for inicio in range(0, len(numerados), ITENS_POR_CONSULTA_INSUMOS):
+        bloco = numerados[inicio:inicio + ITENS_POR_CONSULTA_INSUMOS]
+        insumos: Dict[Any, List[Dict[str, Any]]] = {}
+        for insumo in buscar_insumos([item.get("id") for _, item in bloco if item.get("id")]):
+            insumos.setdefault(insumo.get("orcamento_item_id"), []).append(insumo)
+
+        for numero, item in bloco:
+            qtd = float(item.get("quantidade") or 0)
+            pu = float(item.get("preco_unitario") or 0)
+            ws.append([
+                cel(ws, numero, "orc_negrito"),
+                cel(ws, item.get("codigo_composicao", ""), "orc_negrito"),
+                cel(ws, item.get("descricao", ""), "orc_negrito"),
+                cel(ws, item.get("unidade", ""), "orc_negrito"),
+                cel(ws, qtd, "orc_numero"),
+                cel(ws, pu, "orc_moeda"),
+                cel(ws, float(item.get("preco_total") or qtd * pu), "orc_total_moeda"),
+            ])
+            for insumo in insumos.get(item.get("id"), []):
+                preco = insumo.get("preco_unitario_custom")
+                if preco is None:
+                    preco = insumo.get("preco_unitario_base")
+                ws.append([
+                    None,
+                    cel(ws, insumo.get("codigo_insumo", ""), "orc_centro"),
+                    cel(ws, insumo.get("descricao", ""), "orc_recuo"),
+                    cel(ws, insumo.get("unidade", ""), "orc_centro"),
+                    cel(ws, float(insumo.get("quantidade_unitaria") or 0), "orc_numero"),
+                    cel(ws, float(preco or 0), "orc_moeda"),
+                    cel(ws, float(insumo.get("total") or 0), "orc_moeda"),
+                ])
+
+
+def _aba_curva_abc(planilha: _PlanilhaStreaming, orcamento, curva_abc: Dict[str, Any]) -> None:
+    ws = planilha.nova_aba("Curva ABC", LARGURAS_CURVA_ABC)
+    cel = planilha.celula
+    planilha.cabecalho_orcamento(ws, orcamento, CABECALHO_CURVA_ABC)
+
+    for ins in curva_abc.get("insumos", []):
+        ws.append([
+            cel(ws, ins.get("classe"), "orc_centro"),
+            cel(ws, ins.get("codigo_insumo"), "orc_centro"),
+            cel(ws, ins.get("descricao"), "orc_texto"),
+            cel(ws, ins.get("unidade"), "orc_centro"),
+            cel(ws, ins.get("quantidade"), "orc_numero"),
+            cel(ws, ins.get("total"), "orc_moeda"),
+            cel(ws, ins.get("porcentagem"), "orc_percentual"),
+            cel(ws, ins.get("acumulado"), "orc_percentual"),
+        ])
+    for classe, valor in curva_abc.get("resumo_classes", {}).items():
+        planilha.linha_total(ws, f"Classe {classe}", valor, coluna_valor=6)
+    planilha.linha_total(ws, "TOTAL DOS INSUMOS", curva_abc.get("valor_total", 0.0), coluna_valor=6)
+
+
+def _aba_cronograma(planilha: _PlanilhaStreaming, orcamento, cronograma: Dict[str, Any]) -> None:
+    ws = planilha.nova_aba("Cronograma", LARGURAS_CRONOGRAMA)
+    cel = planilha.celula
+    planilha.cabecalho_orcamento(ws, orcamento, CABECALHO_CRONOGRAMA)
+
+    for periodo in cronograma.get("mensal", []):
+        ws.append([
+            cel(ws, periodo.get("mes"), "orc_centro"),
+            cel(ws, periodo.get("inicio"), "orc_data"),
+            cel(ws, periodo.get("fim"), "orc_data"),
+            cel(ws, periodo.get("servicos"), "orc_texto"),
+            cel(ws, periodo.get("valor"), "orc_moeda"),
+            cel(ws, periodo.get("acumulado_pct"), "orc_percentual"),
+        ])
+    planilha.linha_total(ws, "TOTAL", cronograma.get("valor_total", 0.0), coluna_valor=5)
+
+
+def gerar_planilha_orcamento_arquivo(
+    orcamento: Dict[str, Any],
+    itens: Iterable[Dict[str, Any]],
+) -> BinaryIO:
+    """Planilha num arquivo temporário, posicionado no início.
+
+    Fica em memória até ``LIMITE_ARQUIVO_EM_MEMORIA`` e passa para o disco
+    acima disso. Quem recebe fecha o arquivo (ver :func:`iterar_arquivo`).
+    """
+    return _em_arquivo_temporario(escrever_planilha_orcamento, orcamento, itens)
+
+
+def gerar_planilha_completa_arquivo(
+    orcamento: Dict[str, Any],
+    etapas: List[Dict[str, Any]],
+    itens: Iterable[Dict[str, Any]],
+    buscar_insumos: Callable[[List[str]], Iterable[Dict[str, Any]]],
+    curva_abc: Optional[Dict[str, Any]] = None,
+    cronograma: Optional[Dict[str, Any]] = None,
+) -> BinaryIO:
+    """:func:`escrever_planilha_completa` num arquivo temporário, como
+    :func:`gerar_planilha_orcamento_arquivo`."""
+    return _em_arquivo_temporario(
+        escrever_planilha_completa, orcamento, etapas, itens, buscar_insumos, curva_abc, cronograma
+    )
+
+
+def _em_arquivo_temporario(escrever: Callable[..., int], *args) -> BinaryIO:
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_ARQUIVO_EM_MEMORIA)
+    try:
+        escrever(arquivo, *args)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
+
+
+def iterar_arquivo(arquivo: BinaryIO, tamanho_bloco: int = TAMANHO_BLOCO_DOWNLOAD) -> Iterator[bytes]:
+    """Blocos do arquivo para um ``StreamingResponse``; fecha o arquivo no fim."""
+    try:
+        while True:
+            bloco = arquivo.read(tamanho_bloco)
+            if not bloco:
+                break
+            yield bloco
+    finally:
+        arquivo.close()
+
 
+def gerar_planilha_orcamento_excel(orcamento: Dict[str, Any], itens: Iterable[Dict[str, Any]]) -> bytes:
     output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    escrever_planilha_orcamento(output, orcamento, itens)
     return output.getvalue()
@@ -0,0 +1,71 @@
+"""
+Cache dos arquivos exportados (PDF e Excel) por versão do orçamento.
+
+A chave é ``(orcamento_id, formato, updated_at)``: toda edição do cabeçalho,
+de itens, insumos ou etapas regrava o ``updated_at``, então a versão nova
+nunca encontra o arquivo da anterior (que sai pelo LRU). O ETag deriva da
+mesma chave, o que permite responder 304 antes de gerar qualquer coisa.
+
+Na planilha completa de um orçamento sem ``data``, o cronograma posiciona as
+etapas sem datas a partir do dia da geração; aí a versão inclui esse dia.
+"""
+
+import hashlib
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from core.cache import CacheLRU
+from core.config import settings
+
+ChaveExportacao = Tuple[str, str, str]
+
+_cache_exportacoes: CacheLRU[bytes] = CacheLRU(
+    max_itens=settings.EXPORT_CACHE_ARQUIVOS,
+    max_peso=settings.EXPORT_CACHE_BYTES,
+    peso=len,
+)
+
+
+def chave_exportacao(orcamento: Dict[str, Any], formato: str) -> Optional[ChaveExportacao]:
+    """Chave da versão atual do orçamento, ou ``None`` sem ``updated_at``."""
+    versao = orcamento.get("updated_at")
+    if not versao or not orcamento.get("id"):
+        return None
+    versao = str(versao)
+    if formato == "xlsx-completo" and not orcamento.get("data"):
+        versao = f"{versao}|{date.today().isoformat()}"
+    return (str(orcamento["id"]), formato, versao)
+
+
+def etag_exportacao(chave: Optional[ChaveExportacao] = None, conteudo: Optional[bytes] = None) -> str:
+    """ETag forte da versão (``chave``) ou, sem versão, do próprio conteúdo."""
+    base = "|".join(chave).encode() if chave else conteudo
+    return f'"{hashlib.sha256(base).hexdigest()[:32]}"'
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """Se o ``If-None-Match`` da requisição aceita ``etag`` (comparação fraca)."""
+    if not if_none_match:
+        return False
+    candidatos = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in candidatos or etag in candidatos
+
+
+def cabe_no_cache(tamanho: int) -> bool:
+    max_peso = _cache_exportacoes.max_peso
+    return max_peso is None or tamanho <= max_peso
+
+
+def obter_exportacao(chave: ChaveExportacao) -> Optional[bytes]:
+    return _cache_exportacoes.obter(chave)
+
+
+def guardar_exportacao(chave: ChaveExportacao, conteudo: bytes) -> None:
+    _cache_exportacoes.definir(chave, conteudo)
+
+
+def invalidar_exportacoes(orcamento_id: Optional[str] = None) -> int:
+    """Descarta os arquivos de um orçamento (de todos, se omitido)."""
+    if orcamento_id is None:
+        return _cache_exportacoes.invalidar()
+    return _cache_exportacoes.invalidar(lambda chave: chave[0] == str(orcamento_id))
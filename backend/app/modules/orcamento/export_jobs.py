@@ -0,0 +1,195 @@
+"""
+Geração das exportações (PDF e Excel) fora do laço de eventos.
+
+Os dados são lidos do banco na thread que atende a requisição ou a tarefa.
+A renderização é CPU pura (fpdf2/openpyxl): em orçamentos de até
+``EXPORT_SINCRONO_MAX_ITENS`` itens roda na própria thread; acima disso vai
+para um pool de processos, sem disputar o GIL com o servidor, e recebe os
+dados já lidos (dicionários serializáveis) em vez de conexões.
+"""
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple
+
+from app.modules.importacao.services.pdf_service import PdfService
+from app.modules.orcamento.export import (
+    MEDIA_TYPE_XLSX, LIMITE_ARQUIVO_EM_MEMORIA, escrever_planilha_completa, escrever_planilha_orcamento,
+)
+from app.modules.orcamento.repositories import InsumoRepository
+from core.config import settings
+
+logger = logging.getLogger("projeto_orcamento")
+
+# formato -> (media type, extensão)
+FORMATOS: Dict[str, Tuple[str, str]] = {
+    "pdf": ("application/pdf", "pdf"),
+    "xlsx": (MEDIA_TYPE_XLSX, "xlsx"),
+    "xlsx-completo": (MEDIA_TYPE_XLSX, "xlsx"),
+}
+
+# Colunas dos itens usadas no relatório PDF
+COLUNAS_ITENS_PDF = "id,etapa_id,descricao,quantidade,preco_unitario"
+
+
+def nome_arquivo(orcamento_id: str, formato: str) -> str:
+    return f"orcamento_{orcamento_id}.{FORMATOS[formato][1]}"
+
+
+def exportacao_sincrona(service, orcamento_id: str) -> bool:
+    """Se o orçamento é pequeno o bastante para renderizar na própria thread."""
+    qtd = service.orcamento_item_repository.contar_por_orcamento(orcamento_id)
+    return qtd <= settings.EXPORT_SINCRONO_MAX_ITENS
+
+
+def carregar_dados(service, orcamento: Dict[str, Any], formato: str, serializavel: bool = False) -> Dict[str, Any]:
+    """Tudo o que :func:`escrever_exportacao` precisa, lido em consultas em lote.
+
+    Com ``serializavel``, os insumos do analítico são lidos aqui mesmo (para
+    seguir ao pool de processos); sem ele, são lidos por lote de itens
+    durante a escrita.
+    """
+    orcamento_id = orcamento["id"]
+    if formato == "pdf":
+        return {
+            "orcamento": orcamento,
+            "etapas": service.etapa_repository.listar_por_orcamento(orcamento_id),
+            "itens": list(service.orcamento_item_repository.iterar_por_orcamento(orcamento_id, COLUNAS_ITENS_PDF)),
+        }
+    if formato == "xlsx":
+        return {"orcamento": orcamento, "itens": list(service.orcamento_item_repository.iterar_por_orcamento(orcamento_id))}
+
+    dados = service.dados_planilha_completa(orcamento_id)
+    insumos = InsumoRepository(service.supabase)
+    if serializavel:
+        dados["insumos"] = insumos.listar_por_itens([item["id"] for item in dados["itens"] if item.get("id")])
+    else:
+        dados["buscar_insumos"] = insumos.listar_por_itens
+    return dados
+
+
+def _buscar_em(insumos: List[Dict[str, Any]]) -> Callable[[List[str]], List[Dict[str, Any]]]:
+    por_item: Dict[Any, List[Dict[str, Any]]] = {}
+    for insumo in insumos:
+        por_item.setdefault(insumo.get("orcamento_item_id"), []).append(insumo)
+    return lambda item_ids: [insumo for item_id in item_ids for insumo in por_item.get(item_id, [])]
+
+
+def escrever_exportacao(formato: str, dados: Dict[str, Any], destino: BinaryIO) -> None:
+    """Renderiza ``formato`` em ``destino`` a partir de :func:`carregar_dados`."""
+    if formato == "pdf":
+        destino.write(bytes(PdfService().gerar_pdf(dados["orcamento"], dados["itens"], dados["etapas"])))
+    elif formato == "xlsx":
+        escrever_planilha_orcamento(destino, dados["orcamento"], dados["itens"])
+    elif formato == "xlsx-completo":
+        buscar_insumos = dados.get("buscar_insumos") or _buscar_em(dados.get("insumos") or [])
+        escrever_planilha_completa(
+            destino, dados["orcamento"], dados["etapas"], dados["itens"], buscar_insumos,
+            dados.get("curva_abc"), dados.get("cronograma"),
+        )
+    else:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+
+
+def renderizar_em_arquivo(formato: str, dados: Dict[str, Any], caminho: str) -> int:
+    """Ponto de entrada no pool de processos; devolve o tamanho do arquivo."""
+    with open(caminho, "wb") as destino:
+        escrever_exportacao(formato, dados, destino)
+        return destino.tell()
+
+
+@lru_cache(maxsize=1)
+def get_pool_exportacao() -> ProcessPoolExecutor:
+    """Pool de processos deste worker (``spawn``: o processo pai tem threads)."""
+    return ProcessPoolExecutor(
+        max_workers=max(1, settings.EXPORT_PROCESSOS),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def diretorio_exportacoes() -> str:
+    diretorio = settings.EXPORT_DIR or os.path.join(tempfile.gettempdir(), "orcamento_exports")
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def _renderizar_no_pool(formato: str, dados: Dict[str, Any], caminho: str) -> int:
+    try:
+        return get_pool_exportacao().submit(renderizar_em_arquivo, formato, dados, caminho).result()
+    except Exception:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        raise
+
+
+def gerar_exportacao(service, orcamento: Dict[str, Any], formato: str) -> BinaryIO:
+    """Arquivo da exportação, posicionado no início (quem recebe fecha).
+
+    Orçamentos pequenos são renderizados aqui, num arquivo temporário em
+    memória; os grandes, no pool de processos, num arquivo em disco que é
+    removido do diretório logo após aberto.
+    """
+    if exportacao_sincrona(service, orcamento["id"]):
+        arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_ARQUIVO_EM_MEMORIA)
+        try:
+            escrever_exportacao(formato, carregar_dados(service, orcamento, formato), arquivo)
+        except Exception:
+            arquivo.close()
+            raise
+        arquivo.seek(0)
+        return arquivo
+
+    caminho = os.path.join(diretorio_exportacoes(), f"{uuid.uuid4().hex}.{FORMATOS[formato][1]}")
+    _renderizar_no_pool(formato, carregar_dados(service, orcamento, formato, serializavel=True), caminho)
+    arquivo = open(caminho, "rb")
+    os.remove(caminho)
+    return arquivo
+
+
+def exportar_orcamento(progresso: Callable[..., None], service, orcamento_id: str, formato: str) -> Dict[str, Any]:
+    """Tarefa de ``POST /orcamentos/{id}/exports`` para orçamentos grandes.
+
+    Assinatura compatível com :meth:`core.jobs.JobManager.submeter`. O
+    arquivo fica em ``diretorio_exportacoes()`` até ``EXPORT_ARQUIVO_TTL``
+    segundos e é servido por ``GET /orcamentos/{id}/exports/{job_id}``.
+    """
+    diretorio = diretorio_exportacoes()
+    limpar_arquivos_antigos(diretorio)
+
+    progresso("lendo_dados")
+    orcamento = service.buscar_orcamento(orcamento_id)
+    dados = carregar_dados(service, orcamento, formato, serializavel=True)
+
+    progresso("renderizando", itens=len(dados["itens"]))
+    caminho = os.path.join(diretorio, f"{uuid.uuid4().hex}.{FORMATOS[formato][1]}")
+    tamanho = _renderizar_no_pool(formato, dados, caminho)
+
+    progresso("concluido")
+    return {
+        "orcamento_id": orcamento_id,
+        "formato": formato,
+        "arquivo": caminho,
+        "nome_arquivo": nome_arquivo(orcamento_id, formato),
+        "media_type": FORMATOS[formato][0],
+        "tamanho": tamanho,
+    }
+
+
+def limpar_arquivos_antigos(diretorio: str) -> int:
+    """Apaga os arquivos de exportação com mais de ``EXPORT_ARQUIVO_TTL`` segundos."""
+    limite = time.time() - settings.EXPORT_ARQUIVO_TTL
+    removidos = 0
+    for entrada in os.scandir(diretorio):
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                removidos += 1
+        except OSError as e:
+            logger.warning(f"Não foi possível remover a exportação {entrada.path}: {e}")
+    return removidos
@@ -1,14 +1,142 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import base64
+import json
 import logging
+import re
+import time
+import uuid
+
+from app.modules.importacao.services.sinapi_text_utils import remover_acentos
+from core.config import settings
 
 logger = logging.getLogger("projeto_orcamento")
 
 TABELA_ORCAMENTOS = "orcamentos"
 TABELA_ORCAMENTO_ITENS = "orcamento_itens"
 TABELA_INSUMOS = "orcamento_item_insumo"
+RPC_TOTAL_ITENS = "orcamento_total_itens"
+RPC_CURVA_ABC = "orcamento_curva_abc_insumos"
+RPC_ESTATISTICAS = "orcamento_estatisticas"
+
+STATUS_APROVADOS = ("aprovado", "concluido")
+
+# Coluna tsvector (nome + cliente, sem acentos) criada por create_orcamentos_busca.sql
+COLUNA_BUSCA = "busca"
+
+# Ids por consulta ``in`` e linhas por página nas leituras em blocos
+TAMANHO_GRUPO_IN = 200
+TAMANHO_PAGINA = 1000
+
+def _paginar(consulta):
+    """Percorre todas as páginas de ``consulta()`` (uma nova query por página)."""
+    inicio = 0
+    while True:
+        pagina = consulta().range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+        yield from pagina
+        if len(pagina) < TAMANHO_PAGINA:
+            break
+        inicio += TAMANHO_PAGINA
+
+
+def codificar_cursor(orcamento: Dict[str, Any]) -> str:
+    """Cursor opaco da paginação: posição ``(created_at, id)`` do último orçamento."""
+    chave = json.dumps([orcamento.get("created_at"), orcamento.get("id")])
+    return base64.urlsafe_b64encode(chave.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str):
+    """``(created_at, id)`` de um cursor de :func:`codificar_cursor`.
+
+    Os dois valores entram num filtro ``or_`` do PostgREST: só saem daqui
+    reserializados de um ``datetime`` e de um ``UUID`` válidos.
+    """
+    try:
+        created_at, orcamento_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (
+            datetime.fromisoformat(created_at.replace("Z", "+00:00")).isoformat(),
+            str(uuid.UUID(orcamento_id)),
+        )
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+# Códigos de coluna/função inexistente (Postgres e cache de schema do
+# PostgREST): a migração correspondente ainda não foi aplicada
+_CODIGOS_OBJETO_INEXISTENTE = frozenset({"42703", "42883", "PGRST202", "PGRST204"})
+
+
+def _objeto_inexistente(erro: Exception) -> bool:
+    """Se ``erro`` indica que a coluna ou função consultada não existe no banco."""
+    return getattr(erro, "code", None) in _CODIGOS_OBJETO_INEXISTENTE
+
+
+class DisponibilidadeRpc:
+    """Se uma função opcional do banco (RPC) deve ser chamada neste processo.
+
+    Quando o PostgREST responde que a função não existe (migração não
+    aplicada), ela fica desligada por ``RPC_NOVA_TENTATIVA`` segundos e
+    depois é testada de novo. Outras falhas (timeout, rede) só fazem aquela
+    chamada cair no cálculo local. ``tipo`` permite usar o mesmo controle
+    para uma coluna opcional.
+    """
+
+    def __init__(self, nome: str, tipo: str = "RPC"):
+        self.nome = nome
+        self.tipo = tipo
+        self._desligada_ate = 0.0
+
+    def disponivel(self) -> bool:
+        return time.monotonic() >= self._desligada_ate
+
+    def registrar_falha(self, erro: Exception, alternativa: str) -> None:
+        """Registra a falha de uma chamada; ``alternativa`` descreve o cálculo local usado."""
+        if _objeto_inexistente(erro):
+            self._desligada_ate = time.monotonic() + settings.RPC_NOVA_TENTATIVA
+            logger.warning(f"{self.tipo} {self.nome} inexistente no banco, {alternativa}: {erro}")
+        else:
+            logger.warning(f"{self.tipo} {self.nome} falhou, {alternativa}: {erro}")
+
+
+def _termos_busca(busca: str) -> List[str]:
+    """Palavras da busca, sem acentos e sem caracteres de sintaxe do tsquery."""
+    return re.findall(r"\w+", remover_acentos(busca))
+
+
+def resumir_estatisticas(orcamentos) -> Dict[str, Any]:
+    """Agregados de :meth:`OrcamentoRepository.agregar_estatisticas` a partir das linhas."""
+    total_orcamentos = 0
+    valor_total = 0.0
+    aprovados = 0
+    dias_resposta = []
+    for o in orcamentos:
+        total_orcamentos += 1
+        valor_total += float(o.get("valor_total") or 0.0)
+        if (o.get("status") or "").lower() not in STATUS_APROVADOS:
+            continue
+        aprovados += 1
+        created = o.get("created_at")
+        updated = o.get("updated_at")
+        if created and updated:
+            try:
+                t_created = datetime.fromisoformat(created.replace("Z", "+00:00"))
+                t_updated = datetime.fromisoformat(updated.replace("Z", "+00:00"))
+                dias_resposta.append((t_updated - t_created).total_seconds() / 86400.0)
+            except Exception:
+                pass
+    return {
+        "total_orcamentos": total_orcamentos,
+        "valor_total": valor_total,
+        "aprovados": aprovados,
+        "tempo_resposta_medio": sum(dias_resposta) / len(dias_resposta) if dias_resposta else None,
+    }
+
 
 class OrcamentoRepository:
+    _rpc_estatisticas = DisponibilidadeRpc(RPC_ESTATISTICAS)
+    # Desligada por RPC_NOVA_TENTATIVA segundos quando a coluna de busca não existe
+    _busca_textual = DisponibilidadeRpc(f"{TABELA_ORCAMENTOS}.{COLUNA_BUSCA}", tipo="coluna")
+
     def __init__(self, supabase_client):
         self.supabase = supabase_client
 
@@ -35,6 +163,130 @@ class OrcamentoRepository:
         resultado = query.execute()
         return resultado.data or []
 
+    def agregar_estatisticas(self) -> Dict[str, Any]:
+        """Agregados de todos os orçamentos para o painel.
+
+        Devolve ``total_orcamentos``, ``valor_total``, ``aprovados`` e
+        ``tempo_resposta_medio`` (dias entre criação e última alteração dos
+        aprovados; ``None`` se não houver). Usa a função
+        ``orcamento_estatisticas`` do banco, que devolve uma linha; sem ela,
+        lê só as quatro colunas necessárias, em páginas, e agrega aqui.
+        """
+        if OrcamentoRepository._rpc_estatisticas.disponivel():
+            try:
+                dados = self.supabase.rpc(RPC_ESTATISTICAS, {}).execute().data
+                linha = dados[0] if isinstance(dados, list) and dados else dados
+                if isinstance(linha, dict):
+                    return {
+                        "total_orcamentos": int(linha.get("total_orcamentos") or 0),
+                        "valor_total": float(linha.get("valor_total") or 0.0),
+                        "aprovados": int(linha.get("aprovados") or 0),
+                        "tempo_resposta_medio": (
+                            float(linha["tempo_resposta_medio"])
+                            if linha.get("tempo_resposta_medio") is not None else None
+                        ),
+                    }
+            except Exception as e:
+                OrcamentoRepository._rpc_estatisticas.registrar_falha(e, "agregando orçamentos localmente")
+
+        linhas = _paginar(
+            lambda: self.supabase.table(TABELA_ORCAMENTOS)
+            .select("id,valor_total,status,created_at,updated_at").order("id")
+        )
+        return resumir_estatisticas(linhas)
+
+    def listar_pagina(
+        self,
+        nome: Optional[str] = None,
+        status: Optional[str] = None,
+        cliente: Optional[str] = None,
+        busca: Optional[str] = None,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        campos: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Página de orçamentos, do mais recente para o mais antigo.
+
+        A paginação é por chave ``(created_at, id)``: o ``cursor`` devolvido
+        em ``proximo_cursor`` filtra as linhas posteriores à última lida, sem
+        ``offset``. ``campos`` limita as colunas lidas (devem incluir
+        ``created_at`` e ``id`` para haver cursor).
+
+        Returns:
+            ``{"itens": [...], "proximo_cursor": str | None}``.
+        """
+        # Decodificado antes: cursor inválido é erro do cliente, não da busca
+        posicao = decodificar_cursor(cursor) if cursor else None
+
+        def montar(texto_completo: bool):
+            query = self.supabase.table(TABELA_ORCAMENTOS).select(",".join(campos) if campos else "*")
+            query = self._filtrar(query, nome, status, cliente, busca, texto_completo)
+            if posicao:
+                created_at, orcamento_id = posicao
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt."{orcamento_id}")'
+                )
+            query = query.order("created_at", desc=True).order("id", desc=True)
+            if limite:
+                query = query.limit(limite + 1)
+            return query
+
+        linhas = self._executar_com_busca(montar, busca).data or []
+        proximo_cursor = None
+        if limite and len(linhas) > limite:
+            linhas = linhas[:limite]
+            proximo_cursor = codificar_cursor(linhas[-1])
+        return {"itens": linhas, "proximo_cursor": proximo_cursor}
+
+    def contar(
+        self,
+        nome: Optional[str] = None,
+        status: Optional[str] = None,
+        cliente: Optional[str] = None,
+        busca: Optional[str] = None,
+    ) -> int:
+        """Total de orçamentos com os filtros, contado pelo banco (sem trazer linhas)."""
+        def montar(texto_completo: bool):
+            query = self.supabase.table(TABELA_ORCAMENTOS).select("id", count="exact", head=True)
+            return self._filtrar(query, nome, status, cliente, busca, texto_completo)
+
+        return int(self._executar_com_busca(montar, busca).count or 0)
+
+    @staticmethod
+    def _filtrar(query, nome, status, cliente, busca, texto_completo: bool):
+        if nome:
+            query = query.ilike("nome", f"%{nome}%")
+        if status:
+            query = query.eq("status", status)
+        if cliente:
+            query = query.ilike("cliente", f"%{cliente}%")
+        if busca and texto_completo:
+            termos = _termos_busca(busca)
+            if termos:
+                query = query.text_search(
+                    COLUNA_BUSCA, " & ".join(f"{t}:*" for t in termos), options={"config": "simple"}
+                )
+        elif busca:
+            for termo in re.findall(r"\w+", busca):
+                query = query.or_(f"nome.ilike.*{termo}*,cliente.ilike.*{termo}*")
+        return query
+
+    def _executar_com_busca(self, montar, busca: Optional[str]):
+        """Executa ``montar(texto_completo)``; sem a coluna de busca no banco,
+        desliga a busca textual por um tempo (:class:`DisponibilidadeRpc`) e
+        repete com ``ilike``. Outros erros são propagados."""
+        usar_busca = bool(busca) and OrcamentoRepository._busca_textual.disponivel()
+        if not usar_busca:
+            return montar(False).execute()
+        try:
+            return montar(True).execute()
+        except Exception as e:
+            if not _objeto_inexistente(e):
+                raise
+            OrcamentoRepository._busca_textual.registrar_falha(e, "usando ilike")
+            return montar(False).execute()
+
     def buscar_por_id(self, orcamento_id: str) -> Optional[Dict[str, Any]]:
         resultado = self.supabase.table(TABELA_ORCAMENTOS).select("*").eq("id", orcamento_id).execute()
         if resultado.data:
@@ -59,6 +311,8 @@ class OrcamentoRepository:
 
 
 class OrcamentoItemRepository:
+    _rpc_total = DisponibilidadeRpc(RPC_TOTAL_ITENS)
+
     def __init__(self, supabase_client):
         self.supabase = supabase_client
 
@@ -72,6 +326,28 @@ class OrcamentoItemRepository:
         resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS).select("*").eq("orcamento_id", orcamento_id).order("created_at").execute()
         return resultado.data or []
 
+    def iterar_por_orcamento(self, orcamento_id: str, colunas: str = "*"):
+        """Itens do orçamento em páginas de ``TAMANHO_PAGINA``, na ordem de criação.
+
+        Gerador: cada página é pedida quando a anterior foi consumida, então
+        quem exporta milhares de itens não precisa de todos em memória.
+        """
+        return _paginar(
+            lambda: self.supabase.table(TABELA_ORCAMENTO_ITENS)
+            .select(colunas)
+            .eq("orcamento_id", orcamento_id)
+            .order("created_at")
+            .order("id")
+        )
+
+    def contar_por_orcamento(self, orcamento_id: str) -> int:
+        """Quantidade de itens do orçamento, contada pelo banco (sem trazer linhas)."""
+        resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS)\
+            .select("id", count="exact", head=True)\
+            .eq("orcamento_id", orcamento_id)\
+            .execute()
+        return int(resultado.count or 0)
+
     def buscar_por_id(self, item_id: str, orcamento_id: str = None) -> Optional[Dict[str, Any]]:
         query = self.supabase.table(TABELA_ORCAMENTO_ITENS).select("*").eq("id", item_id)
         if orcamento_id:
@@ -91,7 +367,50 @@ class OrcamentoItemRepository:
         self.supabase.table(TABELA_ORCAMENTO_ITENS).delete().eq("id", item_id).execute()
         return True
 
+    def criar_batch(self, dados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insere vários itens numa requisição; devolve as linhas na ordem enviada."""
+        if not dados:
+            return []
+        resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS).insert(dados).execute()
+        return resultado.data or []
+
+    def buscar_por_ids(self, item_ids: List[str], orcamento_id: str) -> List[Dict[str, Any]]:
+        if not item_ids:
+            return []
+        resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS).select("*")\
+            .in_("id", item_ids)\
+            .eq("orcamento_id", orcamento_id)\
+            .execute()
+        return resultado.data or []
+
+    def upsert_batch(self, linhas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Regrava itens existentes (linhas completas) numa requisição."""
+        if not linhas:
+            return []
+        resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS).upsert(linhas, on_conflict="id").execute()
+        return resultado.data or []
+
+    def deletar_batch(self, item_ids: List[str]) -> bool:
+        if item_ids:
+            self.supabase.table(TABELA_ORCAMENTO_ITENS).delete().in_("id", item_ids).execute()
+        return True
+
     def calcular_total_itens(self, orcamento_id: str) -> float:
+        """Soma de ``preco_total`` dos itens do orçamento.
+
+        Usa a função ``orcamento_total_itens`` do banco, que devolve só a
+        soma; sem ela (migração não aplicada), baixa os valores e soma aqui.
+        """
+        if OrcamentoItemRepository._rpc_total.disponivel():
+            try:
+                total = self.supabase.rpc(
+                    RPC_TOTAL_ITENS, {"p_orcamento_id": orcamento_id}
+                ).execute().data
+                if isinstance(total, (int, float, str)) or total is None:
+                    return float(total or 0.0)
+            except Exception as e:
+                OrcamentoItemRepository._rpc_total.registrar_falha(e, "somando itens localmente")
+
         resultado = self.supabase.table(TABELA_ORCAMENTO_ITENS).select("preco_total").eq("orcamento_id", orcamento_id).execute()
         total = 0.0
         if resultado.data:
@@ -103,18 +422,80 @@ class OrcamentoItemRepository:
 
 
 class InsumoRepository:
+    _rpc_curva_abc = DisponibilidadeRpc(RPC_CURVA_ABC)
+
     def __init__(self, supabase_client):
         self.supabase = supabase_client
 
+    def agregar_por_codigo(self, orcamento_id: str) -> List[Dict[str, Any]]:
+        """Insumos do orçamento somados por ``codigo_insumo``.
+
+        Cada linha traz ``codigo_insumo``, ``descricao``, ``unidade``,
+        ``quantidade`` e ``total``. Usa a função ``orcamento_curva_abc_insumos``
+        do banco, que agrupa no servidor; sem ela, lê os insumos em blocos de
+        ``TAMANHO_GRUPO_IN`` itens, paginados (sem esbarrar no limite de
+        linhas do PostgREST), e soma aqui à medida que chegam.
+        """
+        if InsumoRepository._rpc_curva_abc.disponivel():
+            try:
+                linhas = self.supabase.rpc(RPC_CURVA_ABC, {"p_orcamento_id": orcamento_id}).execute().data
+                if isinstance(linhas, list):
+                    return linhas
+            except Exception as e:
+                InsumoRepository._rpc_curva_abc.registrar_falha(e, "agrupando insumos localmente")
+
+        item_ids = [
+            row["id"] for row in _paginar(
+                lambda: self.supabase.table(TABELA_ORCAMENTO_ITENS)
+                .select("id").eq("orcamento_id", orcamento_id).order("id")
+            )
+        ]
+        agrupados: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(item_ids), TAMANHO_GRUPO_IN):
+            grupo = item_ids[i:i + TAMANHO_GRUPO_IN]
+            linhas = _paginar(
+                lambda: self.supabase.table(TABELA_INSUMOS)
+                .select("id,codigo_insumo,descricao,unidade,quantidade_unitaria,total")
+                .in_("orcamento_item_id", grupo).order("id")
+            )
+            for insumo in linhas:
+                codigo = insumo.get("codigo_insumo")
+                if not codigo:
+                    continue
+                atual = agrupados.setdefault(codigo, {
+                    "codigo_insumo": codigo,
+                    "descricao": insumo.get("descricao") or "",
+                    "unidade": insumo.get("unidade") or "",
+                    "quantidade": 0.0,
+                    "total": 0.0,
+                })
+                atual["quantidade"] += float(insumo.get("quantidade_unitaria") or 0.0)
+                atual["total"] += float(insumo.get("total") or 0.0)
+        return list(agrupados.values())
+
     def criar_batch(self, dados: List[Dict[str, Any]]) -> int:
+        """Insere os insumos numa requisição. Erros são propagados: quem
+        regrava insumos precisa saber que a inserção falhou."""
         if not dados:
             return 0
-        try:
-            r = self.supabase.table(TABELA_INSUMOS).insert(dados).execute()
-            return len(r.data) if r.data else 0
-        except Exception as e:
-            logger.error(f"Erro ao inserir insumos em batch: {e}")
-            return 0
+        r = self.supabase.table(TABELA_INSUMOS).insert(dados).execute()
+        return len(r.data) if r.data else 0
+
+    def listar_ids_por_itens(self, item_ids: List[str]) -> List[str]:
+        """Ids dos insumos gravados para os itens, em consultas ``in_`` paginadas."""
+        ids: List[str] = []
+        for i in range(0, len(item_ids), TAMANHO_GRUPO_IN):
+            grupo = item_ids[i:i + TAMANHO_GRUPO_IN]
+            ids.extend(linha["id"] for linha in _paginar(
+                lambda: self.supabase.table(TABELA_INSUMOS)
+                .select("id").in_("orcamento_item_id", grupo).order("id")
+            ))
+        return ids
+
+    def deletar_por_ids(self, insumo_ids: List[str]) -> None:
+        """Apaga insumos pelo id, em grupos de ``TAMANHO_GRUPO_IN``; erros são propagados."""
+        for i in range(0, len(insumo_ids), TAMANHO_GRUPO_IN):
+            self.supabase.table(TABELA_INSUMOS).delete().in_("id", insumo_ids[i:i + TAMANHO_GRUPO_IN]).execute()
 
     def listar_por_item(self, orcamento_item_id: str) -> List[Dict[str, Any]]:
         try:
@@ -127,6 +508,37 @@ class InsumoRepository:
             logger.error(f"Erro ao listar insumos do item {orcamento_item_id}: {e}")
             return []
 
+    def listar_por_itens(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Insumos de vários itens, em consultas ``in_`` de ``TAMANHO_GRUPO_IN`` ids."""
+        insumos: List[Dict[str, Any]] = []
+        for i in range(0, len(item_ids), TAMANHO_GRUPO_IN):
+            grupo = item_ids[i:i + TAMANHO_GRUPO_IN]
+            insumos.extend(_paginar(
+                lambda: self.supabase.table(TABELA_INSUMOS)
+                .select("*").in_("orcamento_item_id", grupo).order("id")
+            ))
+        return insumos
+
+    def listar_precos_custom(self, item_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """``{item_id: {codigo_insumo: preco_unitario_custom}}`` dos insumos com
+        preço definido pelo usuário. Erros são propagados: quem regrava os
+        insumos não pode tratar uma falha como "sem preços customizados"."""
+        precos: Dict[str, Dict[str, float]] = {}
+        for i in range(0, len(item_ids), TAMANHO_GRUPO_IN):
+            grupo = item_ids[i:i + TAMANHO_GRUPO_IN]
+            linhas = _paginar(
+                lambda: self.supabase.table(TABELA_INSUMOS)
+                .select("id,orcamento_item_id,codigo_insumo,preco_unitario_custom")
+                .in_("orcamento_item_id", grupo)
+                .not_.is_("preco_unitario_custom", "null")
+                .order("id")
+            )
+            for linha in linhas:
+                precos.setdefault(linha["orcamento_item_id"], {})[linha["codigo_insumo"]] = float(
+                    linha["preco_unitario_custom"]
+                )
+        return precos
+
     def atualizar(self, insumo_id: str, dados: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             r = self.supabase.table(TABELA_INSUMOS)\
@@ -154,3 +566,14 @@ class InsumoRepository:
                 .execute()
         except Exception as e:
             logger.error(f"Erro ao deletar insumos do item {orcamento_item_id}: {e}")
+
+    def deletar_por_itens(self, orcamento_item_ids: List[str]) -> None:
+        if not orcamento_item_ids:
+            return
+        try:
+            self.supabase.table(TABELA_INSUMOS)\
+                .delete()\
+                .in_("orcamento_item_id", orcamento_item_ids)\
+                .execute()
+        except Exception as e:
+            logger.error(f"Erro ao deletar insumos de {len(orcamento_item_ids)} itens: {e}")
@@ -1,19 +1,30 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Response
-from fastapi.responses import StreamingResponse
+import os
+from typing import BinaryIO, Callable, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from io import BytesIO
 
 from app.modules.orcamento.schemas import (
-    OrcamentoResponse, OrcamentoCreate, OrcamentoUpdate, OrcamentoStatsResponse,
+    OrcamentoResponse, OrcamentoListaResponse, OrcamentoCreate, OrcamentoUpdate, OrcamentoStatsResponse,
     CurvaABCResponse, CronogramaResponse, OrcamentoItemResponse, OrcamentoItemCreate,
-    OrcamentoItemUpdate, OrcamentoItemInsumoUpdate
+    OrcamentoItemUpdate, OrcamentoItemInsumoUpdate, OrcamentoItensLoteRequest, OrcamentoItensLoteResponse,
+    OrcamentoRepricingRequest, OrcamentoRepricingResponse
 )
 from app.modules.orcamento.services import OrcamentoService, OrcamentoItemService
+from app.modules.orcamento.export import MEDIA_TYPE_XLSX, iterar_arquivo
+from app.modules.orcamento.export_jobs import (
+    FORMATOS, exportacao_sincrona, exportar_orcamento, gerar_exportacao, nome_arquivo,
+)
+from app.modules.orcamento.export_cache import (
+    cabe_no_cache, chave_exportacao, etag_confere, etag_exportacao, guardar_exportacao, obter_exportacao,
+)
 from app.modules.orcamento.repositories import OrcamentoRepository, OrcamentoItemRepository, InsumoRepository
 from app.modules.item.repositories import ItemRepository
+from app.modules.item.composition_tree import get_explosao_composicoes
+from app.modules.item.price_index import get_indice_precos
 from app.modules.etapa.repositories import EtapaRepository
-from app.modules.importacao.services.pdf_service import PdfService
 
+from core.jobs import STATUS_CONCLUIDO, STATUS_ERRO, STATUS_PENDENTE, get_job_manager
 from core.security import get_current_user
 from app.dependencies import get_supabase
 
@@ -32,11 +43,14 @@ def get_orcamento_service(supabase = Depends(get_supabase)) -> OrcamentoService:
     return OrcamentoService(repository, etapa_repo, item_repo, supabase)
 
 def get_orcamento_item_service(supabase = Depends(get_supabase)) -> OrcamentoItemService:
-    item_repo = ItemRepository(supabase)
+    item_repo = ItemRepository(supabase, indice_precos=get_indice_precos())
     orcamento_repo = OrcamentoRepository(supabase)
     orcamento_item_repo = OrcamentoItemRepository(supabase)
     insumo_repo = InsumoRepository(supabase)
-    return OrcamentoItemService(orcamento_item_repo, orcamento_repo, item_repo, insumo_repo)
+    return OrcamentoItemService(
+        orcamento_item_repo, orcamento_repo, item_repo, insumo_repo,
+        explosao=get_explosao_composicoes(),
+    )
 
 
 # --- Rotas de Orçamentos ---
@@ -56,18 +70,37 @@ async def criar_orcamento(
 
 @router.get(
     "/",
-    response_model=List[OrcamentoResponse],
+    response_model=List[OrcamentoListaResponse],
+    response_model_exclude_unset=True,
     summary="Listar orçamentos",
     tags=["Orçamentos"]
 )
 async def listar_orcamentos(
+    response: Response,
     nome: Optional[str] = None,
     status: Optional[str] = None, 
     cliente: Optional[str] = None, 
+    busca: Optional[str] = Query(None, description="Palavras (por prefixo) em nome ou cliente"),
+    limite: Optional[int] = Query(None, ge=1, le=500, description="Orçamentos por página"),
+    cursor: Optional[str] = Query(None, description="Valor do cabeçalho X-Next-Cursor da página anterior"),
+    fields: Optional[str] = Query(None, description="Campos devolvidos, separados por vírgula"),
+    com_total: bool = Query(False, description="Envia o total no cabeçalho X-Total-Count"),
     service: OrcamentoService = Depends(get_orcamento_service)
 ):
-    """Lista todos os orçamentos, com filtros opcionais"""
-    return service.listar_orcamentos(nome, status, cliente)
+    """Lista os orçamentos, com filtros opcionais e paginação por cursor"""
+    campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+    try:
+        pagina = service.listar_orcamentos_pagina(
+            nome, status, cliente, busca=busca, limite=limite, cursor=cursor,
+            campos=campos, com_total=com_total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if pagina["proximo_cursor"]:
+        response.headers["X-Next-Cursor"] = pagina["proximo_cursor"]
+    if pagina["total"] is not None:
+        response.headers["X-Total-Count"] = str(pagina["total"])
+    return pagina["itens"]
 
 @router.get(
     "/stats",
@@ -130,29 +163,70 @@ async def deletar_orcamento(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+def _responder_exportacao(
+    request: Request,
+    orcamento: dict,
+    formato: str,
+    media_type: str,
+    nome_arquivo: str,
+    gerar: Callable[[], Union[bytes, bytearray, BinaryIO]],
+) -> Response:
+    """Resposta de uma exportação com ETag, 304 e cache por versão do orçamento.
+
+    ``gerar`` só é chamado quando o cliente não tem a versão atual e ela não
+    está em cache. Arquivos maiores que o cache inteiro seguem em streaming.
+    """
+    headers = {
+        "Content-Disposition": f"attachment; filename={nome_arquivo}",
+        "Cache-Control": "private, no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    chave = chave_exportacao(orcamento, formato)
+    if chave:
+        headers["ETag"] = etag_exportacao(chave)
+        if etag_confere(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers={"ETag": headers["ETag"], "Cache-Control": headers["Cache-Control"]})
+        conteudo = obter_exportacao(chave)
+        if conteudo is not None:
+            return Response(content=conteudo, media_type=media_type, headers=headers)
+
+    gerado = gerar()
+    if isinstance(gerado, (bytes, bytearray)):
+        conteudo = bytes(gerado)
+    else:
+        tamanho = gerado.seek(0, 2)
+        gerado.seek(0)
+        if not cabe_no_cache(tamanho):
+            return StreamingResponse(iterar_arquivo(gerado), media_type=media_type, headers=headers)
+        with gerado:
+            conteudo = gerado.read()
+
+    if chave:
+        guardar_exportacao(chave, conteudo)
+    else:
+        headers["ETag"] = etag_exportacao(conteudo=conteudo)
+        if etag_confere(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers={"ETag": headers["ETag"], "Cache-Control": headers["Cache-Control"]})
+    return Response(content=conteudo, media_type=media_type, headers=headers)
+
+# O PDF e o Excel são CPU pura: rotas síncronas rodam no threadpool do
+# servidor e os orçamentos grandes renderizam no pool de processos
+
 @router.get(
     "/{orcamento_id}/pdf",
     tags=["Orçamentos"]
 )
-async def download_pdf_orcamento(
+def download_pdf_orcamento(
     orcamento_id: str,
-    service: OrcamentoService = Depends(get_orcamento_service),
-    supabase = Depends(get_supabase)
+    request: Request,
+    service: OrcamentoService = Depends(get_orcamento_service)
 ):
-    """Gera e retorna um relatório em PDF do orçamento"""
+    """Gera e retorna um relatório em PDF do orçamento, agrupado por etapa"""
     try:
         orcamento = service.buscar_orcamento(orcamento_id)
-        itens = service.item_repository.listar_por_orcamento(orcamento_id)
-        
-        pdf_service = PdfService()
-        pdf_bytes = pdf_service.gerar_pdf_orcamento(orcamento, itens)
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=orcamento_{orcamento_id}.pdf"
-            }
+        return _responder_exportacao(
+            request, orcamento, "pdf", FORMATOS["pdf"][0], nome_arquivo(orcamento_id, "pdf"),
+            lambda: gerar_exportacao(service, orcamento, "pdf"),
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -163,33 +237,90 @@ async def download_pdf_orcamento(
     "/{orcamento_id}/excel",
     tags=["Orçamentos"]
 )
-async def download_excel_orcamento(
+def download_excel_orcamento(
     orcamento_id: str,
+    request: Request,
+    completo: bool = Query(
+        False,
+        description="Inclui sintético por etapa, analítico com insumos, Curva ABC e cronograma",
+    ),
     service: OrcamentoService = Depends(get_orcamento_service)
 ):
     """Gera e retorna a planilha orçamentária em formato Excel (.xlsx)"""
     try:
-        from app.modules.orcamento.export import gerar_planilha_orcamento_excel
         orcamento = service.buscar_orcamento(orcamento_id)
-        itens = service.item_repository.listar_por_orcamento(orcamento_id)
-        
-        excel_bytes = gerar_planilha_orcamento_excel(
-            orcamento.model_dump() if hasattr(orcamento, "model_dump") else dict(orcamento),
-            [i.model_dump() if hasattr(i, "model_dump") else dict(i) for i in itens]
-        )
-        
-        return Response(
-            content=excel_bytes,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename=orcamento_{orcamento_id}.xlsx"
-            }
+        formato = "xlsx-completo" if completo else "xlsx"
+        return _responder_exportacao(
+            request, orcamento, formato, MEDIA_TYPE_XLSX, nome_arquivo(orcamento_id, formato),
+            lambda: gerar_exportacao(service, orcamento, formato),
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar planilha Excel: {str(e)}")
 
+@router.post(
+    "/{orcamento_id}/exports",
+    summary="Exportar orçamento (PDF/Excel), em segundo plano se for grande",
+    tags=["Orçamentos"]
+)
+def criar_exportacao(
+    orcamento_id: str,
+    request: Request,
+    formato: str = Query("pdf", pattern="^(pdf|xlsx|xlsx-completo)$"),
+    service: OrcamentoService = Depends(get_orcamento_service)
+):
+    """
+    Orçamentos de até ``EXPORT_SINCRONO_MAX_ITENS`` itens recebem o arquivo
+    na própria resposta (200). Os maiores viram uma tarefa (202): consulte
+    ``GET /orcamentos/{id}/exports/{job_id}`` até ele devolver o arquivo.
+    """
+    try:
+        orcamento = service.buscar_orcamento(orcamento_id)
+        if exportacao_sincrona(service, orcamento_id):
+            return _responder_exportacao(
+                request, orcamento, formato, FORMATOS[formato][0], nome_arquivo(orcamento_id, formato),
+                lambda: gerar_exportacao(service, orcamento, formato),
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar exportação: {str(e)}")
+
+    job_id = get_job_manager().submeter("exportacao", exportar_orcamento, service, orcamento_id, formato)
+    url = f"/orcamentos/{orcamento_id}/exports/{job_id}"
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": STATUS_PENDENTE, "url": url},
+        headers={"Location": url},
+    )
+
+@router.get(
+    "/{orcamento_id}/exports/{job_id}",
+    summary="Estado ou arquivo de uma exportação em segundo plano",
+    tags=["Orçamentos"]
+)
+def obter_exportacao_job(orcamento_id: str, job_id: str):
+    """202 com o estado enquanto a tarefa roda; o arquivo quando conclui.
+
+    O estado vem do banco compartilhado de tarefas (``JOBS_DB_PATH``), então
+    a consulta pode ser atendida por um worker diferente do que gerou o arquivo.
+    """
+    job = get_job_manager().obter(job_id)
+    if job is None or job["tipo"] != "exportacao":
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    if job["status"] == STATUS_ERRO:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar exportação: {job['erro']}")
+    if job["status"] != STATUS_CONCLUIDO:
+        return JSONResponse(status_code=202, content=job)
+
+    resultado = job["resultado"]
+    if resultado["orcamento_id"] != orcamento_id:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    if not os.path.exists(resultado["arquivo"]):
+        raise HTTPException(status_code=410, detail="Arquivo da exportação expirado; gere novamente")
+    return FileResponse(resultado["arquivo"], media_type=resultado["media_type"], filename=resultado["nome_arquivo"])
+
 @router.get(
     "/{orcamento_id}/curva-abc",
     response_model=CurvaABCResponse,
@@ -214,15 +345,54 @@ async def obter_curva_abc_endpoint(
 )
 async def obter_cronograma_endpoint(
     orcamento_id: str,
+    periodo: str = Query(
+        "mensal",
+        pattern=r"^(mensal|semanal|[1-9][0-9]*)$",
+        description="mensal, semanal ou número de dias de cada período",
+    ),
     service: OrcamentoService = Depends(get_orcamento_service)
 ):
     """Retorna o Cronograma Físico-Financeiro dinâmico do orçamento"""
     try:
-        return service.obter_cronograma(orcamento_id)
+        return service.obter_cronograma(orcamento_id, periodo)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.post(
+    "/{orcamento_id}/recalcular-total",
+    summary="Recalcular valor total do orçamento",
+    tags=["Orçamentos"]
+)
+async def recalcular_valor_total(
+    orcamento_id: str,
+    service: OrcamentoItemService = Depends(get_orcamento_item_service)
+):
+    """Reconcilia o valor total (mantido por incrementos) com a soma dos itens"""
+    try:
+        return {"id": orcamento_id, "valor_total": service.recalcular_valor_total(orcamento_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post(
+    "/{orcamento_id}/repricing",
+    response_model=OrcamentoRepricingResponse,
+    summary="Reprecificar orçamento em outra base",
+    tags=["Orçamentos"]
+)
+async def reprecificar_orcamento(
+    orcamento_id: str,
+    pedido: OrcamentoRepricingRequest,
+    service: OrcamentoItemService = Depends(get_orcamento_item_service)
+):
+    """Reprecifica todos os itens em outro mês/estado/tipo; com dry_run só compara os preços"""
+    try:
+        return service.reprecificar(orcamento_id, pedido)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao reprecificar orçamento: {str(e)}")
+
 # --- Rotas de Itens do Orçamento ---
 
 @router.post(
@@ -244,6 +414,23 @@ async def adicionar_item(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao adicionar item: {str(e)}")
 
+@router.post(
+    "/{orcamento_id}/itens/lote",
+    response_model=OrcamentoItensLoteResponse,
+    summary="Criar, atualizar e remover itens em lote",
+    tags=["Itens do Orçamento"]
+)
+async def processar_lote_itens(
+    orcamento_id: str,
+    lote: OrcamentoItensLoteRequest,
+    service: OrcamentoItemService = Depends(get_orcamento_item_service)
+):
+    """Aplica várias operações de itens numa requisição, com resultado por linha"""
+    try:
+        return service.processar_lote(orcamento_id, lote)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @router.get(
     "/{orcamento_id}/itens", 
     response_model=List[OrcamentoItemResponse], 
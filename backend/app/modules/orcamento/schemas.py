@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional, Any, List
+from typing import Optional, Any, List, Literal
 from datetime import date, datetime
 from uuid import UUID
 
@@ -56,6 +56,26 @@ class OrcamentoResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class OrcamentoListaResponse(BaseModel):
+    """Orçamento na listagem: só os campos pedidos em ``fields`` são enviados."""
+    id: str
+    nome: Optional[str] = None
+    cliente: Optional[str] = None
+    data: Optional[date] = None
+    base_referencia: Optional[str] = None
+    tipo_composicao: Optional[str] = None
+    estado: Optional[str] = None
+    fonte: Optional[str] = None
+    bdi: Optional[float] = None
+    valor_total: Optional[float] = None
+    status: Optional[str] = None
+    variaveis_globais: Optional[List[Any]] = None
+    locais: Optional[List[Any]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class OrcamentoStatsResponse(BaseModel):
     total_orcamentos: int
     valor_total: float
@@ -86,6 +106,8 @@ class CurvaABCResponse(BaseModel):
 
 class CronogramaMesResponse(BaseModel):
     mes: str
+    inicio: Optional[date] = None
+    fim: Optional[date] = None
     servicos: str
     valor: float
     acumulado_pct: float
@@ -94,6 +116,7 @@ class CronogramaMesResponse(BaseModel):
 
 class CronogramaResponse(BaseModel):
     valor_total: float
+    periodo: str = "mensal"
     mensal: List[CronogramaMesResponse]
 
     model_config = ConfigDict(from_attributes=True)
@@ -147,6 +170,70 @@ class OrcamentoItemResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+# --- Schemas de Operações em Lote nos Itens ---
+
+class OrcamentoItemLoteUpdate(OrcamentoItemUpdate):
+    id: str
+
+class OrcamentoItensLoteRequest(BaseModel):
+    criar: List[OrcamentoItemCreate] = []
+    atualizar: List[OrcamentoItemLoteUpdate] = []
+    remover: List[str] = []
+
+class OrcamentoItemLoteResultado(BaseModel):
+    operacao: Literal["criar", "atualizar", "remover"]
+    indice: int
+    id: Optional[str] = None
+    sucesso: bool
+    erro: Optional[str] = None
+    item: Optional[OrcamentoItemResponse] = None
+
+class OrcamentoItensLoteResponse(BaseModel):
+    resultados: List[OrcamentoItemLoteResultado]
+    criados: int
+    atualizados: int
+    removidos: int
+    falhas: int
+    valor_total: float
+
+
+# --- Schemas de Reprecificação ---
+
+class OrcamentoRepricingRequest(BaseModel):
+    base_referencia: Optional[str] = None
+    estado: Optional[str] = None
+    tipo_composicao: Optional[str] = None
+    dry_run: bool = True
+
+class OrcamentoRepricingItem(BaseModel):
+    id: str
+    codigo_composicao: str
+    descricao: Optional[str] = None
+    quantidade: float
+    preco_unitario_anterior: Optional[float] = None
+    preco_unitario_novo: Optional[float] = None
+    preco_total_anterior: Optional[float] = None
+    preco_total_novo: Optional[float] = None
+    diferenca: float = 0.0
+    situacao: Literal["alterado", "inalterado", "sem_preco", "manual"]
+    precos_custom: List[str] = []
+
+class OrcamentoRepricingResponse(BaseModel):
+    dry_run: bool
+    base_referencia: str
+    estado: str
+    tipo_composicao: str
+    itens: List[OrcamentoRepricingItem]
+    itens_alterados: int
+    itens_sem_preco: int
+    itens_com_preco_custom: int = 0
+    total_itens_anterior: float
+    total_itens_novo: float
+    valor_total_anterior: float
+    valor_total_novo: float
+    lotes_gravados: int = 0
+
+
 # --- Schemas de Insumo do Item de Orçamento ---
 
 class OrcamentoItemInsumoUpdate(BaseModel):
@@ -1,14 +1,145 @@
 from datetime import date, datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import BinaryIO, List, Optional, Dict, Any, Union
 import logging
+import time
 
 from app.modules.orcamento.repositories import OrcamentoRepository, OrcamentoItemRepository, InsumoRepository
+from app.modules.orcamento.cronograma import (
+    PERIODO_MENSAL, calcular_cronograma, normalizar_periodo, rotulo_periodo,
+)
+from app.modules.orcamento.export import gerar_planilha_completa_arquivo
+from app.modules.orcamento.export_cache import invalidar_exportacoes
 from app.modules.item.repositories import ItemRepository
+from app.modules.item.composition_tree import ExplosaoComposicoes, InsumoExplodido
 from app.modules.etapa.repositories import EtapaRepository
-from app.modules.orcamento.schemas import OrcamentoCreate, OrcamentoUpdate, OrcamentoItemCreate, OrcamentoItemUpdate
+from app.modules.orcamento.schemas import (
+    OrcamentoCreate, OrcamentoUpdate, OrcamentoItemCreate, OrcamentoItemUpdate, OrcamentoItensLoteRequest,
+    OrcamentoRepricingRequest, OrcamentoListaResponse,
+)
+from core.cache import CacheLRU
+from core.config import settings
 
 logger = logging.getLogger("projeto_orcamento")
 
+# Linhas de orcamento_item_insumo por inserção na explosão em lote
+TAMANHO_LOTE_INSUMOS = 1000
+
+# Campos do item que entram na explosão (_insumos_em_lote): mudar qualquer
+# um deles numa atualização em lote regrava os insumos
+CAMPOS_EXPLOSAO = ("codigo_composicao", "quantidade", "estado", "fonte")
+
+# Itens gravados (e com insumos reexplodidos) por lote na reprecificação
+TAMANHO_LOTE_REPRECIFICACAO = 500
+
+# Indicadores do painel (/orcamentos/stats), com prazo curto
+_cache_estatisticas: CacheLRU[Dict[str, Any]] = CacheLRU(max_itens=1, ttl=settings.ORCAMENTO_STATS_TTL)
+
+# Curva ABC por orçamento: (updated_at do orçamento, resultado)
+_cache_curva_abc: CacheLRU[tuple] = CacheLRU(max_itens=settings.CURVA_ABC_CACHE_ORCAMENTOS)
+
+# Incrementos de valor_total aplicados desde a última soma completa, por orçamento
+_incrementos_valor_total: CacheLRU[int] = CacheLRU(max_itens=1024)
+
+
+def _reconciliacao_devida(orcamento_id: str) -> bool:
+    """Conta um incremento e indica se é hora da soma completa dos itens."""
+    limite = settings.ORCAMENTO_RECONCILIAR_A_CADA
+    if limite <= 0:
+        return False
+    incrementos = (_incrementos_valor_total.obter(orcamento_id) or 0) + 1
+    _incrementos_valor_total.definir(orcamento_id, incrementos)
+    return incrementos >= limite
+
+
+def _montar_insumos(
+    item_id: str,
+    folhas: List[InsumoExplodido],
+    precos: Dict[str, Optional[float]],
+    quantidade_pai: float,
+    precos_custom: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Linhas de ``orcamento_item_insumo`` de um item a partir do vetor explodido.
+
+    Com ``precos_custom`` (``{codigo_insumo: preco}``), os insumos listados
+    mantêm o preço definido pelo usuário, que passa a valer no ``total``.
+    """
+    batch = []
+    for folha in folhas:
+        preco_base = precos.get(folha.codigo)
+        preco_custom = precos_custom.get(folha.codigo) if precos_custom is not None else None
+        preco_efetivo = preco_custom if preco_custom is not None else preco_base
+
+        qtd_total = round(folha.coeficiente * quantidade_pai, 6)
+        total = round(qtd_total * preco_efetivo, 2) if preco_efetivo else None
+
+        linha = {
+            "orcamento_item_id": item_id,
+            "codigo_insumo": folha.codigo,
+            "descricao": folha.descricao,
+            "unidade": folha.unidade,
+            "quantidade_unitaria": qtd_total,
+            "preco_unitario_base": preco_base,
+            "total": total,
+            "tipo_item": "MATERIAL",
+        }
+        if precos_custom is not None:
+            linha["preco_unitario_custom"] = preco_custom
+        batch.append(linha)
+    return batch
+
+
+def _reprecifica(item_update: OrcamentoItemUpdate) -> bool:
+    """A edição troca composição, estado ou fonte (exige novo preço)."""
+    return any(
+        v is not None
+        for v in (item_update.codigo_composicao, item_update.estado, item_update.fonte)
+    )
+
+
+def _chave_preco_atualizacao(item_atual: dict, item_update: OrcamentoItemUpdate, orcamento: dict):
+    """``(codigo_composicao, estado, fonte)`` do item após a edição."""
+    return (
+        item_update.codigo_composicao or item_atual.get("codigo_composicao"),
+        item_update.estado or item_atual.get("estado"),
+        item_update.fonte or item_atual.get("fonte") or orcamento.get("fonte", "SINAPI"),
+    )
+
+
+def _montar_atualizacao(
+    item_atual: dict,
+    item_update: OrcamentoItemUpdate,
+    preco_unitario: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Campos alterados de um item; ``preco_unitario`` é o novo preço se a
+    edição reprecifica (ver :func:`_reprecifica`)."""
+    dados_atualizacao: Dict[str, Any] = {}
+    if _reprecifica(item_update):
+        dados_atualizacao["preco_unitario"] = preco_unitario
+        dados_atualizacao["codigo_composicao"] = item_update.codigo_composicao or item_atual.get("codigo_composicao")
+        dados_atualizacao["estado"] = (item_update.estado or item_atual.get("estado")).lower()
+        if item_update.fonte is not None:
+            dados_atualizacao["fonte"] = item_update.fonte
+    else:
+        preco_unitario = item_atual.get("preco_unitario")
+
+    if item_update.quantidade is not None:
+        if item_update.quantidade <= 0:
+            raise ValueError("Quantidade deve ser maior que zero")
+        dados_atualizacao["quantidade"] = item_update.quantidade
+        dados_atualizacao["preco_total"] = item_update.quantidade * (preco_unitario or item_atual.get("preco_unitario", 0))
+
+    if item_update.descricao is not None:
+        dados_atualizacao["descricao"] = item_update.descricao
+    if item_update.unidade is not None:
+        dados_atualizacao["unidade"] = item_update.unidade
+    if item_update.etapa_id is not None:
+        dados_atualizacao["etapa_id"] = item_update.etapa_id
+    if item_update.memoria_calculo is not None:
+        dados_atualizacao["memoria_calculo"] = item_update.memoria_calculo
+    if item_update.variaveis is not None:
+        dados_atualizacao["variaveis"] = item_update.variaveis
+    return dados_atualizacao
+
 class OrcamentoService:
     def __init__(
         self,
@@ -39,11 +170,59 @@ class OrcamentoService:
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
-        return self.repository.criar(dados)
+        criado = self.repository.criar(dados)
+        _cache_estatisticas.invalidar()
+        return criado
 
     def listar_orcamentos(self, nome: Optional[str] = None, status: Optional[str] = None, cliente: Optional[str] = None):
         return self.repository.listar(nome, status, cliente)
 
+    def listar_orcamentos_pagina(
+        self,
+        nome: Optional[str] = None,
+        status: Optional[str] = None,
+        cliente: Optional[str] = None,
+        busca: Optional[str] = None,
+        limite: Optional[int] = None,
+        cursor: Optional[str] = None,
+        campos: Optional[List[str]] = None,
+        com_total: bool = False,
+    ) -> Dict[str, Any]:
+        """Listagem paginada por cursor, com projeção de colunas.
+
+        Args:
+            busca: Palavras procuradas (por prefixo) em nome e cliente.
+            limite: Orçamentos por página; sem ele, devolve todos.
+            cursor: ``proximo_cursor`` da página anterior.
+            campos: Colunas devolvidas (``id`` sempre incluída). Sem elas, as
+                de :class:`OrcamentoListaResponse`.
+            com_total: Conta os orçamentos com os filtros (consulta extra).
+
+        Returns:
+            ``{"itens", "proximo_cursor", "total"}`` (``total`` é ``None`` sem
+            ``com_total``).
+        """
+        permitidos = list(OrcamentoListaResponse.model_fields)
+        if campos:
+            invalidos = [c for c in campos if c not in permitidos]
+            if invalidos:
+                raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+        pedidos = campos or permitidos
+        # id e created_at formam o cursor
+        colunas = list(dict.fromkeys(["id", *pedidos, "created_at"]))
+
+        pagina = self.repository.listar_pagina(
+            nome, status, cliente, busca=busca, limite=limite, cursor=cursor, campos=colunas,
+        )
+        itens = pagina["itens"]
+        if "created_at" not in pedidos:
+            itens = [{k: v for k, v in linha.items() if k != "created_at"} for linha in itens]
+        return {
+            "itens": itens,
+            "proximo_cursor": pagina["proximo_cursor"],
+            "total": self.repository.contar(nome, status, cliente, busca) if com_total else None,
+        }
+
     def buscar_orcamento(self, orcamento_id: str):
         orcamento = self.repository.buscar_por_id(orcamento_id)
         if not orcamento:
@@ -82,18 +261,45 @@ class OrcamentoService:
             dados_atualizacao["variaveis_globais"] = orcamento_update.variaveis_globais
         if orcamento_update.locais is not None:
             dados_atualizacao["locais"] = orcamento_update.locais
+
+        # O valor_total é mantido por incrementos com o BDI vigente: mudar o
+        # BDI exige recalculá-lo sobre a soma dos itens
+        bdi_alterado = (
+            orcamento_update.bdi is not None
+            and float(orcamento_update.bdi) != float(existente.get("bdi") or 0.0)
+        )
+        if bdi_alterado and orcamento_update.valor_total is None and self.orcamento_item_repository:
+            total_itens = self.orcamento_item_repository.calcular_total_itens(orcamento_id)
+            dados_atualizacao["valor_total"] = total_itens * (1 + float(orcamento_update.bdi) / 100)
             
-        return self.repository.atualizar(orcamento_id, dados_atualizacao)
+        atualizado = self.repository.atualizar(orcamento_id, dados_atualizacao)
+        _cache_estatisticas.invalidar()
+        invalidar_exportacoes(orcamento_id)
+        return atualizado
 
     def deletar_orcamento(self, orcamento_id: str):
         existente = self.repository.buscar_por_id(orcamento_id)
         if not existente:
             raise ValueError("Orçamento não encontrado")
-        return self.repository.deletar(orcamento_id)
+        deletado = self.repository.deletar(orcamento_id)
+        _cache_estatisticas.invalidar()
+        invalidar_exportacoes(orcamento_id)
+        return deletado
 
     def obter_estatisticas(self) -> Dict[str, Any]:
-        orcamentos = self.repository.listar()
-        if not orcamentos:
+        """Indicadores do painel de orçamentos.
+
+        Vêm de uma agregação no banco (ver
+        :meth:`OrcamentoRepository.agregar_estatisticas`) e ficam em cache por
+        ``settings.ORCAMENTO_STATS_TTL`` segundos; criar, alterar ou excluir
+        um orçamento neste processo descarta o cache.
+        """
+        return _cache_estatisticas.obter_ou_calcular("global", self._calcular_estatisticas)
+
+    def _calcular_estatisticas(self) -> Dict[str, Any]:
+        agregados = self.repository.agregar_estatisticas()
+        total_orcamentos = agregados["total_orcamentos"]
+        if not total_orcamentos:
             return {
                 "total_orcamentos": 0,
                 "valor_total": 0.0,
@@ -102,27 +308,12 @@ class OrcamentoService:
                 "tempo_resposta_medio": 0.0
             }
 
-        total_orcamentos = len(orcamentos)
-        valor_total = sum(float(o.get("valor_total") or 0.0) for o in orcamentos)
-        aprovados = sum(1 for o in orcamentos if o.get("status", "").lower() in ["aprovado", "concluido"])
-        
-        taxa_aprovacao = (aprovados / total_orcamentos) * 100.0 if total_orcamentos > 0 else 0.0
-        ticket_medio = valor_total / total_orcamentos if total_orcamentos > 0 else 0.0
-
-        times = []
-        for o in orcamentos:
-            created = o.get("created_at")
-            updated = o.get("updated_at")
-            if created and updated and o.get("status", "").lower() in ["aprovado", "concluido"]:
-                try:
-                    t_created = datetime.fromisoformat(created.replace("Z", "+00:00"))
-                    t_updated = datetime.fromisoformat(updated.replace("Z", "+00:00"))
-                    diff_days = (t_updated - t_created).total_seconds() / 86400.0
-                    times.append(diff_days)
-                except Exception:
-                    pass
-
-        tempo_resposta_medio = sum(times) / len(times) if times else 1.4
+        valor_total = agregados["valor_total"]
+        taxa_aprovacao = (agregados["aprovados"] / total_orcamentos) * 100.0
+        ticket_medio = valor_total / total_orcamentos
+        tempo_resposta_medio = agregados["tempo_resposta_medio"]
+        if tempo_resposta_medio is None:
+            tempo_resposta_medio = 1.4
 
         return {
             "total_orcamentos": total_orcamentos,
@@ -133,6 +324,14 @@ class OrcamentoService:
         }
 
     def obter_curva_abc(self, orcamento_id: str) -> Dict[str, Any]:
+        """Curva ABC dos insumos do orçamento.
+
+        Os insumos chegam já somados por código (ver
+        :meth:`InsumoRepository.agregar_por_codigo`). O resultado fica em
+        cache por orçamento junto com o ``updated_at`` lido; toda edição de
+        itens ou insumos regrava o ``updated_at`` do orçamento, o que
+        invalida a curva na leitura seguinte.
+        """
         orcamento = self.repository.buscar_por_id(orcamento_id)
         if not orcamento:
             raise ValueError("Orçamento não encontrado")
@@ -140,39 +339,28 @@ class OrcamentoService:
         if not self.orcamento_item_repository or not self.supabase:
             raise ValueError("Dependências de Curva ABC não injetadas no serviço")
 
-        itens = self.orcamento_item_repository.listar_por_orcamento(orcamento_id)
-        if not itens:
-            return {
-                "valor_total": 0.0,
-                "insumos": [],
-                "resumo_classes": {"A": 0.0, "B": 0.0, "C": 0.0}
+        versao = orcamento.get("updated_at")
+        em_cache = _cache_curva_abc.obter(orcamento_id)
+        if em_cache is not None and versao is not None and em_cache[0] == versao:
+            return em_cache[1]
+
+        resultado = self._calcular_curva_abc(orcamento_id)
+        if versao is not None:
+            _cache_curva_abc.definir(orcamento_id, (versao, resultado))
+        return resultado
+
+    def _calcular_curva_abc(self, orcamento_id: str) -> Dict[str, Any]:
+        grouped_insumos = {
+            ins["codigo_insumo"]: {
+                "codigo_insumo": ins["codigo_insumo"],
+                "descricao": ins.get("descricao") or "",
+                "unidade": ins.get("unidade") or "",
+                "quantidade": float(ins.get("quantidade") or 0.0),
+                "total": float(ins.get("total") or 0.0),
             }
-
-        item_ids = [item["id"] for item in itens]
-        resultado_insumos = self.supabase.table("orcamento_item_insumo").select("*").in_("orcamento_item_id", item_ids).execute()
-        insumos = resultado_insumos.data or []
-
-        grouped_insumos = {}
-        for insumo in insumos:
-            codigo = insumo.get("codigo_insumo")
-            if not codigo:
-                continue
-            
-            qtd = float(insumo.get("quantidade_unitaria") or 0.0)
-            total = float(insumo.get("total") or 0.0)
-            desc = insumo.get("descricao") or ""
-            unid = insumo.get("unidade") or ""
-
-            if codigo not in grouped_insumos:
-                grouped_insumos[codigo] = {
-                    "codigo_insumo": codigo,
-                    "descricao": desc,
-                    "unidade": unid,
-                    "quantidade": 0.0,
-                    "total": 0.0
-                }
-            grouped_insumos[codigo]["quantidade"] += qtd
-            grouped_insumos[codigo]["total"] += total
+            for ins in InsumoRepository(self.supabase).agregar_por_codigo(orcamento_id)
+            if ins.get("codigo_insumo")
+        }
 
         custo_total_acumulado = sum(ins["total"] for ins in grouped_insumos.values())
         if custo_total_acumulado == 0:
@@ -212,7 +400,14 @@ class OrcamentoService:
             "resumo_classes": {k: round(v, 2) for k, v in resumo_classes.items()}
         }
 
-    def obter_cronograma(self, orcamento_id: str) -> Dict[str, Any]:
+    def obter_cronograma(self, orcamento_id: str, periodo: Union[str, int] = PERIODO_MENSAL) -> Dict[str, Any]:
+        """Cronograma físico-financeiro com o custo de cada etapa rateado por dia.
+
+        Args:
+            periodo: ``"mensal"``, ``"semanal"`` ou a quantidade de dias de
+                cada período (ver :func:`calcular_cronograma`).
+        """
+        periodo = normalizar_periodo(periodo)
         orcamento = self.repository.buscar_por_id(orcamento_id)
         if not orcamento:
             raise ValueError("Orçamento não encontrado")
@@ -222,7 +417,15 @@ class OrcamentoService:
 
         etapas = self.etapa_repository.listar_por_orcamento(orcamento_id)
         itens = self.orcamento_item_repository.listar_por_orcamento(orcamento_id)
+        return self._montar_cronograma(orcamento, etapas, itens, periodo)
 
+    def _montar_cronograma(
+        self,
+        orcamento: Dict[str, Any],
+        etapas: List[Dict[str, Any]],
+        itens: List[Dict[str, Any]],
+        periodo: Union[str, int],
+    ) -> Dict[str, Any]:
         if not etapas or not itens:
             return {"valor_total": 0.0, "mensal": []}
 
@@ -236,10 +439,10 @@ class OrcamentoService:
         def parse_date(val):
             if not val:
                 return None
-            if isinstance(val, date):
-                return val
             if isinstance(val, datetime):
                 return val.date()
+            if isinstance(val, date):
+                return val
             try:
                 return datetime.fromisoformat(val.replace("Z", "+00:00")).date()
             except Exception:
@@ -247,12 +450,9 @@ class OrcamentoService:
 
         orcamento_date = parse_date(orcamento.get("data")) or date.today()
 
-        desembolsos_mensais = {}
-        etapas_ativas_no_mes = {}
-
+        inicios, fins, custos, nomes = [], [], [], []
         for etapa in etapas:
-            etapa_id = etapa["id"]
-            custo_etapa = etapa_custo_acumulado.get(etapa_id, 0.0)
+            custo_etapa = etapa_custo_acumulado.get(etapa["id"], 0.0)
             if custo_etapa <= 0:
                 continue
 
@@ -264,83 +464,125 @@ class OrcamentoService:
                 data_inicio = orcamento_date + timedelta(days=ordem * 30)
                 data_fim = data_inicio + timedelta(days=29)
 
-            months_spanned = []
-            curr = date(data_inicio.year, data_inicio.month, 1)
-            end_month = date(data_fim.year, data_fim.month, 1)
+            inicios.append(data_inicio)
+            fins.append(data_fim)
+            custos.append(custo_etapa)
+            nomes.append(etapa.get("nome") or "")
 
-            while curr <= end_month:
-                months_spanned.append(f"{curr.year}-{curr.month:02d}")
-                if curr.month == 12:
-                    curr = date(curr.year + 1, 1, 1)
-                else:
-                    curr = date(curr.year, curr.month + 1, 1)
-
-            if not months_spanned:
-                months_spanned = [f"{data_inicio.year}-{data_inicio.month:02d}"]
-
-            cost_per_month = custo_etapa / len(months_spanned)
-            for m in months_spanned:
-                desembolsos_mensais[m] = desembolsos_mensais.get(m, 0.0) + cost_per_month
-                if m not in etapas_ativas_no_mes:
-                    etapas_ativas_no_mes[m] = set()
-                etapas_ativas_no_mes[m].add(etapa.get("nome"))
-
-        if not desembolsos_mensais:
+        periodos = calcular_cronograma(inicios, fins, custos, nomes, periodo)
+        if not periodos:
             return {"valor_total": 0.0, "mensal": []}
 
-        sorted_months = sorted(desembolsos_mensais.keys())
-        total_desembolso = sum(desembolsos_mensais.values())
-
-        MESES_PT = {
-            "01": "Jan", "02": "Fev", "03": "Mar", "04": "Abr",
-            "05": "Mai", "06": "Jun", "07": "Jul", "08": "Ago",
-            "09": "Set", "10": "Out", "11": "Nov", "12": "Dez"
+        return {
+            "valor_total": round(sum(custos), 2),
+            "periodo": str(periodo),
+            "mensal": [
+                {
+                    "mes": rotulo_periodo(p, periodo),
+                    "inicio": p.inicio,
+                    "fim": p.fim,
+                    "servicos": ", ".join(p.etapas),
+                    "valor": round(p.valor, 2),
+                    "acumulado_pct": round(p.acumulado_pct, 1)
+                }
+                for p in periodos
+            ]
         }
 
-        mensal_res = []
-        acumulado_acum = 0.0
-
-        for m in sorted_months:
-            val = desembolsos_mensais[m]
-            pct = (val / total_desembolso) * 100.0 if total_desembolso > 0 else 0.0
-            acumulado_acum += pct
+    def dados_planilha_completa(self, orcamento_id: str) -> Dict[str, Any]:
+        """Orçamento, etapas, itens, Curva ABC e cronograma do workbook completo.
 
-            y, month_num = m.split("-")
-            mes_display = f"{MESES_PT[month_num]}/{y}"
+        Etapas, itens e a Curva ABC são lidos uma vez cada; o cronograma
+        reaproveita as etapas e os itens já lidos. Os insumos do analítico
+        ficam de fora (ver :meth:`gerar_planilha_completa`).
+        """
+        orcamento = self.repository.buscar_por_id(orcamento_id)
+        if not orcamento:
+            raise ValueError("Orçamento não encontrado")
 
-            servicos_ativos = ", ".join(sorted(list(etapas_ativas_no_mes[m])))
-
-            mensal_res.append({
-                "mes": mes_display,
-                "servicos": servicos_ativos,
-                "valor": round(val, 2),
-                "acumulado_pct": round(acumulado_acum, 1)
-            })
+        if not self.etapa_repository or not self.orcamento_item_repository or not self.supabase:
+            raise ValueError("Dependências de exportação não injetadas no serviço")
 
+        etapas = self.etapa_repository.listar_por_orcamento(orcamento_id)
+        itens = list(self.orcamento_item_repository.iterar_por_orcamento(orcamento_id))
         return {
-            "valor_total": round(total_desembolso, 2),
-            "mensal": mensal_res
+            "orcamento": orcamento,
+            "etapas": etapas,
+            "itens": itens,
+            "curva_abc": self.obter_curva_abc(orcamento_id),
+            "cronograma": self._montar_cronograma(orcamento, etapas, itens, PERIODO_MENSAL),
         }
 
+    def gerar_planilha_completa(self, orcamento_id: str) -> BinaryIO:
+        """Workbook completo do orçamento num arquivo temporário (ver
+        :func:`escrever_planilha_completa`), com os insumos do analítico
+        lidos em lotes de itens à medida que as linhas são escritas.
+        """
+        dados = self.dados_planilha_completa(orcamento_id)
+        return gerar_planilha_completa_arquivo(
+            dados["orcamento"], dados["etapas"], dados["itens"],
+            InsumoRepository(self.supabase).listar_por_itens,
+            dados["curva_abc"], dados["cronograma"],
+        )
+
 
 class OrcamentoItemService:
     def __init__(self, 
                  repository: OrcamentoItemRepository,
                  orcamento_repository: OrcamentoRepository,
                  item_repository: ItemRepository,
-                 insumo_repository: Optional[InsumoRepository] = None):
+                 insumo_repository: Optional[InsumoRepository] = None,
+                 explosao: Optional[ExplosaoComposicoes] = None):
         self.repository = repository
         self.orcamento_repository = orcamento_repository
         self.item_repository = item_repository
         self.insumo_repository = insumo_repository
+        self.explosao = explosao or ExplosaoComposicoes()
 
     def _buscar_preco_composicao(self, codigo_composicao: str, estado: str, mes_referencia: str, tipo_composicao: str, fonte: str = "SINAPI") -> Optional[float]:
         return self.item_repository.buscar_preco(codigo_composicao, estado, mes_referencia, tipo_composicao, fonte)
 
-    def _atualizar_valor_total_orcamento(self, orcamento_id: str):
-        orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
+    def _atualizar_valor_total_orcamento(
+        self,
+        orcamento_id: str,
+        delta_itens: Optional[float] = None,
+        orcamento: Optional[dict] = None,
+    ):
+        """Atualiza o ``valor_total`` (com BDI) após uma edição de itens.
+
+        Com ``delta_itens`` (variação da soma dos itens causada pela edição),
+        aplica só a diferença ao valor gravado, sem ler os itens. A soma
+        completa de :meth:`recalcular_valor_total` é usada sem delta, quando
+        o orçamento ainda não tem ``valor_total`` e a cada
+        ``settings.ORCAMENTO_RECONCILIAR_A_CADA`` incrementos, corrigindo
+        desvios de edições concorrentes.
+
+        Args:
+            orcamento: Linha atual do orçamento, se o chamador já a leu.
+        """
+        if delta_itens is None or _reconciliacao_devida(orcamento_id):
+            return self.recalcular_valor_total(orcamento_id)
+
+        orcamento = orcamento or self.orcamento_repository.buscar_por_id(orcamento_id)
         if not orcamento:
             return 0.0
+        if orcamento.get("valor_total") is None:
+            return self.recalcular_valor_total(orcamento_id)
+
+        bdi = float(orcamento.get("bdi") or 0.0)
+        valor_total = float(orcamento["valor_total"]) + delta_itens * (1 + bdi / 100)
+
+        self.orcamento_repository.atualizar(orcamento_id, {
+            "valor_total": valor_total,
+            "updated_at": datetime.now().isoformat()
+        })
+        return valor_total
+
+    def recalcular_valor_total(self, orcamento_id: str) -> float:
+        """Reconcilia o ``valor_total`` com a soma atual dos itens."""
+        orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
+        if not orcamento:
+            raise ValueError("Orçamento não encontrado")
             
         bdi = float(orcamento.get("bdi") or 0.0)
         total_itens = self.repository.calcular_total_itens(orcamento_id)
@@ -351,6 +593,7 @@ class OrcamentoItemService:
             "valor_total": valor_total,
             "updated_at": datetime.now().isoformat()
         })
+        _incrementos_valor_total.definir(orcamento_id, 0)
         return valor_total
 
     def adicionar_item(self, orcamento_id: str, item: OrcamentoItemCreate):
@@ -381,7 +624,34 @@ class OrcamentoItemService:
                 orcamento.get("tipo_composicao"),
                 fonte=fonte
             )
-            
+
+        dados_item = self._montar_novo_item(
+            orcamento_id, item, composicao, preco_unitario, estado_para_buscar, fonte,
+        )
+        preco_total = dados_item["preco_total"]
+
+        novo_item = self.repository.criar(dados_item)
+        if not novo_item:
+            raise Exception("Erro ao adicionar item")
+
+        if self.insumo_repository and isinstance(novo_item, dict):
+            self._explodir_insumos(novo_item, orcamento, fonte, estado_para_buscar)
+
+        # Por último: o updated_at gravado aqui é a versão da Curva ABC em cache
+        self._atualizar_valor_total_orcamento(orcamento_id, delta_itens=preco_total, orcamento=orcamento)
+        
+        return novo_item
+
+    @staticmethod
+    def _montar_novo_item(
+        orcamento_id: str,
+        item: OrcamentoItemCreate,
+        composicao: dict,
+        preco_unitario: Optional[float],
+        estado: str,
+        fonte: str,
+    ) -> Dict[str, Any]:
+        """Valida o item e monta a linha de ``orcamento_itens``."""
         if preco_unitario is None and item.codigo_composicao != "MANUAL":
             raise ValueError(f"Preço não encontrado para a composição {item.codigo_composicao}")
         
@@ -391,20 +661,15 @@ class OrcamentoItemService:
         if item.quantidade <= 0:
             raise ValueError("Quantidade deve ser maior que zero")
 
-        preco_total = item.quantidade * preco_unitario
-
-        descricao = item.descricao or composicao.get("descricao", "")
-        unidade = item.unidade or composicao.get("unidade", "")
-        
-        dados_item = {
+        return {
             "orcamento_id": orcamento_id,
             "codigo_composicao": item.codigo_composicao,
-            "descricao": descricao,
+            "descricao": item.descricao or composicao.get("descricao", ""),
             "quantidade": item.quantidade,
-            "unidade": unidade,
+            "unidade": item.unidade or composicao.get("unidade", ""),
             "preco_unitario": preco_unitario,
-            "preco_total": preco_total,
-            "estado": estado_para_buscar.lower(),
+            "preco_total": item.quantidade * preco_unitario,
+            "estado": estado.lower(),
             "fonte": fonte,
             "etapa_id": item.etapa_id,
             "memoria_calculo": item.memoria_calculo,
@@ -412,17 +677,6 @@ class OrcamentoItemService:
             "created_at": datetime.now().isoformat()
         }
 
-        novo_item = self.repository.criar(dados_item)
-        if not novo_item:
-            raise Exception("Erro ao adicionar item")
-
-        self._atualizar_valor_total_orcamento(orcamento_id)
-
-        if self.insumo_repository and isinstance(novo_item, dict):
-            self._explodir_insumos(novo_item, orcamento, fonte, estado_para_buscar)
-        
-        return novo_item
-
     def listar_itens(self, orcamento_id: str):
         orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
         if not orcamento:
@@ -435,14 +689,11 @@ class OrcamentoItemService:
         if not item_atual:
             raise ValueError("Item não encontrado")
 
-        dados_atualizacao = {}
-        codigo_composicao = item_update.codigo_composicao or item_atual.get("codigo_composicao")
-        estado = item_update.estado or item_atual.get("estado")
-        quantidade = item_update.quantidade if item_update.quantidade is not None else item_atual.get("quantidade")
-
-        if item_update.codigo_composicao is not None or item_update.estado is not None or item_update.fonte is not None:
+        orcamento = None
+        preco_unitario = None
+        if _reprecifica(item_update):
             orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
-            fonte = item_update.fonte or item_atual.get("fonte") or orcamento.get("fonte", "SINAPI")
+            codigo_composicao, estado, fonte = _chave_preco_atualizacao(item_atual, item_update, orcamento)
             preco_unitario = self._buscar_preco_composicao(
                 codigo_composicao, 
                 estado,
@@ -452,40 +703,375 @@ class OrcamentoItemService:
             )
             if preco_unitario is None:
                 raise ValueError(f"Preço não encontrado para a composição {codigo_composicao} na base {fonte}")
-            
-            dados_atualizacao["preco_unitario"] = preco_unitario
-            dados_atualizacao["codigo_composicao"] = codigo_composicao
-            dados_atualizacao["estado"] = estado.lower()
-            if item_update.fonte is not None:
-                dados_atualizacao["fonte"] = item_update.fonte
-        else:
-            preco_unitario = item_atual.get("preco_unitario")
-
-        if item_update.quantidade is not None:
-            if quantidade <= 0:
-                raise ValueError("Quantidade deve ser maior que zero")
-            dados_atualizacao["quantidade"] = quantidade
-            dados_atualizacao["preco_total"] = quantidade * (preco_unitario or item_atual.get("preco_unitario", 0))
-
-        if item_update.descricao is not None:
-            dados_atualizacao["descricao"] = item_update.descricao
-        if item_update.unidade is not None:
-            dados_atualizacao["unidade"] = item_update.unidade
-        if item_update.etapa_id is not None:
-            dados_atualizacao["etapa_id"] = item_update.etapa_id
-        if item_update.memoria_calculo is not None:
-            dados_atualizacao["memoria_calculo"] = item_update.memoria_calculo
-        if item_update.variaveis is not None:
-            dados_atualizacao["variaveis"] = item_update.variaveis
+
+        dados_atualizacao = _montar_atualizacao(item_atual, item_update, preco_unitario)
 
         if not dados_atualizacao:
             return item_atual
 
         item_atualizado = self.repository.atualizar(item_id, dados_atualizacao)
-        self._atualizar_valor_total_orcamento(orcamento_id)
+        total_anterior = float(item_atual.get("preco_total") or 0.0)
+        total_novo = float(dados_atualizacao.get("preco_total", total_anterior) or 0.0)
+        self._atualizar_valor_total_orcamento(
+            orcamento_id, delta_itens=total_novo - total_anterior, orcamento=orcamento,
+        )
         
         return item_atualizado
 
+    def processar_lote(self, orcamento_id: str, lote: OrcamentoItensLoteRequest) -> Dict[str, Any]:
+        """Cria, atualiza e remove vários itens do orçamento numa operação.
+
+        Composições e preços são resolvidos com consultas em lote; as
+        gravações são uma inserção, um upsert e uma exclusão; os insumos dos
+        itens novos ou com composição/quantidade alterada são explodidos
+        juntos; e o ``valor_total`` é recalculado uma única vez no fim. Uma
+        linha inválida não impede as demais: cada uma recebe seu resultado.
+        """
+        orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
+        if not orcamento:
+            raise ValueError("Orçamento não encontrado")
+
+        mes = orcamento.get("base_referencia")
+        tipo_composicao = orcamento.get("tipo_composicao")
+        resultados: Dict[str, List[Dict[str, Any]]] = {"criar": [], "atualizar": [], "remover": []}
+
+        def registrar(operacao, indice, item_id=None, erro=None, item=None):
+            resultados[operacao].append({
+                "operacao": operacao, "indice": indice, "id": item_id,
+                "sucesso": erro is None, "erro": erro, "item": item,
+            })
+
+        existentes = {
+            i["id"]: i for i in self.repository.buscar_por_ids(
+                list(dict.fromkeys([u.id for u in lote.atualizar] + list(lote.remover))), orcamento_id,
+            )
+        }
+
+        # 1. Validação e pedidos de composição/preço agrupados por base
+        criacoes = []
+        codigos_por_fonte: Dict[str, set] = {}
+        pedidos_preco: Dict[tuple, set] = {}
+        for indice, item in enumerate(lote.criar):
+            estado = item.estado or orcamento.get("estado")
+            if not estado:
+                registrar("criar", indice, erro="Estado não definido no orçamento")
+                continue
+            fonte = item.fonte or orcamento.get("fonte", "SINAPI")
+            criacoes.append((indice, item, estado, fonte))
+            if item.codigo_composicao != "MANUAL":
+                codigos_por_fonte.setdefault(fonte, set()).add(item.codigo_composicao)
+                if item.preco_unitario is None:
+                    pedidos_preco.setdefault((estado.lower(), fonte), set()).add(item.codigo_composicao)
+
+        atualizacoes = []
+        # Um id repetido no mesmo upsert faz o banco rejeitar o lote inteiro
+        primeira_atualizacao: Dict[str, int] = {}
+        for indice, item_update in enumerate(lote.atualizar):
+            if item_update.id in primeira_atualizacao:
+                registrar("atualizar", indice, item_update.id, erro=(
+                    f"Item repetido no lote (já atualizado no índice {primeira_atualizacao[item_update.id]})"
+                ))
+                continue
+            primeira_atualizacao[item_update.id] = indice
+            item_atual = existentes.get(item_update.id)
+            if not item_atual:
+                registrar("atualizar", indice, item_update.id, erro="Item não encontrado")
+                continue
+            chave = None
+            if _reprecifica(item_update):
+                chave = _chave_preco_atualizacao(item_atual, item_update, orcamento)
+                pedidos_preco.setdefault((chave[1].lower(), chave[2]), set()).add(chave[0])
+            atualizacoes.append((indice, item_update, item_atual, chave))
+
+        composicoes = {
+            fonte: self.item_repository.buscar_por_codigos(sorted(codigos), fonte=fonte)
+            for fonte, codigos in codigos_por_fonte.items()
+        }
+        precos = {
+            (estado, fonte): self.item_repository.buscar_precos_em_lote(
+                sorted(codigos), estado, mes, tipo_composicao, fonte
+            )
+            for (estado, fonte), codigos in pedidos_preco.items()
+        }
+
+        # 2. Montagem das linhas
+        novos = []
+        for indice, item, estado, fonte in criacoes:
+            composicao = {"descricao": item.descricao, "unidade": item.unidade}
+            if item.codigo_composicao != "MANUAL":
+                composicao = composicoes.get(fonte, {}).get(item.codigo_composicao)
+                if not composicao:
+                    registrar("criar", indice, erro=f"Composição {item.codigo_composicao} não encontrada na base {fonte}")
+                    continue
+            preco_unitario = item.preco_unitario
+            if preco_unitario is None:
+                preco_unitario = precos.get((estado.lower(), fonte), {}).get(item.codigo_composicao)
+            try:
+                novos.append((indice, self._montar_novo_item(
+                    orcamento_id, item, composicao, preco_unitario, estado, fonte,
+                )))
+            except ValueError as e:
+                registrar("criar", indice, erro=str(e))
+
+        alterados = []
+        for indice, item_update, item_atual, chave in atualizacoes:
+            preco_unitario = None
+            if chave is not None:
+                codigo, estado, fonte = chave
+                preco_unitario = precos.get((estado.lower(), fonte), {}).get(codigo)
+                if preco_unitario is None:
+                    registrar("atualizar", indice, item_update.id,
+                              erro=f"Preço não encontrado para a composição {codigo} na base {fonte}")
+                    continue
+            try:
+                dados = _montar_atualizacao(item_atual, item_update, preco_unitario)
+            except ValueError as e:
+                registrar("atualizar", indice, item_update.id, erro=str(e))
+                continue
+            if not dados:
+                registrar("atualizar", indice, item_update.id, item=item_atual)
+                continue
+            alterados.append((indice, item_atual, {**item_atual, **dados}))
+
+        remocoes = []
+        for indice, item_id in enumerate(lote.remover):
+            if item_id in existentes:
+                remocoes.append((indice, item_id))
+            else:
+                registrar("remover", indice, item_id, erro="Item não encontrado")
+
+        # 3. Gravação em massa
+        explodir: List[dict] = []
+        houve_gravacao = False
+        if novos:
+            try:
+                criados = self.repository.criar_batch([dados for _, dados in novos])
+                for (indice, _), criado in zip(novos, criados):
+                    registrar("criar", indice, criado.get("id"), item=criado)
+                    explodir.append(criado)
+                for indice, _ in novos[len(criados):]:
+                    registrar("criar", indice, erro="Item não retornado pelo banco")
+                houve_gravacao = True
+            except Exception as e:
+                logger.error(f"Erro ao inserir itens em lote no orçamento {orcamento_id}: {e}")
+                for indice, _ in novos:
+                    registrar("criar", indice, erro=f"Erro ao adicionar item: {e}")
+
+        if alterados:
+            try:
+                gravados = {i.get("id"): i for i in self.repository.upsert_batch([linha for _, _, linha in alterados])}
+                for indice, item_atual, linha in alterados:
+                    item = gravados.get(linha["id"], linha)
+                    registrar("atualizar", indice, linha["id"], item=item)
+                    if any(linha.get(campo) != item_atual.get(campo) for campo in CAMPOS_EXPLOSAO):
+                        explodir.append(item)
+                houve_gravacao = True
+            except Exception as e:
+                logger.error(f"Erro ao atualizar itens em lote no orçamento {orcamento_id}: {e}")
+                for indice, _, linha in alterados:
+                    registrar("atualizar", indice, linha["id"], erro=f"Erro ao atualizar item: {e}")
+
+        if remocoes:
+            try:
+                self.repository.deletar_batch([item_id for _, item_id in remocoes])
+                for indice, item_id in remocoes:
+                    registrar("remover", indice, item_id)
+                houve_gravacao = True
+            except Exception as e:
+                logger.error(f"Erro ao remover itens em lote do orçamento {orcamento_id}: {e}")
+                for indice, item_id in remocoes:
+                    registrar("remover", indice, item_id, erro=f"Erro ao remover item: {e}")
+
+        if self.insumo_repository and explodir:
+            try:
+                self._explodir_insumos_em_lote(explodir, orcamento)
+            except Exception as e:
+                logger.error(f"Erro ao gravar insumos dos itens do lote no orçamento {orcamento_id}: {e}")
+
+        valor_total = (
+            self.recalcular_valor_total(orcamento_id) if houve_gravacao
+            else float(orcamento.get("valor_total") or 0.0)
+        )
+
+        linhas = [
+            r for operacao in ("criar", "atualizar", "remover")
+            for r in sorted(resultados[operacao], key=lambda r: r["indice"])
+        ]
+        sucessos = {op: sum(1 for r in rs if r["sucesso"]) for op, rs in resultados.items()}
+        return {
+            "resultados": linhas,
+            "criados": sucessos["criar"],
+            "atualizados": sucessos["atualizar"],
+            "removidos": sucessos["remover"],
+            "falhas": sum(1 for r in linhas if not r["sucesso"]),
+            "valor_total": valor_total,
+        }
+
+    def reprecificar(self, orcamento_id: str, pedido: OrcamentoRepricingRequest) -> Dict[str, Any]:
+        """Reprecifica todos os itens numa nova base (mês, estado e/ou tipo).
+
+        Os preços das composições vêm de uma busca em lote por estado/fonte.
+        Com ``pedido.dry_run`` só devolve a comparação item a item entre o
+        preço atual e o da nova base. Sem ele, grava os itens e reexplode
+        os insumos em lotes de ``TAMANHO_LOTE_REPRECIFICACAO``, atualiza o
+        cabeçalho do orçamento e recalcula o ``valor_total``.
+
+        Itens manuais e composições sem preço na nova base mantêm o preço
+        atual e são sinalizados no resultado. Insumos com
+        ``preco_unitario_custom`` mantêm esse preço na nova base: o preço
+        desses itens passa a ser a soma dos insumos (como em
+        :meth:`atualizar_insumo`), e os códigos aparecem em ``precos_custom``.
+        """
+        orcamento = self.orcamento_repository.buscar_por_id(orcamento_id)
+        if not orcamento:
+            raise ValueError("Orçamento não encontrado")
+
+        cabecalho = {
+            "base_referencia": pedido.base_referencia or orcamento.get("base_referencia"),
+            "estado": (pedido.estado or orcamento.get("estado") or "").lower(),
+            "tipo_composicao": pedido.tipo_composicao or orcamento.get("tipo_composicao"),
+        }
+        if not cabecalho["estado"]:
+            raise ValueError("Estado não definido no orçamento")
+
+        itens = self.repository.listar_por_orcamento(orcamento_id)
+
+        def estado_do(item: dict) -> str:
+            return (pedido.estado or item.get("estado") or cabecalho["estado"]).lower()
+
+        def fonte_do(item: dict) -> str:
+            return item.get("fonte") or orcamento.get("fonte") or "SINAPI"
+
+        pedidos_preco: Dict[tuple, set] = {}
+        for item in itens:
+            if item.get("codigo_composicao") != "MANUAL":
+                pedidos_preco.setdefault((estado_do(item), fonte_do(item)), set()).add(item["codigo_composicao"])
+
+        precos = {
+            (estado, fonte): self.item_repository.buscar_precos_em_lote(
+                sorted(codigos), estado, cabecalho["base_referencia"], cabecalho["tipo_composicao"], fonte
+            )
+            for (estado, fonte), codigos in pedidos_preco.items()
+        }
+
+        orcamento_novo = {**orcamento, **cabecalho}
+        precos_custom = (
+            self.insumo_repository.listar_precos_custom(
+                [item["id"] for item in itens if item.get("codigo_composicao") != "MANUAL"]
+            )
+            if self.insumo_repository else {}
+        )
+        totais_com_custom = self._totais_com_precos_custom(
+            [
+                {**item, "estado": estado_do(item)} for item in itens
+                if item.get("id") in precos_custom
+                and precos.get((estado_do(item), fonte_do(item)), {}).get(item["codigo_composicao"]) is not None
+            ],
+            orcamento_novo,
+            precos_custom,
+        )
+
+        diff: List[Dict[str, Any]] = []
+        gravar: List[dict] = []
+        reexplodir: List[dict] = []
+        total_anterior = total_novo = 0.0
+        for item in itens:
+            quantidade = float(item.get("quantidade") or 0.0)
+            preco_anterior = item.get("preco_unitario")
+            total_item_anterior = float(item.get("preco_total") or 0.0)
+            preco_novo = None
+            if item.get("codigo_composicao") != "MANUAL":
+                preco_novo = precos.get((estado_do(item), fonte_do(item)), {}).get(item["codigo_composicao"])
+
+            if preco_novo is None:
+                situacao = "manual" if item.get("codigo_composicao") == "MANUAL" else "sem_preco"
+                total_item_novo = total_item_anterior
+            else:
+                if item.get("id") in totais_com_custom:
+                    total_item_novo = totais_com_custom[item["id"]]
+                    preco_novo = round(total_item_novo / quantidade, 2) if quantidade > 0 else 0.0
+                else:
+                    total_item_novo = quantidade * preco_novo
+                alterado = preco_anterior is None or abs(float(preco_anterior) - preco_novo) > 1e-9
+                situacao = "alterado" if alterado else "inalterado"
+                linha = {**item, "preco_unitario": preco_novo, "preco_total": total_item_novo, "estado": estado_do(item)}
+                if alterado or item.get("estado") != linha["estado"]:
+                    gravar.append(linha)
+                reexplodir.append(linha)
+
+            total_anterior += total_item_anterior
+            total_novo += total_item_novo
+            diff.append({
+                "id": item.get("id"),
+                "codigo_composicao": item.get("codigo_composicao"),
+                "descricao": item.get("descricao"),
+                "quantidade": quantidade,
+                "preco_unitario_anterior": preco_anterior,
+                "preco_unitario_novo": preco_novo if preco_novo is not None else preco_anterior,
+                "preco_total_anterior": total_item_anterior,
+                "preco_total_novo": total_item_novo,
+                "diferenca": round(total_item_novo - total_item_anterior, 2),
+                "situacao": situacao,
+                "precos_custom": sorted(precos_custom.get(item.get("id"), {})),
+            })
+
+        fator_bdi = 1 + float(orcamento.get("bdi") or 0.0) / 100
+        resultado = {
+            "dry_run": pedido.dry_run,
+            **cabecalho,
+            "itens": diff,
+            "itens_alterados": sum(1 for d in diff if d["situacao"] == "alterado"),
+            "itens_sem_preco": sum(1 for d in diff if d["situacao"] == "sem_preco"),
+            "itens_com_preco_custom": sum(1 for d in diff if d["precos_custom"]),
+            "total_itens_anterior": total_anterior,
+            "total_itens_novo": total_novo,
+            "valor_total_anterior": (
+                float(orcamento["valor_total"]) if orcamento.get("valor_total") is not None
+                else total_anterior * fator_bdi
+            ),
+            "valor_total_novo": total_novo * fator_bdi,
+            "lotes_gravados": 0,
+        }
+        if pedido.dry_run:
+            return resultado
+
+        # Todos os lotes são explodidos antes da primeira gravação: uma
+        # composição que não explode não deixa o orçamento meio reprecificado
+        lotes_itens = [
+            reexplodir[i:i + TAMANHO_LOTE_REPRECIFICACAO]
+            for i in range(0, len(reexplodir), TAMANHO_LOTE_REPRECIFICACAO)
+        ]
+        insumos_por_lote = [
+            self._insumos_em_lote(lote, orcamento_novo, precos_custom) if self.insumo_repository else None
+            for lote in lotes_itens
+        ]
+
+        gravar_ids = {linha["id"] for linha in gravar}
+        lotes = 0
+        try:
+            for lote, insumos in zip(lotes_itens, insumos_por_lote):
+                linhas = [linha for linha in lote if linha["id"] in gravar_ids]
+                if linhas:
+                    self.repository.upsert_batch(linhas)
+                if insumos is not None:
+                    self._regravar_insumos([linha["id"] for linha in lote], insumos)
+                lotes += 1
+
+            self.orcamento_repository.atualizar(orcamento_id, {
+                **cabecalho,
+                "updated_at": datetime.now().isoformat()
+            })
+        finally:
+            # Mesmo numa falha de gravação, o valor_total reflete os itens gravados
+            resultado["valor_total_novo"] = self.recalcular_valor_total(orcamento_id)
+        resultado["lotes_gravados"] = lotes
+        logger.info(
+            "Orçamento %s reprecificado para %s/%s/%s: %d itens alterados em %d lotes",
+            orcamento_id, cabecalho["base_referencia"], cabecalho["estado"],
+            cabecalho["tipo_composicao"], resultado["itens_alterados"], lotes,
+        )
+        return resultado
+
     def listar_insumos(self, orcamento_id: str, item_id: str):
         item = self.repository.buscar_por_id(item_id, orcamento_id)
         if not item:
@@ -531,7 +1117,10 @@ class OrcamentoItemService:
             "preco_total": novo_preco_total_pai
         })
 
-        self._atualizar_valor_total_orcamento(orcamento_id)
+        self._atualizar_valor_total_orcamento(
+            orcamento_id,
+            delta_itens=novo_preco_total_pai - float(item_pai.get("preco_total") or 0.0),
+        )
 
         return insumo_upd
 
@@ -541,50 +1130,157 @@ class OrcamentoItemService:
         orcamento: dict,
         fonte: str,
         estado: str,
-    ) -> None:
+    ) -> Optional[Dict[str, Any]]:
+        """Grava os insumos básicos do item, explodindo as subcomposições.
+
+        A árvore da composição é descida até os insumos básicos (com os
+        coeficientes multiplicados ao longo do caminho) pelo cache de
+        ``self.explosao``; os preços vêm de uma busca em lote e a gravação
+        é uma única inserção, independentemente do tamanho da composição.
+
+        Returns:
+            ``{"insumos": n, "tempos_ms": {...}}`` com o tempo de cada etapa,
+            ou ``None`` se a composição não tem filhos ou a explosão falhou.
+        """
         try:
             codigo = item.get("codigo_composicao")
             mes = orcamento.get("base_referencia")
             tipo_composicao = orcamento.get("tipo_composicao", "Sem Desoneração")
             quantidade_pai = float(item.get("quantidade", 1))
             item_id = item.get("id")
+            tempos: Dict[str, float] = {}
 
-            filhos = self.item_repository.buscar_filhos_composicao(codigo, mes, fonte)
-            if not filhos:
-                return
+            inicio = time.perf_counter()
+            folhas = self.explosao.explodir(self.item_repository, codigo, mes, fonte)
+            tempos["filhos"] = time.perf_counter() - inicio
+            if not folhas:
+                return None
 
-            self.insumo_repository.deletar_por_item(item_id)
+            inicio = time.perf_counter()
+            precos = self.item_repository.buscar_precos_em_lote(
+                [f.codigo for f in folhas], estado, mes, tipo_composicao, fonte
+            )
+            tempos["precos"] = time.perf_counter() - inicio
 
-            batch = []
-            for filho in filhos:
-                cod_filho = filho.get("codigo_filho")
-                coef = float(filho.get("quantidade_coeficiente") or 0)
-                if coef <= 0:
-                    continue
+            batch = _montar_insumos(item_id, folhas, precos, quantidade_pai)
+
+            inicio = time.perf_counter()
+            self._regravar_insumos([item_id], batch)
+            tempos["gravacao"] = time.perf_counter() - inicio
 
-                preco_base = self.item_repository.buscar_preco(
-                    cod_filho, estado, mes, tipo_composicao, fonte
-                )
-
-                qtd_total = round(coef * quantidade_pai, 6)
-                total = round(qtd_total * preco_base, 2) if preco_base else None
-
-                batch.append({
-                    "orcamento_item_id": item_id,
-                    "codigo_insumo": cod_filho,
-                    "descricao": filho.get("descricao_filho", ""),
-                    "unidade": filho.get("unidade_filho", "-"),
-                    "quantidade_unitaria": qtd_total,
-                    "preco_unitario_base": preco_base,
-                    "total": total,
-                    "tipo_item": "MATERIAL",
-                })
-
-            if batch:
-                self.insumo_repository.criar_batch(batch)
+            tempos_ms = {etapa: round(s * 1000, 2) for etapa, s in tempos.items()}
+            logger.debug(
+                "Insumos do item %s (%s): %d gravados em %s ms",
+                item_id, codigo, len(batch), tempos_ms,
+            )
+            return {"insumos": len(batch), "tempos_ms": tempos_ms}
+        except Exception as e:
+            logger.warning(f"Falha ao explodir insumos: {e}")
+            return None
+
+    def _explodir_insumos_em_lote(
+        self,
+        itens: List[dict],
+        orcamento: dict,
+        precos_custom: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Versão de :meth:`_explodir_insumos` para vários itens.
+
+        Um vetor explodido por composição distinta (do cache), uma busca de
+        preços por estado/fonte e a regravação de todos juntos
+        (:meth:`_regravar_insumos`). ``precos_custom``
+        (``{item_id: {codigo_insumo: preco}}``) é levado para os insumos
+        regravados.
+
+        Falhas na explosão devolvem ``None`` sem tocar nos insumos gravados;
+        falhas na gravação levantam exceção, com os insumos anteriores intactos.
+        """
+        inicio = time.perf_counter()
+        try:
+            batch = self._insumos_em_lote(itens, orcamento, precos_custom)
         except Exception as e:
-            import logging
-            logging.getLogger(__name__).warning(f"Falha ao explodir insumos: {e}")
+            logger.warning(f"Falha ao explodir insumos em lote: {e}")
+            return None
+
+        self._regravar_insumos([item.get("id") for item in itens], batch)
+
+        tempo_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        logger.debug("Insumos de %d itens: %d gravados em %s ms", len(itens), len(batch), tempo_ms)
+        return {"itens": len(itens), "insumos": len(batch), "tempo_ms": tempo_ms}
+
+    def _regravar_insumos(self, item_ids: List[str], batch: List[Dict[str, Any]]) -> None:
+        """Troca os insumos de ``item_ids`` pelas linhas de ``batch``.
+
+        As linhas novas são inseridas antes de apagar as antigas (pelo id):
+        se uma inserção falhar, as já inseridas são removidas, os insumos
+        anteriores (com seus preços customizados) continuam gravados e a
+        exceção é propagada.
+        """
+        antigos = self.insumo_repository.listar_ids_por_itens(item_ids)
+        try:
+            for i in range(0, len(batch), TAMANHO_LOTE_INSUMOS):
+                self.insumo_repository.criar_batch(batch[i:i + TAMANHO_LOTE_INSUMOS])
+        except Exception:
+            inseridos = set(self.insumo_repository.listar_ids_por_itens(item_ids)) - set(antigos)
+            self.insumo_repository.deletar_por_ids(sorted(inseridos))
+            raise
+        self.insumo_repository.deletar_por_ids(antigos)
+
+    def _totais_com_precos_custom(
+        self,
+        itens: List[dict],
+        orcamento: dict,
+        precos_custom: Dict[str, Dict[str, float]],
+    ) -> Dict[str, float]:
+        """``{item_id: soma dos insumos}`` na base de ``orcamento``, com os preços customizados."""
+        if not itens:
+            return {}
+        totais: Dict[str, float] = {}
+        for insumo in self._insumos_em_lote(itens, orcamento, precos_custom):
+            item_id = insumo["orcamento_item_id"]
+            totais[item_id] = totais.get(item_id, 0.0) + float(insumo.get("total") or 0.0)
+        return {item_id: round(total, 2) for item_id, total in totais.items()}
+
+    def _insumos_em_lote(
+        self,
+        itens: List[dict],
+        orcamento: dict,
+        precos_custom: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Linhas de ``orcamento_item_insumo`` de todos os ``itens`` (sem gravar)."""
+        mes = orcamento.get("base_referencia")
+        tipo_composicao = orcamento.get("tipo_composicao", "Sem Desoneração")
+
+        folhas: Dict[tuple, List[InsumoExplodido]] = {}
+        pedidos_preco: Dict[tuple, set] = {}
+        for item in itens:
+            chave = (item.get("codigo_composicao"), item.get("fonte") or "SINAPI")
+            if chave[0] == "MANUAL":
+                continue
+            if chave not in folhas:
+                folhas[chave] = self.explosao.explodir(self.item_repository, chave[0], mes, chave[1])
+            estado = (item.get("estado") or orcamento.get("estado") or "").lower()
+            pedidos_preco.setdefault((estado, chave[1]), set()).update(f.codigo for f in folhas[chave])
+
+        precos = {
+            (estado, fonte): self.item_repository.buscar_precos_em_lote(
+                sorted(codigos), estado, mes, tipo_composicao, fonte
+            )
+            for (estado, fonte), codigos in pedidos_preco.items() if codigos
+        }
+
+        batch: List[Dict[str, Any]] = []
+        for item in itens:
+            fonte = item.get("fonte") or "SINAPI"
+            estado = (item.get("estado") or orcamento.get("estado") or "").lower()
+            batch.extend(_montar_insumos(
+                item.get("id"),
+                folhas.get((item.get("codigo_composicao"), fonte), []),
+                precos.get((estado, fonte), {}),
+                float(item.get("quantidade", 1)),
+                precos_custom.get(item.get("id"), {}) if precos_custom is not None else None,
+            ))
+        return batch
 
     def remover_item(self, orcamento_id: str, item_id: str):
         item_existente = self.repository.buscar_por_id(item_id, orcamento_id)
@@ -592,5 +1288,7 @@ class OrcamentoItemService:
              raise ValueError("Item não encontrado")
         
         self.repository.deletar(item_id)
-        self._atualizar_valor_total_orcamento(orcamento_id)
+        self._atualizar_valor_total_orcamento(
+            orcamento_id, delta_itens=-float(item_existente.get("preco_total") or 0.0),
+        )
         return {"message": "Item removido com sucesso", "id": item_id}
@@ -0,0 +1,123 @@
+"""
+Cache LRU em memória, seguro para uso entre threads.
+
+Usado para resultados caros de recalcular dentro de um processo (metadados
+de planilhas, índices de preço, relatórios). Cada worker do gunicorn tem
+o seu próprio cache; nada aqui é compartilhado entre processos.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+_AUSENTE = object()
+
+
+class CacheLRU(Generic[V]):
+    """Mapa limitado a ``max_itens`` que descarta o item usado há mais tempo.
+
+    Com ``ttl`` (segundos), itens mais antigos que o prazo são tratados
+    como ausentes. Com ``max_peso``, a soma de ``peso(valor)`` dos itens
+    também é limitada (por exemplo, bytes de arquivos com ``peso=len``); um
+    valor mais pesado que o limite sozinho não é guardado.
+
+        >>> cache = CacheLRU(max_itens=2)
+        >>> cache.definir("a", 1)
+        >>> cache.obter("a")
+        1
+    """
+
+    def __init__(
+        self,
+        max_itens: int = 128,
+        ttl: Optional[float] = None,
+        max_peso: Optional[int] = None,
+        peso: Optional[Callable[[V], int]] = None,
+    ):
+        self.max_itens = max(1, max_itens)
+        self.ttl = ttl
+        self.max_peso = max_peso
+        self._peso = peso or (lambda valor: 1)
+        self.peso_total = 0
+        self._itens: "OrderedDict[Hashable, tuple[float, V, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave: Hashable, padrao: Any = None) -> Optional[V]:
+        """Valor da chave (marcando-a como recente) ou ``padrao``."""
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE or self._expirado(item[0]):
+                if item is not _AUSENTE:
+                    self._remover(chave)
+                self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[1]
+
+    def definir(self, chave: Hashable, valor: V) -> None:
+        """Guarda ``valor``, descartando o item mais antigo se necessário."""
+        peso = self._peso(valor)
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            if self.max_peso is not None and peso > self.max_peso:
+                return
+            self._itens[chave] = (time.monotonic(), valor, peso)
+            self.peso_total += peso
+            while len(self._itens) > self.max_itens or (
+                self.max_peso is not None and self.peso_total > self.max_peso
+            ):
+                self._remover(next(iter(self._itens)))
+
+    def obter_ou_calcular(self, chave: Hashable, calcular: Callable[[], V]) -> V:
+        """Valor em cache ou ``calcular()``, guardando o resultado.
+
+        O cálculo roda fora do lock: duas threads com a mesma chave ausente
+        podem calcular em paralelo, e a última a terminar prevalece.
+        """
+        valor = self.obter(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = calcular()
+            self.definir(chave, valor)
+        return valor
+
+    def invalidar(self, filtro: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Remove as chaves aceitas por ``filtro`` (todas, se omitido).
+
+        Returns:
+            Quantidade de itens removidos.
+        """
+        with self._lock:
+            if filtro is None:
+                qtd = len(self._itens)
+                self._itens.clear()
+                self.peso_total = 0
+                return qtd
+            removidas = [c for c in self._itens if filtro(c)]
+            for chave in removidas:
+                self._remover(chave)
+            return len(removidas)
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {"itens": len(self._itens), "acertos": self.acertos, "falhas": self.falhas}
+
+    def __contains__(self, chave: Hashable) -> bool:
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            return item is not _AUSENTE and not self._expirado(item[0])
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def _remover(self, chave: Hashable) -> None:
+        self.peso_total -= self._itens.pop(chave)[2]
+
+    def _expirado(self, criado_em: float) -> bool:
+        return self.ttl is not None and time.monotonic() - criado_em > self.ttl
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -24,6 +26,47 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
 
+    # Importação SINAPI
+    IMPORT_PARALELO: bool = False  # Extrai cada aba num processo separado
+    IMPORT_WORKERS: int = 0  # 0 = número de CPUs da máquina
+    IMPORT_CACHE_ARQUIVOS: int = 32  # Arquivos com metadados em cache (por SHA-256)
+    UPSERT_MAX_EM_VOO: int = 4  # Lotes de upsert enviados simultaneamente
+    UPSERT_BYTES_POR_LOTE: int = 1_000_000  # Tamanho alvo do payload de cada lote
+    UPSERT_TENTATIVAS: int = 3  # Tentativas por lote antes de descartá-lo
+    IMPORT_INSUMOS_BASICOS: bool = True  # Pré-calcula composicao_insumos_basicos na importação
+    IMPORT_MEDIR_MEMORIA: bool = False  # Pico de memória por etapa nas estatísticas (tracemalloc; mais lento)
+
+    # Índice de preços em memória (buscar_preco)
+    PRECO_INDICE_TTL: int = 900  # Segundos até recarregar uma base (0 = sem expiração)
+
+    # Valor total dos orçamentos (mantido por incrementos)
+    ORCAMENTO_RECONCILIAR_A_CADA: int = 50  # Incrementos até somar todos os itens de novo (0 = nunca)
+    RPC_NOVA_TENTATIVA: int = 300  # Segundos até testar de novo uma função do banco ausente
+
+    # Explosão recursiva de composições em insumos básicos
+    EXPLOSAO_CACHE_COMPOSICOES: int = 2048  # Composições com vetor de insumos em cache
+
+    # Análises de orçamento
+    CURVA_ABC_CACHE_ORCAMENTOS: int = 256  # Orçamentos com Curva ABC em cache
+    ORCAMENTO_STATS_TTL: int = 30  # Segundos de cache dos indicadores do painel (0 = sem cache)
+
+    # Arquivos exportados (PDF/Excel) por versão do orçamento
+    EXPORT_CACHE_ARQUIVOS: int = 64  # Arquivos em cache por processo
+    EXPORT_CACHE_BYTES: int = 128 * 1024 * 1024  # Soma máxima dos arquivos em cache (0 = sem cache)
+    EXPORT_SINCRONO_MAX_ITENS: int = 2000  # Acima disso, a renderização vai para o pool de processos
+    EXPORT_PROCESSOS: int = 2  # Processos que renderizam exportações grandes
+    EXPORT_DIR: str = ""  # Diretório dos arquivos gerados por tarefas (vazio = temporário do sistema)
+    EXPORT_ARQUIVO_TTL: int = 3600  # Segundos até apagar o arquivo de uma tarefa de exportação
+
+    # Tarefas em segundo plano
+    # Arquivo SQLite do estado das tarefas, compartilhado pelos workers do gunicorn
+    # (vazio = memória, só para um processo)
+    JOBS_DB_PATH: str = os.path.join(tempfile.gettempdir(), "projeto_orcamento_jobs.sqlite3")
+    JOBS_WORKERS: int = 2  # Tarefas executadas simultaneamente por processo
+    # Segundos sem atualização após os quais uma tarefa pendente/em execução é
+    # dada como interrompida (reinício do servidor) ao iniciar um processo
+    JOBS_INTERROMPIDA_APOS: int = 900
+
     # Define de onde carregar as variáveis (prioriza .env)
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
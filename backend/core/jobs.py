@@ -0,0 +1,250 @@
+"""
+Fila local de tarefas em segundo plano.
+
+Tarefas longas (importação de planilhas, exportações) rodam num pool de
+threads do próprio processo, enquanto o estado de cada tarefa fica numa
+tabela SQLite. ``JOBS_DB_PATH`` aponta por padrão para um arquivo no
+diretório temporário, então todos os workers do gunicorn enxergam o mesmo
+estado (a consulta de uma tarefa pode cair em outro worker), sem depender de
+serviços externos; vazio, o banco fica em memória (um processo só).
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+
+logger = logging.getLogger("projeto_orcamento")
+
+STATUS_PENDENTE = "pendente"
+STATUS_EXECUTANDO = "executando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    status TEXT NOT NULL,
+    etapa TEXT,
+    progresso TEXT NOT NULL DEFAULT '{}',
+    resultado TEXT,
+    erro TEXT,
+    criado_em REAL NOT NULL,
+    iniciado_em REAL,
+    finalizado_em REAL,
+    atualizado_em REAL
+)
+"""
+
+
+# Colunas que _atualizar pode gravar (os nomes entram no SQL)
+_COLUNAS_ATUALIZAVEIS = frozenset(
+    {"status", "etapa", "progresso", "resultado", "erro", "iniciado_em", "finalizado_em", "atualizado_em"}
+)
+
+ERRO_INTERROMPIDA = "Tarefa interrompida: o processo que a executava foi encerrado"
+
+
+class ProgressoJob:
+    """Relator de progresso entregue à função da tarefa.
+
+    Cada chamada define a etapa atual e soma contagens de linhas por tabela:
+
+        >>> progresso("upsert_estados", gravadas={"composicao_estados": 1000})
+    """
+
+    def __init__(self, manager: "JobManager", job_id: str):
+        self._manager = manager
+        self._job_id = job_id
+        self._dados: Dict[str, Any] = {"linhas_lidas": {}, "linhas_gravadas": {}}
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        etapa: str,
+        lidas: Optional[Dict[str, int]] = None,
+        gravadas: Optional[Dict[str, int]] = None,
+        **extras: Any,
+    ) -> None:
+        with self._lock:
+            for chave, incrementos in (("linhas_lidas", lidas), ("linhas_gravadas", gravadas)):
+                for tabela, qtd in (incrementos or {}).items():
+                    self._dados[chave][tabela] = self._dados[chave].get(tabela, 0) + qtd
+            self._dados.update(extras)
+            snapshot = json.dumps(self._dados, default=str)
+        self._manager._atualizar(self._job_id, etapa=etapa, progresso=snapshot)
+
+
+class JobManager:
+    """Executa tarefas num pool de threads e guarda o estado no SQLite."""
+
+    def __init__(
+        self,
+        db_path: str = "",
+        max_workers: int = 2,
+        max_jobs_retidos: int = 500,
+        interrompida_apos: float = 900,
+    ):
+        """
+        Args:
+            db_path: Arquivo SQLite do estado das tarefas; vazio usa memória.
+            max_workers: Tarefas executadas simultaneamente neste processo.
+            max_jobs_retidos: Tarefas finalizadas mantidas para consulta.
+            interrompida_apos: Segundos sem atualização para uma tarefa
+                pendente/em execução ser marcada como erro na inicialização.
+        """
+        self._conn = sqlite3.connect(
+            db_path or ":memory:", check_same_thread=False, timeout=30,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._max_jobs_retidos = max_jobs_retidos
+        self._futuros: Dict[str, Future] = {}
+        with self._lock, self._conn:
+            if db_path:
+                # Vários processos lendo e gravando o mesmo arquivo
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            colunas = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "atualizado_em" not in colunas:
+                # Arquivo criado por uma versão anterior
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN atualizado_em REAL")
+        self._marcar_interrompidas(interrompida_apos)
+
+    def submeter(
+        self,
+        tipo: str,
+        func: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> str:
+        """Enfileira ``func(progresso, *args, **kwargs)`` e devolve o id da tarefa.
+
+        O valor retornado por ``func`` (serializável em JSON) vira o
+        ``resultado`` da tarefa; uma exceção vira ``erro``.
+        """
+        job_id = uuid.uuid4().hex
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, tipo, status, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+                (job_id, tipo, STATUS_PENDENTE, agora, agora),
+            )
+        self._limpar_antigos()
+        futuro = self._executor.submit(self._executar, job_id, func, args, kwargs)
+        self._futuros[job_id] = futuro
+        futuro.add_done_callback(lambda _: self._futuros.pop(job_id, None))
+        return job_id
+
+    def aguardar(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Espera a tarefa terminar (até ``timeout`` segundos) e devolve o estado.
+
+        Só espera tarefas submetidas por este processo; para as demais
+        devolve o estado atual imediatamente.
+        """
+        futuro = self._futuros.get(job_id)
+        if futuro is not None:
+            wait([futuro], timeout=timeout)
+        return self.obter(job_id)
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado atual da tarefa, ou ``None`` se não existir."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        agora = time.time()
+        inicio = row["iniciado_em"]
+        fim = row["finalizado_em"] or agora
+        return {
+            "id": row["id"],
+            "tipo": row["tipo"],
+            "status": row["status"],
+            "etapa": row["etapa"],
+            "progresso": json.loads(row["progresso"]),
+            "resultado": json.loads(row["resultado"]) if row["resultado"] else None,
+            "erro": row["erro"],
+            "tempo_decorrido_s": round(fim - inicio, 3) if inicio else 0.0,
+            "tempo_na_fila_s": round((inicio or agora) - row["criado_em"], 3),
+        }
+
+    def encerrar(self, esperar: bool = True) -> None:
+        """Finaliza o pool de threads (usado em testes e no shutdown)."""
+        self._executor.shutdown(wait=esperar)
+
+    def _executar(self, job_id: str, func: Callable[..., Any], args, kwargs) -> None:
+        self._atualizar(job_id, status=STATUS_EXECUTANDO, iniciado_em=time.time())
+        try:
+            resultado = func(ProgressoJob(self, job_id), *args, **kwargs)
+            self._atualizar(
+                job_id,
+                status=STATUS_CONCLUIDO,
+                resultado=json.dumps(resultado, default=str),
+                finalizado_em=time.time(),
+            )
+        except Exception as e:
+            logger.error(f"Erro na tarefa {job_id}: {e}", exc_info=True)
+            self._atualizar(job_id, status=STATUS_ERRO, erro=str(e), finalizado_em=time.time())
+
+    def _atualizar(self, job_id: str, **campos: Any) -> None:
+        campos.setdefault("atualizado_em", time.time())
+        invalidas = set(campos) - _COLUNAS_ATUALIZAVEIS
+        if invalidas:
+            raise ValueError(f"Colunas de tarefa inválidas: {sorted(invalidas)}")
+        colunas = ", ".join(f"{c} = ?" for c in campos)
+        # Nomes de coluna vêm da lista fixa acima; os valores vão como parâmetros
+        sql = f"UPDATE jobs SET {colunas} WHERE id = ?"  # nosec B608
+        with self._lock, self._conn:
+            self._conn.execute(sql, (*campos.values(), job_id))
+
+    def _marcar_interrompidas(self, interrompida_apos: float) -> None:
+        """Marca como erro as tarefas pendentes/em execução sem atualização há
+        ``interrompida_apos`` segundos: o processo que as executava morreu.
+
+        O prazo protege as tarefas vivas de outros workers que usam o mesmo
+        arquivo; se uma delas ainda terminar, o status final a sobrescreve.
+        """
+        agora = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, erro = ?, finalizado_em = ?, atualizado_em = ?
+                WHERE status IN (?, ?) AND COALESCE(atualizado_em, criado_em) < ?
+                """,
+                (STATUS_ERRO, ERRO_INTERROMPIDA, agora, agora,
+                 STATUS_PENDENTE, STATUS_EXECUTANDO, agora - interrompida_apos),
+            )
+        if cursor.rowcount:
+            logger.warning(f"{cursor.rowcount} tarefa(s) interrompida(s) marcada(s) como erro")
+
+    def _limpar_antigos(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                DELETE FROM jobs WHERE finalizado_em IS NOT NULL AND id NOT IN (
+                    SELECT id FROM jobs WHERE finalizado_em IS NOT NULL
+                    ORDER BY finalizado_em DESC LIMIT ?
+                )
+                """,
+                (self._max_jobs_retidos,),
+            )
+
+
+@lru_cache(maxsize=1)
+def get_job_manager() -> JobManager:
+    """Instância única do gerenciador de tarefas deste processo."""
+    return JobManager(
+        db_path=settings.JOBS_DB_PATH,
+        max_workers=settings.JOBS_WORKERS,
+        interrompida_apos=settings.JOBS_INTERROMPIDA_APOS,
+    )
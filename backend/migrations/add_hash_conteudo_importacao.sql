@@ -0,0 +1,15 @@
+-- Impressão digital do conteúdo de cada linha importada do SINAPI.
+-- A importação incremental (delta) compara o hash calculado na planilha com
+-- o hash gravado e só envia linhas novas ou alteradas.
+
+ALTER TABLE composicao ADD COLUMN IF NOT EXISTS hash_conteudo TEXT;
+ALTER TABLE composicao_estados ADD COLUMN IF NOT EXISTS hash_conteudo TEXT;
+ALTER TABLE composicao_itens ADD COLUMN IF NOT EXISTS hash_conteudo TEXT;
+
+-- A leitura dos hashes é sempre filtrada por mês + fonte
+CREATE INDEX IF NOT EXISTS idx_composicao_mes_fonte
+    ON composicao (mes_referencia, fonte);
+CREATE INDEX IF NOT EXISTS idx_composicao_estados_mes_fonte
+    ON composicao_estados (mes_referencia, fonte);
+CREATE INDEX IF NOT EXISTS idx_composicao_itens_mes_fonte
+    ON composicao_itens (mes_referencia, fonte);
@@ -0,0 +1,9 @@
+-- Tipo do filho no Analítico do SINAPI (COMPOSICAO ou INSUMO).
+-- A explosão de insumos desce recursivamente pelos filhos do tipo
+-- COMPOSICAO; linhas antigas (NULL) são tratadas como possíveis composições.
+
+ALTER TABLE composicao_itens ADD COLUMN IF NOT EXISTS tipo_item TEXT;
+
+-- A explosão busca os filhos de vários pais de uma vez (codigo_pai IN ...)
+CREATE INDEX IF NOT EXISTS idx_composicao_itens_pai_mes_fonte
+    ON composicao_itens (codigo_pai, mes_referencia, fonte);
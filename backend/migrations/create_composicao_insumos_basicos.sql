@@ -0,0 +1,19 @@
+-- Vetor achatado de insumos básicos de cada composição, por mês/fonte.
+-- Calculado na importação a partir de composicao_itens (subcomposições
+-- expandidas, coeficientes multiplicados ao longo do caminho) e lido pela
+-- explosão de insumos dos itens de orçamento numa única consulta.
+
+CREATE TABLE IF NOT EXISTS composicao_insumos_basicos (
+    codigo_composicao TEXT NOT NULL,
+    codigo_insumo TEXT NOT NULL,
+    coeficiente DOUBLE PRECISION NOT NULL,
+    descricao TEXT,
+    unidade TEXT,
+    mes_referencia TEXT NOT NULL,
+    fonte TEXT NOT NULL DEFAULT 'SINAPI',
+    PRIMARY KEY (codigo_composicao, codigo_insumo, mes_referencia, fonte)
+);
+
+-- A importação lê as chaves da base e apaga as linhas obsoletas após regravar
+CREATE INDEX IF NOT EXISTS idx_composicao_insumos_basicos_mes_fonte
+    ON composicao_insumos_basicos (mes_referencia, fonte);
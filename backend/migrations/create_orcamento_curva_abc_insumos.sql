@@ -0,0 +1,32 @@
+-- Insumos de um orçamento somados por código, para a Curva ABC.
+-- Agrupa no banco em vez de baixar cada linha de orcamento_item_insumo
+-- (que o PostgREST truncaria no limite de linhas em orçamentos grandes).
+
+CREATE OR REPLACE FUNCTION public.orcamento_curva_abc_insumos(p_orcamento_id UUID)
+RETURNS TABLE (
+    codigo_insumo TEXT,
+    descricao TEXT,
+    unidade TEXT,
+    quantidade DOUBLE PRECISION,
+    total DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        ins.codigo_insumo::TEXT,
+        MIN(ins.descricao)::TEXT,
+        MIN(ins.unidade)::TEXT,
+        COALESCE(SUM(ins.quantidade_unitaria), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(ins.total), 0)::DOUBLE PRECISION
+    FROM public.orcamento_item_insumo ins
+    JOIN public.orcamento_itens it ON it.id = ins.orcamento_item_id
+    WHERE it.orcamento_id = p_orcamento_id
+      AND ins.codigo_insumo IS NOT NULL
+    GROUP BY ins.codigo_insumo;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_orcamento_item_insumo_item
+    ON public.orcamento_item_insumo (orcamento_item_id);
+
+GRANT EXECUTE ON FUNCTION public.orcamento_curva_abc_insumos(UUID) TO authenticated, service_role;
@@ -0,0 +1,25 @@
+-- Indicadores do painel de orçamentos calculados no banco.
+-- Devolve uma única linha, em vez de baixar todos os orçamentos (com os
+-- JSON de variáveis e locais) a cada carregamento de /orcamentos/stats.
+
+CREATE OR REPLACE FUNCTION public.orcamento_estatisticas()
+RETURNS TABLE (
+    total_orcamentos BIGINT,
+    valor_total DOUBLE PRECISION,
+    aprovados BIGINT,
+    tempo_resposta_medio DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        COALESCE(SUM(valor_total), 0)::DOUBLE PRECISION,
+        COUNT(*) FILTER (WHERE LOWER(status) IN ('aprovado', 'concluido')),
+        (AVG(EXTRACT(EPOCH FROM (updated_at::TIMESTAMPTZ - created_at::TIMESTAMPTZ)) / 86400.0)
+            FILTER (WHERE LOWER(status) IN ('aprovado', 'concluido')
+                    AND created_at IS NOT NULL AND updated_at IS NOT NULL))::DOUBLE PRECISION
+    FROM public.orcamentos;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.orcamento_estatisticas() TO authenticated, service_role;
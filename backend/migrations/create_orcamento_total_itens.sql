@@ -0,0 +1,18 @@
+-- Soma dos itens de um orçamento calculada no banco.
+-- Usada na reconciliação de orcamentos.valor_total, que no dia a dia é
+-- mantido por incrementos; evita baixar o preco_total de cada item.
+
+CREATE OR REPLACE FUNCTION public.orcamento_total_itens(p_orcamento_id UUID)
+RETURNS DOUBLE PRECISION
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE(SUM(preco_total), 0)::DOUBLE PRECISION
+    FROM public.orcamento_itens
+    WHERE orcamento_id = p_orcamento_id;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_orcamento_itens_orcamento
+    ON public.orcamento_itens (orcamento_id);
+
+GRANT EXECUTE ON FUNCTION public.orcamento_total_itens(UUID) TO authenticated, service_role;
@@ -0,0 +1,39 @@
+-- Busca e paginação da listagem de orçamentos (GET /orcamentos).
+--
+-- * Coluna "busca" (tsvector de nome + cliente, sem acentos) com índice GIN,
+--   usada pelo parâmetro ?busca= com prefixos ("esc:* & mun:*").
+-- * Índices trigram para os filtros ?nome= e ?cliente= (ilike '%...%'),
+--   que sem eles percorrem a tabela inteira.
+-- * Índice (created_at, id) para a paginação por cursor.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() não é IMMUTABLE; a versão com dicionário explícito pode ser
+-- usada em coluna gerada
+CREATE OR REPLACE FUNCTION public.orcamentos_texto_busca(nome TEXT, cliente TEXT)
+RETURNS TSVECTOR
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT to_tsvector(
+        'simple',
+        public.unaccent('public.unaccent'::REGDICTIONARY, COALESCE(nome, '') || ' ' || COALESCE(cliente, ''))
+    );
+$$;
+
+ALTER TABLE public.orcamentos
+    ADD COLUMN IF NOT EXISTS busca TSVECTOR
+    GENERATED ALWAYS AS (public.orcamentos_texto_busca(nome, cliente)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_orcamentos_busca
+    ON public.orcamentos USING GIN (busca);
+
+CREATE INDEX IF NOT EXISTS idx_orcamentos_nome_trgm
+    ON public.orcamentos USING GIN (nome gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_orcamentos_cliente_trgm
+    ON public.orcamentos USING GIN (cliente gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_orcamentos_created_at_id
+    ON public.orcamentos (created_at DESC, id DESC);
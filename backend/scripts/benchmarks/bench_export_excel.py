@@ -0,0 +1,151 @@
+"""
+Benchmark da exportação Excel de um orçamento grande.
+
+Compara o workbook montado em memória com estilos por célula (como era
+feito antes) com a escrita write-only e estilos nomeados de
+``escrever_planilha_orcamento``, alimentada por um gerador de itens (como a
+leitura paginada do repositório). Mede tempo, pico de memória alocada
+(tracemalloc) e tamanho do arquivo.
+
+Com ``--completo``, mede também o workbook completo de
+``escrever_planilha_completa`` (sintético por etapa, analítico com insumos,
+Curva ABC e cronograma).
+
+Uso:
+    cd backend
+    python scripts/benchmarks/bench_export_excel.py [--itens 20000] [--completo 1000]
+"""
+import argparse
+import io
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+import openpyxl
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.modules.orcamento.export import escrever_planilha_completa, escrever_planilha_orcamento  # noqa: E402
+
+ORCAMENTO = {"nome": "Orçamento sintético", "cliente": "Cliente", "base_referencia": "01/2026", "bdi": 25}
+
+
+def gerar_itens(quantidade: int):
+    """Itens gerados sob demanda, como as páginas de ``iterar_por_orcamento``."""
+    rnd = random.Random(42)
+    for i in range(quantidade):
+        qtd = round(rnd.uniform(1, 500), 2)
+        pu = round(rnd.uniform(5, 3000), 2)
+        yield {
+            "codigo_composicao": str(90000 + i),
+            "descricao": f"COMPOSIÇÃO SINTÉTICA {i} - EXECUÇÃO DE SERVIÇO COM DESCRIÇÃO LONGA",
+            "unidade": "M2",
+            "quantidade": qtd,
+            "preco_unitario": pu,
+            "preco_total": round(qtd * pu, 2),
+        }
+
+
+def exportar_em_memoria(orcamento, itens) -> bytes:
+    """Implementação de referência (workbook completo), usada apenas para comparação."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    align_center = Alignment(horizontal="center", vertical="center")
+    align_right = Alignment(horizontal="right", vertical="center")
+    border_thin = Border(*(Side(style="thin", color="E2E8F0") for _ in range(4)))
+    ws["A1"] = f"ORÇAMENTO: {orcamento.get('nome', '')}"
+    ws["A1"].font = Font(name="Calibri", size=16, bold=True, color="001B3D")
+    for col_num, header in enumerate(["Item", "Código", "Descrição", "Unid.", "Qtd.", "PU", "PT"], 1):
+        cell = ws.cell(row=4, column=col_num, value=header)
+        cell.font = Font(name="Calibri", size=11, bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="001B3D", end_color="001B3D", fill_type="solid")
+        cell.alignment = align_center
+    row_num = 5
+    total = Decimal("0.0")
+    for idx, item in enumerate(itens, 1):
+        pt = Decimal(str(item["preco_total"]))
+        total += pt
+        ws.cell(row=row_num, column=1, value=idx).alignment = align_center
+        ws.cell(row=row_num, column=2, value=item["codigo_composicao"]).alignment = align_center
+        ws.cell(row=row_num, column=3, value=item["descricao"])
+        ws.cell(row=row_num, column=4, value=item["unidade"]).alignment = align_center
+        for col, valor, fmt in ((5, item["quantidade"], "#,##0.00"), (6, item["preco_unitario"], "R$ #,##0.00"), (7, float(pt), "R$ #,##0.00")):
+            cell = ws.cell(row=row_num, column=col, value=valor)
+            cell.number_format = fmt
+            cell.alignment = align_right
+        for c in range(1, 8):
+            ws.cell(row=row_num, column=c).border = border_thin
+        row_num += 1
+    ws.cell(row=row_num, column=7, value=float(total))
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def exportar_streaming(orcamento, itens) -> int:
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as arquivo:
+        escrever_planilha_orcamento(arquivo, orcamento, itens)
+        return arquivo.tell()
+
+
+def exportar_completo(quantidade: int, insumos_por_item: int = 8) -> int:
+    """Workbook completo com etapas de 50 itens e insumos gerados por lote de itens."""
+    etapas = [{"id": f"e{i}", "nome": f"Etapa {i}"} for i in range(quantidade // 50 + 1)]
+    itens = [dict(item, id=f"i{i}", etapa_id=f"e{i // 50}") for i, item in enumerate(gerar_itens(quantidade))]
+
+    def buscar_insumos(item_ids):
+        return [
+            {"orcamento_item_id": item_id, "codigo_insumo": str(1000 + j), "descricao": f"INSUMO {j}",
+             "unidade": "H", "quantidade_unitaria": 1.5, "preco_unitario_base": 20.0, "total": 30.0}
+            for item_id in item_ids for j in range(insumos_por_item)
+        ]
+
+    curva = {"valor_total": 0.0, "resumo_classes": {}, "insumos": []}
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as arquivo:
+        escrever_planilha_completa(arquivo, ORCAMENTO, etapas, itens, buscar_insumos, curva, None)
+        return arquivo.tell()
+
+
+def medir(funcao, quantidade: int):
+    """Tempo numa execução sem tracemalloc (que a deixa bem mais lenta) e
+    pico de memória em outra."""
+    inicio = time.perf_counter()
+    resultado = funcao(ORCAMENTO, gerar_itens(quantidade))
+    segundos = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    funcao(ORCAMENTO, gerar_itens(quantidade))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--itens", type=int, default=20_000)
+    parser.add_argument("--completo", type=int, default=0, help="itens do workbook completo (0 = não mede)")
+    args = parser.parse_args()
+
+    bytes_ref, t_ref, pico_ref = medir(exportar_em_memoria, args.itens)
+    tamanho, t_str, pico_str = medir(exportar_streaming, args.itens)
+
+    mb = 1024 * 1024
+    print(f"Itens: {args.itens}")
+    print(f"Em memória:  {t_ref:7.2f}s | pico {pico_ref / mb:7.1f} MB | arquivo {len(bytes_ref) / mb:5.1f} MB")
+    print(f"Write-only:  {t_str:7.2f}s | pico {pico_str / mb:7.1f} MB | arquivo {tamanho / mb:5.1f} MB")
+    print(f"Speedup:     {t_ref / t_str:7.1f}x | memória {pico_ref / max(pico_str, 1):5.1f}x menor")
+
+    if args.completo:
+        inicio = time.perf_counter()
+        tamanho = exportar_completo(args.completo)
+        print(f"Completo ({args.completo} itens, 8 insumos/item): {time.perf_counter() - inicio:.2f}s | "
+              f"arquivo {tamanho / mb:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark do relatório PDF de um orçamento grande com etapas.
+
+Compara o renderizador anterior (``multi_cell`` com ``dry_run`` para medir
+cada linha e de novo para desenhá-la) com o atual, que quebra as descrições
+uma vez com ``quebrar_linhas`` (em cache) e desenha as células com
+``rect`` e ``text``.
+Mede tempo e pico de memória alocada (tracemalloc).
+
+Uso:
+    cd backend
+    python scripts/benchmarks/bench_export_pdf.py [--itens 3000]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.modules.importacao.services.pdf_service import PdfService, quebrar_linhas  # noqa: E402
+
+ORCAMENTO = {"nome": "Orçamento sintético", "cliente": "Cliente", "fonte": "SINAPI",
+             "base_referencia": "01/2026", "created_at": "2026-01-01T00:00:00Z", "bdi": 25}
+
+DESCRICOES = [
+    "CONCRETO FCK = 25MPA, TRAÇO 1:2,3:2,7 (EM MASSA SECA DE CIMENTO/ AREIA MÉDIA/ BRITA 1) - PREPARO MECÂNICO COM BETONEIRA 400 L. AF_05/2021",
+    "ARMAÇÃO DE PILAR OU VIGA DE ESTRUTURA CONVENCIONAL DE CONCRETO ARMADO UTILIZANDO AÇO CA-50 DE 10,0 MM - MONTAGEM. AF_06/2022",
+    "ALVENARIA DE VEDAÇÃO DE BLOCOS CERÂMICOS FURADOS NA HORIZONTAL DE 9X19X19 CM (ESPESSURA 9 CM) E ARGAMASSA DE ASSENTAMENTO COM PREPARO EM BETONEIRA. AF_12/2021",
+    "PINTURA LÁTEX ACRÍLICA PREMIUM, APLICAÇÃO MANUAL EM PAREDES, DUAS DEMÃOS. AF_04/2023",
+]
+
+
+def gerar_dados(quantidade: int):
+    rnd = random.Random(42)
+    etapas = [{"id": f"e{i}", "nome": f"Etapa {i}", "ordem": i, "parent_id": None} for i in range(quantidade // 100 + 1)]
+    itens = [
+        {"id": f"i{i}", "etapa_id": f"e{i // 100}", "descricao": f"{rnd.choice(DESCRICOES)} ({i})",
+         "quantidade": round(rnd.uniform(1, 500), 2), "preco_unitario": round(rnd.uniform(5, 3000), 2)}
+        for i in range(quantidade)
+    ]
+    return etapas, itens
+
+
+class PdfDryRun(PdfService):
+    """Renderizador de referência (medição com multi_cell dry_run), só para comparação."""
+
+    def _render_row(self, indent, number_str, description, quant_str, unitario_str, total_str, fill=False):
+        line_h = 6
+        full_text = f"{indent}{number_str}. {description}" if number_str else f"{indent}{description}"
+        lines = self.multi_cell(w=100, h=line_h, text=full_text, dry_run=True, output='LINES')
+        row_h = max(1, len(lines)) * line_h
+        if self.get_y() + row_h > self.page_break_trigger:
+            self.add_page()
+        start_x, start_y = self.get_x(), self.get_y()
+        self.multi_cell(w=100, h=line_h, text=full_text, border=1, fill=fill)
+        self.set_xy(start_x + 100, start_y)
+        self.cell(w=30, h=row_h, text=quant_str, border=1, align='C', fill=fill)
+        self.cell(w=30, h=row_h, text=unitario_str, border=1, align='R', fill=fill)
+        self.cell(w=30, h=row_h, text=total_str, border=1, align='R', fill=fill, new_x="LMARGIN", new_y="NEXT")
+
+
+def medir(classe, etapas, itens):
+    """Tempo numa execução sem tracemalloc e pico de memória em outra."""
+    quebrar_linhas.cache_clear()
+    inicio = time.perf_counter()
+    pdf = classe().gerar_pdf(ORCAMENTO, itens, etapas)
+    segundos = time.perf_counter() - inicio
+
+    quebrar_linhas.cache_clear()
+    tracemalloc.start()
+    classe().gerar_pdf(ORCAMENTO, itens, etapas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(pdf), segundos, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--itens", type=int, default=3_000)
+    args = parser.parse_args()
+
+    etapas, itens = gerar_dados(args.itens)
+    tam_ref, t_ref, pico_ref = medir(PdfDryRun, etapas, itens)
+    tam, t, pico = medir(PdfService, etapas, itens)
+
+    mb = 1024 * 1024
+    print(f"Itens: {args.itens} | etapas: {len(etapas)}")
+    print(f"multi_cell dry_run: {t_ref:7.2f}s | pico {pico_ref / mb:6.1f} MB | arquivo {tam_ref / mb:5.1f} MB")
+    print(f"Quebra em cache:    {t:7.2f}s | pico {pico / mb:6.1f} MB | arquivo {tam / mb:5.1f} MB")
+    print(f"Speedup:            {t_ref / t:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
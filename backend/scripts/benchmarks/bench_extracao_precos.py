@@ -0,0 +1,112 @@
+"""
+Benchmark da extração de preços de uma aba CSD/CCD/CSE sintética.
+
+Compara o processamento linha a linha (``iterrows`` + ``limpar_valor_moeda``
+por célula, como era feito antes) com a extração vetorizada de
+``SinapiExcelParser._extrair_registros_vetorizado``. A leitura do Excel não
+entra na medição: as duas versões recebem o mesmo DataFrame em memória.
+
+Uso:
+    cd backend
+    python scripts/benchmarks/bench_extracao_precos.py [--linhas 50000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.modules.importacao.services.sinapi_excel_parser import (  # noqa: E402
+    COLUNAS_ESTADOS,
+    HeaderInfo,
+    SinapiExcelParser,
+)
+from app.modules.importacao.services.sinapi_text_utils import limpar_valor_moeda  # noqa: E402
+
+
+def _valor_preco():
+    """Mistura típica de uma aba real: maioria numérica, alguns textos e vazios."""
+    sorteio = random.random()
+    if sorteio < 0.85:
+        return round(random.uniform(1, 900), 2)
+    if sorteio < 0.90:
+        return f"{random.uniform(1, 9000):_.2f}".replace(".", ",").replace("_", ".")
+    return random.choice(["-", "", None])
+
+
+def gerar_aba(linhas: int) -> tuple[pd.DataFrame, HeaderInfo]:
+    """Gera uma aba no formato CSD já lida com ``header=None``."""
+    random.seed(42)
+    cabecalho = ["GRUPO", "CODIGO", "DESCRICAO", "UNIDADE"] + COLUNAS_ESTADOS
+    dados = [cabecalho]
+    for i in range(linhas):
+        linha = ["ASSENTAMENTO", str(80000 + i), f"COMPOSICAO SINTETICA {i}", "M2"]
+        linha += [_valor_preco() for _ in COLUNAS_ESTADOS]
+        dados.append(linha)
+
+    header = HeaderInfo(linha=0, col_grupo=0, col_codigo=1, col_descricao=2, col_unidade=3)
+    header.mapa_estados = {4 + i: sigla.lower() for i, sigla in enumerate(COLUNAS_ESTADOS)}
+    return pd.DataFrame(dados), header
+
+
+def extrair_linha_a_linha(df_dados, header, mes, tipo):
+    """Implementação de referência (por linha), usada apenas para comparação."""
+    composicoes, precos = [], []
+    for _, row in df_dados.iterrows():
+        cod_raw = row.iloc[header.col_codigo]
+        if pd.isna(cod_raw) or str(cod_raw).strip() == "":
+            continue
+        cod = str(cod_raw).replace(".0", "").strip()
+        if not cod.isdigit() and len(cod) < 3:
+            continue
+        composicoes.append({
+            "codigo_composicao": cod,
+            "descricao": str(row.iloc[header.col_descricao]).strip(),
+            "unidade": str(row.iloc[header.col_unidade]).strip(),
+            "grupo": str(row.iloc[header.col_grupo]).strip() or "-",
+            "mes_referencia": mes,
+        })
+        reg = {"codigo_composicao": cod, "mes_referencia": mes, "tipo_composicao": tipo}
+        tem_valor = False
+        for c_idx, sigla in header.mapa_estados.items():
+            val = limpar_valor_moeda(row.iloc[c_idx])
+            reg[sigla] = val
+            tem_valor = tem_valor or val is not None
+        if tem_valor:
+            precos.append(reg)
+    return composicoes, precos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--linhas", type=int, default=50_000)
+    args = parser.parse_args()
+
+    df, header = gerar_aba(args.linhas)
+    df_dados = df.iloc[header.linha + 1:]
+    mes, tipo = "01/2026", "Sem Desoneração"
+
+    t0 = time.perf_counter()
+    comp_ref, precos_ref = extrair_linha_a_linha(df_dados, header, mes, tipo)
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    comp_vet, precos_vet = SinapiExcelParser._extrair_registros_vetorizado(
+        df_dados, header, mes, tipo,
+    )
+    t_vet = time.perf_counter() - t0
+
+    assert len(comp_ref) == len(comp_vet) and len(precos_ref) == len(precos_vet)
+
+    print(f"Linhas: {args.linhas} | estados: {len(header.mapa_estados)}")
+    print(f"Linha a linha: {t_ref:8.3f}s")
+    print(f"Vetorizado:    {t_vet:8.3f}s")
+    print(f"Speedup:       {t_ref / t_vet:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark do índice de preços em memória (``IndicePrecos``).
+
+Carrega uma base sintética (sem banco: o cliente Supabase é simulado) e
+mede o tempo médio de ``buscar`` para códigos existentes e para o fallback
+de mês mais recente já memorizado.
+
+Uso:
+    cd backend
+    python scripts/benchmarks/bench_indice_precos.py [--codigos 12000] [--consultas 200000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.modules.item.price_index import ESTADOS, IndicePrecos  # noqa: E402
+
+
+def _supabase_sintetico(qtd_codigos: int) -> MagicMock:
+    linhas = [
+        {"codigo_composicao": str(90000 + i), **{uf: round(random.uniform(1, 500), 2) for uf in ESTADOS}}
+        for i in range(qtd_codigos)
+    ]
+    paginas = [linhas[i:i + 1000] for i in range(0, len(linhas), 1000)] + [[]]
+
+    supabase = MagicMock()
+    chain = supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.ilike.return_value = chain
+    chain.order.return_value = chain
+    chain.in_.return_value = chain
+    chain.range.return_value.execute.side_effect = [MagicMock(data=p) for p in paginas]
+    chain.execute.return_value.data = []
+    return supabase
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--codigos", type=int, default=12000)
+    parser.add_argument("--consultas", type=int, default=200000)
+    args = parser.parse_args()
+
+    supabase = _supabase_sintetico(args.codigos)
+    indice = IndicePrecos()
+
+    inicio = time.perf_counter()
+    indice.base(supabase, "SINAPI", "12/2025", "Sem Desoneração")
+    print(f"Carga da base ({args.codigos} composições): {time.perf_counter() - inicio:.3f}s")
+
+    codigos = [str(90000 + random.randrange(args.codigos)) for _ in range(args.consultas)]
+    estados = [random.choice(ESTADOS) for _ in range(args.consultas)]
+    inicio = time.perf_counter()
+    for codigo, uf in zip(codigos, estados):
+        indice.buscar(supabase, codigo, uf, "12/2025", "Sem Desoneração")
+    decorrido = time.perf_counter() - inicio
+    print(f"Consulta existente: {decorrido / args.consultas * 1e6:.2f} µs/consulta")
+
+    indice.buscar(supabase, "inexistente", "sp", "12/2025", "Sem Desoneração")
+    inicio = time.perf_counter()
+    for _ in range(args.consultas):
+        indice.buscar(supabase, "inexistente", "sp", "12/2025", "Sem Desoneração")
+    decorrido = time.perf_counter() - inicio
+    print(f"Fallback memorizado: {decorrido / args.consultas * 1e6:.2f} µs/consulta")
+
+
+if __name__ == "__main__":
+    main()
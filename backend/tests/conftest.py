@@ -27,6 +27,31 @@ from core.security import get_current_user  # noqa: E402
 # Shared infrastructure fixtures
 # ---------------------------------------------------------------------------
 
+@pytest.fixture(autouse=True)
+def limpar_cache_arquivos_importacao():
+    """Isola os testes dos caches de processo (metadados de arquivo, índice de
+    preços, explosão de composições, incrementos de valor total, Curva ABC, painel,
+    exportações)."""
+    from app.modules.importacao.services.import_service import _cache_arquivos
+    from app.modules.item.composition_tree import invalidar_explosao_composicoes
+    from app.modules.item.price_index import invalidar_indice_precos
+    from app.modules.orcamento.services import (
+        _cache_curva_abc, _cache_estatisticas, _incrementos_valor_total,
+    )
+    from app.modules.orcamento.export_cache import _cache_exportacoes
+
+    caches = (_cache_arquivos, _incrementos_valor_total, _cache_curva_abc, _cache_estatisticas, _cache_exportacoes)
+    for cache in caches:
+        cache.invalidar()
+    invalidar_indice_precos()
+    invalidar_explosao_composicoes()
+    yield
+    for cache in caches:
+        cache.invalidar()
+    invalidar_indice_precos()
+    invalidar_explosao_composicoes()
+
+
 @pytest.fixture
 def mock_supabase():
     """Creates a MagicMock to simulate the Supabase client."""
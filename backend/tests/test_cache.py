@@ -0,0 +1,67 @@
+"""
+Unit tests for core.cache.CacheLRU.
+"""
+import pytest
+from core.cache import CacheLRU
+
+
+@pytest.mark.unit
+def test_cache_descarta_item_menos_usado():
+    cache = CacheLRU(max_itens=2)
+    cache.definir("a", 1)
+    cache.definir("b", 2)
+    cache.obter("a")  # "a" passa a ser o mais recente
+    cache.definir("c", 3)
+
+    assert "b" not in cache
+    assert cache.obter("a") == 1
+    assert cache.obter("c") == 3
+
+
+@pytest.mark.unit
+def test_cache_ttl_expira_itens(monkeypatch):
+    agora = [100.0]
+    monkeypatch.setattr("core.cache.time.monotonic", lambda: agora[0])
+    cache = CacheLRU(max_itens=10, ttl=5)
+    cache.definir("a", 1)
+
+    agora[0] = 104.0
+    assert cache.obter("a") == 1
+    agora[0] = 106.0
+    assert cache.obter("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.unit
+def test_cache_obter_ou_calcular_e_invalidar():
+    cache = CacheLRU(max_itens=10)
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        return "valor"
+
+    assert cache.obter_ou_calcular(("mes", "01/2024"), calcular) == "valor"
+    assert cache.obter_ou_calcular(("mes", "01/2024"), calcular) == "valor"
+    cache.definir(("mes", "02/2024"), "outro")
+
+    removidos = cache.invalidar(lambda chave: chave[1] == "01/2024")
+
+    assert len(chamadas) == 1
+    assert removidos == 1
+    assert ("mes", "02/2024") in cache
+    assert cache.estatisticas() == {"itens": 1, "acertos": 1, "falhas": 1}
+
+
+@pytest.mark.unit
+def test_cache_limitado_por_peso():
+    cache = CacheLRU(max_itens=10, max_peso=10, peso=len)
+    cache.definir("a", b"1234")
+    cache.definir("b", b"1234")
+    cache.definir("c", b"1234")  # passa de 10 bytes: descarta "a"
+    cache.definir("grande", b"x" * 11)  # maior que o limite: não é guardado
+
+    assert "a" not in cache and "grande" not in cache
+    assert cache.peso_total == 8
+    cache.definir("b", b"12")
+    assert cache.peso_total == 6
@@ -0,0 +1,158 @@
+"""
+Unit tests for ExplosaoComposicoes — explosão recursiva de composições.
+"""
+import pytest
+from unittest.mock import MagicMock
+
+from app.modules.item.composition_tree import ExplosaoComposicoes, GrafoComposicoes, achatar_grafo
+from app.modules.item.repositories import ItemRepository
+
+
+def _filho(codigo, coef, tipo="INSUMO"):
+    return {"codigo_filho": codigo, "quantidade_coeficiente": coef, "tipo_item": tipo}
+
+
+class _RepoArvore:
+    """Repositório falso que registra os códigos consultados a cada nível."""
+
+    def __init__(self, filhos_por_pai, insumos_basicos=None):
+        self.filhos_por_pai = filhos_por_pai
+        self.insumos_basicos = insumos_basicos or {}
+        self.consultas = []
+
+    def buscar_insumos_basicos(self, codigo, mes_referencia, fonte="SINAPI"):
+        return self.insumos_basicos.get(codigo, [])
+
+    def buscar_filhos_composicoes(self, codigos, mes_referencia, fonte="SINAPI"):
+        self.consultas.append(list(codigos))
+        return {c: self.filhos_por_pai[c] for c in codigos if c in self.filhos_por_pai}
+
+
+# Duas composições que usam a mesma argamassa (500), que usa cimento (10) e areia (11)
+ARVORE = {
+    "1": [_filho("500", 2.0, "COMPOSICAO"), _filho("10", 1.0)],
+    "2": [_filho("500", 0.5, "COMPOSICAO")],
+    "500": [_filho("10", 3.0), _filho("11", 0.25)],
+}
+
+
+@pytest.mark.unit
+def test_explodir_multiplica_coeficientes_e_soma_insumos_repetidos():
+    repo = _RepoArvore(ARVORE)
+
+    insumos = {i.codigo: i.coeficiente for i in ExplosaoComposicoes().explodir(repo, "1", "12/2025")}
+
+    assert insumos == {"10": pytest.approx(7.0), "11": pytest.approx(0.5)}
+    assert repo.consultas == [["1"], ["500"]]
+
+
+@pytest.mark.unit
+def test_explodir_reaproveita_subcomposicao_em_cache():
+    repo = _RepoArvore(ARVORE)
+    explosao = ExplosaoComposicoes()
+    explosao.explodir(repo, "1", "12/2025")
+
+    insumos = {i.codigo: i.coeficiente for i in explosao.explodir(repo, "2", "12/2025")}
+    explosao.explodir(repo, "1", "12/2025")
+
+    assert insumos == {"10": pytest.approx(1.5), "11": pytest.approx(0.125)}
+    # "2" é consultado sozinho; "500" e "1" vêm do cache
+    assert repo.consultas == [["1"], ["500"], ["2"]]
+
+
+@pytest.mark.unit
+def test_explodir_cache_separado_por_mes_e_invalidacao():
+    repo = _RepoArvore(ARVORE)
+    explosao = ExplosaoComposicoes()
+    explosao.explodir(repo, "1", "12/2025")
+    explosao.explodir(repo, "1", "01/2026")
+    assert len(repo.consultas) == 4
+
+    assert explosao.invalidar(fonte="SINAPI", mes_referencia="12/2025") == 2
+    explosao.explodir(repo, "1", "01/2026")
+    explosao.explodir(repo, "1", "12/2025")
+    assert len(repo.consultas) == 6
+
+
+@pytest.mark.unit
+def test_explodir_filho_sem_tipo_vira_folha_sem_filhos():
+    repo = _RepoArvore({"1": [_filho("10", 2.0, tipo=None)]})
+
+    insumos = ExplosaoComposicoes().explodir(repo, "1", "12/2025")
+
+    assert [(i.codigo, i.coeficiente) for i in insumos] == [("10", 2.0)]
+    assert repo.consultas == [["1"], ["10"]]
+
+
+@pytest.mark.unit
+def test_explodir_ciclo_nao_entra_em_laco():
+    repo = _RepoArvore({
+        "1": [_filho("2", 1.0, "COMPOSICAO")],
+        "2": [_filho("1", 1.0, "COMPOSICAO"), _filho("10", 4.0)],
+    })
+
+    insumos = {i.codigo: i.coeficiente for i in ExplosaoComposicoes().explodir(repo, "1", "12/2025")}
+
+    assert insumos == {"1": 1.0, "10": 4.0}
+
+
+@pytest.mark.unit
+def test_explodir_usa_vetor_pre_calculado_sem_percorrer_grafo():
+    repo = _RepoArvore(ARVORE, insumos_basicos={
+        "1": [{"codigo_insumo": "10", "coeficiente": 7.0, "descricao": "Cimento", "unidade": "KG"}],
+    })
+
+    insumos = ExplosaoComposicoes().explodir(repo, "1", "12/2025")
+
+    assert [(i.codigo, i.coeficiente, i.unidade) for i in insumos] == [("10", 7.0, "KG")]
+    assert repo.consultas == []
+
+
+@pytest.mark.unit
+def test_achatar_grafo_gera_vetor_de_todas_as_composicoes():
+    grafo = GrafoComposicoes()
+    grafo.adicionar([
+        {"codigo_pai": pai, **filho} for pai, filhos in ARVORE.items() for filho in filhos
+    ])
+
+    linhas = achatar_grafo(grafo, "12/2025", "SINAPI")
+
+    vetores = {(l["codigo_composicao"], l["codigo_insumo"]): l["coeficiente"] for l in linhas}
+    assert vetores == {
+        ("1", "10"): pytest.approx(7.0), ("1", "11"): pytest.approx(0.5),
+        ("2", "10"): pytest.approx(1.5), ("2", "11"): pytest.approx(0.125),
+        ("500", "10"): pytest.approx(3.0), ("500", "11"): pytest.approx(0.25),
+    }
+    assert {l["mes_referencia"] for l in linhas} == {"12/2025"}
+
+
+@pytest.mark.unit
+def test_grafo_ignora_relacao_repetida_entre_lotes():
+    """Relação pai/filho repetida (em outro lote do streaming) não soma o coeficiente duas vezes."""
+    grafo = GrafoComposicoes()
+    grafo.adicionar([{"codigo_pai": "1", **_filho("10", 2.0)}])
+    grafo.adicionar([{"codigo_pai": "1", **_filho("10", 2.0)}, {"codigo_pai": "1", **_filho("11", 1.0)}])
+
+    linhas = achatar_grafo(grafo, "12/2025", "SINAPI")
+
+    assert {l["codigo_insumo"]: l["coeficiente"] for l in linhas} == {"10": 2.0, "11": 1.0}
+
+
+@pytest.mark.unit
+def test_repository_buscar_filhos_composicoes_agrupa_por_pai():
+    supabase = MagicMock()
+    chain = supabase.table.return_value.select.return_value
+    chain.in_.return_value = chain
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.range.return_value.execute.return_value.data = [
+        {"codigo_pai": "1", "codigo_filho": "10"},
+        {"codigo_pai": "1", "codigo_filho": "11"},
+        {"codigo_pai": "2", "codigo_filho": "10"},
+    ]
+    repo = ItemRepository(supabase)
+
+    filhos = repo.buscar_filhos_composicoes(["1", "2", "3"], "12/2025")
+
+    assert {k: len(v) for k, v in filhos.items()} == {"1": 2, "2": 1}
+    chain.in_.assert_called_once_with("codigo_pai", ["1", "2", "3"])
@@ -86,8 +86,11 @@ def test_atualizar_etapa_sucesso(client, mock_supabase):
     assert data["id"] == etapa_id
     assert data["data_inicio"] == "2026-07-21"
     assert data["data_fim"] == "2026-08-15"
-    mock_supabase.table.return_value.update.assert_called_with({
+    mock_supabase.table.return_value.update.assert_any_call({
         "data_inicio": "2026-07-21", 
         "data_fim": "2026-08-15"
     })
+    # A alteração da etapa também regrava a versão do orçamento
+    mock_supabase.table.assert_any_call("orcamentos")
+    assert "updated_at" in mock_supabase.table.return_value.update.call_args.args[0]
 
@@ -90,3 +90,17 @@ def test_atualizar_etapa_falha_repositorio_retorna_none(etapa_service, repositor
     with pytest.raises(Exception, match="Erro ao atualizar etapa"):
         etapa_service.atualizar_etapa("1", {"nome": "X"})
 
+
+
+@pytest.mark.unit
+def test_alterar_etapas_regrava_versao_do_orcamento(etapa_service, repository_mock):
+    """Criar, atualizar ou deletar etapa muda o updated_at do orçamento (versão das exportações)."""
+    repository_mock.criar.return_value = {"id": "1", "orcamento_id": "orc1"}
+    repository_mock.atualizar.return_value = {"id": "1", "orcamento_id": "orc1"}
+
+    etapa_service.criar_etapa("orc1", EtapaCreate(nome="Fundação", ordem=1))
+    etapa_service.atualizar_etapa("1", {"ordem": 2})
+    etapa_service.deletar_etapa("1", "orc1")
+
+    assert repository_mock.marcar_orcamento_alterado.call_count == 3
+    repository_mock.marcar_orcamento_alterado.assert_called_with("orc1")
@@ -85,3 +85,195 @@ def test_process_import_file_parser_error_propaga_value_error(sinapi_excel_conte
         with pytest.raises(ValueError, match="Erro no processamento"):
             process_import_file(sinapi_excel_content, mock_repo, source_type="SINAPI")
 
+
+
+@pytest.mark.unit
+def test_process_import_file_abre_arquivo_uma_unica_vez(sinapi_excel_content: bytes):
+    """Metadados e extração compartilham a mesma leitura da aba de preços."""
+    import pandas as pd
+
+    mock_repo = MagicMock()
+    mock_repo.upsert_batch_composicoes.return_value = 2
+    mock_repo.upsert_batch_estados.return_value = 2
+
+    with patch(
+        "app.modules.importacao.services.workbook_session.pd.ExcelFile",
+        wraps=pd.ExcelFile,
+    ) as excel_file:
+        resultado = process_import_file(sinapi_excel_content, mock_repo, source_type="SINAPI")
+
+    assert excel_file.call_count == 1
+    estatisticas = resultado["estatisticas"]
+    assert estatisticas["leitura_aba:CSD_TESTE"]["chamadas"] == 1
+    assert "metadados" in estatisticas
+    assert "extracao:CSD_TESTE" in estatisticas
+
+
+@pytest.mark.unit
+def test_process_import_file_registra_pico_de_memoria_quando_configurado(sinapi_excel_content: bytes, monkeypatch):
+    from app.modules.importacao.services import import_service
+
+    monkeypatch.setattr(import_service.settings, "IMPORT_MEDIR_MEMORIA", True)
+    mock_repo = MagicMock()
+    mock_repo.upsert_batch_composicoes.return_value = 2
+    mock_repo.upsert_batch_estados.return_value = 2
+
+    resultado = process_import_file(sinapi_excel_content, mock_repo, source_type="SINAPI")
+
+    assert resultado["estatisticas"]["leitura_aba:CSD_TESTE"]["pico_memoria_bytes"] > 0
+
+
+@pytest.mark.unit
+def test_process_import_file_grava_analitico_em_lotes(sinapi_excel_content: bytes):
+    """Cada lote do Analítico é enviado ao repositório assim que é lido."""
+    mock_repo = MagicMock()
+    mock_repo.upsert_batch_composicoes.return_value = 2
+    mock_repo.upsert_batch_estados.return_value = 2
+    mock_repo.upsert_batch_composicao_itens.side_effect = lambda lote: len(lote)
+
+    lotes = [
+        [{"codigo_pai": "1", "codigo_filho": str(i)} for i in range(3)],
+        [{"codigo_pai": "2", "codigo_filho": str(i)} for i in range(2)],
+    ]
+    with patch(
+        "app.modules.importacao.services.sinapi_excel_parser.SinapiExcelParser.identificar_aba_analitico",
+        return_value="Analítico",
+    ), patch(
+        "app.modules.importacao.services.sinapi_excel_parser.SinapiExcelParser.iterar_analitico",
+        return_value=iter(lotes),
+    ):
+        resultado = process_import_file(sinapi_excel_content, mock_repo, source_type="SINAPI")
+
+    assert mock_repo.upsert_batch_composicao_itens.call_count == 2
+    assert resultado["imported_analitico"] == 5
+    assert resultado["estatisticas"]["upsert_analitico"]["chamadas"] == 2
+
+
+@pytest.mark.unit
+def test_process_import_file_grava_insumos_basicos(sinapi_excel_content: bytes):
+    """Após o Analítico, o vetor achatado de cada composição é regravado."""
+    mock_repo = MagicMock()
+    mock_repo.upsert_batch_composicao_itens.side_effect = lambda lote: len(lote)
+    mock_repo.substituir_insumos_basicos.side_effect = lambda linhas, mes, fonte: len(linhas)
+
+    lotes = [[
+        {"codigo_pai": "1", "codigo_filho": "500", "quantidade_coeficiente": 2.0, "tipo_item": "COMPOSICAO"},
+        {"codigo_pai": "500", "codigo_filho": "10", "quantidade_coeficiente": 3.0, "tipo_item": "INSUMO"},
+    ]]
+    with patch(
+        "app.modules.importacao.services.sinapi_excel_parser.SinapiExcelParser.identificar_aba_analitico",
+        return_value="Analítico",
+    ), patch(
+        "app.modules.importacao.services.sinapi_excel_parser.SinapiExcelParser.iterar_analitico",
+        return_value=iter(lotes),
+    ):
+        resultado = process_import_file(sinapi_excel_content, mock_repo, source_type="SINAPI")
+
+    linhas, mes, fonte = mock_repo.substituir_insumos_basicos.call_args.args
+    assert {(l["codigo_composicao"], l["codigo_insumo"], l["coeficiente"]) for l in linhas} == {
+        ("1", "10", 6.0), ("500", "10", 3.0),
+    }
+    assert fonte == "SINAPI"
+    assert resultado["imported_insumos_basicos"] == 2
+
+
+@pytest.mark.integration
+def test_process_import_file_paralelo_equivale_ao_sequencial(sinapi_excel_content: bytes):
+    """O modo paralelo grava exatamente os mesmos registros do sequencial."""
+    def _executar(paralelo: bool) -> MagicMock:
+        mock_repo = MagicMock()
+        mock_repo.upsert_batch_composicoes.side_effect = lambda dados: len(dados)
+        mock_repo.upsert_batch_estados.side_effect = lambda dados: len(dados)
+        process_import_file(
+            sinapi_excel_content, mock_repo, source_type="SINAPI",
+            paralelo=paralelo, max_workers=2,
+        )
+        return mock_repo
+
+    sequencial = _executar(False)
+    paralelo = _executar(True)
+
+    assert (
+        paralelo.upsert_batch_composicoes.call_args.args
+        == sequencial.upsert_batch_composicoes.call_args.args
+    )
+    assert (
+        paralelo.upsert_batch_estados.call_args.args
+        == sequencial.upsert_batch_estados.call_args.args
+    )
+
+
+@pytest.mark.unit
+def test_deduplicar_por_chave_precos():
+    """Preços repetidos com a mesma chave de conflito são gravados uma vez."""
+    from app.modules.importacao.services.import_service import CHAVE_PRECO, _deduplicar_por_chave
+
+    base = {"codigo_composicao": "1", "mes_referencia": "01/2024", "fonte": "SINAPI"}
+    precos = [
+        {**base, "tipo_composicao": "Sem Desoneração", "SP": 1.0},
+        {**base, "tipo_composicao": "Sem Desoneração", "SP": 2.0},
+        {**base, "tipo_composicao": "Com Desoneração", "SP": 3.0},
+    ]
+
+    resultado = _deduplicar_por_chave(precos, CHAVE_PRECO)
+
+    assert [p["SP"] for p in resultado] == [1.0, 3.0]
+
+
+@pytest.mark.unit
+def test_process_import_file_delta_pula_linhas_inalteradas(sinapi_excel_content: bytes):
+    """Reimportar o mesmo arquivo em modo delta não reenvia nenhuma linha."""
+    from app.modules.importacao.services.delta_import import chave_registro
+    from app.modules.importacao.services.import_service import CHAVE_COMPOSICAO, CHAVE_PRECO
+
+    primeira = MagicMock()
+    primeira.upsert_batch_composicoes.side_effect = lambda dados: len(dados)
+    primeira.upsert_batch_estados.side_effect = lambda dados: len(dados)
+    process_import_file(sinapi_excel_content, primeira, source_type="SINAPI")
+
+    composicoes = primeira.upsert_batch_composicoes.call_args.args[0]
+    precos = primeira.upsert_batch_estados.call_args.args[0]
+    gravados = {
+        "composicao": {chave_registro(c, CHAVE_COMPOSICAO): c["hash_conteudo"] for c in composicoes},
+        "composicao_estados": {chave_registro(p, CHAVE_PRECO): p["hash_conteudo"] for p in precos},
+    }
+    # Um preço mudou desde a última importação
+    primeiro_preco = chave_registro(precos[0], CHAVE_PRECO)
+    gravados["composicao_estados"][primeiro_preco] = "hash-antigo"
+
+    segunda = MagicMock()
+    segunda.listar_hashes.side_effect = lambda tabela, *a, **k: gravados.get(tabela, {})
+    segunda.upsert_batch_composicoes.side_effect = lambda dados: len(dados)
+    segunda.upsert_batch_estados.side_effect = lambda dados: len(dados)
+
+    resultado = process_import_file(sinapi_excel_content, segunda, source_type="SINAPI", delta=True)
+
+    assert segunda.upsert_batch_composicoes.call_args.args[0] == []
+    reenviados = segunda.upsert_batch_estados.call_args.args[0]
+    assert [chave_registro(p, CHAVE_PRECO) for p in reenviados] == [primeiro_preco]
+    assert resultado["ignorados"]["composicao"] == 2
+    assert resultado["ignorados"]["composicao_estados"] == 1
+
+
+@pytest.mark.unit
+def test_extract_metadata_repetido_nao_reabre_planilha(sinapi_excel_content: bytes):
+    """Uploads repetidos do mesmo arquivo reaproveitam a análise em cache."""
+    import pandas as pd
+
+    with patch(
+        "app.modules.importacao.services.workbook_session.pd.ExcelFile",
+        wraps=pd.ExcelFile,
+    ) as excel_file:
+        primeiro = extract_metadata(sinapi_excel_content)
+        segundo = extract_metadata(sinapi_excel_content)
+
+        mock_repo = MagicMock()
+        resultado = process_import_file(
+            sinapi_excel_content, mock_repo, source_type="SINAPI", paralelo=True, max_workers=1,
+        )
+
+    # Só o primeiro upload abre o arquivo; o import paralelo lê as abas nos processos filhos
+    assert excel_file.call_count == 1
+    assert primeiro == segundo
+    assert resultado["metadata"]["mes_referencia"] == "12/2025"
+    assert "leitura_aba:CSD_TESTE" not in resultado["estatisticas"]
@@ -55,16 +55,14 @@ def test_criar_batch_sucesso_retorna_count(repo, supabase):
 
 
 @pytest.mark.unit
-def test_criar_batch_excecao_retorna_zero(repo, supabase):
-    """Quando Supabase lança exceção → retorna 0 sem propagar."""
+def test_criar_batch_excecao_e_propagada(repo, supabase):
+    """Quando Supabase lança exceção → propaga (quem regrava não pode apagar os antigos)."""
     # Arrange
     supabase.table.return_value.insert.return_value.execute.side_effect = RuntimeError("Timeout")
 
-    # Act
-    resultado = repo.criar_batch([{"id": "x"}])
-
-    # Assert
-    assert resultado == 0
+    # Act / Assert
+    with pytest.raises(RuntimeError, match="Timeout"):
+        repo.criar_batch([{"id": "x"}])
 
 
 # ---------------------------------------------------------------------------
@@ -173,3 +171,16 @@ def test_deletar_por_item_chama_delete_eq(repo, supabase):
 
     # Assert
     supabase.table.return_value.delete.assert_called_once()
+
+
+@pytest.mark.unit
+def test_deletar_por_ids_apaga_em_grupos(repo, supabase, monkeypatch):
+    """deletar_por_ids divide os ids em grupos de TAMANHO_GRUPO_IN."""
+    from app.modules.orcamento import repositories
+
+    monkeypatch.setattr(repositories, "TAMANHO_GRUPO_IN", 2)
+
+    repo.deletar_por_ids(["a", "b", "c"])
+
+    grupos = [c.args for c in supabase.table.return_value.delete.return_value.in_.call_args_list]
+    assert grupos == [("id", ["a", "b"]), ("id", ["c"])]
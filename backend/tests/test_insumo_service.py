@@ -163,6 +163,13 @@ def test_atualizar_insumo_sem_repo_levanta_value_error(
 # _explodir_insumos
 # ---------------------------------------------------------------------------
 
+def _arvore(filhos_por_pai):
+    """side_effect de ``buscar_filhos_composicoes`` para uma árvore fixa."""
+    def buscar(codigos, mes, fonte):
+        return {c: filhos_por_pai[c] for c in codigos if c in filhos_por_pai}
+    return buscar
+
+
 @pytest.mark.unit
 def test_explodir_insumos_com_filhos_cria_batch(
     orcamento_item_service_com_insumo,
@@ -188,22 +195,97 @@ def test_explodir_insumos_com_filhos_cria_batch(
             "unidade_filho": "M3",
         }
     ]
-    item_repo_mock.buscar_filhos_composicao.return_value = filhos
-    item_repo_mock.buscar_preco.return_value = 10.0
-    insumo_repo_mock.deletar_por_item.return_value = None
+    item_repo_mock.buscar_filhos_composicoes.side_effect = _arvore({"9999": filhos})
+    item_repo_mock.buscar_precos_em_lote.return_value = {"101": 10.0}
+    insumo_repo_mock.listar_ids_por_itens.return_value = ["antigo-1"]
     insumo_repo_mock.criar_batch.return_value = 1
 
     # Act
     orcamento_item_service_com_insumo._explodir_insumos(item, orcamento, "SINAPI", "sp")
 
     # Assert
-    insumo_repo_mock.deletar_por_item.assert_called_once_with("item-1")
+    insumo_repo_mock.listar_ids_por_itens.assert_called_once_with(["item-1"])
+    insumo_repo_mock.deletar_por_ids.assert_called_once_with(["antigo-1"])
     insumo_repo_mock.criar_batch.assert_called_once()
     batch_args = insumo_repo_mock.criar_batch.call_args[0][0]
     assert len(batch_args) == 1
     assert batch_args[0]["codigo_insumo"] == "101"
     assert batch_args[0]["orcamento_item_id"] == "item-1"
     assert batch_args[0]["quantidade_unitaria"] == pytest.approx(3.0)  # 1.5 * 2.0
+    assert batch_args[0]["total"] == pytest.approx(30.0)
+
+
+@pytest.mark.unit
+def test_explodir_insumos_busca_precos_em_uma_consulta(
+    orcamento_item_service_com_insumo,
+    item_repo_mock,
+    insumo_repo_mock,
+):
+    """Todos os filhos têm o preço resolvido numa única busca em lote."""
+    # Arrange
+    item = {"id": "item-1", "codigo_composicao": "9999", "quantidade": 1.0}
+    orcamento = {"base_referencia": "12/2025", "tipo_composicao": "Sem Desoneração"}
+    item_repo_mock.buscar_filhos_composicoes.side_effect = _arvore({"9999": [
+        {"codigo_filho": str(c), "quantidade_coeficiente": 1.0, "tipo_item": "INSUMO"}
+        for c in range(30)
+    ] + [{"codigo_filho": "zero", "quantidade_coeficiente": 0}]})
+    item_repo_mock.buscar_precos_em_lote.return_value = {str(c): 2.0 for c in range(29)}
+
+    # Act
+    relatorio = orcamento_item_service_com_insumo._explodir_insumos(
+        item, orcamento, "SINAPI", "sp"
+    )
+
+    # Assert
+    item_repo_mock.buscar_preco.assert_not_called()
+    item_repo_mock.buscar_precos_em_lote.assert_called_once_with(
+        [str(c) for c in range(30)], "sp", "12/2025", "Sem Desoneração", "SINAPI"
+    )
+    insumo_repo_mock.criar_batch.assert_called_once()
+    batch_args = insumo_repo_mock.criar_batch.call_args[0][0]
+    assert len(batch_args) == 30
+    assert batch_args[-1]["preco_unitario_base"] is None
+    assert batch_args[-1]["total"] is None
+    assert relatorio["insumos"] == 30
+    assert set(relatorio["tempos_ms"]) == {"filhos", "precos", "gravacao"}
+    # Filhos do tipo INSUMO não são consultados como composições
+    item_repo_mock.buscar_filhos_composicoes.assert_called_once()
+
+
+@pytest.mark.unit
+def test_explodir_insumos_desce_subcomposicoes(
+    orcamento_item_service_com_insumo,
+    item_repo_mock,
+    insumo_repo_mock,
+):
+    """Filho do tipo COMPOSICAO é expandido até os insumos básicos."""
+    # Arrange
+    item = {"id": "item-1", "codigo_composicao": "9999", "quantidade": 2.0}
+    orcamento = {"base_referencia": "12/2025", "tipo_composicao": "Sem Desoneração"}
+    item_repo_mock.buscar_filhos_composicoes.side_effect = _arvore({
+        "9999": [
+            {"codigo_filho": "5000", "quantidade_coeficiente": 0.5, "tipo_item": "COMPOSICAO"},
+            {"codigo_filho": "101", "quantidade_coeficiente": 1.0, "tipo_item": "INSUMO",
+             "descricao_filho": "Areia", "unidade_filho": "M3"},
+        ],
+        "5000": [
+            {"codigo_filho": "101", "quantidade_coeficiente": 2.0, "tipo_item": "INSUMO",
+             "descricao_filho": "Areia", "unidade_filho": "M3"},
+            {"codigo_filho": "102", "quantidade_coeficiente": 4.0, "tipo_item": "INSUMO",
+             "descricao_filho": "Cimento", "unidade_filho": "KG"},
+        ],
+    })
+    item_repo_mock.buscar_precos_em_lote.return_value = {"101": 10.0, "102": 1.0}
+
+    # Act
+    orcamento_item_service_com_insumo._explodir_insumos(item, orcamento, "SINAPI", "sp")
+
+    # Assert — 101: (1.0 + 0.5*2.0) * 2 ; 102: 0.5*4.0 * 2
+    batch = {i["codigo_insumo"]: i for i in insumo_repo_mock.criar_batch.call_args[0][0]}
+    assert set(batch) == {"101", "102"}
+    assert batch["101"]["quantidade_unitaria"] == pytest.approx(4.0)
+    assert batch["102"]["quantidade_unitaria"] == pytest.approx(4.0)
+    assert batch["102"]["unidade"] == "KG"
 
 
 @pytest.mark.unit
@@ -216,13 +298,13 @@ def test_explodir_insumos_sem_filhos_nao_chama_batch(
     # Arrange
     item = {"id": "item-1", "codigo_composicao": "0000", "quantidade": 1.0}
     orcamento = {"base_referencia": "12/2025", "tipo_composicao": "Sem Desoneração"}
-    item_repo_mock.buscar_filhos_composicao.return_value = []
+    item_repo_mock.buscar_filhos_composicoes.side_effect = _arvore({})
 
     # Act
     orcamento_item_service_com_insumo._explodir_insumos(item, orcamento, "SINAPI", "sp")
 
     # Assert
-    insumo_repo_mock.deletar_por_item.assert_not_called()
+    insumo_repo_mock.deletar_por_ids.assert_not_called()
     insumo_repo_mock.criar_batch.assert_not_called()
 
 
@@ -236,7 +318,7 @@ def test_explodir_insumos_falha_silenciosa(
     # Arrange
     item = {"id": "item-1", "codigo_composicao": "9999", "quantidade": 1.0}
     orcamento = {"base_referencia": "12/2025", "tipo_composicao": "Sem Desoneração"}
-    item_repo_mock.buscar_filhos_composicao.side_effect = RuntimeError("Erro de rede")
+    item_repo_mock.buscar_filhos_composicoes.side_effect = RuntimeError("Erro de rede")
 
     # Act — não deve levantar exceção
     orcamento_item_service_com_insumo._explodir_insumos(item, orcamento, "SINAPI", "sp")
@@ -276,3 +276,184 @@ def test_upsert_batch_composicao_itens_salva_hierarquias(repo, supabase):
 
     # Assert
     assert resultado == 1
+
+
+# ---------------------------------------------------------------------------
+# BulkUpsertWriter (lotes concorrentes com retentativa)
+# ---------------------------------------------------------------------------
+
+def _repo_com_writer(supabase, **kwargs):
+    from app.modules.item.bulk_writer import BulkUpsertWriter
+
+    writer = BulkUpsertWriter(supabase, dormir=lambda _: None, **kwargs)
+    return ItemRepository(supabase, writer=writer)
+
+
+@pytest.mark.unit
+def test_upsert_batch_estados_refaz_lote_com_falha(supabase):
+    """Lote que falha é reenviado e contabilizado em retentativas."""
+    dados = [{"codigo_composicao": "100", "mes_referencia": "12/2025"}]
+    upsert = supabase.table.return_value.upsert.return_value
+    upsert.execute.side_effect = [Exception("timeout"), MagicMock(data=dados)]
+    repo = _repo_com_writer(supabase, tentativas=3)
+
+    assert repo.upsert_batch_estados(dados) == 1
+    assert repo.relatorio_upsert()["composicao_estados"] == {
+        "gravadas": 1, "falhas": 0, "retentativas": 1, "lotes": 1,
+    }
+
+
+@pytest.mark.unit
+def test_upsert_batch_composicao_itens_conta_linhas_perdidas(supabase):
+    """Lote que esgota as tentativas é contado como falha, sem interromper os demais."""
+    dados = [{"codigo_pai": "1", "codigo_filho": str(i)} for i in range(4)]
+    def _upsert(lote, on_conflict):
+        chamada = MagicMock()
+        if lote[0]["codigo_filho"] == "0":
+            chamada.execute.side_effect = Exception("erro permanente")
+        else:
+            chamada.execute.return_value.data = lote
+        return chamada
+
+    supabase.table.return_value.upsert.side_effect = _upsert
+    repo = _repo_com_writer(supabase, tentativas=2, bytes_por_lote=1, max_em_voo=3)
+
+    assert repo.upsert_batch_composicao_itens(dados) == 3
+    relatorio = repo.relatorio_upsert()["composicao_itens"]
+    assert relatorio == {"gravadas": 3, "falhas": 1, "retentativas": 1, "lotes": 4}
+
+
+@pytest.mark.unit
+def test_substituir_insumos_basicos_grava_antes_de_apagar_obsoletas(supabase):
+    """Upsert primeiro; depois só as linhas fora do novo conjunto são apagadas."""
+    linhas = [
+        {"codigo_composicao": "1", "codigo_insumo": "10", "coeficiente": 2.0},
+        {"codigo_composicao": "2", "codigo_insumo": "20", "coeficiente": 1.0},
+    ]
+    tabela = supabase.table.return_value
+    tabela.upsert.return_value.execute.return_value.data = linhas
+    leitura = tabela.select.return_value.eq.return_value.eq.return_value.order.return_value.order.return_value
+    leitura.range.return_value.execute.return_value.data = [
+        {"codigo_composicao": "1", "codigo_insumo": "10"},
+        {"codigo_composicao": "1", "codigo_insumo": "11"},
+        {"codigo_composicao": "2", "codigo_insumo": "20"},
+        {"codigo_composicao": "3", "codigo_insumo": "30"},
+    ]
+    apagar = tabela.delete.return_value.eq.return_value.eq.return_value
+    repo = _repo_com_writer(supabase)
+
+    assert repo.substituir_insumos_basicos(linhas, "12/2025") == 2
+
+    nomes = [c[0] for c in tabela.method_calls if c[0] in ("upsert", "delete")]
+    assert nomes[0] == "upsert" and "delete" in nomes
+    apagar.in_.assert_called_once_with("codigo_composicao", ["3"])
+    apagar.eq.assert_called_once_with("codigo_composicao", "1")
+    apagar.eq.return_value.in_.assert_called_once_with("codigo_insumo", ["11"])
+
+
+@pytest.mark.unit
+def test_substituir_insumos_basicos_com_lote_perdido_nao_apaga_nada(supabase):
+    linhas = [{"codigo_composicao": "1", "codigo_insumo": "10", "coeficiente": 2.0}]
+    supabase.table.return_value.upsert.return_value.execute.side_effect = Exception("timeout")
+    repo = _repo_com_writer(supabase, tentativas=2)
+
+    with pytest.raises(Exception, match="Falha ao gravar 1 de 1 insumos básicos"):
+        repo.substituir_insumos_basicos(linhas, "12/2025")
+
+    supabase.table.return_value.delete.assert_not_called()
+
+
+@pytest.mark.unit
+def test_bulk_writer_lote_limitado_por_bytes(supabase):
+    """Linhas grandes reduzem o tamanho do lote abaixo de max_linhas."""
+    from app.modules.item.bulk_writer import BulkUpsertWriter
+
+    writer = BulkUpsertWriter(supabase, bytes_por_lote=10_000)
+    dados = [{"descricao": "x" * 1000}] * 100
+
+    assert writer.linhas_por_lote(dados, max_linhas=1000) == 9
+
+
+# ---------------------------------------------------------------------------
+# listar_hashes (importação delta)
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_listar_hashes_pagina_ate_o_fim(repo, supabase):
+    """Lê páginas até receber uma incompleta e indexa pela chave de upsert."""
+    chain = supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.range.return_value.execute.side_effect = [
+        MagicMock(data=[
+            {"codigo_composicao": "1", "mes_referencia": "01/2024", "fonte": "SINAPI", "hash_conteudo": "a"},
+            {"codigo_composicao": "2", "mes_referencia": "01/2024", "fonte": "SINAPI", "hash_conteudo": "b"},
+        ]),
+        MagicMock(data=[
+            {"codigo_composicao": "3", "mes_referencia": "01/2024", "fonte": "SINAPI", "hash_conteudo": None},
+        ]),
+    ]
+
+    hashes = repo.listar_hashes(
+        "composicao", ("codigo_composicao", "mes_referencia", "fonte"),
+        "01/2024", "SINAPI", tamanho_pagina=2,
+    )
+
+    assert hashes == {("1", "01/2024", "SINAPI"): "a", ("2", "01/2024", "SINAPI"): "b"}
+    assert chain.range.call_args_list == [call(0, 1), call(2, 3)]
+
+
+# ---------------------------------------------------------------------------
+# buscar_precos_em_lote
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_buscar_precos_em_lote_uma_consulta_e_fallback(repo, supabase):
+    """Base pedida numa consulta ``in``; ausentes resolvidos pelo mês mais recente."""
+    chain = supabase.table.return_value.select.return_value
+    chain.in_.return_value = chain
+    chain.eq.return_value = chain
+    chain.ilike.return_value = chain
+    chain.execute.side_effect = [
+        MagicMock(data=[{"codigo_composicao": "100", "sp": 10.0}]),
+        MagicMock(data=[
+            {"codigo_composicao": "200", "mes_referencia": "01/2024", "sp": 5.0},
+            {"codigo_composicao": "200", "mes_referencia": "06/2025", "sp": 7.0},
+        ]),
+    ]
+
+    precos = repo.buscar_precos_em_lote(["100", "200", "300", "100"], "SP", "12/2025", "Sem Desoneração")
+
+    assert precos == {"100": 10.0, "200": 7.0, "300": None}
+    assert chain.execute.call_count == 2
+    assert chain.in_.call_args_list[0] == call("codigo_composicao", ["100", "200", "300"])
+    assert chain.in_.call_args_list[1] == call("codigo_composicao", ["200", "300"])
+
+
+@pytest.mark.unit
+def test_buscar_precos_em_lote_estado_invalido_nao_consulta(repo, supabase):
+    """Um estado fora de ESTADOS não chega ao select (seria nome de coluna)."""
+    precos = repo.buscar_precos_em_lote(["100"], "sp,senha", "12/2025", "Sem Desoneração")
+
+    assert precos == {"100": None}
+    supabase.table.assert_not_called()
+
+
+@pytest.mark.unit
+def test_buscar_precos_em_lote_meses_alternativos(repo):
+    """Com meses separados por vírgula, só os códigos sem preço vão ao mês seguinte."""
+    respostas = {
+        "12/2025": {"100": 1.0, "200": None},
+        "11/2025": {"200": 2.0},
+    }
+    repo.buscar_precos_em_lote = MagicMock(
+        side_effect=lambda codigos, estado, mes, tipo, fonte: respostas[mes],
+        wraps=repo.buscar_precos_em_lote,
+    )
+
+    precos = ItemRepository.buscar_precos_em_lote(
+        repo, ["100", "200"], "sp", "12/2025, 11/2025", "Sem Desoneração",
+    )
+
+    assert precos == {"100": 1.0, "200": 2.0}
+    assert repo.buscar_precos_em_lote.call_args_list[1].args[0] == ["200"]
@@ -0,0 +1,140 @@
+"""
+Unit tests for core.jobs — fila local de tarefas em segundo plano.
+"""
+import sqlite3
+import time
+
+import pytest
+from core.jobs import (
+    ERRO_INTERROMPIDA, STATUS_CONCLUIDO, STATUS_ERRO, STATUS_EXECUTANDO, STATUS_PENDENTE, JobManager,
+)
+
+
+@pytest.fixture
+def manager():
+    m = JobManager(max_workers=1)
+    yield m
+    m.encerrar()
+
+
+def _aguardar(manager: JobManager, job_id: str) -> dict:
+    return manager.aguardar(job_id, timeout=5)
+
+
+@pytest.mark.unit
+def test_job_concluido_guarda_resultado_e_progresso(manager):
+    """A função recebe o relator de progresso e o retorno vira o resultado."""
+    def tarefa(progresso, n):
+        progresso("leitura", lidas={"composicao": n})
+        progresso("gravacao", gravadas={"composicao": n - 1})
+        progresso("gravacao", gravadas={"composicao": 1}, arquivo="CSD.xlsx")
+        return {"total": n}
+
+    job_id = manager.submeter("teste", tarefa, 10)
+    job = _aguardar(manager, job_id)
+
+    assert job["status"] == STATUS_CONCLUIDO
+    assert job["etapa"] == "gravacao"
+    assert job["resultado"] == {"total": 10}
+    assert job["progresso"] == {
+        "linhas_lidas": {"composicao": 10},
+        "linhas_gravadas": {"composicao": 10},
+        "arquivo": "CSD.xlsx",
+    }
+    assert job["tempo_decorrido_s"] >= 0
+
+
+@pytest.mark.unit
+def test_job_com_excecao_registra_erro(manager):
+    def tarefa(progresso):
+        raise ValueError("planilha inválida")
+
+    job = _aguardar(manager, manager.submeter("teste", tarefa))
+
+    assert job["status"] == STATUS_ERRO
+    assert job["erro"] == "planilha inválida"
+    assert job["resultado"] is None
+
+
+@pytest.mark.unit
+def test_obter_job_inexistente_retorna_none(manager):
+    assert manager.obter("nao-existe") is None
+
+
+@pytest.mark.unit
+def test_jobs_finalizados_antigos_sao_descartados():
+    """Só os ``max_jobs_retidos`` mais recentes continuam consultáveis."""
+    manager = JobManager(max_workers=1, max_jobs_retidos=1)
+    primeiro = manager.submeter("teste", lambda progresso: 1)
+    manager.aguardar(primeiro, timeout=5)
+    segundo = manager.submeter("teste", lambda progresso: 2)
+    manager.aguardar(segundo, timeout=5)
+    manager._limpar_antigos()
+    manager.encerrar()
+
+    assert manager.obter(primeiro) is None
+    assert manager.obter(segundo)["resultado"] == 2
+
+
+@pytest.mark.unit
+def test_tarefa_e_visivel_por_outro_worker_no_mesmo_arquivo(tmp_path):
+    """Com o banco em arquivo, a consulta pode cair em outro processo (worker)."""
+    caminho = str(tmp_path / "jobs.sqlite3")
+    worker_a = JobManager(db_path=caminho, max_workers=1)
+    worker_b = JobManager(db_path=caminho, max_workers=1)
+
+    job_id = worker_a.submeter("teste", lambda progresso: {"ok": True})
+    worker_a.aguardar(job_id, timeout=5)
+    worker_a.encerrar()
+    worker_b.encerrar()
+
+    assert worker_b.obter(job_id)["resultado"] == {"ok": True}
+
+
+@pytest.mark.unit
+def test_inicializacao_marca_tarefas_interrompidas_como_erro(tmp_path, monkeypatch):
+    """Tarefas deixadas pendentes/em execução por um processo morto viram erro;
+    as atualizadas há pouco (outro worker vivo) continuam como estão."""
+    caminho = str(tmp_path / "jobs.sqlite3")
+    antigo = JobManager(db_path=caminho, max_workers=1)
+    antigo.encerrar()
+    agora = time.time()
+    with antigo._conn:
+        antigo._conn.executemany(
+            "INSERT INTO jobs (id, tipo, status, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+            [
+                ("parada", "importacao", STATUS_EXECUTANDO, agora - 3600, agora - 1000),
+                ("na_fila", "exportacao", STATUS_PENDENTE, agora - 1000, agora - 1000),
+                ("viva", "importacao", STATUS_EXECUTANDO, agora - 3600, agora - 10),
+            ],
+        )
+
+    novo = JobManager(db_path=caminho, max_workers=1, interrompida_apos=900)
+    novo.encerrar()
+
+    for job_id in ("parada", "na_fila"):
+        job = novo.obter(job_id)
+        assert (job["status"], job["erro"]) == (STATUS_ERRO, ERRO_INTERROMPIDA)
+    assert novo.obter("viva")["status"] == STATUS_EXECUTANDO
+
+
+@pytest.mark.unit
+def test_arquivo_sem_coluna_atualizado_em_e_migrado(tmp_path):
+    """Um arquivo de uma versão anterior ganha a coluna na inicialização."""
+    caminho = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(caminho) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, tipo TEXT NOT NULL, status TEXT NOT NULL, etapa TEXT,"
+            " progresso TEXT NOT NULL DEFAULT '{}', resultado TEXT, erro TEXT, criado_em REAL NOT NULL,"
+            " iniciado_em REAL, finalizado_em REAL)"
+        )
+        conn.execute("INSERT INTO jobs (id, tipo, status, criado_em) VALUES ('velha', 'importacao', 'executando', 0)")
+    conn.close()
+
+    manager = JobManager(db_path=caminho, max_workers=1)
+    job_id = manager.submeter("teste", lambda progresso: 1)
+    manager.aguardar(job_id, timeout=5)
+    manager.encerrar()
+
+    assert manager.obter("velha")["status"] == STATUS_ERRO
+    assert manager.obter(job_id)["status"] == STATUS_CONCLUIDO
@@ -0,0 +1,125 @@
+"""
+Unit tests da exportação Excel do orçamento (escrita write-only em streaming).
+"""
+import io
+
+import openpyxl
+import pytest
+
+from app.modules.orcamento.export import (
+    SEM_ETAPA,
+    escrever_planilha_completa,
+    gerar_planilha_orcamento_arquivo,
+    gerar_planilha_orcamento_excel,
+    iterar_arquivo,
+)
+
+ORCAMENTO = {"nome": "Escola", "cliente": "Prefeitura", "base_referencia": "01/2026", "bdi": 20}
+
+
+def _itens(qtd):
+    for i in range(qtd):
+        yield {"codigo_composicao": str(100 + i), "descricao": f"Serviço {i}", "unidade": "M2",
+               "quantidade": 2, "preco_unitario": 10.0}
+
+
+@pytest.mark.unit
+def test_planilha_tem_itens_total_e_estilos_nomeados():
+    ws = openpyxl.load_workbook(io.BytesIO(gerar_planilha_orcamento_excel(ORCAMENTO, _itens(3)))).active
+
+    linhas = list(ws.iter_rows(values_only=True))
+    assert linhas[3][0] == "Item"
+    assert [l[1] for l in linhas[4:7]] == ["100", "101", "102"]
+    assert linhas[7][2] == "TOTAL GERAL DO ORÇAMENTO" and linhas[7][6] == 60.0
+    assert ws["G5"].style == "orc_moeda" and ws["G5"].number_format == "R$ #,##0.00"
+    assert ws.column_dimensions["C"].width == 50
+
+
+@pytest.mark.unit
+def test_arquivo_consome_gerador_e_e_lido_em_blocos():
+    consumidos = []
+
+    def itens():
+        for item in _itens(50):
+            consumidos.append(item["codigo_composicao"])
+            yield item
+
+    arquivo = gerar_planilha_orcamento_arquivo(ORCAMENTO, itens())
+    blocos = list(iterar_arquivo(arquivo, tamanho_bloco=1024))
+
+    assert len(consumidos) == 50
+    assert len(blocos) > 1
+    assert arquivo.closed
+    ws = openpyxl.load_workbook(io.BytesIO(b"".join(blocos))).active
+    assert ws.max_row == 4 + 50 + 1
+
+
+@pytest.mark.unit
+def test_planilha_completa_agrupa_por_etapa_e_busca_insumos_em_lote():
+    etapas = [{"id": "e1", "nome": "Fundação"}, {"id": "e2", "nome": "Estrutura"}]
+    itens = [
+        {"id": "i1", "etapa_id": "e2", "codigo_composicao": "200", "descricao": "Pilar", "unidade": "M3",
+         "quantidade": 1, "preco_unitario": 100.0, "preco_total": 100.0},
+        {"id": "i2", "etapa_id": "e1", "codigo_composicao": "100", "descricao": "Sapata", "unidade": "M3",
+         "quantidade": 2, "preco_unitario": 50.0, "preco_total": 100.0},
+        {"id": "i3", "etapa_id": None, "codigo_composicao": "300", "descricao": "Limpeza", "unidade": "M2",
+         "quantidade": 1, "preco_unitario": 5.0, "preco_total": 5.0},
+    ]
+    consultas = []
+
+    def buscar_insumos(item_ids):
+        consultas.append(list(item_ids))
+        return [{"orcamento_item_id": "i2", "codigo_insumo": "88309", "descricao": "Pedreiro",
+                 "unidade": "H", "quantidade_unitaria": 3, "preco_unitario_base": 20.0,
+                 "preco_unitario_custom": 25.0, "total": 75.0}]
+
+    curva = {"valor_total": 75.0, "resumo_classes": {"A": 75.0, "B": 0.0, "C": 0.0},
+             "insumos": [{"classe": "A", "codigo_insumo": "88309", "descricao": "Pedreiro", "unidade": "H",
+                          "quantidade": 3, "total": 75.0, "porcentagem": 100.0, "acumulado": 100.0}]}
+    destino = io.BytesIO()
+    qtd = escrever_planilha_completa(destino, ORCAMENTO, etapas, itens, buscar_insumos, curva, None)
+
+    wb = openpyxl.load_workbook(io.BytesIO(destino.getvalue()))
+    assert qtd == 3
+    assert consultas == [["i2", "i1", "i3"]]
+    assert wb.sheetnames == ["Sintético por Etapa", "Analítico", "Curva ABC"]
+
+    sintetico = list(wb["Sintético por Etapa"].iter_rows(min_row=5, values_only=True))
+    assert [(l[0], l[2], l[6]) for l in sintetico] == [
+        ("1", "Fundação", 100.0), ("1.1", "Sapata", 100.0),
+        ("2", "Estrutura", 100.0), ("2.1", "Pilar", 100.0),
+        ("3", SEM_ETAPA, 5.0), ("3.1", "Limpeza", 5.0),
+        (None, "TOTAL GERAL DO ORÇAMENTO", 205.0),
+    ]
+    assert wb["Sintético por Etapa"]["A5"].style == "orc_etapa"
+
+    analitico = list(wb["Analítico"].iter_rows(min_row=5, values_only=True))
+    assert analitico[0][0] == "1.1"
+    assert analitico[1][1:] == ("88309", "Pedreiro", "H", 3.0, 25.0, 75.0)
+    assert [l[0] for l in analitico[2:]] == ["2.1", "3.1"]
+
+
+@pytest.mark.unit
+def test_chave_da_planilha_completa_sem_data_muda_com_o_dia(monkeypatch):
+    """Sem ``data`` no orçamento o cronograma parte do dia da geração; o cache não pode atravessar dias."""
+    from datetime import date
+
+    from app.modules.orcamento import export_cache
+
+    class _Hoje(date):
+        dia = date(2026, 1, 10)
+
+        @classmethod
+        def today(cls):
+            return cls.dia
+
+    monkeypatch.setattr(export_cache, "date", _Hoje)
+    sem_data = {"id": "orc-1", "updated_at": "2026-01-01T00:00:00"}
+    com_data = {**sem_data, "data": "2026-01-05"}
+
+    chave_ontem = export_cache.chave_exportacao(sem_data, "xlsx-completo")
+    _Hoje.dia = date(2026, 1, 11)
+
+    assert export_cache.chave_exportacao(sem_data, "xlsx-completo") != chave_ontem
+    assert export_cache.chave_exportacao(com_data, "xlsx-completo") == ("orc-1", "xlsx-completo", "2026-01-01T00:00:00")
+    assert export_cache.chave_exportacao(sem_data, "pdf") == ("orc-1", "pdf", "2026-01-01T00:00:00")
@@ -39,6 +39,11 @@ def test_adicionar_item(client, mock_supabase):
     # Mock Item Price (ItemRepository)
     # listar_estados_por_item -> .select().eq().execute()
     mock_itens_table.select.return_value.eq.return_value.execute.return_value.data = [{"sp": 50.0}]
+    # Carga da base no índice de preços -> .select().eq().ilike().eq().order().range().execute()
+    carga_base = mock_itens_table.select.return_value.eq.return_value.ilike.return_value.eq.return_value
+    carga_base.order.return_value.range.return_value.execute.return_value.data = [
+        {"codigo_composicao": "CODE-123", "sp": 50.0}
+    ]
     
     mock_response_db = {
         "id": "item-1",
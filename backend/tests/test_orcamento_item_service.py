@@ -155,3 +155,428 @@ def test_remover_item(
 
     orcamento_item_repo_mock.deletar.assert_called_once_with("item1")
     orcamento_repo_mock.atualizar.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# valor_total incremental
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_adicionar_item_aplica_delta_sem_somar_itens(
+    orcamento_item_service,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+):
+    """Com valor_total gravado, só a contribuição do novo item (com BDI) é somada."""
+    orcamento_repo_mock.buscar_por_id.return_value = {
+        **_make_orcamento(), "bdi": 10.0, "valor_total": 110.0,
+    }
+    item_repo_mock.buscar_por_codigo.return_value = [{"codigo_composicao": "12345"}]
+    item_repo_mock.buscar_preco.return_value = 10.0
+    orcamento_item_repo_mock.criar.return_value = {"id": "item1"}
+
+    orcamento_item_service.adicionar_item(
+        "orc1", OrcamentoItemCreate(codigo_composicao="12345", quantidade=2.0, descricao="T", unidade="un"),
+    )
+
+    orcamento_item_repo_mock.calcular_total_itens.assert_not_called()
+    args_upd, _ = orcamento_repo_mock.atualizar.call_args
+    assert args_upd[1]["valor_total"] == pytest.approx(132.0)  # 110 + 20 * 1.1
+
+
+@pytest.mark.unit
+def test_remover_item_subtrai_total_do_item(
+    orcamento_item_service,
+    orcamento_item_repo_mock,
+    orcamento_repo_mock,
+):
+    orcamento_item_repo_mock.buscar_por_id.return_value = {"id": "item1", "preco_total": 30.0}
+    orcamento_repo_mock.buscar_por_id.return_value = {"id": "orc1", "bdi": 0.0, "valor_total": 100.0}
+
+    orcamento_item_service.remover_item("orc1", "item1")
+
+    orcamento_item_repo_mock.calcular_total_itens.assert_not_called()
+    args_upd, _ = orcamento_repo_mock.atualizar.call_args
+    assert args_upd[1]["valor_total"] == pytest.approx(70.0)
+
+
+@pytest.mark.unit
+def test_valor_total_reconcilia_periodicamente(
+    orcamento_item_service,
+    orcamento_item_repo_mock,
+    orcamento_repo_mock,
+    monkeypatch,
+):
+    """A cada N incrementos o total é recalculado a partir da soma dos itens."""
+    from core.config import settings
+    monkeypatch.setattr(settings, "ORCAMENTO_RECONCILIAR_A_CADA", 3)
+    orcamento_item_repo_mock.buscar_por_id.return_value = {"id": "item1", "preco_total": 1.0}
+    orcamento_repo_mock.buscar_por_id.return_value = {"id": "orc1", "bdi": 0.0, "valor_total": 50.0}
+    orcamento_item_repo_mock.calcular_total_itens.return_value = 42.0
+
+    for _ in range(3):
+        orcamento_item_service.remover_item("orc1", "item1")
+
+    orcamento_item_repo_mock.calcular_total_itens.assert_called_once_with("orc1")
+    args_upd, _ = orcamento_repo_mock.atualizar.call_args
+    assert args_upd[1]["valor_total"] == 42.0
+
+
+# ---------------------------------------------------------------------------
+# processar_lote
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_processar_lote_usa_consultas_em_lote_e_reporta_por_linha(
+    orcamento_item_service,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+):
+    from app.modules.orcamento.schemas import OrcamentoItensLoteRequest
+
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.buscar_por_ids.return_value = [
+        {"id": "item1", "codigo_composicao": "111", "quantidade": 1.0, "preco_unitario": 5.0,
+         "preco_total": 5.0, "estado": "sp", "fonte": "SINAPI"},
+        {"id": "item2", "codigo_composicao": "222", "quantidade": 1.0, "preco_total": 7.0},
+    ]
+    item_repo_mock.buscar_por_codigos.return_value = {
+        "12345": {"codigo_composicao": "12345", "descricao": "Tijolo", "unidade": "un"},
+    }
+    item_repo_mock.buscar_precos_em_lote.return_value = {"12345": 10.0, "99999": None}
+    orcamento_item_repo_mock.criar_batch.side_effect = lambda linhas: [
+        {**linha, "id": f"novo{i}"} for i, linha in enumerate(linhas)
+    ]
+    orcamento_item_repo_mock.upsert_batch.side_effect = lambda linhas: linhas
+    orcamento_item_repo_mock.calcular_total_itens.return_value = 65.0
+
+    lote = OrcamentoItensLoteRequest(
+        criar=[
+            OrcamentoItemCreate(codigo_composicao="12345", quantidade=2.0, descricao="", unidade=""),
+            OrcamentoItemCreate(codigo_composicao="99999", quantidade=1.0, descricao="X", unidade="un"),
+        ],
+        atualizar=[{"id": "item1", "quantidade": 4.0}, {"id": "nao-existe", "quantidade": 1.0}],
+        remover=["item2"],
+    )
+
+    resultado = orcamento_item_service.processar_lote("orc1", lote)
+
+    item_repo_mock.buscar_por_codigos.assert_called_once()
+    item_repo_mock.buscar_precos_em_lote.assert_called_once()
+    item_repo_mock.buscar_preco.assert_not_called()
+    orcamento_item_repo_mock.criar_batch.assert_called_once()
+    orcamento_item_repo_mock.deletar_batch.assert_called_once_with(["item2"])
+    orcamento_item_repo_mock.calcular_total_itens.assert_called_once_with("orc1")
+
+    (novo,) = orcamento_item_repo_mock.criar_batch.call_args.args[0]
+    assert novo["descricao"] == "Tijolo" and novo["preco_total"] == 20.0
+    (atualizado,) = orcamento_item_repo_mock.upsert_batch.call_args.args[0]
+    assert atualizado["id"] == "item1" and atualizado["preco_total"] == 20.0
+
+    status = [(r["operacao"], r["indice"], r["sucesso"]) for r in resultado["resultados"]]
+    assert status == [
+        ("criar", 0, True), ("criar", 1, False),
+        ("atualizar", 0, True), ("atualizar", 1, False),
+        ("remover", 0, True),
+    ]
+    assert "Composição 99999 não encontrada" in resultado["resultados"][1]["erro"]
+    assert (resultado["criados"], resultado["atualizados"], resultado["removidos"]) == (1, 1, 1)
+    assert resultado["falhas"] == 2
+    assert resultado["valor_total"] == 65.0
+
+
+@pytest.mark.unit
+def test_processar_lote_rejeita_id_repetido_em_atualizar(
+    orcamento_item_service,
+    orcamento_repo_mock,
+    orcamento_item_repo_mock,
+):
+    """O upsert recebe cada id uma vez só; a repetição vira erro na própria linha."""
+    from app.modules.orcamento.schemas import OrcamentoItensLoteRequest
+
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.buscar_por_ids.return_value = [
+        {"id": "item1", "codigo_composicao": "111", "quantidade": 1.0, "preco_unitario": 5.0, "preco_total": 5.0},
+        {"id": "item2", "codigo_composicao": "222", "quantidade": 1.0, "preco_unitario": 2.0, "preco_total": 2.0},
+    ]
+    orcamento_item_repo_mock.upsert_batch.side_effect = lambda linhas: linhas
+    orcamento_item_repo_mock.calcular_total_itens.return_value = 12.0
+
+    resultado = orcamento_item_service.processar_lote("orc1", OrcamentoItensLoteRequest(atualizar=[
+        {"id": "item1", "quantidade": 2.0},
+        {"id": "item2", "quantidade": 1.0},
+        {"id": "item1", "quantidade": 3.0},
+    ]))
+
+    (linhas,) = [c.args[0] for c in orcamento_item_repo_mock.upsert_batch.call_args_list]
+    assert [(l["id"], l["quantidade"]) for l in linhas] == [("item1", 2.0), ("item2", 1.0)]
+    status = [(r["indice"], r["sucesso"]) for r in resultado["resultados"]]
+    assert status == [(0, True), (1, True), (2, False)]
+    assert "repetido" in resultado["resultados"][2]["erro"]
+    assert (resultado["atualizados"], resultado["falhas"]) == (2, 1)
+
+
+@pytest.mark.unit
+def test_processar_lote_reexplode_insumos_ao_mudar_estado(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+):
+    """Trocar só o estado reprecifica o item e regrava os insumos com os preços do novo estado."""
+    from app.modules.orcamento.schemas import OrcamentoItensLoteRequest
+
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.buscar_por_ids.return_value = [
+        {"id": "item1", "codigo_composicao": "111", "quantidade": 1.0, "estado": "sp", "fonte": "SINAPI",
+         "preco_unitario": 5.0, "preco_total": 5.0},
+    ]
+    item_repo_mock.buscar_por_codigos.return_value = {"111": {"codigo_composicao": "111"}}
+    item_repo_mock.buscar_insumos_basicos.side_effect = lambda codigo, mes, fonte: [
+        {"codigo_insumo": "cimento", "coeficiente": 2.0, "unidade": "KG"},
+    ]
+    item_repo_mock.buscar_precos_em_lote.return_value = {"111": 7.0, "cimento": 0.8}
+    orcamento_item_repo_mock.upsert_batch.side_effect = lambda linhas: linhas
+
+    orcamento_item_service_com_insumo.processar_lote("orc1", OrcamentoItensLoteRequest(atualizar=[
+        {"id": "item1", "estado": "RJ"},
+    ]))
+
+    insumo_repo_mock.criar_batch.assert_called_once()
+    (insumo,) = insumo_repo_mock.criar_batch.call_args.args[0]
+    assert (insumo["orcamento_item_id"], insumo["preco_unitario_base"]) == ("item1", 0.8)
+    estados = [c.args[1] for c in item_repo_mock.buscar_precos_em_lote.call_args_list]
+    assert estados == ["rj", "rj"]
+
+
+@pytest.mark.unit
+def test_processar_lote_explode_insumos_de_todos_os_itens_juntos(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+):
+    from app.modules.orcamento.schemas import OrcamentoItensLoteRequest
+
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.buscar_por_ids.return_value = []
+    item_repo_mock.buscar_por_codigos.return_value = {"A": {"codigo_composicao": "A"}, "B": {"codigo_composicao": "B"}}
+    item_repo_mock.buscar_insumos_basicos.side_effect = lambda codigo, mes, fonte: [
+        {"codigo_insumo": "cimento", "coeficiente": 2.0, "unidade": "KG"},
+    ]
+    item_repo_mock.buscar_precos_em_lote.return_value = {"A": 1.0, "B": 2.0, "cimento": 0.5}
+    orcamento_item_repo_mock.criar_batch.side_effect = lambda linhas: [
+        {**linha, "id": f"novo{i}"} for i, linha in enumerate(linhas)
+    ]
+
+    orcamento_item_service_com_insumo.processar_lote("orc1", OrcamentoItensLoteRequest(criar=[
+        OrcamentoItemCreate(codigo_composicao="A", quantidade=1.0, descricao="a", unidade="un"),
+        OrcamentoItemCreate(codigo_composicao="B", quantidade=3.0, descricao="b", unidade="un"),
+    ]))
+
+    insumo_repo_mock.listar_ids_por_itens.assert_called_with(["novo0", "novo1"])
+    insumo_repo_mock.criar_batch.assert_called_once()
+    insumos = insumo_repo_mock.criar_batch.call_args.args[0]
+    assert [(i["orcamento_item_id"], i["quantidade_unitaria"]) for i in insumos] == [
+        ("novo0", 2.0), ("novo1", 6.0),
+    ]
+    # Uma busca para os itens e outra para os insumos explodidos
+    assert item_repo_mock.buscar_precos_em_lote.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# reprecificar
+# ---------------------------------------------------------------------------
+
+def _itens_para_reprecificar():
+    return [
+        {"id": "item1", "codigo_composicao": "111", "descricao": "Alvenaria", "quantidade": 2.0,
+         "preco_unitario": 10.0, "preco_total": 20.0, "estado": "sp", "fonte": "SINAPI"},
+        {"id": "item2", "codigo_composicao": "222", "descricao": "Reboco", "quantidade": 1.0,
+         "preco_unitario": 5.0, "preco_total": 5.0, "estado": "sp", "fonte": "SINAPI"},
+        {"id": "item3", "codigo_composicao": "MANUAL", "descricao": "Taxa", "quantidade": 1.0,
+         "preco_unitario": 3.0, "preco_total": 3.0, "estado": "sp", "fonte": "SINAPI"},
+    ]
+
+
+@pytest.mark.unit
+def test_reprecificar_dry_run_compara_precos_sem_gravar(
+    orcamento_item_service,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+):
+    from app.modules.orcamento.schemas import OrcamentoRepricingRequest
+
+    orcamento_repo_mock.buscar_por_id.return_value = {**_make_orcamento(), "valor_total": 28.0}
+    orcamento_item_repo_mock.listar_por_orcamento.return_value = _itens_para_reprecificar()
+    item_repo_mock.buscar_precos_em_lote.return_value = {"111": 12.5}
+
+    resultado = orcamento_item_service.reprecificar(
+        "orc1", OrcamentoRepricingRequest(base_referencia="01/2026", estado="RJ"),
+    )
+
+    item_repo_mock.buscar_precos_em_lote.assert_called_once_with(
+        ["111", "222"], "rj", "01/2026", "PRECO_MEDIO", "SINAPI",
+    )
+    orcamento_item_repo_mock.upsert_batch.assert_not_called()
+    orcamento_repo_mock.atualizar.assert_not_called()
+
+    situacoes = {d["id"]: (d["situacao"], d["preco_total_novo"]) for d in resultado["itens"]}
+    assert situacoes == {
+        "item1": ("alterado", 25.0), "item2": ("sem_preco", 5.0), "item3": ("manual", 3.0),
+    }
+    assert (resultado["itens_alterados"], resultado["itens_sem_preco"]) == (1, 1)
+    assert resultado["valor_total_anterior"] == 28.0
+    assert resultado["valor_total_novo"] == 33.0
+
+
+@pytest.mark.unit
+def test_reprecificar_grava_itens_cabecalho_e_insumos_em_lotes(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+    monkeypatch,
+):
+    from app.modules.orcamento import services
+    from app.modules.orcamento.schemas import OrcamentoRepricingRequest
+
+    monkeypatch.setattr(services, "TAMANHO_LOTE_REPRECIFICACAO", 1)
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.listar_por_orcamento.return_value = _itens_para_reprecificar()
+    item_repo_mock.buscar_insumos_basicos.return_value = []
+    item_repo_mock.buscar_filhos_composicoes.return_value = {}
+    item_repo_mock.buscar_precos_em_lote.return_value = {"111": 12.5, "222": 5.0}
+    orcamento_item_repo_mock.calcular_total_itens.return_value = 33.0
+    insumo_repo_mock.listar_precos_custom.return_value = {}
+
+    resultado = orcamento_item_service_com_insumo.reprecificar(
+        "orc1", OrcamentoRepricingRequest(base_referencia="01/2026", dry_run=False),
+    )
+
+    # Só o item com preço novo é regravado; os dois itens com preço têm insumos reexplodidos
+    (linhas,) = [c.args[0] for c in orcamento_item_repo_mock.upsert_batch.call_args_list]
+    assert [(l["id"], l["preco_total"]) for l in linhas] == [("item1", 25.0)]
+    assert insumo_repo_mock.deletar_por_ids.call_count == 2
+    assert resultado["lotes_gravados"] == 2
+
+    cabecalho = orcamento_repo_mock.atualizar.call_args_list[0].args[1]
+    assert cabecalho["base_referencia"] == "01/2026" and cabecalho["estado"] == "sp"
+    assert resultado["valor_total_novo"] == 33.0
+
+
+def _preparar_reprecificacao_com_insumos(orcamento_repo_mock, item_repo_mock, orcamento_item_repo_mock):
+    orcamento_repo_mock.buscar_por_id.return_value = _make_orcamento()
+    orcamento_item_repo_mock.listar_por_orcamento.return_value = _itens_para_reprecificar()
+    item_repo_mock.buscar_insumos_basicos.side_effect = lambda codigo, mes, fonte: [
+        {"codigo_insumo": "cimento", "coeficiente": 2.0, "unidade": "KG"},
+        {"codigo_insumo": "areia", "coeficiente": 1.0, "unidade": "M3"},
+    ]
+    item_repo_mock.buscar_precos_em_lote.return_value = {"111": 12.5, "222": 5.0, "cimento": 0.5, "areia": 3.0}
+
+
+@pytest.mark.unit
+def test_reprecificar_mantem_precos_custom_dos_insumos(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+):
+    """O preço definido pelo usuário num insumo sobrevive à reexplosão e entra no preço do item."""
+    from app.modules.orcamento.schemas import OrcamentoRepricingRequest
+
+    _preparar_reprecificacao_com_insumos(orcamento_repo_mock, item_repo_mock, orcamento_item_repo_mock)
+    insumo_repo_mock.listar_precos_custom.return_value = {"item1": {"cimento": 1.0}}
+    insumo_repo_mock.criar_batch.side_effect = len
+
+    simulacao = orcamento_item_service_com_insumo.reprecificar(
+        "orc1", OrcamentoRepricingRequest(base_referencia="01/2026"),
+    )
+    resultado = orcamento_item_service_com_insumo.reprecificar(
+        "orc1", OrcamentoRepricingRequest(base_referencia="01/2026", dry_run=False),
+    )
+
+    # item1 (quantidade 2): cimento 4 kg a 1,00 (custom) + areia 2 m³ a 3,00 = 10,00
+    item1 = next(d for d in simulacao["itens"] if d["id"] == "item1")
+    assert (item1["preco_unitario_novo"], item1["preco_total_novo"]) == (5.0, 10.0)
+    assert item1["precos_custom"] == ["cimento"]
+    assert simulacao["itens_com_preco_custom"] == 1
+    insumo_repo_mock.deletar_por_ids.assert_called_once()
+
+    gravados = {
+        (i["orcamento_item_id"], i["codigo_insumo"]): i
+        for chamada in insumo_repo_mock.criar_batch.call_args_list for i in chamada.args[0]
+    }
+    assert gravados[("item1", "cimento")]["preco_unitario_custom"] == 1.0
+    assert gravados[("item1", "cimento")]["total"] == 4.0
+    assert gravados[("item2", "cimento")]["preco_unitario_custom"] is None
+    (linhas,) = [c.args[0] for c in orcamento_item_repo_mock.upsert_batch.call_args_list]
+    assert {l["id"]: l["preco_unitario"] for l in linhas} == {"item1": 5.0}
+    assert resultado["itens_com_preco_custom"] == 1
+
+
+@pytest.mark.unit
+def test_reprecificar_falha_ao_gravar_insumos_nao_reporta_sucesso(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+):
+    """Uma inserção de insumos que falha interrompe a reprecificação sem
+    apagar os insumos anteriores; o valor_total é reconciliado mesmo assim."""
+    from app.modules.orcamento.schemas import OrcamentoRepricingRequest
+
+    _preparar_reprecificacao_com_insumos(orcamento_repo_mock, item_repo_mock, orcamento_item_repo_mock)
+    insumo_repo_mock.listar_precos_custom.return_value = {}
+    insumo_repo_mock.listar_ids_por_itens.side_effect = [["antigo1", "antigo2"], ["antigo1", "antigo2", "novo1"]]
+    insumo_repo_mock.criar_batch.side_effect = Exception("Timeout")
+
+    with pytest.raises(Exception, match="Timeout"):
+        orcamento_item_service_com_insumo.reprecificar(
+            "orc1", OrcamentoRepricingRequest(base_referencia="01/2026", dry_run=False),
+        )
+
+    # Só a linha inserida antes da falha é removida
+    insumo_repo_mock.deletar_por_ids.assert_called_once_with(["novo1"])
+    # O cabeçalho não muda de base; só o valor_total é reconciliado
+    (chamada,) = orcamento_repo_mock.atualizar.call_args_list
+    assert "base_referencia" not in chamada.args[1] and "valor_total" in chamada.args[1]
+
+
+@pytest.mark.unit
+def test_reprecificar_falha_na_explosao_nao_grava_nenhum_lote(
+    orcamento_item_service_com_insumo,
+    orcamento_repo_mock,
+    item_repo_mock,
+    orcamento_item_repo_mock,
+    insumo_repo_mock,
+    monkeypatch,
+):
+    """Todos os lotes são explodidos antes da primeira gravação."""
+    from app.modules.orcamento import services
+    from app.modules.orcamento.schemas import OrcamentoRepricingRequest
+
+    monkeypatch.setattr(services, "TAMANHO_LOTE_REPRECIFICACAO", 1)
+    _preparar_reprecificacao_com_insumos(orcamento_repo_mock, item_repo_mock, orcamento_item_repo_mock)
+    insumo_repo_mock.listar_precos_custom.return_value = {}
+    item_repo_mock.buscar_insumos_basicos.side_effect = lambda codigo, mes, fonte: (
+        [{"codigo_insumo": "cimento", "coeficiente": 2.0, "unidade": "KG"}] if codigo == "111"
+        else (_ for _ in ()).throw(RuntimeError("composição 222 indisponível"))
+    )
+
+    with pytest.raises(RuntimeError, match="222"):
+        orcamento_item_service_com_insumo.reprecificar(
+            "orc1", OrcamentoRepricingRequest(base_referencia="01/2026", dry_run=False),
+        )
+
+    orcamento_item_repo_mock.upsert_batch.assert_not_called()
+    insumo_repo_mock.criar_batch.assert_not_called()
+    orcamento_repo_mock.atualizar.assert_not_called()
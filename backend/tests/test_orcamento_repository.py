@@ -4,7 +4,8 @@ Supabase client é mockado via encadeamento MagicMock.
 """
 import pytest
 from unittest.mock import MagicMock
-from app.modules.orcamento.repositories import OrcamentoRepository
+from postgrest.exceptions import APIError
+from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoRepository
 
 
 # ---------------------------------------------------------------------------
@@ -169,3 +170,164 @@ def test_deletar_retorna_true(repo, supabase):
 
     # Assert
     assert resultado is True
+
+
+# ---------------------------------------------------------------------------
+# OrcamentoItemRepository.calcular_total_itens
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_calcular_total_itens_usa_soma_do_banco(supabase, monkeypatch):
+    """A RPC devolve só a soma; os itens não são baixados."""
+    from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoItemRepository
+    monkeypatch.setattr(OrcamentoItemRepository, "_rpc_total", DisponibilidadeRpc("orcamento_total_itens"))
+    supabase.rpc.return_value.execute.return_value.data = 1234.5
+
+    total = OrcamentoItemRepository(supabase).calcular_total_itens("orc-1")
+
+    assert total == 1234.5
+    supabase.rpc.assert_called_once_with("orcamento_total_itens", {"p_orcamento_id": "orc-1"})
+    supabase.table.assert_not_called()
+
+
+@pytest.mark.unit
+def test_calcular_total_itens_sem_rpc_soma_localmente(supabase, monkeypatch):
+    """Sem a função no banco, soma os itens e não tenta a RPC de novo."""
+    from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoItemRepository
+    monkeypatch.setattr(OrcamentoItemRepository, "_rpc_total", DisponibilidadeRpc("orcamento_total_itens"))
+    supabase.rpc.side_effect = APIError({"code": "PGRST202", "message": "Could not find the function"})
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"preco_total": 10.0}, {"preco_total": None}, {"preco_total": 5.5},
+    ]
+    repo_itens = OrcamentoItemRepository(supabase)
+
+    assert repo_itens.calcular_total_itens("orc-1") == 15.5
+    assert repo_itens.calcular_total_itens("orc-1") == 15.5
+    assert supabase.rpc.call_count == 1
+
+
+@pytest.mark.unit
+def test_calcular_total_itens_rpc_ausente_e_testada_de_novo_apos_intervalo(supabase, monkeypatch):
+    """A função ausente volta a ser testada depois de RPC_NOVA_TENTATIVA segundos."""
+    from app.modules.orcamento import repositories
+    from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoItemRepository
+    monkeypatch.setattr(OrcamentoItemRepository, "_rpc_total", DisponibilidadeRpc("orcamento_total_itens"))
+    agora = [1000.0]
+    monkeypatch.setattr(repositories.time, "monotonic", lambda: agora[0])
+    supabase.rpc.return_value.execute.side_effect = [
+        APIError({"code": "PGRST202", "message": "Could not find the function"}),
+        MagicMock(data=42.0),
+    ]
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = []
+    repo_itens = OrcamentoItemRepository(supabase)
+
+    assert repo_itens.calcular_total_itens("orc-1") == 0.0
+    agora[0] += repositories.settings.RPC_NOVA_TENTATIVA
+    assert repo_itens.calcular_total_itens("orc-1") == 42.0
+
+
+@pytest.mark.unit
+def test_calcular_total_itens_falha_transitoria_nao_desliga_rpc(supabase, monkeypatch):
+    """Timeout ou erro de rede cai na soma local só naquela chamada."""
+    from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoItemRepository
+    monkeypatch.setattr(OrcamentoItemRepository, "_rpc_total", DisponibilidadeRpc("orcamento_total_itens"))
+    supabase.rpc.return_value.execute.side_effect = [ConnectionError("reset"), MagicMock(data=7.0)]
+    supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [{"preco_total": 7.0}]
+    repo_itens = OrcamentoItemRepository(supabase)
+
+    assert repo_itens.calcular_total_itens("orc-1") == 7.0
+    assert repo_itens.calcular_total_itens("orc-1") == 7.0
+    assert supabase.rpc.call_count == 2
+    assert supabase.table.call_count == 1
+
+
+# ---------------------------------------------------------------------------
+# listar_pagina / busca
+# ---------------------------------------------------------------------------
+
+@pytest.mark.unit
+def test_listar_pagina_busca_por_prefixo_sem_acentos(repo, supabase, monkeypatch):
+    monkeypatch.setattr(OrcamentoRepository, "_busca_textual", DisponibilidadeRpc("orcamentos.busca", tipo="coluna"))
+    chain = supabase.table.return_value.select.return_value
+    for metodo in ("text_search", "order", "limit"):
+        getattr(chain, metodo).return_value = chain
+    chain.execute.return_value.data = [{"id": "1"}]
+
+    pagina = repo.listar_pagina(busca="Escola Município", limite=10)
+
+    assert pagina == {"itens": [{"id": "1"}], "proximo_cursor": None}
+    chain.text_search.assert_called_once_with(
+        "busca", "escola:* & municipio:*", options={"config": "simple"},
+    )
+
+
+@pytest.mark.unit
+def test_listar_pagina_sem_coluna_de_busca_usa_ilike(repo, supabase, monkeypatch):
+    monkeypatch.setattr(OrcamentoRepository, "_busca_textual", DisponibilidadeRpc("orcamentos.busca", tipo="coluna"))
+    chain = supabase.table.return_value.select.return_value
+    for metodo in ("text_search", "or_", "order"):
+        getattr(chain, metodo).return_value = chain
+    chain.execute.side_effect = [
+        APIError({"code": "42703", "message": "column orcamentos.busca does not exist"}),
+        MagicMock(data=[{"id": "1"}]),
+    ]
+
+    pagina = repo.listar_pagina(busca="escola")
+
+    assert pagina["itens"] == [{"id": "1"}]
+    assert not OrcamentoRepository._busca_textual.disponivel()
+    chain.or_.assert_called_once_with("nome.ilike.*escola*,cliente.ilike.*escola*")
+
+
+@pytest.mark.unit
+def test_listar_pagina_busca_textual_volta_apos_o_prazo(repo, supabase, monkeypatch):
+    """Aplicada a migração, a busca textual volta depois de RPC_NOVA_TENTATIVA segundos."""
+    from app.modules.orcamento import repositories
+
+    monkeypatch.setattr(OrcamentoRepository, "_busca_textual", DisponibilidadeRpc("orcamentos.busca", tipo="coluna"))
+    agora = [1000.0]
+    monkeypatch.setattr(repositories.time, "monotonic", lambda: agora[0])
+    chain = supabase.table.return_value.select.return_value
+    for metodo in ("text_search", "or_", "order"):
+        getattr(chain, metodo).return_value = chain
+    chain.execute.side_effect = [
+        APIError({"code": "42703", "message": "column orcamentos.busca does not exist"}),
+        MagicMock(data=[]),
+        MagicMock(data=[]),
+        MagicMock(data=[{"id": "1"}]),
+    ]
+
+    repo.listar_pagina(busca="escola")
+    repo.listar_pagina(busca="escola")
+    assert chain.text_search.call_count == 1
+
+    agora[0] += repositories.settings.RPC_NOVA_TENTATIVA
+    assert repo.listar_pagina(busca="escola")["itens"] == [{"id": "1"}]
+    assert chain.text_search.call_count == 2
+
+
+@pytest.mark.unit
+def test_listar_pagina_erro_transitorio_nao_desliga_busca(repo, supabase, monkeypatch):
+    """Só coluna inexistente desliga a busca textual; outros erros sobem."""
+    monkeypatch.setattr(OrcamentoRepository, "_busca_textual", DisponibilidadeRpc("orcamentos.busca", tipo="coluna"))
+    chain = supabase.table.return_value.select.return_value
+    for metodo in ("text_search", "or_", "order"):
+        getattr(chain, metodo).return_value = chain
+    chain.execute.side_effect = APIError({"code": "57014", "message": "canceling statement due to statement timeout"})
+
+    with pytest.raises(APIError):
+        repo.listar_pagina(busca="escola")
+
+    assert OrcamentoRepository._busca_textual.disponivel()
+    assert chain.execute.call_count == 1
+
+
+@pytest.mark.unit
+def test_listar_pagina_cursor_invalido_nao_desliga_busca(repo, supabase, monkeypatch):
+    monkeypatch.setattr(OrcamentoRepository, "_busca_textual", DisponibilidadeRpc("orcamentos.busca", tipo="coluna"))
+
+    with pytest.raises(ValueError, match="Cursor inválido"):
+        repo.listar_pagina(busca="escola", limite=10, cursor="nao-e-um-cursor")
+
+    assert OrcamentoRepository._busca_textual.disponivel()
+    supabase.table.assert_not_called()
@@ -1,7 +1,14 @@
+import base64
+import json
+
 import pytest
 from unittest.mock import MagicMock
 from datetime import date
 
+# Ids de orçamento (o cursor de paginação só aceita UUIDs)
+ORC_1 = "3f0c2a7e-8d3b-4a51-9a3e-1b2c3d4e5f60"
+ORC_2 = "7b9e1c44-2f6d-4e8a-b1c2-d3e4f5a6b7c8"
+
 
 @pytest.mark.integration
 def test_criar_orcamento(client, mock_supabase):
@@ -44,7 +51,9 @@ def test_listar_orcamentos(client, mock_supabase):
         {"id": "orc-1", "nome": "Orc 1", "cliente": "C1", "data": "2023-01-01", "base_referencia": "A", "tipo_composicao": "T1", "estado": "SP", "status": "ok", "valor_total": 100, "bdi": 0.0, "fonte": "SINAPI"},
         {"id": "orc-2", "nome": "Orc 2", "cliente": "C2", "data": "2023-01-02", "base_referencia": "B", "tipo_composicao": "T2", "estado": "RJ", "status": "ok", "valor_total": 200, "bdi": 0.0, "fonte": "SINAPI"}
     ]
-    mock_supabase.table.return_value.select.return_value.order.return_value.execute.return_value.data = mock_data
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.order.return_value = chain
+    chain.execute.return_value.data = mock_data
 
     # Act
     response = client.get("/orcamentos/")
@@ -55,6 +64,50 @@ def test_listar_orcamentos(client, mock_supabase):
     assert len(data) == 2
     assert data[0]["nome"] == "Orc 1"
 
+@pytest.mark.integration
+def test_listar_orcamentos_paginado_com_campos(client, mock_supabase):
+    # Setup Mock: limite=1 lê 2 linhas para saber se há próxima página
+    chain = mock_supabase.table.return_value.select.return_value
+    for metodo in ("order", "limit", "or_", "eq"):
+        getattr(chain, metodo).return_value = chain
+    chain.execute.return_value.data = [
+        {"id": ORC_2, "nome": "Orc 2", "created_at": "2023-01-02T00:00:00"},
+        {"id": ORC_1, "nome": "Orc 1", "created_at": "2023-01-01T00:00:00"},
+    ]
+    chain.execute.return_value.count = 7
+
+    # Act
+    response = client.get("/orcamentos/?limite=1&fields=nome&com_total=true")
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json() == [{"id": ORC_2, "nome": "Orc 2"}]
+    assert response.headers["X-Total-Count"] == "7"
+    cursor = response.headers["X-Next-Cursor"]
+    mock_supabase.table.return_value.select.assert_any_call("id,nome,created_at")
+    chain.limit.assert_called_once_with(2)
+
+    # A página seguinte filtra pela posição (created_at, id) do último item
+    client.get(f"/orcamentos/?limite=1&cursor={cursor}")
+    filtro = chain.or_.call_args.args[0]
+    assert 'created_at.lt."2023-01-02T00:00:00"' in filtro and f'id.lt."{ORC_2}"' in filtro
+
+
+@pytest.mark.integration
+def test_listar_orcamentos_cursor_com_valores_invalidos_retorna_400(client, mock_supabase):
+    """Um cursor bem codificado mas com valores fora do formato não chega ao filtro."""
+    chain = mock_supabase.table.return_value.select.return_value
+    for valores in (["2023-01-02T00:00:00", 'x",id.gt."0'], ['2023-01-02",or(id.gt.0', ORC_2]):
+        cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+        response = client.get(f"/orcamentos/?limite=1&cursor={cursor}")
+        assert response.status_code == 400
+    chain.or_.assert_not_called()
+
+@pytest.mark.integration
+def test_listar_orcamentos_campo_invalido(client, mock_supabase):
+    response = client.get("/orcamentos/?fields=nome,senha")
+    assert response.status_code == 400
+
 @pytest.mark.integration
 def test_buscar_orcamento_por_id(client, mock_supabase):
     # Setup Mock
@@ -142,7 +195,7 @@ def test_download_pdf_orcamento(client, mock_supabase):
 
     # Mock geração de PDF para não depender de weasyprint
     pdf_bytes = b"%PDF-1.4 dummy content"
-    with patch("app.modules.orcamento.routes.PdfService") as mock_pdf_class:
+    with patch("app.modules.orcamento.export_jobs.PdfService") as mock_pdf_class:
         mock_pdf_class.return_value.gerar_pdf.return_value = pdf_bytes
 
         # Act
@@ -152,4 +205,131 @@ def test_download_pdf_orcamento(client, mock_supabase):
     assert response.status_code == 200
     assert response.headers["content-type"] == "application/pdf"
     assert response.content == pdf_bytes
+    orcamento, itens, etapas = mock_pdf_class.return_value.gerar_pdf.call_args.args
+    assert orcamento["id"] == orc_id and itens == [] and etapas == []
+
+
+@pytest.mark.integration
+def test_download_excel_orcamento_em_streaming(client, mock_supabase):
+    orcamento = {"id": "orc-1", "nome": "Orc 1", "cliente": "C1", "base_referencia": "A", "bdi": 0.0}
+    itens = [{"codigo_composicao": "1", "descricao": "Item", "unidade": "un", "quantidade": 1, "preco_unitario": 5.0}]
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.execute.return_value.data = [orcamento]
+    chain.range.return_value.execute.return_value.data = itens
+
+    response = client.get("/orcamentos/orc-1/excel")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.openxmlformats")
+    assert response.content[:2] == b"PK"
+
+
+@pytest.mark.integration
+def test_download_pdf_usa_cache_e_responde_304_pela_versao(client, mock_supabase):
+    from unittest.mock import patch
+
+    orcamento = {"id": "orc-1", "nome": "Orc 1", "cliente": "C1", "base_referencia": "A", "bdi": 0.0,
+                 "updated_at": "2026-01-01T10:00:00"}
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.execute.return_value.data = [orcamento]
+    chain.range.return_value.execute.return_value.data = []
+
+    with patch("app.modules.orcamento.export_jobs.PdfService") as mock_pdf_class:
+        mock_pdf_class.return_value.gerar_pdf.return_value = b"%PDF-1.4 v1"
+        primeira = client.get("/orcamentos/orc-1/pdf")
+        segunda = client.get("/orcamentos/orc-1/pdf")
+        nao_modificado = client.get("/orcamentos/orc-1/pdf", headers={"If-None-Match": primeira.headers["etag"]})
+
+        orcamento["updated_at"] = "2026-01-01T11:00:00"
+        mock_pdf_class.return_value.gerar_pdf.return_value = b"%PDF-1.4 v2"
+        nova_versao = client.get("/orcamentos/orc-1/pdf", headers={"If-None-Match": primeira.headers["etag"]})
+
+    assert primeira.content == segunda.content == b"%PDF-1.4 v1"
+    assert nao_modificado.status_code == 304 and nao_modificado.content == b""
+    assert nova_versao.status_code == 200 and nova_versao.content == b"%PDF-1.4 v2"
+    assert nova_versao.headers["etag"] != primeira.headers["etag"]
+    assert mock_pdf_class.return_value.gerar_pdf.call_count == 2
+
+
+@pytest.mark.integration
+def test_exportacao_pequena_responde_o_arquivo_direto(client, mock_supabase):
+    orcamento = {"id": "orc-1", "nome": "Orc 1", "cliente": "C1", "base_referencia": "A", "bdi": 0.0}
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.execute.return_value.data = [orcamento]
+    chain.execute.return_value.count = 3
+    chain.range.return_value.execute.return_value.data = []
+
+    response = client.post("/orcamentos/orc-1/exports", params={"formato": "xlsx"})
+
+    assert response.status_code == 200
+    assert response.content[:2] == b"PK"
+
+
+@pytest.mark.integration
+def test_exportacao_sincrona_com_erro_retorna_500(client, mock_supabase):
+    """Falha na renderização síncrona vira 500, como em /pdf e /excel."""
+    from unittest.mock import patch
+
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.execute.return_value.data = [{"id": "orc-1", "nome": "Orc 1"}]
+    chain.execute.return_value.count = 3
+
+    with patch("app.modules.orcamento.routes.gerar_exportacao", side_effect=RuntimeError("falhou")):
+        response = client.post("/orcamentos/orc-1/exports", params={"formato": "xlsx"})
+
+    assert response.status_code == 500
+    assert "Erro ao gerar exportação" in response.json()["detail"]
+
+
+@pytest.mark.integration
+def test_exportacao_grande_vira_tarefa_renderizada_em_processo(client, mock_supabase, monkeypatch, tmp_path):
+    """Acima do limite de itens: 202 com o id da tarefa; o GET devolve o arquivo quando conclui."""
+    from unittest.mock import patch
+    from core.jobs import JobManager
+    from app.modules.orcamento import export_jobs
+
+    orcamento = {"id": "orc-1", "nome": "Orc 1", "cliente": "C1", "base_referencia": "A", "bdi": 0.0}
+    itens = [{"id": "i1", "etapa_id": None, "descricao": "Item", "quantidade": 2, "preco_unitario": 5.0}]
+    chain = mock_supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.order.return_value = chain
+    chain.execute.return_value.data = [orcamento]
+    chain.execute.return_value.count = 5000
+    chain.range.return_value.execute.return_value.data = itens
+    monkeypatch.setattr(export_jobs.settings, "EXPORT_SINCRONO_MAX_ITENS", 1000)
+    monkeypatch.setattr(export_jobs.settings, "EXPORT_DIR", str(tmp_path))
+    # Dois workers do gunicorn: um recebe o POST, outro atende a consulta
+    db_path = str(tmp_path / "jobs.sqlite3")
+    manager = JobManager(db_path=db_path, max_workers=1)
+    outro_worker = JobManager(db_path=db_path, max_workers=1)
+
+    try:
+        with patch("app.modules.orcamento.routes.get_job_manager", return_value=manager):
+            response = client.post("/orcamentos/orc-1/exports", params={"formato": "pdf"})
+            assert response.status_code == 202
+            url = response.json()["url"]
+            assert response.headers["location"] == url
+
+            job = manager.aguardar(response.json()["job_id"], timeout=60)
+        with patch("app.modules.orcamento.routes.get_job_manager", return_value=outro_worker):
+            download = client.get(url)
+            outro_orcamento = client.get(url.replace("orc-1", "orc-2"))
+    finally:
+        manager.encerrar()
+        outro_worker.encerrar()
+        export_jobs.get_pool_exportacao().shutdown()
+        export_jobs.get_pool_exportacao.cache_clear()
 
+    assert job["status"] == "concluido", job["erro"]
+    assert job["progresso"]["itens"] == 1
+    assert download.status_code == 200
+    assert download.headers["content-type"] == "application/pdf"
+    assert download.content.startswith(b"%PDF")
+    assert outro_orcamento.status_code == 404
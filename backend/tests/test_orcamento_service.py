@@ -169,3 +169,17 @@ def test_deletar_orcamento_nao_encontrado_levanta_value_error(orcamento_service,
         orcamento_service.deletar_orcamento("id-inexistente")
 
     repository_mock.deletar.assert_not_called()
+
+
+@pytest.mark.unit
+def test_atualizar_orcamento_bdi_recalcula_valor_total(repository_mock):
+    """Trocar o BDI recalcula o valor_total sobre a soma dos itens."""
+    itens_mock = MagicMock()
+    itens_mock.calcular_total_itens.return_value = 200.0
+    service = OrcamentoService(repository_mock, orcamento_item_repository=itens_mock)
+    repository_mock.buscar_por_id.return_value = {"id": "1", "bdi": 0.0, "valor_total": 200.0}
+
+    service.atualizar_orcamento("1", OrcamentoUpdate(bdi=25.0))
+
+    args, _ = repository_mock.atualizar.call_args
+    assert args[1]["valor_total"] == pytest.approx(250.0)
@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import MagicMock
+from postgrest.exceptions import APIError
 from datetime import date, datetime
 from app.modules.orcamento.services import OrcamentoService
 
@@ -32,24 +33,27 @@ def service(orcamento_repo, etapa_repo, item_repo, supabase):
 # obter_estatisticas
 # ---------------------------------------------------------------------------
 
+ORCAMENTOS_ESTATISTICAS = [
+    {
+        "id": "1",
+        "valor_total": 100000.0,
+        "status": "APROVADO",
+        "created_at": "2026-07-01T10:00:00Z",
+        "updated_at": "2026-07-02T10:00:00Z"
+    },
+    {
+        "id": "2",
+        "valor_total": 200000.0,
+        "status": "pendente",
+        "created_at": "2026-07-01T10:00:00Z",
+        "updated_at": "2026-07-01T12:00:00Z"
+    }
+]
+
 def test_obter_estatisticas_sucesso(service, orcamento_repo):
     # Arrange
-    orcamento_repo.listar.return_value = [
-        {
-            "id": "1",
-            "valor_total": 100000.0,
-            "status": "APROVADO",
-            "created_at": "2026-07-01T10:00:00Z",
-            "updated_at": "2026-07-02T10:00:00Z"
-        },
-        {
-            "id": "2",
-            "valor_total": 200000.0,
-            "status": "pendente",
-            "created_at": "2026-07-01T10:00:00Z",
-            "updated_at": "2026-07-01T12:00:00Z"
-        }
-    ]
+    from app.modules.orcamento.repositories import resumir_estatisticas
+    orcamento_repo.agregar_estatisticas.return_value = resumir_estatisticas(ORCAMENTOS_ESTATISTICAS)
 
     # Act
     stats = service.obter_estatisticas()
@@ -63,7 +67,9 @@ def test_obter_estatisticas_sucesso(service, orcamento_repo):
 
 def test_obter_estatisticas_vazio(service, orcamento_repo):
     # Arrange
-    orcamento_repo.listar.return_value = []
+    orcamento_repo.agregar_estatisticas.return_value = {
+        "total_orcamentos": 0, "valor_total": 0.0, "aprovados": 0, "tempo_resposta_medio": None,
+    }
 
     # Act
     stats = service.obter_estatisticas()
@@ -75,6 +81,35 @@ def test_obter_estatisticas_vazio(service, orcamento_repo):
     assert stats["ticket_medio"] == 0.0
     assert stats["tempo_resposta_medio"] == 0.0
 
+def test_obter_estatisticas_em_cache_ate_alterar_orcamento(service, orcamento_repo):
+    from app.modules.orcamento.repositories import resumir_estatisticas
+    orcamento_repo.agregar_estatisticas.return_value = resumir_estatisticas(ORCAMENTOS_ESTATISTICAS)
+
+    service.obter_estatisticas()
+    service.obter_estatisticas()
+    assert orcamento_repo.agregar_estatisticas.call_count == 1
+
+    orcamento_repo.buscar_por_id.return_value = {"id": "1", "bdi": 0.0}
+    service.deletar_orcamento("1")
+    service.obter_estatisticas()
+    assert orcamento_repo.agregar_estatisticas.call_count == 2
+
+def test_agregar_estatisticas_sem_rpc_le_so_colunas_necessarias(monkeypatch):
+    from app.modules.orcamento.repositories import DisponibilidadeRpc, OrcamentoRepository
+
+    monkeypatch.setattr(OrcamentoRepository, "_rpc_estatisticas", DisponibilidadeRpc("orcamento_estatisticas"))
+    supabase = MagicMock()
+    supabase.rpc.side_effect = APIError({"code": "42883", "message": "function orcamento_estatisticas() does not exist"})
+    consulta = supabase.table.return_value.select.return_value.order.return_value
+    consulta.range.return_value.execute.return_value.data = ORCAMENTOS_ESTATISTICAS
+
+    agregados = OrcamentoRepository(supabase).agregar_estatisticas()
+
+    supabase.table.return_value.select.assert_called_once_with("id,valor_total,status,created_at,updated_at")
+    assert agregados == {
+        "total_orcamentos": 2, "valor_total": 300000.0, "aprovados": 1, "tempo_resposta_medio": 1.0,
+    }
+
 # ---------------------------------------------------------------------------
 # obter_curva_abc
 # ---------------------------------------------------------------------------
@@ -83,25 +118,24 @@ def test_obter_curva_abc_sucesso(service, orcamento_repo, item_repo, supabase):
     # Arrange
     orcamento_id = "orc-1"
     orcamento_repo.buscar_por_id.return_value = {"id": orcamento_id}
-    item_repo.listar_por_orcamento.return_value = [{"id": "item-1"}]
     
     mock_insumos = [
         {
             "codigo_insumo": "INS-A",
             "descricao": "Cimento",
             "unidade": "SC",
-            "quantidade_unitaria": 10.0,
+            "quantidade": 10.0,
             "total": 80.0
         },
         {
             "codigo_insumo": "INS-B",
             "descricao": "Areia",
             "unidade": "M3",
-            "quantidade_unitaria": 5.0,
+            "quantidade": 5.0,
             "total": 20.0
         }
     ]
-    supabase.table.return_value.select.return_value.in_.return_value.execute.return_value.data = mock_insumos
+    supabase.rpc.return_value.execute.return_value.data = mock_insumos
 
     # Act
     res = service.obter_curva_abc(orcamento_id)
@@ -127,6 +161,49 @@ def test_obter_curva_abc_sucesso(service, orcamento_repo, item_repo, supabase):
     assert res["resumo_classes"]["B"] == 0.0
     assert res["resumo_classes"]["C"] == 20.0
 
+def test_obter_curva_abc_cache_invalidado_por_updated_at(service, orcamento_repo, supabase):
+    orcamento_repo.buscar_por_id.return_value = {"id": "orc-1", "updated_at": "2026-07-01T10:00:00"}
+    supabase.rpc.return_value.execute.return_value.data = [
+        {"codigo_insumo": "INS-A", "quantidade": 1.0, "total": 10.0},
+    ]
+
+    primeira = service.obter_curva_abc("orc-1")
+    segunda = service.obter_curva_abc("orc-1")
+    assert segunda is primeira
+    assert supabase.rpc.call_count == 1
+
+    orcamento_repo.buscar_por_id.return_value = {"id": "orc-1", "updated_at": "2026-07-01T10:05:00"}
+    supabase.rpc.return_value.execute.return_value.data = [
+        {"codigo_insumo": "INS-A", "quantidade": 1.0, "total": 30.0},
+    ]
+    assert service.obter_curva_abc("orc-1")["valor_total"] == 30.0
+    assert supabase.rpc.call_count == 2
+
+def test_agregar_insumos_sem_rpc_le_em_blocos_paginados(monkeypatch):
+    from app.modules.orcamento import repositories
+    from app.modules.orcamento.repositories import InsumoRepository
+
+    monkeypatch.setattr(InsumoRepository, "_rpc_curva_abc", repositories.DisponibilidadeRpc("orcamento_curva_abc_insumos"))
+    monkeypatch.setattr(repositories, "TAMANHO_GRUPO_IN", 2)
+    supabase = MagicMock()
+    supabase.rpc.side_effect = APIError({"code": "PGRST202", "message": "Could not find the function"})
+    ids = supabase.table.return_value.select.return_value.eq.return_value.order.return_value
+    ids.range.return_value.execute.return_value.data = [{"id": "i1"}, {"id": "i2"}, {"id": "i3"}]
+    insumos = supabase.table.return_value.select.return_value.in_.return_value.order.return_value
+    insumos.range.return_value.execute.return_value.data = [
+        {"codigo_insumo": "INS-A", "descricao": "Cimento", "quantidade_unitaria": 2.0, "total": 8.0},
+    ]
+
+    linhas = InsumoRepository(supabase).agregar_por_codigo("orc-1")
+
+    assert InsumoRepository._rpc_curva_abc.disponivel() is False
+    grupos = [c.args for c in supabase.table.return_value.select.return_value.in_.call_args_list]
+    assert grupos == [("orcamento_item_id", ["i1", "i2"]), ("orcamento_item_id", ["i3"])]
+    assert linhas == [{
+        "codigo_insumo": "INS-A", "descricao": "Cimento", "unidade": "",
+        "quantidade": 4.0, "total": 16.0,
+    }]
+
 def test_obter_curva_abc_orcamento_inexistente(service, orcamento_repo):
     # Arrange
     orcamento_repo.buscar_por_id.return_value = None
@@ -187,3 +264,52 @@ def test_obter_cronograma_sucesso(service, orcamento_repo, etapa_repo, item_repo
     assert m2["valor"] == 60000.0
     assert m2["acumulado_pct"] == 100.0
     assert "Alvenaria" in m2["servicos"]
+
+def test_obter_cronograma_rateia_custo_pelos_dias_de_cada_mes(service, orcamento_repo, etapa_repo, item_repo):
+    orcamento_repo.buscar_por_id.return_value = {"id": "orc-1", "data": "2026-07-01"}
+    # 10 dias em julho e 20 em agosto
+    etapa_repo.listar_por_orcamento.return_value = [
+        {"id": "etapa-1", "nome": "Estrutura", "data_inicio": "2026-07-22", "data_fim": "2026-08-20"},
+    ]
+    item_repo.listar_por_orcamento.return_value = [{"id": "i1", "etapa_id": "etapa-1", "preco_total": 3000.0}]
+
+    res = service.obter_cronograma("orc-1")
+
+    assert [(m["mes"], m["valor"], m["acumulado_pct"]) for m in res["mensal"]] == [
+        ("Jul/2026", 1000.0, 33.3), ("Ago/2026", 2000.0, 100.0),
+    ]
+
+def test_obter_cronograma_semanal_inclui_periodos_sem_desembolso(service, orcamento_repo, etapa_repo, item_repo):
+    orcamento_repo.buscar_por_id.return_value = {"id": "orc-1", "data": "2026-07-01"}
+    # 2026-07-06 é segunda-feira
+    etapa_repo.listar_por_orcamento.return_value = [
+        {"id": "e1", "nome": "Fundação", "data_inicio": "2026-07-06", "data_fim": "2026-07-12"},
+        {"id": "e2", "nome": "Cobertura", "data_inicio": "2026-07-20", "data_fim": "2026-07-26"},
+    ]
+    item_repo.listar_por_orcamento.return_value = [
+        {"id": "i1", "etapa_id": "e1", "preco_total": 700.0},
+        {"id": "i2", "etapa_id": "e2", "preco_total": 700.0},
+    ]
+
+    res = service.obter_cronograma("orc-1", periodo="semanal")
+
+    assert res["periodo"] == "semanal"
+    assert [(m["mes"], m["valor"], m["servicos"]) for m in res["mensal"]] == [
+        ("06/07/2026", 700.0, "Fundação"),
+        ("13/07/2026", 0.0, ""),
+        ("20/07/2026", 700.0, "Cobertura"),
+    ]
+
+def test_calcular_cronograma_periodo_em_dias_soma_o_custo_total():
+    from datetime import date, timedelta
+    from app.modules.orcamento.cronograma import calcular_cronograma
+
+    inicios = [date(2026, 1, 1) + timedelta(days=i) for i in range(2000)]
+    fins = [d + timedelta(days=45) for d in inicios]
+
+    periodos = calcular_cronograma(inicios, fins, [100.0] * 2000, [f"E{i}" for i in range(2000)], 15)
+
+    assert periodos[0].inicio == date(2026, 1, 1)
+    assert all((p.fim - p.inicio).days == 14 for p in periodos)
+    assert sum(p.valor for p in periodos) == pytest.approx(200000.0)
+    assert periodos[-1].acumulado_pct == pytest.approx(100.0)
@@ -83,3 +83,78 @@ def test_metadata_extraction_missing_cells():
     assert meta["mes_referencia"] == "UNKNOWN"
     assert meta["uf"] == "BR"
     assert meta["desoneracao"] == "UNKNOWN"
+
+def test_sinapi_parser_extracao_vetorizada_normaliza_colunas():
+    """Códigos, textos e preços em formato brasileiro são normalizados por coluna."""
+    data = [
+        ["", "", "", ""],
+        ["", "", "", ""],
+        ["", "01/2024", "", ""],
+        ["GRUPO", "CODIGO", "DESCRICAO", "UNIDADE", "AC", "SP"],
+        ["G1", 100.0, " Item 1 ", "UN", "1.234,56", 15.0],
+        [None, "101", None, None, "-", None],
+        ["G2", "X", "Código inválido", "UN", 1.0, 1.0],
+        [None, None, "Sem código", "UN", 1.0, 1.0],
+    ]
+    content = create_mock_excel({"CSD_VET": data})
+    parser = SinapiExcelParser(content)
+
+    composicoes, precos = parser.extrair_registros_aba("CSD_VET", "01/2024")
+
+    assert [c["codigo_composicao"] for c in composicoes] == ["100", "101"]
+    assert composicoes[0] == {
+        "codigo_composicao": "100",
+        "descricao": "Item 1",
+        "unidade": "UN",
+        "grupo": "G1",
+        "mes_referencia": "01/2024",
+    }
+    assert composicoes[1]["descricao"] == ""
+    assert composicoes[1]["unidade"] == "-"
+    assert composicoes[1]["grupo"] == "-"
+
+    # A linha 101 não tem nenhum preço → não gera registro de preço
+    assert len(precos) == 1
+    assert precos[0]["codigo_composicao"] == "100"
+    assert precos[0]["tipo_composicao"] == "Sem Desoneração"
+    assert precos[0]["ac"] == 1234.56
+    assert precos[0]["sp"] == 15.0
+
+def _dados_analitico(qtd_filhos: int) -> list:
+    linhas = [
+        ["SINAPI - ANALÍTICO", "", "", "", "", ""],
+        ["Código da Composição", "Tipo Item", "Código do Item", "Descrição", "Unidade", "Coeficiente"],
+        ["87878", "", "", "Composição pai", "M2", ""],
+    ]
+    for i in range(qtd_filhos):
+        linhas.append(["87878", "INSUMO", str(100 + i), f"Insumo {i}", "KG", "0,5"])
+    linhas.append(["87878", "INSUMO", "ABC", "Código inválido", "KG", "1"])
+    return linhas
+
+
+def test_sinapi_parser_iterar_analitico_produz_lotes():
+    """A leitura em streaming respeita o tamanho do lote e ignora linhas inválidas."""
+    content = create_mock_excel({"Analítico": _dados_analitico(5)})
+    parser = SinapiExcelParser(content)
+
+    lotes = list(parser.iterar_analitico("Analítico", "01/2024", tamanho_lote=2))
+
+    assert [len(lote) for lote in lotes] == [2, 2, 1]
+    primeiro = lotes[0][0]
+    assert primeiro == {
+        "codigo_pai": "87878",
+        "codigo_filho": "100",
+        "quantidade_coeficiente": 0.5,
+        "fonte": "SINAPI",
+        "mes_referencia": "01/2024",
+        "descricao_filho": "Insumo 0",
+        "unidade_filho": "KG",
+        "tipo_item": "INSUMO",
+    }
+
+
+def test_sinapi_parser_extrair_analitico_sem_header():
+    content = create_mock_excel({"Analítico": [["Lixo", "Texto"], ["1", "2"]]})
+    parser = SinapiExcelParser(content)
+
+    assert parser.extrair_analitico("Analítico", "01/2024") == []
@@ -59,3 +59,20 @@ def test_pdf_service_hierarquico():
     assert isinstance(pdf_bytes, bytearray) or isinstance(pdf_bytes, bytes)
     assert len(pdf_bytes) > 0
     assert pdf_bytes.startswith(b"%PDF")
+
+def test_quebra_de_linhas_igual_ao_multi_cell():
+    """A quebra em cache produz as mesmas linhas que o multi_cell do fpdf"""
+    pdf_service = PdfService()
+    pdf_service.add_page()
+    pdf_service.set_font('helvetica', '', 9)
+    textos = [
+        "",
+        "Item curto",
+        "1.2. CONCRETO FCK = 25MPA, TRAÇO 1:2,3:2,7 (EM MASSA SECA DE CIMENTO/ AREIA MÉDIA/ BRITA 1) - PREPARO MECÂNICO COM BETONEIRA 400 L. AF_05/2021",
+        "PALAVRA" * 20 + " fim",
+        "primeira linha\nsegunda linha",
+    ]
+
+    for texto in textos:
+        esperado = pdf_service.multi_cell(w=100, h=6, text=texto, dry_run=True, output='LINES')
+        assert list(pdf_service._linhas(texto, 100)) == esperado
@@ -0,0 +1,97 @@
+"""
+Unit tests for IndicePrecos — índice de preços em memória do buscar_preco.
+"""
+import pytest
+from unittest.mock import MagicMock
+
+from app.modules.item.price_index import IndicePrecos
+from app.modules.item.repositories import ItemRepository
+
+
+def _supabase_com_base(linhas_base, linhas_todos_meses=None):
+    """Mock cujo carregamento de base devolve ``linhas_base`` e o fallback ``linhas_todos_meses``."""
+    supabase = MagicMock()
+    chain = supabase.table.return_value.select.return_value
+    chain.eq.return_value = chain
+    chain.ilike.return_value = chain
+    chain.order.return_value = chain
+    chain.in_.return_value = chain
+    chain.range.return_value.execute.return_value.data = linhas_base
+    chain.execute.return_value.data = linhas_todos_meses or []
+    return supabase, chain
+
+
+@pytest.mark.unit
+def test_indice_carrega_base_uma_unica_vez():
+    supabase, chain = _supabase_com_base([
+        {"codigo_composicao": "100", "sp": 150.0, "rj": None},
+        {"codigo_composicao": "101", "sp": 10.5, "rj": 11.0},
+    ])
+    indice = IndicePrecos()
+
+    assert indice.buscar(supabase, "100", "SP", "12/2025", "Sem Desoneração") == 150.0
+    assert indice.buscar(supabase, "101", "rj", "12/2025", "Sem Desoneração") == 11.0
+    assert indice.buscar(supabase, "100", "rj", "12/2025", "SEM DESONERAÇÃO") is None
+
+    assert chain.range.return_value.execute.call_count == 1
+    assert indice.bases_carregadas() == [("SINAPI", "12/2025", "sem desoneração")]
+
+
+@pytest.mark.unit
+def test_indice_fallback_mes_mais_recente_e_memorizado():
+    supabase, chain = _supabase_com_base(
+        [{"codigo_composicao": "100", "sp": 1.0}],
+        linhas_todos_meses=[
+            {"codigo_composicao": "999", "mes_referencia": "01/2024", "sp": 70.0},
+            {"codigo_composicao": "999", "mes_referencia": "01/2026", "sp": 88.0},
+        ],
+    )
+    indice = IndicePrecos()
+
+    assert indice.buscar(supabase, "999", "sp", "12/2025", "Sem Desoneração") == 88.0
+    assert indice.buscar(supabase, "999", "sp", "12/2025", "Sem Desoneração") == 88.0
+    assert chain.execute.call_count == 1
+
+
+@pytest.mark.unit
+def test_indice_fallback_expira_com_o_ttl(monkeypatch):
+    """Respostas do fallback, inclusive as negativas, valem só por ``ttl`` segundos."""
+    agora = [1000.0]
+    monkeypatch.setattr("app.modules.item.price_index.time.monotonic", lambda: agora[0])
+    supabase, chain = _supabase_com_base([{"codigo_composicao": "100", "sp": 1.0}])
+    indice = IndicePrecos(ttl=60)
+
+    assert indice.buscar(supabase, "999", "sp", "12/2025", "Sem Desoneração") is None
+    agora[0] += 30
+    assert indice.buscar(supabase, "999", "sp", "12/2025", "Sem Desoneração") is None
+    assert chain.execute.call_count == 1
+
+    chain.execute.return_value.data = [{"codigo_composicao": "999", "mes_referencia": "01/2026", "sp": 88.0}]
+    agora[0] += 31
+    assert indice.buscar(supabase, "999", "sp", "12/2025", "Sem Desoneração") == 88.0
+    assert chain.execute.call_count == 2
+
+
+@pytest.mark.unit
+def test_indice_invalidar_recarrega_base():
+    supabase, chain = _supabase_com_base([{"codigo_composicao": "100", "sp": 1.0}])
+    indice = IndicePrecos()
+    indice.buscar(supabase, "100", "sp", "12/2025", "Sem Desoneração")
+
+    assert indice.invalidar(fonte="SINAPI", mes_referencia="11/2025") == 0
+    assert indice.invalidar(fonte="SINAPI", mes_referencia="12/2025") == 1
+
+    chain.range.return_value.execute.return_value.data = [{"codigo_composicao": "100", "sp": 2.0}]
+    assert indice.buscar(supabase, "100", "sp", "12/2025", "Sem Desoneração") == 2.0
+    assert chain.range.return_value.execute.call_count == 2
+
+
+@pytest.mark.unit
+def test_buscar_preco_usa_indice_quando_configurado():
+    supabase, chain = _supabase_com_base([{"codigo_composicao": "100", "sp": 150.0}])
+    repo = ItemRepository(supabase, indice_precos=IndicePrecos())
+
+    precos = [repo.buscar_preco("100", "sp", "12/2025", "Sem Desoneração") for _ in range(5)]
+
+    assert precos == [150.0] * 5
+    assert chain.range.return_value.execute.call_count == 1
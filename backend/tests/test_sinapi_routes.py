@@ -102,3 +102,86 @@ def test_listar_bases_disponiveis(client: TestClient, mock_supabase):
     result = response.json()
     assert isinstance(result, list)
 
+
+
+@pytest.mark.integration
+def test_import_enfileira_job_e_consulta_progresso(client: TestClient, sinapi_excel_content: bytes):
+    """POST /importacao/import devolve o id da tarefa; GET /jobs/{id} traz o progresso."""
+    from core.jobs import JobManager
+
+    manager = JobManager(max_workers=1)
+    repo = MagicMock()
+    repo.upsert_batch_composicoes.side_effect = lambda dados: len(dados)
+    repo.upsert_batch_estados.side_effect = lambda dados: len(dados)
+    repo.relatorio_upsert.return_value = {}
+
+    with patch("app.modules.importacao.routes.get_job_manager", return_value=manager), \
+         patch("app.modules.importacao.routes.get_item_repository", return_value=repo):
+        files = [("files", ("CSD.xlsx", sinapi_excel_content, "application/octet-stream"))]
+        response = client.post("/importacao/import", files=files)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        manager.aguardar(job_id, timeout=10)
+        job = client.get(f"/importacao/jobs/{job_id}").json()
+
+    manager.encerrar()
+    assert job["status"] == "concluido"
+    assert job["etapa"] == "concluido"
+    assert job["progresso"]["linhas_lidas"] == {"composicao": 2, "composicao_estados": 2}
+    assert job["progresso"]["linhas_gravadas"] == {"composicao": 2, "composicao_estados": 2}
+    assert job["resultado"]["imported_items"] == 2
+
+
+def test_import_sem_planilha_excel_retorna_400(client: TestClient):
+    files = [("files", ("dados.txt", b"texto", "text/plain"))]
+    response = client.post("/importacao/import", files=files)
+    assert response.status_code == 400
+
+
+def test_job_inexistente_retorna_404(client: TestClient):
+    response = client.get("/importacao/jobs/nao-existe")
+    assert response.status_code == 404
+
+
+def test_job_de_exportacao_nao_e_exposto_na_rota_de_importacao(client: TestClient):
+    """O armazenamento de tarefas é compartilhado; a rota só mostra importações."""
+    from core.jobs import JobManager
+
+    manager = JobManager(max_workers=1)
+    job_id = manager.submeter("exportacao", lambda progresso: {"arquivo": "/tmp/orcamento.xlsx"})
+    manager.aguardar(job_id, timeout=5)
+    manager.encerrar()
+
+    with patch("app.modules.importacao.routes.get_job_manager", return_value=manager):
+        response = client.get(f"/importacao/jobs/{job_id}")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.integration
+def test_buscar_precos_em_lote_rota(client: TestClient):
+    """POST /composicoes/precos → preços por código e lista dos não encontrados."""
+    with patch(
+        "app.modules.item.repositories.ItemRepository.buscar_precos_em_lote",
+        return_value={"100": 10.0, "200": None},
+    ) as buscar:
+        response = client.post("/composicoes/precos", json={
+            "codigos": ["100", "200"], "estado": "SP", "mes_referencia": "12/2025",
+        })
+
+    assert response.status_code == 200
+    assert response.json() == {"precos": {"100": 10.0, "200": None}, "nao_encontrados": ["200"]}
+    buscar.assert_called_once_with(["100", "200"], "SP", "12/2025", "Sem Desoneração", "SINAPI")
+
+
+@pytest.mark.integration
+def test_buscar_precos_em_lote_estado_invalido_retorna_400(client: TestClient):
+    """O estado vira coluna da consulta: só as 27 UFs são aceitas."""
+    with patch("app.modules.item.repositories.ItemRepository.buscar_precos_em_lote") as buscar:
+        response = client.post("/composicoes/precos", json={
+            "codigos": ["100"], "estado": "sp,senha", "mes_referencia": "12/2025",
+        })
+
+    assert response.status_code == 400
+    buscar.assert_not_called()
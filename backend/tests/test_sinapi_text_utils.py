@@ -2,14 +2,18 @@
 Unit tests for sinapi_text_utils.py — pure functions, no mocks needed.
 
 Covers: remover_acentos, limpar_link_excel, gerar_chave_match,
-        limpar_valor_moeda, normalizar_nome_aba.
+        limpar_valor_moeda, limpar_valores_moeda_serie, normalizar_nome_aba.
 """
+import math
+
+import pandas as pd
 import pytest
 
 from app.modules.importacao.services.sinapi_text_utils import (
     gerar_chave_match,
     limpar_link_excel,
     limpar_valor_moeda,
+    limpar_valores_moeda_serie,
     normalizar_nome_aba,
     remover_acentos,
 )
@@ -110,6 +114,33 @@ def test_limpar_valor_moeda_converte_corretamente(entrada, esperado):
     assert resultado == esperado
 
 
+@pytest.mark.unit
+def test_limpar_valores_moeda_serie_equivale_a_versao_escalar():
+    """A versão vetorizada deve concordar com limpar_valor_moeda célula a célula."""
+    # Arrange
+    entradas = [10.5, 7, "1.234,56", "  99,9 ", "", "-", "nan", None, float("nan"), "abc"]
+    serie = pd.Series(entradas, dtype=object, index=range(10, 20))
+
+    # Act
+    resultado = limpar_valores_moeda_serie(serie)
+
+    # Assert
+    assert list(resultado.index) == list(serie.index)
+    for entrada, obtido in zip(entradas, resultado):
+        esperado = limpar_valor_moeda(entrada)
+        if esperado is None:
+            assert math.isnan(obtido)
+        else:
+            assert obtido == esperado
+
+
+@pytest.mark.unit
+def test_limpar_valores_moeda_serie_coluna_numerica_mantem_valores():
+    """Coluna já numérica é apenas convertida para float."""
+    resultado = limpar_valores_moeda_serie(pd.Series([1, 2, 3]))
+    assert resultado.dtype == "float64"
+    assert resultado.tolist() == [1.0, 2.0, 3.0]
+
 
 # ---------------------------------------------------------------------------
 # normalizar_nome_aba
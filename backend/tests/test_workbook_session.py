@@ -0,0 +1,93 @@
+"""
+Unit tests for WorkbookSession — cache de abas e contadores por etapa.
+
+Usa o fixture `sinapi_excel_content` (conftest.py) para gerar o Excel em memória.
+"""
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from app.modules.importacao.services.workbook_session import WorkbookSession
+
+
+@pytest.mark.unit
+def test_ler_aba_completa_le_uma_unica_vez(sinapi_excel_content: bytes):
+    """Leituras repetidas da mesma aba são servidas pelo cache."""
+    sessao = WorkbookSession(sinapi_excel_content)
+
+    with patch(
+        "app.modules.importacao.services.workbook_session.pd.read_excel",
+        wraps=pd.read_excel,
+    ) as read_excel:
+        df1 = sessao.ler_aba("CSD_TESTE", header=None)
+        df2 = sessao.ler_aba("CSD_TESTE", header=None)
+        head = sessao.ler_aba("CSD_TESTE", header=None, nrows=3)
+
+    assert read_excel.call_count == 1
+    assert df1 is df2
+    assert len(head) == 3
+
+
+@pytest.mark.unit
+def test_ler_aba_parcial_sem_ler_abas_completas(sinapi_excel_content: bytes):
+    """No modo upload, uma leitura com nrows não carrega a aba inteira."""
+    sessao = WorkbookSession(sinapi_excel_content, ler_abas_completas=False)
+
+    df = sessao.ler_aba("CSD_TESTE", header=None, nrows=2)
+
+    assert len(df) == 2
+
+
+@pytest.mark.unit
+def test_ler_aba_parcial_com_ler_abas_completas_reaproveita(sinapi_excel_content: bytes):
+    """No modo importação, a leitura de metadados já carrega a aba inteira."""
+    sessao = WorkbookSession(sinapi_excel_content, ler_abas_completas=True)
+
+    with patch(
+        "app.modules.importacao.services.workbook_session.pd.read_excel",
+        wraps=pd.read_excel,
+    ) as read_excel:
+        sessao.ler_aba("CSD_TESTE", header=None, nrows=2)
+        completa = sessao.ler_aba("CSD_TESTE", header=None)
+
+    assert read_excel.call_count == 1
+    assert len(completa) == 8
+
+
+@pytest.mark.unit
+def test_liberar_aba_descarta_cache(sinapi_excel_content: bytes):
+    sessao = WorkbookSession(sinapi_excel_content)
+    df1 = sessao.ler_aba("CSD_TESTE", header=None)
+
+    sessao.liberar_aba("CSD_TESTE")
+    df2 = sessao.ler_aba("CSD_TESTE", header=None)
+
+    assert df1 is not df2
+
+
+@pytest.mark.unit
+def test_workbook_formulas_aberto_uma_vez(sinapi_excel_content: bytes):
+    sessao = WorkbookSession(sinapi_excel_content)
+
+    wb1 = sessao.workbook_formulas()
+    wb2 = sessao.workbook_formulas()
+
+    assert wb1 is wb2
+    assert sessao.estatisticas()["abrir_formulas"]["chamadas"] == 1
+    sessao.fechar()
+
+
+@pytest.mark.unit
+def test_estatisticas_registram_tempo_e_memoria(sinapi_excel_content: bytes):
+    sessao = WorkbookSession(sinapi_excel_content, medir_memoria=True)
+
+    with sessao.medir("etapa_teste"):
+        sessao.ler_aba("CSD_TESTE", header=None)
+
+    estat = sessao.estatisticas()
+    assert estat["etapa_teste"]["chamadas"] == 1
+    assert estat["etapa_teste"]["segundos"] >= 0
+    assert estat["etapa_teste"]["pico_memoria_bytes"] > 0
+    assert "leitura_aba:CSD_TESTE" in estat
+    assert "abrir_arquivo" in estat
@@ -23,7 +23,36 @@ export async function uploadWorksheet(file: File, source: string = "SINAPI"): Pr
     return response.json();
 }
 
-export async function importWorksheet(files: File[], source: string = "SINAPI"): Promise<any> {
+export interface ImportJob {
+    id: string;
+    status: 'pendente' | 'executando' | 'concluido' | 'erro';
+    etapa: string | null;
+    progresso: {
+        linhas_lidas: Record<string, number>;
+        linhas_gravadas: Record<string, number>;
+        [key: string]: unknown;
+    };
+    resultado: any;
+    erro: string | null;
+    tempo_decorrido_s: number;
+}
+
+export async function getImportJob(jobId: string): Promise<ImportJob> {
+    const response = await fetchWithAuth(`/importacao/jobs/${jobId}`);
+
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Erro ao consultar importação');
+    }
+
+    return response.json();
+}
+
+export async function importWorksheet(
+    files: File[],
+    source: string = "SINAPI",
+    onProgress?: (job: ImportJob) => void,
+): Promise<any> {
     const formData = new FormData();
     files.forEach(file => {
         formData.append('files', file); // 'files' must match backend parameter name
@@ -39,5 +68,13 @@ export async function importWorksheet(files: File[], source: string = "SINAPI"):
         throw new Error(error.detail || 'Erro ao importar dados');
     }
 
-    return response.json();
+    // A importação roda em segundo plano: acompanha a tarefa até o fim
+    const { job_id } = await response.json();
+    while (true) {
+        const job = await getImportJob(job_id);
+        onProgress?.(job);
+        if (job.status === 'concluido') return job.resultado;
+        if (job.status === 'erro') throw new Error(job.erro || 'Erro ao importar dados');
+        await new Promise(resolve => setTimeout(resolve, 2000));
+    }
 }
@@ -156,6 +156,42 @@ export async function getOrcamentos(
   return response.json();
 }
 
+export interface OrcamentosPagina {
+  itens: Partial<Orcamento>[];
+  proximoCursor: string | null;
+  total: number | null;
+}
+
+export async function getOrcamentosPagina(opcoes: {
+  busca?: string;
+  status?: string;
+  limite?: number;
+  cursor?: string | null;
+  fields?: (keyof Orcamento)[];
+  comTotal?: boolean;
+}): Promise<OrcamentosPagina> {
+  const params = new URLSearchParams();
+  if (opcoes.busca) params.append("busca", opcoes.busca);
+  if (opcoes.status) params.append("status", opcoes.status);
+  params.append("limite", String(opcoes.limite ?? 50));
+  if (opcoes.cursor) params.append("cursor", opcoes.cursor);
+  if (opcoes.fields?.length) params.append("fields", opcoes.fields.join(","));
+  if (opcoes.comTotal) params.append("com_total", "true");
+
+  const response = await fetchWithAuth(`/orcamentos/?${params.toString()}`);
+
+  if (!response.ok) {
+    throw new Error("Erro ao buscar orçamentos");
+  }
+
+  const total = response.headers.get("X-Total-Count");
+  return {
+    itens: await response.json(),
+    proximoCursor: response.headers.get("X-Next-Cursor"),
+    total: total !== null ? Number(total) : null,
+  };
+}
+
 export async function getOrcamento(id: string): Promise<Orcamento> {
   const response = await fetchWithAuth(`/orcamentos/${id}`);
 
@@ -217,6 +253,36 @@ export async function downloadOrcamentoExcel(id: string): Promise<Blob> {
   return response.blob();
 }
 
+export type FormatoExportacao = "pdf" | "xlsx" | "xlsx-completo";
+
+// Orçamentos pequenos voltam o arquivo direto (200); os grandes viram uma
+// tarefa (202) consultada até o arquivo ficar pronto.
+export async function exportarOrcamento(
+  id: string,
+  formato: FormatoExportacao,
+  intervaloMs = 2000,
+): Promise<Blob> {
+  let response = await fetchWithAuth(
+    `/orcamentos/${id}/exports?formato=${formato}`,
+    { method: "POST" },
+  );
+
+  if (response.status === 202) {
+    const { url } = await response.json();
+    do {
+      await new Promise((resolve) => setTimeout(resolve, intervaloMs));
+      response = await fetchWithAuth(url);
+    } while (response.status === 202);
+  }
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || "Erro ao exportar orçamento");
+  }
+
+  return response.blob();
+}
+
 // Funções para Itens do Orçamento
 export async function addItem(
   orcamentoId: string,
@@ -442,6 +508,8 @@ export interface CurvaABCResponse {
 
 export interface CronogramaMes {
   mes: string;
+  inicio?: string;
+  fim?: string;
   servicos: string;
   valor: number;
   acumulado_pct: number;
@@ -449,6 +517,7 @@ export interface CronogramaMes {
 
 export interface CronogramaResponse {
   valor_total: number;
+  periodo?: string;
   mensal: CronogramaMes[];
 }
 
@@ -464,8 +533,13 @@ export async function getOrcamentoCurvaABC(orcamentoId: string): Promise<CurvaAB
   return response.json();
 }
 
-export async function getOrcamentoCronograma(orcamentoId: string): Promise<CronogramaResponse> {
-  const response = await fetchWithAuth(`/orcamentos/${orcamentoId}/cronograma`);
+export async function getOrcamentoCronograma(
+  orcamentoId: string,
+  periodo: "mensal" | "semanal" | number = "mensal",
+): Promise<CronogramaResponse> {
+  const response = await fetchWithAuth(
+    `/orcamentos/${orcamentoId}/cronograma?periodo=${periodo}`,
+  );
   if (!response.ok) throw new Error("Erro ao buscar cronograma do orçamento");
   return response.json();
 }